@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import assets, accounts, portfolios, transactions, dashboard
+from app.api.v1.endpoints import assets, accounts, portfolios, transactions, dashboard, market_data, exports, admin, stream
 
 api_router = APIRouter()
 api_router.include_router(assets.router, prefix="/assets", tags=["assets"])
@@ -7,3 +7,7 @@ api_router.include_router(accounts.router, prefix="/accounts", tags=["accounts"]
 api_router.include_router(portfolios.router, prefix="/portfolios", tags=["portfolios"])
 api_router.include_router(transactions.router, prefix="/transactions", tags=["transactions"])
 api_router.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
+api_router.include_router(market_data.router, prefix="/market_data", tags=["market_data"])
+api_router.include_router(exports.router, prefix="/exports", tags=["exports"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
+api_router.include_router(stream.router, prefix="/stream", tags=["stream"])
@@ -1,12 +1,20 @@
-from typing import Annotated
+from datetime import datetime
+from decimal import Decimal
+from typing import Annotated, Optional
 from fastapi import APIRouter, Depends, Query, HTTPException
 
 from app.services.account import AccountService
+from app.services.lots import LotService
+from app.services.position import PositionService
 from app.schemas.account import AccountCreate, AccountRead, AccountUpdate
+from app.schemas.lot import RealizedGainsReport, TaxLotRead
+from app.schemas.position import HoldingsAsOfReport
 
 router = APIRouter()
 
 ServiceDep = Annotated[AccountService, Depends()]
+LotServiceDep = Annotated[LotService, Depends()]
+PositionServiceDep = Annotated[PositionService, Depends()]
 
 @router.post("/", response_model=AccountRead)
 def create_account(account_service: ServiceDep, account_in: AccountCreate):
@@ -39,6 +47,62 @@ def read_account_by_id(account_service: ServiceDep, account_id: int):
     return account
 
 
+@router.get("/{account_id}/lots", response_model=list[TaxLotRead])
+def read_account_lots(
+    account_service: ServiceDep,
+    lot_service: LotServiceDep,
+    account_id: int,
+    asset_id: Optional[int] = None,
+):
+    """
+    Open tax lots of an account (optionally one asset), oldest first.
+    """
+    if not account_service.get_account_model(account_id=account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    return lot_service.get_open_lots(account_id=account_id, asset_id=asset_id)
+
+
+@router.get("/{account_id}/realized_gains", response_model=RealizedGainsReport)
+def read_account_realized_gains(
+    account_service: ServiceDep,
+    lot_service: LotServiceDep,
+    account_id: int,
+    asset_id: Optional[int] = None,
+):
+    """
+    Realized gains per year under the account's lot method, split into short and long term.
+    """
+    if not account_service.get_account_model(account_id=account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    years = lot_service.get_realized_gains(account_id=account_id, asset_id=asset_id)
+    return RealizedGainsReport(
+        account_id=account_id,
+        method=lot_service.get_method(account_id).value,
+        years=[year._asdict() for year in years],
+        total_gain=sum((year.gain for year in years), Decimal(0)),
+    )
+
+
+@router.get("/{account_id}/holdings", response_model=HoldingsAsOfReport)
+def read_account_holdings(
+    account_service: ServiceDep,
+    position_service: PositionServiceDep,
+    account_id: int,
+    as_of: datetime,
+):
+    """
+    Holdings of an account as of a point in time, replayed from the nearest position checkpoint.
+    """
+    if not account_service.get_account_model(account_id=account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    holdings = position_service.get_holdings_as_of(account_id=account_id, as_of=as_of)
+    return HoldingsAsOfReport(
+        account_id=account_id,
+        as_of=as_of,
+        holdings=[holding._asdict() for holding in holdings],
+    )
+
+
 @router.patch("/{account_id}", response_model=AccountRead)
 def update_account_by_id(account_service: ServiceDep, account_id: int, account_in: AccountUpdate):
     """
@@ -0,0 +1,28 @@
+from typing import Annotated, Literal
+from fastapi import APIRouter, Query
+
+from app.core.slow_queries import slow_query_log
+from app.schemas.admin import SlowQueryReport
+
+router = APIRouter()
+
+
+@router.get("/slow_queries", response_model=SlowQueryReport)
+def read_slow_queries(
+    limit: Annotated[int, Query(ge=1, le=200)] = 20,
+    order_by: Literal["total", "count", "p95", "max"] = "total",
+):
+    """
+    Slow SQL statements grouped by normalized text (top offenders first),
+    with count, p95 latency, callers and query plan, plus the latest entries.
+    """
+    return slow_query_log.report(limit=limit, order_by=order_by)
+
+
+@router.delete("/slow_queries")
+def reset_slow_queries():
+    """
+    Clear the slow query log.
+    """
+    slow_query_log.reset()
+    return {"ok": True}
@@ -1,5 +1,5 @@
 from typing import Annotated
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 
 from app.services.asset import AssetService
 from app.schemas.asset import AssetCreate, AssetRead, AssetUpdate, AssetValidateRequest, AssetValidateResponse
@@ -9,33 +9,42 @@ router = APIRouter()
 ServiceDep = Annotated[AssetService, Depends()]
 
 @router.post("/validate", response_model=AssetValidateResponse)
-def validate_asset_ticker(asset_service: ServiceDep, request: AssetValidateRequest):
+async def validate_asset_ticker(asset_service: ServiceDep, request: AssetValidateRequest):
     """
     Validate a ticker using yfinance and return metadata.
     """
-    result = asset_service.validate_ticker(request.ticker)
+    result = await asset_service.validate_ticker(request.ticker)
     if not result.valid:
         raise HTTPException(status_code=404, detail=f"Ticker '{request.ticker}' not found or invalid.")
     return result
 
 @router.post("/update_prices")
-def update_all_prices(asset_service: ServiceDep):
+async def update_all_prices(asset_service: ServiceDep, request: Request, response: Response, background: bool = False):
     """
     Update current prices for all assets.
+
+    With `background=true` the refresh is handed to the background scheduler and the
+    call returns 202 immediately (held assets first, stalest first).
     """
-    count = asset_service.update_prices()
+    scheduler = getattr(request.app.state, "price_scheduler", None)
+    if background and scheduler is not None and scheduler.running:
+        scheduler.trigger()
+        response.status_code = 202
+        return {"ok": True, "scheduled": True}
+
+    count = await asset_service.update_prices()
     return {"ok": True, "updated_count": count}
 
 @router.post("/", response_model=AssetRead)
-def create_asset(asset_service: ServiceDep, asset_in: AssetCreate):
+async def create_asset(asset_service: ServiceDep, asset_in: AssetCreate):
     """
     Create a new asset.
     """
-    return asset_service.create_asset(asset_in=asset_in)
+    return await asset_service.create_asset(asset_in=asset_in)
 
 
 @router.get("/", response_model=list[AssetRead])
-def read_assets(
+async def read_assets(
     asset_service: ServiceDep,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
@@ -43,40 +52,40 @@ def read_assets(
     """
     Retrieve assets.
     """
-    return asset_service.get_assets(offset=offset, limit=limit)
+    return await asset_service.get_assets(offset=offset, limit=limit)
 
 
 @router.get("/{asset_id}", response_model=AssetRead)
-def read_asset_by_id(asset_service: ServiceDep, asset_id: int):
+async def read_asset_by_id(asset_service: ServiceDep, asset_id: int):
     """
     Get a specific asset by ID.
     """
-    asset = asset_service.get_asset_by_id(asset_id=asset_id)
+    asset = await asset_service.get_asset_by_id(asset_id=asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     return asset
 
 
 @router.patch("/{asset_id}", response_model=AssetRead)
-def update_asset_by_id(asset_service: ServiceDep, asset_id: int, asset_in: AssetUpdate):
+async def update_asset_by_id(asset_service: ServiceDep, asset_id: int, asset_in: AssetUpdate):
     """
     Update an asset.
     """
-    asset = asset_service.get_asset_by_id(asset_id=asset_id)
+    asset = await asset_service.get_asset_by_id(asset_id=asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     
-    return asset_service.update_asset(asset=asset, asset_in=asset_in)
+    return await asset_service.update_asset(asset=asset, asset_in=asset_in)
 
 
 @router.delete("/{asset_id}")
-def delete_asset_by_id(asset_service: ServiceDep, asset_id: int):
+async def delete_asset_by_id(asset_service: ServiceDep, asset_id: int):
     """
     Delete an asset.
     """
-    asset = asset_service.get_asset_by_id(asset_id=asset_id)
+    asset = await asset_service.get_asset_by_id(asset_id=asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     
-    asset_service.delete_asset(asset=asset)
+    await asset_service.delete_asset(asset=asset)
     return {"ok": True}
\ No newline at end of file
@@ -0,0 +1,72 @@
+from datetime import datetime
+from typing import Annotated, Iterator, List, Literal, Optional
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.models.transacions import TransactionType
+from app.services.export import EXPORT_FORMATS, ExportService, check_format
+
+router = APIRouter()
+
+ServiceDep = Annotated[ExportService, Depends()]
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
+
+def _streaming(name: str, fmt: str, chunks: Iterator[bytes]) -> StreamingResponse:
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+def _check(fmt: str) -> None:
+    try:
+        check_format(fmt)
+    except ModuleNotFoundError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+@router.get("/transactions")
+def export_transactions(
+    export_service: ServiceDep,
+    format: ExportFormat = "csv",
+    account_id: Optional[int] = None,
+    asset_id: Optional[int] = None,
+    types: Annotated[Optional[List[TransactionType]], Query(alias="type")] = None,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+):
+    """
+    Stream transactions in time order (the CSV/NDJSON output can be re-imported).
+    """
+    _check(format)
+    chunks = export_service.export_transactions(
+        format, account_id=account_id, asset_id=asset_id, types=types, start=start, end=end
+    )
+    return _streaming("transactions", format, chunks)
+
+
+@router.get("/positions")
+def export_positions(export_service: ServiceDep, format: ExportFormat = "csv", account_id: Optional[int] = None):
+    """
+    Stream current positions (holdings) with the latest asset price.
+    """
+    _check(format)
+    return _streaming("positions", format, export_service.export_positions(format, account_id=account_id))
+
+
+@router.get("/prices")
+def export_prices(
+    export_service: ServiceDep,
+    format: ExportFormat = "csv",
+    asset_ids: Annotated[Optional[List[int]], Query()] = None,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+):
+    """
+    Stream price history (market_data) ordered by asset and time.
+    """
+    _check(format)
+    chunks = export_service.export_prices(format, asset_ids=asset_ids, start=start, end=end)
+    return _streaming("prices", format, chunks)
@@ -0,0 +1,43 @@
+import io
+from datetime import datetime
+from typing import Annotated, Dict, List, Optional
+from fastapi import APIRouter, Depends, Query, UploadFile
+
+from app.services.market_data import MarketDataService
+from app.schemas.market_data import MarketDataRead, MarketDataImportResult
+
+router = APIRouter()
+
+ServiceDep = Annotated[MarketDataService, Depends()]
+
+@router.get("/", response_model=Dict[int, List[MarketDataRead]])
+def read_price_history(
+    market_data_service: ServiceDep,
+    asset_ids: Annotated[List[int], Query()],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """
+    Retrieve price history for one or more assets within a time range.
+    """
+    return market_data_service.get_range(asset_ids=asset_ids, start=start, end=end)
+
+
+@router.get("/as_of", response_model=Dict[int, MarketDataRead])
+def read_prices_as_of(
+    market_data_service: ServiceDep,
+    asset_ids: Annotated[List[int], Query()],
+    timestamp: datetime,
+):
+    """
+    Get the latest known price of each asset at a point in time.
+    """
+    return market_data_service.get_prices_as_of(asset_ids=asset_ids, as_of=timestamp)
+
+
+@router.post("/import", response_model=MarketDataImportResult)
+def import_price_history(market_data_service: ServiceDep, file: UploadFile):
+    """
+    Backfill price history from a CSV file (ticker or asset_id, timestamp, price).
+    """
+    return market_data_service.import_csv(io.TextIOWrapper(file.file, encoding="utf-8"))
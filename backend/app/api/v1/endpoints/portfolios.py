@@ -1,18 +1,24 @@
-from typing import Annotated, List
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
 from fastapi import APIRouter, Depends, Query, HTTPException
 
+from app.core.cache import portfolio_summary_cache
 from app.services.portfolio import PortfolioService
+from app.services.performance import PerformanceService
 from app.schemas.portfolio import (
     PortfolioCreate, 
     PortfolioRead, 
     PortfolioUpdate, 
     PortfolioListItem, 
-    PortfolioSummary
+    PortfolioSummary,
+    PortfolioHistory,
+    PortfolioPerformance
 )
 
 router = APIRouter()
 
 ServiceDep = Annotated[PortfolioService, Depends()]
+PerformanceServiceDep = Annotated[PerformanceService, Depends()]
 
 @router.post("/", response_model=PortfolioRead)
 def create_portfolio(portfolio_service: ServiceDep, portfolio_in: PortfolioCreate):
@@ -34,6 +40,30 @@ def read_portfolios(
     return portfolio_service.get_portfolios(offset=offset, limit=limit)
 
 
+@router.get("/summary_cache")
+def read_summary_cache_stats():
+    """
+    Get hit/miss statistics of the portfolio summary cache.
+    """
+    return portfolio_summary_cache.stats()
+
+
+@router.get("/performance", response_model=List[PortfolioPerformance])
+def read_portfolios_performance(
+    performance_service: PerformanceServiceDep,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+):
+    """
+    Get TWR, XIRR and max drawdown of every portfolio, computed in one batch
+    (defaults to since the first transaction).
+    """
+    try:
+        return performance_service.get_performance(start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/{portfolio_id}/summary", response_model=PortfolioSummary)
 def read_portfolio_summary(portfolio_service: ServiceDep, portfolio_id: int):
     """
@@ -45,6 +75,47 @@ def read_portfolio_summary(portfolio_service: ServiceDep, portfolio_id: int):
     return portfolio_summary
 
 
+@router.get("/{portfolio_id}/history", response_model=PortfolioHistory)
+def read_portfolio_history(
+    portfolio_service: ServiceDep,
+    portfolio_id: int,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+    interval: Literal["1d", "1h"] = "1d",
+):
+    """
+    Get the portfolio valuation series (defaults to the last 365 days, daily).
+    """
+    try:
+        history = portfolio_service.get_portfolio_history(
+            portfolio_id=portfolio_id, start=start, end=end, interval=interval
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not history:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return history
+
+
+@router.get("/{portfolio_id}/performance", response_model=PortfolioPerformance)
+def read_portfolio_performance(
+    performance_service: PerformanceServiceDep,
+    portfolio_id: int,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+):
+    """
+    Get TWR, XIRR and max drawdown of a portfolio (defaults to since its first transaction).
+    """
+    try:
+        performance = performance_service.get_performance(portfolio_ids=[portfolio_id], start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not performance:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return performance[0]
+
+
 @router.get("/{portfolio_id}", response_model=PortfolioRead)
 def read_portfolio_by_id(portfolio_service: ServiceDep, portfolio_id: int):
     """
@@ -0,0 +1,58 @@
+from typing import Annotated, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.services.live_updates import LiveUpdateBroker
+
+router = APIRouter()
+
+
+def get_broker(request: Request) -> LiveUpdateBroker:
+    broker = getattr(request.app.state, "live_updates", None)
+    if broker is None or not broker.running:
+        raise HTTPException(status_code=503, detail="Live updates are not running")
+    return broker
+
+
+BrokerDep = Annotated[LiveUpdateBroker, Depends(get_broker)]
+
+
+@router.get("/")
+async def stream_live_updates(
+    broker: BrokerDep,
+    portfolio_id: Annotated[List[int], Query()] = [],
+):
+    """
+    Server-sent events with live prices (`prices`), dashboard stats (`dashboard`) and the
+    summary of every requested `portfolio_id` (`portfolio`).
+
+    The first event of each kind carries the full state, later ones only the top-level fields
+    that changed; merge them into the previous state.
+    """
+    if broker.full:
+        raise HTTPException(status_code=503, detail="Too many live update subscribers")
+
+    async def events():
+        # 在 generator 裡訂閱：連線還沒開始就斷掉時不會留下訂閱者
+        subscriber = broker.subscribe(portfolio_id)
+        try:
+            while True:
+                frames = await subscriber.next(settings.LIVE_UPDATES_HEARTBEAT_SECONDS)
+                yield b"".join(frames) if frames else b": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+def read_stream_stats(broker: BrokerDep):
+    """
+    Subscribers and fan-out statistics of the live update stream.
+    """
+    return broker.stats()
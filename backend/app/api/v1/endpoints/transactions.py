@@ -1,12 +1,30 @@
-from typing import Annotated, List, Optional
-from fastapi import APIRouter, Depends, Query, HTTPException
+import io
+from datetime import datetime
+from typing import Annotated, List, Literal, Optional
+from fastapi import APIRouter, Body, Depends, Query, HTTPException, Response, UploadFile
 
-from app.services.transaction import TransactionService
-from app.schemas.transaction import TransactionCreate, TransactionRead, TransactionUpdate, TransactionReadDetail
+from app.models.transacions import TransactionType
+from app.services.transaction import TransactionService, encode_cursor
+from app.services.transaction_import import TransactionImportService
+from app.services.lots import LotService
+from app.schemas.transaction import (
+    TransactionCreate,
+    TransactionRead,
+    TransactionUpdate,
+    TransactionReadDetail,
+    TransactionImportResult,
+    TransactionBatchUpdate,
+    TransactionBatchDelete,
+    TransactionBatchDeleteResult,
+    MAX_BATCH_SIZE,
+)
+from app.schemas.lot import LotSelectionIn, RealizedLotRead
 
 router = APIRouter()
 
 ServiceDep = Annotated[TransactionService, Depends()]
+ImportServiceDep = Annotated[TransactionImportService, Depends()]
+LotServiceDep = Annotated[LotService, Depends()]
 
 @router.post("/", response_model=TransactionRead)
 def create_transaction(transaction_service: ServiceDep, transaction_in: TransactionCreate):
@@ -16,17 +34,105 @@ def create_transaction(transaction_service: ServiceDep, transaction_in: Transact
     return transaction_service.create_transaction(transaction_in=transaction_in)
 
 
+@router.post("/import", response_model=TransactionImportResult)
+def import_transactions(
+    import_service: ImportServiceDep,
+    file: UploadFile,
+    format: Optional[Literal["csv", "ndjson"]] = None,
+):
+    """
+    Bulk import transactions from a CSV or NDJSON file (columns as in TransactionCreate,
+    `ticker` may replace `asset_id`). Rows already imported are skipped as duplicates;
+    invalid rows are counted in `error_count` (the first ones listed in `errors`) and the rest
+    are still imported.
+    """
+    if format is None:
+        is_ndjson = (file.filename or "").lower().endswith((".ndjson", ".jsonl")) or \
+            file.content_type in ("application/x-ndjson", "application/jsonl")
+        format = "ndjson" if is_ndjson else "csv"
+
+    text = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    rows = import_service.read_ndjson(text) if format == "ndjson" else import_service.read_csv(text)
+    return import_service.import_rows(rows)
+
+
+def _get_existing(transaction_service: TransactionService, transaction_ids: List[int]):
+    transactions = transaction_service.get_transactions_by_ids(transaction_ids)
+    missing = sorted(set(transaction_ids) - transactions.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Transactions not found: {missing}")
+    return transactions
+
+
+@router.post("/batch", response_model=List[TransactionRead])
+def create_transactions_batch(
+    transaction_service: ServiceDep,
+    transactions_in: Annotated[List[TransactionCreate], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+):
+    """
+    Create many transactions in one database transaction (all or nothing).
+    Each affected position is recomputed once per batch.
+    """
+    return transaction_service.create_transactions(transactions_in=transactions_in)
+
+
+@router.patch("/batch", response_model=List[TransactionRead])
+def update_transactions_batch(
+    transaction_service: ServiceDep,
+    transactions_in: Annotated[List[TransactionBatchUpdate], Body(min_length=1, max_length=MAX_BATCH_SIZE)],
+):
+    """
+    Update many transactions by id in one database transaction. 404 if any id does not exist.
+    """
+    transactions = _get_existing(transaction_service, [item.id for item in transactions_in])
+    changes = [
+        (transactions[item.id], TransactionUpdate.model_validate(item.model_dump(exclude={"id"}, exclude_unset=True)))
+        for item in transactions_in
+    ]
+    return transaction_service.update_transactions(changes=changes)
+
+
+@router.post("/batch/delete", response_model=TransactionBatchDeleteResult)
+def delete_transactions_batch(transaction_service: ServiceDep, batch_in: TransactionBatchDelete):
+    """
+    Delete many transactions by id in one database transaction. 404 if any id does not exist.
+    """
+    transactions = _get_existing(transaction_service, batch_in.ids)
+    deleted = transaction_service.delete_transactions(transactions=list(transactions.values()))
+    return TransactionBatchDeleteResult(deleted=deleted)
+
+
 @router.get("/", response_model=List[TransactionReadDetail])
 def read_transactions(
     transaction_service: ServiceDep,
+    response: Response,
     account_id: Optional[int] = None,
+    asset_id: Optional[int] = None,
+    types: Annotated[Optional[List[TransactionType]], Query(alias="type")] = None,
+    start: Annotated[Optional[datetime], Query(alias="from")] = None,
+    end: Annotated[Optional[datetime], Query(alias="to")] = None,
+    cursor: Optional[str] = None,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
 ):
     """
-    Retrieve transactions with details.
+    Retrieve transactions with details, newest first.
+
+    Pass the `X-Next-Cursor` response header back as `cursor` to fetch the next page;
+    the header is omitted on the last page. `offset` is deprecated in favour of `cursor`.
     """
-    return transaction_service.get_transactions(offset=offset, limit=limit, account_id=account_id)
+    try:
+        transactions = transaction_service.get_transactions(
+            offset=offset, limit=limit, account_id=account_id, asset_id=asset_id,
+            types=types, start=start, end=end, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if transactions and len(transactions) == limit:
+        last = transactions[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.transaction_time, last.id)
+    return transactions
 
 
 @router.get("/{transaction_id}", response_model=TransactionReadDetail)
@@ -63,3 +169,35 @@ def delete_transaction_by_id(transaction_service: ServiceDep, transaction_id: in
     
     transaction_service.delete_transaction(transaction=transaction)
     return {"ok": True}
+
+
+@router.get("/{transaction_id}/lots", response_model=List[RealizedLotRead])
+def read_transaction_lots(transaction_service: ServiceDep, lot_service: LotServiceDep, transaction_id: int):
+    """
+    Lots matched by a sell transaction.
+    """
+    if not transaction_service.get_transaction(transaction_id=transaction_id):
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return lot_service.get_realized_lots(transaction_id)
+
+
+@router.put("/{transaction_id}/lots", response_model=List[RealizedLotRead])
+def select_transaction_lots(
+    transaction_service: ServiceDep,
+    transaction_id: int,
+    selections: Annotated[List[LotSelectionIn], Body(max_length=MAX_BATCH_SIZE)],
+):
+    """
+    Choose which buys a sell closes (accounts using the `specific` lot method).
+    Unselected quantity is matched FIFO. An empty list clears the selection.
+    """
+    transaction = transaction_service.get_transaction(transaction_id=transaction_id)
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    try:
+        return transaction_service.select_lots(
+            transaction=transaction,
+            selections=[(item.lot_transaction_id, item.quantity) for item in selections],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
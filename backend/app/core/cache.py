@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Hashable
+
+from app.core.config import settings
+
+_MISSING = object()
+
+
+class VersionRegistry:
+    """
+    以 (namespace, key) 為單位的版本號。寫入端在 commit 後 bump，
+    快取端記下計算當下的版本，之後只要版本沒變就代表輸入沒變。
+    """
+
+    def __init__(self):
+        self._versions: dict[tuple[str, Hashable], int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[[str, Hashable], None]] = []
+
+    def get(self, namespace: str, key: Hashable = None) -> int:
+        return self._versions.get((namespace, key), 0)
+
+    def bump(self, namespace: str, key: Hashable = None) -> None:
+        with self._lock:
+            self._versions[(namespace, key)] += 1
+        for listener in self._listeners:
+            listener(namespace, key)
+
+    def add_listener(self, listener: Callable[[str, Hashable], None]) -> None:
+        """
+        每次 bump 後呼叫 listener(namespace, key)。bump 可能在任何 thread 發生，listener 要自己處理。
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, Hashable], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with a bounded size and hit/miss statistics.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None, validate: Callable[[Any], bool] | None = None) -> Any:
+        """
+        `validate` 回傳 False 時 (例如版本已過期) 視為 miss 並移除該筆。
+        """
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING and (validate is None or validate(value)):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            if value is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# 全域版本號: "prices" (任何報價變動)、("account", id)、("portfolio", id)
+versions = VersionRegistry()
+
+# Portfolio summary 快取: portfolio_id -> (版本快照, PortfolioSummary)
+portfolio_summary_cache = LRUCache(maxsize=settings.SUMMARY_CACHE_SIZE)
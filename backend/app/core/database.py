@@ -1,17 +1,147 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.config import settings
 from app.core.init_db import init_fiat_assets
+from app.core.metrics import instrument_engine
+from app.core.slow_queries import SQLiteConnection, install_slow_query_log
+from app.migrations import run_migrations
 
 
-SQLITE_URL = "sqlite:////data/test.db"
+def sqlite_pragmas() -> dict[str, str | int]:
+    """
+    每條 SQLite 連線建立時要套用的 PRAGMA (由設定決定)。
+    """
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+    }
 
-class SQLiteDB:
+
+@contextmanager
+def unit_of_work(session: Session) -> Iterator[Session]:
+    """
+    一個寫入請求 = 一個 DB 交易：區塊內的服務只 flush，結束時 commit 一次，
+    發生例外就 rollback (交易與持倉不會只寫入一半)。
+    """
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def to_async_url(url: str | URL) -> URL:
+    """
+    將 sync URL 換成對應的 async driver：SQLite 用 aiosqlite，PostgreSQL 用 psycopg (v3 原生支援 async)。
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+psycopg")
+    return url
+
+
+def _sqlite_connect_args() -> dict:
     connect_args = {"check_same_thread": False}
-    engine = create_engine(SQLITE_URL, connect_args=connect_args)
+    if settings.SLOW_QUERY_LOG_ENABLED:
+        # SQLiteConnection：慢查詢紀錄要算進讀取結果的時間 (關閉時用原本的 sqlite3 連線)
+        connect_args["factory"] = SQLiteConnection
+    return connect_args
+
+
+# server DB 預設的 pool 容量比 worker thread 數多出的連線 (response 驗證與關閉 session 之間還占著連線的請求)
+POOL_HEADROOM = 10
+
+
+def max_overflow(backend: str) -> int:
+    """
+    DB_MAX_OVERFLOW，未設定時 SQLite 不限 (-1)，其他 DB 為 THREADPOOL_SIZE - DB_POOL_SIZE + POOL_HEADROOM。
+    """
+    if settings.DB_MAX_OVERFLOW is not None:
+        return settings.DB_MAX_OVERFLOW
+    if backend == "sqlite":
+        return -1
+    return max(settings.THREADPOOL_SIZE - settings.DB_POOL_SIZE, 0) + POOL_HEADROOM
+
+
+def _engine_options(url: URL) -> dict:
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # in-memory DB 只存在於單一連線上，所有 session 共用同一條
+            return {"connect_args": _sqlite_connect_args(), "poolclass": StaticPool}
+        return {
+            "connect_args": _sqlite_connect_args(),
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": max_overflow("sqlite"),
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+        }
+    # PostgreSQL 等 server DB：QueuePool，並在取出連線時確認連線仍然有效
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": max_overflow(url.get_backend_name()),
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _install_sqlite_pragmas(engine: Engine, pragmas: dict[str, str | int]) -> None:
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_db_engine(url: str | URL | None = None, pragmas: dict[str, str | int] | None = None) -> Engine:
+    """
+    依 URL 建立 engine。SQLite 會套用 `pragmas` (預設為 sqlite_pragmas())，傳入 {} 則不套用。
+    """
+    url = make_url(url or settings.DATABASE_URL)
+    engine = create_engine(url, **_engine_options(url))
+    if url.get_backend_name() == "sqlite":
+        _install_sqlite_pragmas(engine, sqlite_pragmas() if pragmas is None else pragmas)
+    return engine
+
+
+def create_async_db_engine(url: str | URL | None = None, pragmas: dict[str, str | int] | None = None) -> AsyncEngine:
+    url = to_async_url(url or settings.DATABASE_URL)
+    options = _engine_options(url)
+    options.pop("connect_args", None)
+    engine = create_async_engine(url, **options)
+    if url.get_backend_name() == "sqlite":
+        # event 要掛在底層的 sync engine 上
+        _install_sqlite_pragmas(engine.sync_engine, sqlite_pragmas() if pragmas is None else pragmas)
+    return engine
+
+
+class SQLiteDB:
+    """
+    應用程式共用的 engine 與 session (名稱沿用舊的，實際後端由 DATABASE_URL 決定)。
+    sync 與 async engine 各自有一個 pool。
+    """
+    engine = create_db_engine()
+    # 給 async 端點使用 (等待外部報價時不佔用 worker thread)
+    async_engine = create_async_db_engine()
 
     @classmethod
     def create_db_and_tables(cls):
         SQLModel.metadata.create_all(cls.engine)
+        # 既有 DB 的欄位與索引變更
+        run_migrations(cls.engine)
 
     @classmethod
     def initialize(cls):
@@ -22,3 +152,18 @@ class SQLiteDB:
     def get_session(cls):
         with Session(cls.engine) as session:
             yield session
+
+    @classmethod
+    async def get_async_session(cls):
+        # async 下不能 lazy load，commit 後不要讓物件過期
+        async with AsyncSession(cls.async_engine, expire_on_commit=False) as session:
+            yield session
+
+
+# 每個 SQL 的次數與時間記錄到 /metrics
+instrument_engine(SQLiteDB.engine)
+instrument_engine(SQLiteDB.async_engine.sync_engine)
+
+# 超過門檻的 SQL 記錄到 /api/v1/admin/slow_queries
+if settings.SLOW_QUERY_LOG_ENABLED:
+    install_slow_query_log(SQLiteDB.engine)
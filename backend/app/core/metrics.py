@@ -0,0 +1,264 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Sequence
+
+from sqlalchemy import Engine, event
+
+# 延遲的 histogram bucket 上界 (秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每個請求的 SQL 數量
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _Metric:
+    """
+    以 thread 為單位分片：每個 thread 只寫自己的 dict，寫入端不需要 lock；
+    輸出時再把所有分片加總 (讀到正在更新的值也只差一筆，對監控可接受)。
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], row_size: int):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._row_size = row_size
+        self._local = threading.local()
+        self._shards: List[Dict[tuple, list]] = []
+        self._shards_lock = threading.Lock()
+
+    def _row(self, labels: tuple) -> list:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # 每個 thread 第一次寫入時註冊一次
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        row = shard.get(labels)
+        if row is None:
+            row = shard[labels] = [0] * self._row_size
+        return row
+
+    def _merged(self) -> Dict[tuple, list]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        merged: Dict[tuple, list] = {}
+        for shard in shards:
+            for labels, row in list(shard.items()):
+                total = merged.setdefault(labels, [0] * self._row_size)
+                for i, value in enumerate(row):
+                    total[i] += value
+        return merged
+
+    def _label_text(self, labels: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter(_Metric):
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames, 1)
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._row(labels)[0] += amount
+
+    def value(self, labels: tuple = ()) -> float:
+        return self._merged().get(labels, [0])[0]
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, row in sorted(self._merged().items()):
+            lines.append(f"{self.name}{self._label_text(labels)} {_number(row[0])}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    每組 label 一列：[各 bucket 的次數 (非累計, 最後一格是 +Inf)..., sum, count]。
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, len(self.buckets) + 3)
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        row = self._row(labels)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def count(self, labels: tuple = ()) -> int:
+        row = self._merged().get(labels)
+        return row[-1] if row else 0
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, row in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, hits in zip((*self.buckets, "+Inf"), row):
+                cumulative += hits
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(f"{self.name}_bucket{self._label_text(labels, 'le="' + le + '"')} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labels)} {_number(row[-2])}")
+            lines.append(f"{self.name}_count{self._label_text(labels)} {row[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4)。
+        """
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template and status.",
+    ("method", "route", "status"),
+))
+HTTP_REQUEST_SQL_STATEMENTS = registry.register(Histogram(
+    "http_request_sql_statements", "SQL statements executed per HTTP request.",
+    ("method", "route"), buckets=COUNT_BUCKETS,
+))
+HTTP_REQUEST_SQL_SECONDS = registry.register(Histogram(
+    "http_request_sql_duration_seconds", "Total SQL time per HTTP request.",
+    ("method", "route"),
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by operation (including background jobs).",
+    ("operation",),
+))
+QUOTE_PROVIDER_SECONDS = registry.register(Histogram(
+    "quote_provider_duration_seconds", "Latency of quote provider calls and of each provider batch download.",
+    ("provider", "call", "outcome"),
+))
+QUOTE_PROVIDER_SYMBOLS = registry.register(Counter(
+    "quote_provider_symbols_total", "Symbols requested from / returned by / failed in the quote provider.",
+    ("provider", "result"),
+))
+
+# 目前請求的 SQL 統計 [次數, 秒數, 逐筆紀錄 (只有 profiler 開啟時是 list)]；不在請求中 (例如背景排程) 時為 None
+_request_sql: ContextVar[list | None] = ContextVar("request_sql", default=None)
+
+_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    operation = statement[:6].upper()
+    DB_QUERY_SECONDS.observe(elapsed, (operation if operation in _OPERATIONS else "OTHER",))
+    stats = _request_sql.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += elapsed
+        if stats[2] is not None:
+            stats[2].append((context._metrics_start, elapsed, statement, cursor.rowcount, executemany))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    記錄這個 engine 每個 SQL 的時間 (async engine 請傳入 engine.sync_engine)。
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def uninstrument_engine(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: per-route latency histogram and per-request SQL count/time.
+
+    The route label is the matched route template (e.g. /api/v1/accounts/{account_id}),
+    so label cardinality stays bounded. Streaming responses are timed until the
+    last chunk is sent. Per request it only allocates a three-item list and the
+    label tuples.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        stats = [0, 0.0, None]
+        token = _request_sql.set(stats)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_sql.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.observe(elapsed, (method, route_path, str(status)))
+            HTTP_REQUEST_SQL_STATEMENTS.observe(stats[0], (method, route_path))
+            HTTP_REQUEST_SQL_SECONDS.observe(stats[1], (method, route_path))
+
+
+@contextmanager
+def capture_request_sql():
+    """
+    逐筆記錄目前請求接下來執行的 SQL：(開始的 perf_counter, 秒數, statement, rowcount, executemany)。
+    給 profiler 用；engine 需已 instrument_engine。
+    """
+    stats = _request_sql.get()
+    token = None
+    if stats is None:
+        # 沒有經過 MetricsMiddleware (例如單獨測試 profiler)
+        stats = [0, 0.0, None]
+        token = _request_sql.set(stats)
+    statements = stats[2] = []
+    try:
+        yield statements
+    finally:
+        stats[2] = None
+        if token is not None:
+            _request_sql.reset(token)
+
+
+def observe_provider_call(provider: str, call: str, start: float, ok: bool) -> None:
+    QUOTE_PROVIDER_SECONDS.observe(time.perf_counter() - start, (provider, call, "ok" if ok else "error"))
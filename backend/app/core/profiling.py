@@ -0,0 +1,200 @@
+import asyncio
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from app.core.config import settings
+from app.core.metrics import capture_request_sql
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_FLAGS = (b"profile=1", b"profile=true")
+
+# 這些函式在最上層代表 thread 正在等待 (event loop 的 select、threadpool 的 queue.get 等)，不算進取樣
+_IDLE_FRAMES = {
+    ("threading", "Condition.wait"),
+    ("threading", "Event.wait"),
+    ("threading", "Thread.join"),
+    ("selectors", "EpollSelector.select"),
+    ("selectors", "KqueueSelector.select"),
+    ("selectors", "PollSelector.select"),
+    ("selectors", "SelectSelector.select"),
+}
+
+
+def _frame_name(code) -> str:
+    return f"{Path(code.co_filename).stem}:{code.co_qualname}"
+
+
+class StackSampler:
+    """
+    每隔 `interval` 秒取樣所有 thread 的 Python stack，累計成 flamegraph 用的
+    collapsed stack 格式 (`thread;root;...;leaf count`)。閒置中的 thread 不計入。
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                if (Path(frame.f_code.co_filename).stem, frame.f_code.co_qualname) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.samples.items()))
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return value.strip().lower() in (b"1", b"true", b"yes")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and any(flag in query.split(b"&") for flag in PROFILE_QUERY_FLAGS)
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware: profile a single request on demand.
+
+    Only installed when PROFILING_ENABLED (so it costs nothing otherwise). A
+    request is profiled when it carries `X-Profile: 1` (or `?profile=1`) and
+    its client address is in the allowlist; other requests only pay for the
+    header check. A profiled request writes to `directory`:
+
+    - `<id>.pstats`: cProfile (deterministic) output, for pstats/snakeviz.
+    - `<id>.collapsed`: sampled stacks in collapsed format, for flamegraph.pl
+      / speedscope.
+    - `<id>.sql.json`: every SQL statement with its offset, duration and rowcount.
+
+    The id is returned in the `X-Profile-Id` response header. Since Python 3.12
+    cProfile sees every thread, so requests running at the same time show up
+    too (the collapsed stacks are rooted at the thread name). Only one request
+    is profiled at a time; a flagged request that arrives meanwhile runs
+    normally with `X-Profile-Skipped: busy`.
+    """
+
+    def __init__(
+        self,
+        app,
+        directory: str | None = None,
+        allowed_clients: Iterable[str] | None = None,
+        sample_interval: float | None = None,
+    ):
+        self.app = app
+        self.directory = Path(directory or settings.PROFILING_DIR)
+        if allowed_clients is None:
+            allowed_clients = settings.PROFILING_ALLOWED_CLIENTS.split(",")
+        self.allowed_clients = {c.strip() for c in allowed_clients if c.strip()}
+        self.sample_interval = sample_interval or settings.PROFILING_SAMPLE_INTERVAL
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        if not client or client[0] not in self.allowed_clients:
+            await self.app(scope, receive, send)
+            return
+        if not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, _send_with_header(send, b"x-profile-skipped", b"busy"))
+            return
+        try:
+            await self._profile(scope, receive, send)
+        finally:
+            self._lock.release()
+
+    async def _profile(self, scope, receive, send):
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status = 500
+
+        send_tagged = _send_with_header(send, b"x-profile-id", profile_id.encode())
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send_tagged(message)
+
+        profiler = cProfile.Profile()
+        sampler = StackSampler(self.sample_interval)
+        with capture_request_sql() as statements:
+            start = time.perf_counter()
+            sampler.start()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 已經有別的 profiler 在跑 (sys.monitoring 只能有一個)
+                sampler.stop()
+                await self.app(scope, receive, _send_with_header(send, b"x-profile-skipped", b"busy"))
+                return
+            try:
+                await self.app(scope, receive, send_with_id)
+            finally:
+                profiler.disable()
+                sampler.stop()
+                elapsed = time.perf_counter() - start
+
+        route = scope.get("route")
+        summary = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None) or "unmatched",
+            "status": status,
+            "seconds": elapsed,
+            "samples": sum(sampler.samples.values()),
+            "sql_statements": len(statements),
+            "sql_seconds": sum(s[1] for s in statements),
+            "statements": [
+                {"offset_ms": (s_start - start) * 1000, "duration_ms": s_elapsed * 1000,
+                 "rowcount": rowcount, "executemany": executemany, "statement": statement}
+                for s_start, s_elapsed, statement, rowcount, executemany in statements
+            ],
+        }
+        try:
+            await asyncio.to_thread(self._write, profile_id, profiler, sampler, summary)
+        except OSError as e:
+            print(f"Failed to write profile {profile_id}: {e}")
+
+    def _write(self, profile_id: str, profiler: cProfile.Profile, sampler: StackSampler, summary: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(self.directory / f"{profile_id}.pstats")
+        (self.directory / f"{profile_id}.collapsed").write_text(sampler.collapsed())
+        (self.directory / f"{profile_id}.sql.json").write_text(json.dumps(summary, indent=2))
+
+
+def _send_with_header(send, name: bytes, value: bytes):
+    async def wrapped(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), (name, value)]}
+        await send(message)
+    return wrapped
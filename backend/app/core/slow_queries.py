@@ -0,0 +1,287 @@
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from sqlalchemy import Engine, event
+
+from app.core.config import settings
+from app.core.timeutils import to_local_naive
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+# SQLite 的 ?，psycopg 的 %s / %(name)s，SQLAlchemy text() 的 :name
+_PARAM = re.compile(r"%\(\w+\)s|%s|(?<![:\w]):\w+")
+_PARAM_LIST = re.compile(r"\(\?(?:, ?\?)*\)")
+_ROW_LIST = re.compile(r"\(\?\.\.\.\)(?:, \(\?\.\.\.\))+")
+
+_EXPLAINABLE = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+_MAX_PARAMETERS_REPR = 500
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    把常數、參數與長度不定的 IN (...) / VALUES (...) 換成 ?，同一種查詢彙整成同一筆。
+    """
+    text = _WHITESPACE.sub(" ", statement).strip()
+    text = _STRING.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _PARAM.sub("?", text)
+    text = _PARAM_LIST.sub("(?...)", text)
+    return _ROW_LIST.sub("(?...)", text)
+
+
+def _caller() -> str:
+    """
+    發出這個 SQL 的 service method (例如 PositionService.rebuild_cash_position，
+    內部的 generator / helper function 歸到呼叫它的 method)；
+    不在 service 裡則取最近的 app 內函式 (endpoint、migration 等)。
+    """
+    frame = sys._getframe(1)
+    function = None
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("app.services."):
+            qualname = frame.f_code.co_qualname.split(".<locals>", 1)[0]
+            if "." in qualname:
+                return qualname
+            if function is None and not qualname.startswith("<"):
+                function = f"{module.rsplit('.', 1)[-1]}.{qualname}"
+        elif fallback is None and module.startswith("app.") and not module.startswith("app.core."):
+            fallback = f"{module}.{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return function or fallback or "unknown"
+
+
+def _parameters_repr(parameters, executemany: bool) -> str:
+    if executemany:
+        text = f"{len(parameters)} rows, first: {parameters[0]!r}" if parameters else "0 rows"
+    else:
+        text = repr(parameters)
+    return text if len(text) <= _MAX_PARAMETERS_REPR else text[:_MAX_PARAMETERS_REPR] + "..."
+
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters, executemany: bool) -> List[str]:
+    """
+    在同一個連線上取得查詢計畫 (SQLite: EXPLAIN QUERY PLAN，其他: EXPLAIN)，不會真的執行 statement。
+    """
+    words = statement.lstrip().split(None, 1)
+    if not words or words[0].upper() not in _EXPLAINABLE:
+        return []
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    explain_cursor = dbapi_connection.cursor()
+    try:
+        if dialect == "sqlite":
+            explain_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+            # (id, parent, notused, detail)：依 parent 縮排成樹狀
+            depth: Dict[int, int] = {0: -1}
+            lines = []
+            for node_id, parent, _, detail in explain_cursor.fetchall():
+                depth[node_id] = depth.get(parent, -1) + 1
+                lines.append("  " * depth[node_id] + detail)
+            return lines
+        explain_cursor.execute("EXPLAIN " + statement, parameters)
+        return [row[0] for row in explain_cursor.fetchall()]
+    finally:
+        explain_cursor.close()
+
+
+class SlowQuery:
+    """
+    同一種 (normalize 後相同的) 慢查詢的累計統計。
+    """
+
+    def __init__(self, statement: str, samples: int):
+        self.statement = statement
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.durations: deque[float] = deque(maxlen=samples)
+        self.callers: Counter[str] = Counter()
+        self.last_parameters: str | None = None
+        self.last_seen: datetime | None = None
+        self.plan: List[str] | None = None
+
+    def percentile(self, q: float) -> float:
+        durations = sorted(self.durations)
+        if not durations:
+            return 0.0
+        return durations[min(len(durations) - 1, max(0, round(q * len(durations)) - 1))]
+
+    def to_dict(self) -> dict:
+        return {
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": self.total_seconds * 1000,
+            "mean_ms": self.total_seconds / self.count * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+            "max_ms": self.max_seconds * 1000,
+            "callers": dict(self.callers.most_common()),
+            "last_parameters": self.last_parameters,
+            "last_seen": self.last_seen,
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    """
+    Statements slower than `threshold` seconds, aggregated by normalized text.
+
+    Each kind of statement keeps its count, total/max time, the last `samples`
+    durations (for p95), the calling service methods, the last parameters and
+    the query plan (captured once, the first time it is slow). The latest
+    `recent` individual entries are kept as well. At most `max_statements`
+    kinds are tracked; slow statements of new kinds beyond that are counted
+    in `dropped`.
+    """
+
+    ORDERS: Dict[str, Callable[[SlowQuery], float]] = {
+        "total": lambda q: q.total_seconds,
+        "count": lambda q: q.count,
+        "p95": lambda q: q.percentile(0.95),
+        "max": lambda q: q.max_seconds,
+    }
+
+    def __init__(self, threshold: float, explain: bool = True, max_statements: int = 200,
+                 samples: int = 1000, recent: int = 100):
+        self.threshold = threshold
+        self.explain = explain
+        self.max_statements = max_statements
+        self.samples = samples
+        self.dropped = 0
+        self._queries: Dict[str, SlowQuery] = {}
+        self._recent: deque[dict] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, parameters, executemany: bool, seconds: float, caller: str,
+               plan: Callable[[], List[str]] | None = None) -> None:
+        normalized = normalize_statement(statement)
+        now = to_local_naive(datetime.now(timezone(timedelta(hours=8))))
+        parameters_repr = _parameters_repr(parameters, executemany)
+        with self._lock:
+            query = self._queries.get(normalized)
+            if query is None:
+                if len(self._queries) >= self.max_statements:
+                    self.dropped += 1
+                    return
+                query = self._queries[normalized] = SlowQuery(normalized, self.samples)
+            query.count += 1
+            query.total_seconds += seconds
+            query.max_seconds = max(query.max_seconds, seconds)
+            query.durations.append(seconds)
+            query.callers[caller] += 1
+            query.last_parameters = parameters_repr
+            query.last_seen = now
+            self._recent.append({
+                "statement": statement, "duration_ms": seconds * 1000, "caller": caller,
+                "parameters": parameters_repr, "timestamp": now,
+            })
+            needs_plan = self.explain and plan is not None and query.plan is None
+
+        if needs_plan:
+            try:
+                query.plan = plan()
+            except Exception as e:
+                query.plan = [f"EXPLAIN failed: {e}"]
+
+    def top(self, limit: int = 20, order_by: str = "total") -> List[dict]:
+        with self._lock:
+            queries = sorted(self._queries.values(), key=self.ORDERS[order_by], reverse=True)[:limit]
+            return [query.to_dict() for query in queries]
+
+    def recent(self) -> List[dict]:
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._queries.clear()
+            self._recent.clear()
+            self.dropped = 0
+
+    def report(self, limit: int = 20, order_by: str = "total") -> dict:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "tracked": len(self._queries),
+            "dropped": self.dropped,
+            "queries": self.top(limit, order_by),
+            "recent": self.recent(),
+        }
+
+
+slow_query_log = SlowQueryLog(
+    threshold=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    explain=settings.SLOW_QUERY_EXPLAIN,
+    max_statements=settings.SLOW_QUERY_MAX_STATEMENTS,
+)
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """
+    SQLite 的 execute 在第一列就緒時就回傳，讀取結果的時間都在之後的 fetch 裡。
+    有結果的 statement 等到 SQLAlchemy 讀完結果、close cursor 時才計算完整時間。
+    """
+    pending: tuple | None = None
+
+    def close(self):
+        pending = self.pending
+        if pending is not None:
+            self.pending = None
+            start, dialect, statement, parameters, executemany = pending
+            elapsed = time.perf_counter() - start
+            if elapsed >= slow_query_log.threshold:
+                _record(self.connection, dialect, statement, parameters, executemany, elapsed)
+        super().close()
+
+
+class SQLiteConnection(sqlite3.Connection):
+    """
+    sqlite3.connect 的 factory (create_db_engine 使用)：cursor 是 _TimedCursor。
+    """
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+
+def _record(dbapi_connection, dialect: str, statement: str, parameters, executemany: bool, elapsed: float) -> None:
+    slow_query_log.record(
+        statement, parameters, executemany, elapsed, _caller(),
+        lambda: explain(dbapi_connection, dialect, statement, parameters, executemany),
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._slow_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if type(cursor) is _TimedCursor and cursor.description is not None:
+        # 結果還沒讀：close 時再判斷
+        cursor.pending = (context._slow_query_start, conn.dialect.name, statement, parameters, executemany)
+        return
+    elapsed = time.perf_counter() - context._slow_query_start
+    if elapsed >= slow_query_log.threshold:
+        _record(cursor.connection, conn.dialect.name, statement, parameters, executemany, elapsed)
+
+
+def install_slow_query_log(engine: Engine) -> None:
+    """
+    記錄這個 engine 超過門檻的 SQL 到 slow_query_log。SQLite 連線要用 SQLiteConnection
+    (create_db_engine 已設定) 才會算進讀取結果的時間；async engine 不支援 (EXPLAIN 直接用 DBAPI 連線)。
+    """
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def uninstall_slow_query_log(engine: Engine) -> None:
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
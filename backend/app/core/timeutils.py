@@ -0,0 +1,10 @@
+from datetime import datetime, timedelta, timezone
+
+
+def to_local_naive(dt: datetime) -> datetime:
+    """
+    DB 中的時間是 UTC+8 的 wall time (不含時區)，查詢參數也轉成同樣格式
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone(timedelta(hours=8))).replace(tzinfo=None)
+    return dt
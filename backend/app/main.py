@@ -1,21 +1,47 @@
 from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.config import settings
 from app.core.database import SQLiteDB
+from app.core.metrics import MetricsMiddleware, registry
+from app.core.profiling import ProfilingMiddleware
 from app.api.v1.api import api_router
+from app.services.live_updates import LiveUpdateBroker
+from app.services.price_scheduler import PriceRefreshScheduler
+from app.services.quote_provider import get_quote_provider
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # print("🚀 System Starting...")
+    # sync 端點的 threadpool (每個 event loop 各一個 limiter)
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
     SQLiteDB.create_db_and_tables()
     SQLiteDB.initialize()
-    
+
+    # 背景更新報價，讀取端不需要等報價來源
+    app.state.price_scheduler = PriceRefreshScheduler(SQLiteDB.async_engine, get_quote_provider())
+    if settings.PRICE_REFRESH_ENABLED:
+        app.state.price_scheduler.start()
+
+    # 報價與交易寫入後推送給 /stream 的訂閱者 (沒有訂閱者時不計算)
+    app.state.live_updates = LiveUpdateBroker(SQLiteDB.engine)
+    if settings.LIVE_UPDATES_ENABLED:
+        app.state.live_updates.start()
+
     yield
     # print("🛑 System Shutting down...")
+    await app.state.live_updates.stop()
+    await app.state.price_scheduler.stop()
 
 app = FastAPI(lifespan=lifespan)
 
+# 只 profile 路由本身 (在 CORS / metrics 之內)；沒開啟時不安裝
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # 開發環境用
 origins = ["http://localhost:3000"]
 
@@ -25,7 +51,10 @@ app.add_middleware(
     allow_credentials=True, # 允許使用憑證（如 Cookies、HTTP 身份驗證）。如果為 True，則 allow_origins 不能設定為 ["*"]
     allow_methods=["*"],    # 允許所有方法：GET, POST, OPTIONS, etc.
     allow_headers=["*"],    # 允許所有標頭，包括 'Content-Type'
+    expose_headers=["X-Next-Cursor"],  # 讓前端讀得到交易列表的分頁游標
 )
+# 最外層：每個路由的延遲、每個請求的 SQL 數量與時間
+app.add_middleware(MetricsMiddleware)
 
 # @app.on_event("startup")
 # def on_startup():
@@ -36,4 +65,12 @@ app.add_middleware(
 def hi():
     return "hello world"
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    return PlainTextResponse(registry.expose(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(api_router, prefix="/api/v1")
\ No newline at end of file
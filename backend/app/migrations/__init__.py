@@ -0,0 +1,68 @@
+"""
+簡單的 schema migration：create_all 只會建立不存在的 table，既有 table 的欄位與索引由這裡補上。
+
+每個 migration 是一個 module，提供 DESCRIPTION 與 upgrade(connection)，依 MIGRATIONS 的順序編號
+(第一個是 version 1)。已套用的版本記錄在 schema_migrations，每個 migration 在各自的交易中執行。
+新增 migration 時只能往 MIGRATIONS 後面加，並讓 upgrade 在全新的 DB (create_all 已建好) 上也能安全執行。
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Column, DateTime, Engine, Integer, MetaData, String, Table, insert, select
+
+from app.migrations import (
+    m0001_asset_previous_close,
+    m0002_transaction_indexes,
+    m0003_transaction_time_index,
+    m0004_transaction_content_hash,
+    m0005_position_asset_index,
+    m0006_tax_lots,
+    m0007_position_checkpoints,
+    m0008_position_total_cost,
+)
+
+MIGRATIONS = [
+    m0001_asset_previous_close,
+    m0002_transaction_indexes,
+    m0003_transaction_time_index,
+    m0004_transaction_content_hash,
+    m0005_position_asset_index,
+    m0006_tax_lots,
+    m0007_position_checkpoints,
+    m0008_position_total_cost,
+]
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """
+    套用尚未執行的 migration，回傳這次套用的版本號。
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version in done:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(insert(schema_migrations).values(
+                version=version,
+                description=migration.DESCRIPTION,
+                applied_at=datetime.now(timezone(timedelta(hours=8))),
+            ))
+        applied.append(version)
+    return applied
@@ -0,0 +1,14 @@
+"""
+assets.previous_close (日漲跌計算用) 是在既有 DB 建立後才加入的欄位。
+"""
+from sqlalchemy import Connection, inspect, text
+
+DESCRIPTION = "add assets.previous_close"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("assets")}
+    if "previous_close" not in columns:
+        connection.execute(text(
+            "ALTER TABLE assets ADD COLUMN previous_close NUMERIC(20, 10) NOT NULL DEFAULT 0"
+        ))
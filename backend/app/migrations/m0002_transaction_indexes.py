@@ -0,0 +1,20 @@
+"""
+交易表的熱路徑索引：
+- (account_id, asset_id, transaction_time)：重播單一持倉、判斷是否為 append
+- (account_id, transaction_time)：現金重算、帳戶交易列表、歷史淨值
+positions(account_id) 不另外建立，unique (account_id, asset_id) 的索引已涵蓋。
+"""
+from sqlalchemy import Connection, text
+
+DESCRIPTION = "add hot-path indexes on transactions"
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_account_asset_time "
+        "ON transactions (account_id, asset_id, transaction_time)"
+    ))
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_account_time "
+        "ON transactions (account_id, transaction_time)"
+    ))
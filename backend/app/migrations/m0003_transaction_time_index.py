@@ -0,0 +1,12 @@
+"""
+(transaction_time, id)：不指定帳戶的交易列表依此排序並以 keyset 游標分頁。
+"""
+from sqlalchemy import Connection, text
+
+DESCRIPTION = "add transactions(transaction_time, id) index for keyset pagination"
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_time_id ON transactions (transaction_time, id)"
+    ))
@@ -0,0 +1,15 @@
+"""
+transactions.content_hash：批次匯入以內容雜湊去重 (unique index，NULL 不互相衝突)。
+"""
+from sqlalchemy import Connection, inspect, text
+
+DESCRIPTION = "add transactions.content_hash with a unique index"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("transactions")}
+    if "content_hash" not in columns:
+        connection.execute(text("ALTER TABLE transactions ADD COLUMN content_hash VARCHAR(64)"))
+    connection.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_transactions_content_hash ON transactions (content_hash)"
+    ))
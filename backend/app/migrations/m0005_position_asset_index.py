@@ -0,0 +1,12 @@
+"""
+positions(asset_id, total_quantity)：背景報價更新找出「有持倉的資產」時只讀這個索引 (covering)。
+"""
+from sqlalchemy import Connection, text
+
+DESCRIPTION = "add positions(asset_id, total_quantity) index for price refresh planning"
+
+
+def upgrade(connection: Connection) -> None:
+    connection.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_positions_asset_quantity ON positions (asset_id, total_quantity)"
+    ))
@@ -0,0 +1,232 @@
+"""
+tax lot：accounts.lot_method 是後加的欄位；tax_lots / realized_lots / lot_selections 由 create_all 建立，
+這裡再以既有交易重播一次，補上 open lots 與已實現損益。
+
+重播的規則是寫這個 migration 時 LotService 的規則，複製在這裡而不是 import app.services：
+之後 service 的改動不能改變舊 DB 升級的結果。交易以一次串流 (依 account, asset, 時間排序) 分批讀出，
+寫入也累積到 BATCH_SIZE 列才送出，記憶體只跟一個 (account, asset) 的 open lots 有關。
+"""
+from collections import deque
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List
+
+from sqlalchemy import (
+    Boolean, Connection, DateTime, Integer, Numeric, String, column, inspect, insert, select, table, text,
+)
+
+from app.core.config import settings
+
+DESCRIPTION = "add accounts.lot_method and backfill tax lots"
+
+# 每次從 DB 讀出 / 寫入的列數
+BATCH_SIZE = 1000
+OPENING = ("buy", "deposit")
+CLOSING = ("sell", "withdraw")
+LONG_TERM = timedelta(days=365)
+
+AMOUNT = Numeric(20, 10)
+accounts = table("accounts", column("id", Integer), column("currency", String), column("lot_method", String))
+assets = table("assets", column("id", Integer), column("ticker", String), column("type", String))
+transactions = table(
+    "transactions",
+    column("id", Integer), column("account_id", Integer), column("asset_id", Integer), column("type", String),
+    column("quantity", AMOUNT), column("price_per_unit", AMOUNT), column("fee", AMOUNT),
+    column("transaction_time", DateTime),
+)
+tax_lots = table(
+    "tax_lots",
+    column("account_id", Integer), column("asset_id", Integer), column("transaction_id", Integer),
+    column("opened_at", DateTime), column("quantity", AMOUNT), column("cost_per_unit", AMOUNT),
+)
+realized_lots = table(
+    "realized_lots",
+    column("account_id", Integer), column("asset_id", Integer), column("transaction_id", Integer),
+    column("lot_transaction_id", Integer), column("opened_at", DateTime), column("closed_at", DateTime),
+    column("quantity", AMOUNT), column("proceeds", AMOUNT), column("cost_basis", AMOUNT),
+    column("long_term", Boolean),
+)
+realized_gains = table(
+    "realized_gains",
+    column("account_id", Integer), column("asset_id", Integer), column("year", Integer),
+    column("proceeds", AMOUNT), column("cost_basis", AMOUNT), column("long_term_gain", AMOUNT),
+    column("lots", Integer),
+)
+
+
+class Lot:
+    __slots__ = ("transaction_id", "opened_at", "quantity", "cost_per_unit")
+
+    def __init__(self, transaction_id, opened_at, quantity: Decimal, cost_per_unit: Decimal):
+        self.transaction_id = transaction_id
+        self.opened_at = opened_at
+        self.quantity = quantity
+        self.cost_per_unit = cost_per_unit
+
+
+class LotReplay:
+    """
+    一個 (account, asset) 的 open lots，最舊的在 deque 左邊。買入加在右邊，賣出 / 轉出從左邊 (fifo, average)
+    或右邊 (lifo) 取；超賣的部分成本為 0。average 的成本是成本池的平均成本。
+    升級時 lot_selections 還是空的，specific 就是 fifo。
+    """
+
+    def __init__(self, method: str):
+        self.method = method
+        self.lots: deque[Lot] = deque()
+        self.quantity = Decimal(0)
+        self.cost = Decimal(0)
+        self.realized: List[dict] = []
+
+    def apply(self, txn) -> None:
+        qty = txn.quantity or Decimal(0)
+        if qty <= 0:
+            return
+        price = txn.price_per_unit or Decimal(0)
+        fee = txn.fee or Decimal(0)
+
+        if txn.type in OPENING:
+            cost = qty * price + fee
+            self.lots.append(Lot(txn.id, txn.transaction_time, qty, cost / qty))
+            self.quantity += qty
+            self.cost += cost
+            return
+        if txn.type not in CLOSING:
+            return
+
+        average = self.cost / self.quantity if self.method == "average" and self.quantity > 0 else None
+        from_right = self.method == "lifo"
+        matches = []
+        remaining = qty
+        while remaining > 0 and self.lots:
+            lot = self.lots[-1] if from_right else self.lots[0]
+            take = min(lot.quantity, remaining)
+            lot.quantity -= take
+            remaining -= take
+            matches.append((lot.transaction_id, lot.opened_at, take,
+                            take * (average if average is not None else lot.cost_per_unit)))
+            if lot.quantity <= 0:
+                self.lots.pop() if from_right else self.lots.popleft()
+        if remaining > 0:
+            matches.append((None, None, remaining, Decimal(0)))
+
+        if average is not None:
+            self.cost -= average * qty
+        else:
+            self.cost -= sum((basis for *_, basis in matches), Decimal(0))
+        self.quantity -= qty
+
+        if txn.type == "sell":
+            proceeds = qty * price - fee
+            for lot_transaction_id, opened_at, quantity, basis in matches:
+                self.realized.append({
+                    "transaction_id": txn.id,
+                    "lot_transaction_id": lot_transaction_id,
+                    "opened_at": opened_at,
+                    "closed_at": txn.transaction_time,
+                    "quantity": quantity,
+                    "proceeds": proceeds * quantity / qty,
+                    "cost_basis": basis,
+                    "long_term": opened_at is not None and txn.transaction_time - opened_at > LONG_TERM,
+                })
+
+    def open_lots(self) -> List[Lot]:
+        return [lot for lot in self.lots if lot.quantity > 0]
+
+
+class BatchWriter:
+    """
+    累積要寫入的列，每個 table 滿 BATCH_SIZE 列就以 executemany 送出。
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.rows: Dict[object, List[dict]] = {}
+
+    def add(self, target, rows: Iterable[dict]) -> None:
+        pending = self.rows.setdefault(target, [])
+        pending.extend(rows)
+        if len(pending) >= BATCH_SIZE:
+            self.flush(target)
+
+    def flush(self, target=None) -> None:
+        for key in [target] if target is not None else list(self.rows):
+            if self.rows.get(key):
+                self.connection.execute(insert(key), self.rows[key])
+                self.rows[key] = []
+
+
+def account_settings(connection: Connection) -> Dict[int, tuple[str, int | None]]:
+    """
+    帳戶 id -> (lot 方法, 現金資產 id)。現金資產是 ticker 等於帳戶幣別的法幣。
+    """
+    cash = assets.alias("cash")
+    rows = connection.execute(
+        select(accounts.c.id, accounts.c.lot_method, cash.c.id)
+        .outerjoin(cash, (cash.c.ticker == accounts.c.currency) & (cash.c.type == "fiat"))
+        .order_by(accounts.c.id, cash.c.id)
+    )
+    result: Dict[int, tuple[str, int | None]] = {}
+    for account_id, method, cash_asset_id in rows:
+        result.setdefault(account_id, (method or settings.TAX_LOT_METHOD, cash_asset_id))
+    return result
+
+
+def pair_transactions(connection: Connection):
+    """
+    分批串流所有有資產的交易，依 (account, asset, 時間, id) 排序，同一個 pair 的交易連在一起。
+    """
+    return connection.execute(
+        select(transactions.c.account_id, transactions.c.asset_id, transactions.c.id, transactions.c.type,
+               transactions.c.quantity, transactions.c.price_per_unit, transactions.c.fee,
+               transactions.c.transaction_time)
+        .where(transactions.c.asset_id.is_not(None))
+        .order_by(transactions.c.account_id, transactions.c.asset_id, transactions.c.transaction_time,
+                  transactions.c.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+
+
+def write_lots(writer: BatchWriter, account_id: int, asset_id: int, book: LotReplay) -> None:
+    keys = {"account_id": account_id, "asset_id": asset_id}
+    writer.add(tax_lots, (
+        {**keys, "transaction_id": lot.transaction_id, "opened_at": lot.opened_at,
+         "quantity": lot.quantity, "cost_per_unit": lot.cost_per_unit}
+        for lot in book.open_lots()
+    ))
+    writer.add(realized_lots, ({**keys, **row} for row in book.realized))
+    gains: Dict[int, dict] = {}
+    for row in book.realized:
+        total = gains.setdefault(row["closed_at"].year, {
+            "proceeds": Decimal(0), "cost_basis": Decimal(0), "long_term_gain": Decimal(0), "lots": 0,
+        })
+        total["proceeds"] += row["proceeds"]
+        total["cost_basis"] += row["cost_basis"]
+        if row["long_term"]:
+            total["long_term_gain"] += row["proceeds"] - row["cost_basis"]
+        total["lots"] += 1
+    writer.add(realized_gains, ({**keys, "year": year, **total} for year, total in gains.items()))
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("accounts")}
+    if "lot_method" not in columns:
+        connection.execute(text("ALTER TABLE accounts ADD COLUMN lot_method VARCHAR(8)"))
+
+    accounts_by_id = account_settings(connection)
+    writer = BatchWriter(connection)
+    pair, book = None, None
+    for txn in pair_transactions(connection):
+        if (txn.account_id, txn.asset_id) != pair:
+            if book is not None:
+                write_lots(writer, *pair, book)
+            pair, book = (txn.account_id, txn.asset_id), None
+            account = accounts_by_id.get(txn.account_id)
+            # 現金不重播 lot
+            if account is not None and txn.asset_id != account[1]:
+                book = LotReplay(account[0])
+        if book is not None:
+            book.apply(txn)
+    if book is not None:
+        write_lots(writer, *pair, book)
+    writer.flush()
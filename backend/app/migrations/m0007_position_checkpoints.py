@@ -0,0 +1,192 @@
+"""
+position checkpoint：positions.since_checkpoint 是後加的欄位；position_checkpoints / checkpoint_lots
+由 create_all 建立，這裡從頭重建每個帳戶的持倉，同時寫入 checkpoint。
+
+與 m0006 一樣使用寫這個 migration 時的規則 (平均成本法的持倉、現金流)，不 import app.services；
+checkpoint 的 lot 快照沿用 m0006 的 LotReplay (已發布的 migration 不會再改)。
+交易分批串流讀出，持倉與 lot 快照累積到 BATCH_SIZE 列才寫入。
+"""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict
+
+from sqlalchemy import (
+    Column, Connection, DateTime, Integer, MetaData, Table, bindparam, column, inspect, insert, select, table, text,
+    update,
+)
+
+from app.core.config import settings
+from app.migrations.m0006_tax_lots import (
+    AMOUNT, BATCH_SIZE, BatchWriter, LotReplay, account_settings, pair_transactions, transactions,
+)
+
+DESCRIPTION = "add positions.since_checkpoint and backfill position checkpoints"
+
+positions = table(
+    "positions",
+    column("id", Integer), column("account_id", Integer), column("asset_id", Integer),
+    column("total_quantity", AMOUNT), column("average_cost", AMOUNT), column("last_updated", DateTime),
+    column("since_checkpoint", Integer),
+)
+# 需要 inserted_primary_key 給 checkpoint_lots 用，所以用有主鍵的 Table
+position_checkpoints = Table(
+    "position_checkpoints",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("account_id", Integer), Column("asset_id", Integer),
+    Column("transaction_time", DateTime), Column("transaction_id", Integer),
+    Column("total_quantity", AMOUNT), Column("total_cost", AMOUNT),
+)
+checkpoint_lots = table(
+    "checkpoint_lots",
+    column("checkpoint_id", Integer), column("transaction_id", Integer), column("opened_at", DateTime),
+    column("quantity", AMOUNT), column("cost_per_unit", AMOUNT),
+)
+
+
+def cash_flow(txn) -> Decimal:
+    amount = (txn.quantity or Decimal(0)) * (txn.price_per_unit or Decimal(0))
+    fee = txn.fee or Decimal(0)
+    if txn.type == "deposit":
+        return amount
+    elif txn.type == "withdraw":
+        return -amount
+    elif txn.type == "buy":
+        return -(amount + fee)
+    elif txn.type in ("sell", "dividend"):
+        return amount - fee
+    return Decimal(0)
+
+
+def apply_transaction(total_qty: Decimal, total_cost: Decimal, txn) -> tuple[Decimal, Decimal]:
+    qty = txn.quantity or Decimal(0)
+    if txn.type in ("buy", "deposit"):
+        total_cost += qty * (txn.price_per_unit or Decimal(0)) + (txn.fee or Decimal(0))
+        total_qty += qty
+    elif txn.type in ("sell", "withdraw"):
+        if total_qty > 0:
+            total_cost -= total_cost / total_qty * qty
+        total_qty -= qty
+    return total_qty, total_cost
+
+
+class Backfill:
+    """
+    寫入 checkpoint 與持倉。持倉以 (account, asset) 對應既有的列：有就更新，沒有就新增
+    (數量與平均成本都是 0 時不新增)。
+    """
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.interval = settings.POSITION_CHECKPOINT_INTERVAL
+        self.now = datetime.now(timezone(timedelta(hours=8)))
+        self.writer = BatchWriter(connection)
+        self.existing: Dict[tuple[int, int], int] = {
+            (row.account_id, row.asset_id): row.id
+            for row in connection.execute(select(positions.c.id, positions.c.account_id, positions.c.asset_id))
+        }
+        self.saved: set[tuple[int, int]] = set()
+        self.updates: list[dict] = []
+
+    def checkpoint(self, account_id: int, asset_id: int, txn, quantity: Decimal, cost: Decimal,
+                   book: LotReplay | None = None) -> None:
+        checkpoint_id = self.connection.execute(insert(position_checkpoints).values(
+            account_id=account_id, asset_id=asset_id, transaction_time=txn.transaction_time,
+            transaction_id=txn.id, total_quantity=quantity, total_cost=cost,
+        )).inserted_primary_key[0]
+        if book is not None:
+            self.writer.add(checkpoint_lots, (
+                {"checkpoint_id": checkpoint_id, "transaction_id": lot.transaction_id, "opened_at": lot.opened_at,
+                 "quantity": lot.quantity, "cost_per_unit": lot.cost_per_unit}
+                for lot in book.open_lots()
+            ))
+
+    def position(self, account_id: int, asset_id: int, quantity: Decimal, average_cost: Decimal,
+                 since_checkpoint: int) -> None:
+        self.saved.add((account_id, asset_id))
+        values = {"total_quantity": quantity, "average_cost": average_cost, "since_checkpoint": since_checkpoint,
+                  "last_updated": self.now}
+        position_id = self.existing.get((account_id, asset_id))
+        if position_id is not None:
+            self.updates.append({"position_id": position_id, **values})
+            if len(self.updates) >= BATCH_SIZE:
+                self.flush_updates()
+        elif quantity != 0 or average_cost != 0:
+            self.writer.add(positions, [{"account_id": account_id, "asset_id": asset_id, **values}])
+
+    def flush_updates(self) -> None:
+        if self.updates:
+            self.connection.execute(
+                update(positions).where(positions.c.id == bindparam("position_id")), self.updates)
+            self.updates = []
+
+    def flush(self) -> None:
+        self.writer.flush()
+        self.flush_updates()
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("positions")}
+    if "since_checkpoint" not in columns:
+        connection.execute(text("ALTER TABLE positions ADD COLUMN since_checkpoint INTEGER NOT NULL DEFAULT 0"))
+
+    accounts_by_id = account_settings(connection)
+    backfill = Backfill(connection)
+    interval = backfill.interval
+
+    # 非現金資產：平均成本法的持倉，每 interval 筆交易一個 checkpoint (含當下的 open lots)
+    def finish(pair, quantity, cost, pending):
+        backfill.position(*pair, quantity, cost / quantity if quantity > 0 else Decimal(0), pending)
+
+    pair, book = None, None
+    quantity, cost, pending = Decimal(0), Decimal(0), 0
+    for txn in pair_transactions(connection):
+        if (txn.account_id, txn.asset_id) != pair:
+            if book is not None:
+                finish(pair, quantity, cost, pending)
+            pair, book = (txn.account_id, txn.asset_id), None
+            quantity, cost, pending = Decimal(0), Decimal(0), 0
+            account = accounts_by_id.get(txn.account_id)
+            if account is not None and txn.asset_id != account[1]:
+                book = LotReplay(account[0])
+        if book is None:
+            continue
+        book.apply(txn)
+        quantity, cost = apply_transaction(quantity, cost, txn)
+        pending += 1
+        if interval and pending >= interval:
+            backfill.checkpoint(*pair, txn, quantity, cost, book)
+            pending = 0
+    if book is not None:
+        finish(pair, quantity, cost, pending)
+
+    # 沒有交易的既有持倉歸零
+    for account_id, asset_id in list(backfill.existing):
+        account = accounts_by_id.get(account_id)
+        if account is not None and asset_id != account[1] and (account_id, asset_id) not in backfill.saved:
+            backfill.position(account_id, asset_id, Decimal(0), Decimal(0), 0)
+
+    # 現金：帳戶所有交易的現金流總和 (與順序無關)，checkpoint 不需要 lot 快照
+    cash: Dict[int, tuple[int, Decimal]] = {
+        account_id: (0, Decimal(0)) for account_id, (_, cash_asset_id) in accounts_by_id.items()
+        if cash_asset_id is not None
+    }
+    rows = connection.execute(
+        select(transactions.c.account_id, transactions.c.id, transactions.c.type, transactions.c.quantity,
+               transactions.c.price_per_unit, transactions.c.fee, transactions.c.transaction_time)
+        .order_by(transactions.c.account_id, transactions.c.transaction_time, transactions.c.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    for txn in rows:
+        if txn.account_id not in cash:
+            continue
+        pending, total = cash[txn.account_id]
+        total += cash_flow(txn)
+        pending += 1
+        if interval and pending >= interval:
+            backfill.checkpoint(txn.account_id, accounts_by_id[txn.account_id][1], txn, total, total)
+            pending = 0
+        cash[txn.account_id] = (pending, total)
+    for account_id, (pending, total) in cash.items():
+        backfill.position(account_id, accounts_by_id[account_id][1], total, Decimal(1), pending)
+    backfill.flush()
@@ -0,0 +1,15 @@
+"""
+positions.total_cost：平均成本法的總成本 (現金為餘額)，append 從這裡繼續計算。
+既有的持倉先以 數量 x 平均成本 補上 (與之前 append 的算法相同)，之後重播這個 pair 時就是精確的總成本。
+"""
+from sqlalchemy import Connection, inspect, text
+
+DESCRIPTION = "add positions.total_cost"
+
+
+def upgrade(connection: Connection) -> None:
+    columns = {column["name"] for column in inspect(connection).get_columns("positions")}
+    if "total_cost" in columns:
+        return
+    connection.execute(text("ALTER TABLE positions ADD COLUMN total_cost NUMERIC(20, 10) NOT NULL DEFAULT 0"))
+    connection.execute(text("UPDATE positions SET total_cost = total_quantity * average_cost"))
@@ -1,7 +1,17 @@
 from typing import List
 from datetime import datetime, timedelta, timezone
+from enum import Enum
 from sqlmodel import SQLModel, Field, Relationship
 
+
+class LotMethod(str, Enum):
+    """賣出時配對 tax lot 的方式 (成本基礎)"""
+    fifo = "fifo"
+    lifo = "lifo"
+    average = "average"
+    # 賣出時指定要賣哪些 lot (沒指定的部分依 FIFO)
+    specific = "specific"
+
 class PortfolioAccount(SQLModel, table=True):
     __tablename__ = "portfolio_accounts"
     
@@ -14,6 +24,8 @@ class Account(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     name: str = Field(max_length=100, nullable=False)
     currency: str = Field(default="USD", max_length=10, nullable=False)
+    # None 表示使用 settings.TAX_LOT_METHOD
+    lot_method: LotMethod | None = Field(default=None)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=8))))
 
     portfolios: List["Portfolio"] = Relationship(back_populates="accounts", link_model=PortfolioAccount)
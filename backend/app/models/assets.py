@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from enum import Enum
-from sqlmodel import SQLModel, Field, UniqueConstraint, Index
+from sqlmodel import SQLModel, Field, UniqueConstraint
 
 
 class AssetType(str, Enum):
@@ -20,17 +20,19 @@ class Asset(SQLModel, table=True):
     currency: str = Field(default="USD", max_length=10, nullable=False)
     
     current_price: Decimal = Field(default=0, max_digits=20, decimal_places=10)
+    # 前一交易日收盤價，更新報價時一併寫入，用來計算日漲跌 (0 代表未知)
+    previous_close: Decimal = Field(default=0, max_digits=20, decimal_places=10)
     last_updated: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=8))))
 
-# class MarketData(SQLModel, table=True):
-#     __tablename__ = "market_data"
+class MarketData(SQLModel, table=True):
+    __tablename__ = "market_data"
     
-#     __table_args__ = (
-#         UniqueConstraint("asset_id", "timestamp", name="unique_asset_time_market_data"),
-#         Index("idx_market_data_asset_time", "asset_id", "timestamp"),
-#     )
+    # Unique constraint 同時是 (asset_id, timestamp) 的索引：去重 + 區間查詢都靠它
+    __table_args__ = (
+        UniqueConstraint("asset_id", "timestamp", name="unique_asset_time_market_data"),
+    )
 
-#     id: int | None = Field(default=None, primary_key=True)
-#     asset_id: int = Field(foreign_key="assets.id", nullable=False, ondelete="CASCADE")
-#     price: Decimal = Field(max_digits=20, decimal_places=10, nullable=False)
-#     timestamp: datetime = Field(nullable=False)
\ No newline at end of file
+    id: int | None = Field(default=None, primary_key=True)
+    asset_id: int = Field(foreign_key="assets.id", nullable=False, ondelete="CASCADE")
+    price: Decimal = Field(max_digits=20, decimal_places=10, nullable=False)
+    timestamp: datetime = Field(nullable=False)
@@ -1,7 +1,7 @@
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 from enum import Enum
-from sqlmodel import SQLModel, Field, UniqueConstraint
+from sqlmodel import SQLModel, Field, Index, UniqueConstraint, PrimaryKeyConstraint
 
 
 class TransactionType(str, Enum):
@@ -13,7 +13,15 @@ class TransactionType(str, Enum):
 
 class Transaction(SQLModel, table=True):
     __tablename__ = "transactions"
-    
+
+    # 重播 (account, asset)、依時間列出交易 (keyset 分頁) 的索引；既有 DB 由 app.migrations 補上
+    __table_args__ = (
+        Index("ix_transactions_account_asset_time", "account_id", "asset_id", "transaction_time"),
+        Index("ix_transactions_account_time", "account_id", "transaction_time"),
+        Index("ix_transactions_time_id", "transaction_time", "id"),
+        Index("ux_transactions_content_hash", "content_hash", unique=True),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     account_id: int = Field(foreign_key="accounts.id", nullable=False, ondelete="CASCADE")
     # Asset 設為 RESTRICT (防止誤刪資產導致交易紀錄消失)
@@ -25,12 +33,17 @@ class Transaction(SQLModel, table=True):
     fee: Decimal = Field(default=0, max_digits=20, decimal_places=10)
     transaction_time: datetime = Field(default_factory=lambda: datetime.now(timezone(timedelta(hours=8))))
     notes: str | None = Field(default=None)
+    # 匯入時依內容計算的雜湊，用來略過重複匯入的列 (手動新增的交易為 NULL)
+    content_hash: str | None = Field(default=None, max_length=64)
 
 class Position(SQLModel, table=True):
     __tablename__ = "positions"
     
+    # Unique constraint 的索引以 account_id 開頭，也負責依帳戶查詢持倉；
+    # (asset_id, total_quantity) 給背景報價更新找出有持倉的資產
     __table_args__ = (
         UniqueConstraint("account_id", "asset_id", name="unique_account_asset_position"),
+        Index("ix_positions_asset_quantity", "asset_id", "total_quantity"),
     )
 
     id: int | None = Field(default=None, primary_key=True)
@@ -39,4 +52,114 @@ class Position(SQLModel, table=True):
     
     total_quantity: Decimal = Field(default=0, max_digits=20, decimal_places=10)
     average_cost: Decimal = Field(default=0, max_digits=20, decimal_places=10)
+    # 平均成本法的總成本 (現金為餘額)：append 從這裡繼續，不從四捨五入過的 average_cost 反推
+    total_cost: Decimal = Field(default=0, max_digits=20, decimal_places=10)
     last_updated: datetime = Field(default_factory=lambda: datetime.now())
+    # 上一個 checkpoint 之後套用過的交易數 (現金持倉是整個帳戶的交易數)
+    since_checkpoint: int = Field(default=0)
+
+
+class PositionCheckpoint(SQLModel, table=True):
+    __tablename__ = "position_checkpoints"
+
+    # 持倉在某筆交易 (依 transaction_time, id 排序) 之後的快照，as-of 查詢與補登重播從最近的一個開始
+    # 現金持倉的 checkpoint 以帳戶的現金資產記錄，涵蓋帳戶所有交易
+    __table_args__ = (
+        Index("ix_position_checkpoints_pair_key", "account_id", "asset_id", "transaction_time", "transaction_id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    account_id: int = Field(foreign_key="accounts.id", nullable=False, ondelete="CASCADE")
+    asset_id: int = Field(foreign_key="assets.id", nullable=False, ondelete="CASCADE")
+    # 快照包含的最後一筆交易
+    transaction_time: datetime = Field(nullable=False)
+    transaction_id: int = Field(nullable=False)
+    total_quantity: Decimal = Field(max_digits=20, decimal_places=10)
+    # 平均成本法的成本池 (total_quantity * average_cost，不經過 average_cost 的捨入)
+    total_cost: Decimal = Field(max_digits=20, decimal_places=10)
+
+
+class CheckpointLot(SQLModel, table=True):
+    __tablename__ = "checkpoint_lots"
+
+    # checkpoint 當下的 open tax lots，從 checkpoint 重播時還原 LotBook
+    __table_args__ = (
+        Index("ix_checkpoint_lots_checkpoint", "checkpoint_id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    checkpoint_id: int = Field(foreign_key="position_checkpoints.id", nullable=False, ondelete="CASCADE")
+    transaction_id: int = Field(nullable=False)
+    opened_at: datetime = Field(nullable=False)
+    quantity: Decimal = Field(max_digits=20, decimal_places=10)
+    cost_per_unit: Decimal = Field(max_digits=20, decimal_places=10)
+
+
+class TaxLot(SQLModel, table=True):
+    __tablename__ = "tax_lots"
+
+    # 只保存還有剩餘數量的 lot；依開倉順序取出同一個 (account, asset) 的 lot
+    __table_args__ = (
+        Index("ix_tax_lots_account_asset_opened", "account_id", "asset_id", "opened_at", "transaction_id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    account_id: int = Field(foreign_key="accounts.id", nullable=False, ondelete="CASCADE")
+    asset_id: int = Field(foreign_key="assets.id", nullable=False, ondelete="CASCADE")
+    # 開倉的交易 (買入或轉入)
+    transaction_id: int = Field(foreign_key="transactions.id", nullable=False, ondelete="CASCADE")
+    opened_at: datetime = Field(nullable=False)
+    # 剩餘數量與每單位成本 (含買入手續費)
+    quantity: Decimal = Field(max_digits=20, decimal_places=10)
+    cost_per_unit: Decimal = Field(max_digits=20, decimal_places=10)
+
+
+class RealizedLot(SQLModel, table=True):
+    __tablename__ = "realized_lots"
+
+    # 一筆賣出對上一個 lot 就是一列 (年度報表讀 realized_gains 的彙總)
+    __table_args__ = (
+        Index("ix_realized_lots_transaction", "transaction_id"),
+        Index("ix_realized_lots_account_asset", "account_id", "asset_id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    account_id: int = Field(foreign_key="accounts.id", nullable=False, ondelete="CASCADE")
+    asset_id: int = Field(foreign_key="assets.id", nullable=False, ondelete="CASCADE")
+    # 賣出的交易與被賣掉的 lot 的開倉交易 (賣超、沒有 lot 可配時為 NULL)
+    transaction_id: int = Field(foreign_key="transactions.id", nullable=False, ondelete="CASCADE")
+    lot_transaction_id: int | None = Field(default=None)
+    opened_at: datetime | None = Field(default=None)
+    closed_at: datetime = Field(nullable=False)
+    quantity: Decimal = Field(max_digits=20, decimal_places=10)
+    # 賣出金額 (已扣掉依數量分攤的手續費) 與成本
+    proceeds: Decimal = Field(max_digits=20, decimal_places=10)
+    cost_basis: Decimal = Field(max_digits=20, decimal_places=10)
+    # 持有超過一年
+    long_term: bool = Field(default=False)
+
+
+class RealizedGain(SQLModel, table=True):
+    __tablename__ = "realized_gains"
+
+    # realized_lots 依 (account, asset, 賣出年度) 的彙總，寫入 realized_lots 時一起更新
+    __table_args__ = (PrimaryKeyConstraint("account_id", "asset_id", "year"),)
+
+    account_id: int = Field(foreign_key="accounts.id", ondelete="CASCADE")
+    asset_id: int = Field(foreign_key="assets.id", ondelete="CASCADE")
+    year: int
+    proceeds: Decimal = Field(default=0, max_digits=20, decimal_places=10)
+    cost_basis: Decimal = Field(default=0, max_digits=20, decimal_places=10)
+    long_term_gain: Decimal = Field(default=0, max_digits=20, decimal_places=10)
+    lots: int = Field(default=0)
+
+
+class LotSelection(SQLModel, table=True):
+    __tablename__ = "lot_selections"
+
+    # LotMethod.specific：賣出交易指定要賣的 lot (以開倉交易表示) 與數量
+    __table_args__ = (PrimaryKeyConstraint("transaction_id", "lot_transaction_id"),)
+
+    transaction_id: int = Field(foreign_key="transactions.id", ondelete="CASCADE")
+    lot_transaction_id: int = Field(foreign_key="transactions.id", ondelete="CASCADE")
+    quantity: Decimal = Field(max_digits=20, decimal_places=10)
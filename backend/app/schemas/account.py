@@ -3,11 +3,15 @@ from decimal import Decimal
 from typing import Optional
 from sqlmodel import SQLModel
 
+from app.models.accounts import LotMethod
+
 
 # Shared properties
 class AccountBase(SQLModel):
     name: str
     currency: str = "USD"
+    # None 表示使用系統預設 (TAX_LOT_METHOD)
+    lot_method: Optional[LotMethod] = None
 
 
 # Properties to receive on item creation
@@ -25,4 +29,5 @@ class AccountRead(AccountBase):
 # Properties to receive on item update
 class AccountUpdate(SQLModel):
     name: Optional[str] = None
-    currency: Optional[str] = None
\ No newline at end of file
+    currency: Optional[str] = None
+    lot_method: Optional[LotMethod] = None
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Dict, List
+from sqlmodel import SQLModel
+
+
+class SlowQueryStats(SQLModel):
+    statement: str  # normalize 後的 SQL
+    count: int
+    total_ms: float
+    mean_ms: float
+    p95_ms: float
+    max_ms: float
+    callers: Dict[str, int]
+    last_parameters: str | None = None
+    last_seen: datetime | None = None
+    plan: List[str] | None = None
+
+
+class SlowQueryEntry(SQLModel):
+    statement: str
+    duration_ms: float
+    caller: str
+    parameters: str
+    timestamp: datetime
+
+
+class SlowQueryReport(SQLModel):
+    threshold_ms: float
+    tracked: int
+    dropped: int
+    queries: List[SlowQueryStats]
+    recent: List[SlowQueryEntry]
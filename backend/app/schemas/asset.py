@@ -23,6 +23,7 @@ class AssetCreate(AssetBase):
 class AssetRead(AssetBase):
     id: int
     current_price: Decimal
+    previous_close: Decimal = Decimal(0)
     last_updated: datetime
 
 class AssetValidateRequest(SQLModel):
@@ -0,0 +1,49 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+from sqlmodel import Field, SQLModel
+
+
+# 尚未賣出的 tax lot
+class TaxLotRead(SQLModel):
+    asset_id: int
+    transaction_id: int
+    opened_at: datetime
+    quantity: Decimal
+    cost_per_unit: Decimal
+
+
+# 一筆賣出配對到的 lot；lot_transaction_id 為 None 表示超賣 (沒有成本基礎)
+class RealizedLotRead(SQLModel):
+    asset_id: int
+    transaction_id: int
+    lot_transaction_id: Optional[int] = None
+    opened_at: Optional[datetime] = None
+    closed_at: datetime
+    quantity: Decimal
+    proceeds: Decimal
+    cost_basis: Decimal
+    long_term: bool
+
+
+class RealizedGainYearRead(SQLModel):
+    year: int
+    proceeds: Decimal
+    cost_basis: Decimal
+    gain: Decimal
+    short_term_gain: Decimal
+    long_term_gain: Decimal
+    lots: int
+
+
+class RealizedGainsReport(SQLModel):
+    account_id: int
+    method: str
+    years: List[RealizedGainYearRead]
+    total_gain: Decimal = Decimal(0)
+
+
+# specific-ID：指定一筆賣出要從哪筆買入 (開倉交易) 賣出多少
+class LotSelectionIn(SQLModel):
+    lot_transaction_id: int
+    quantity: Decimal = Field(gt=0)
@@ -0,0 +1,15 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlmodel import SQLModel
+
+
+# Properties to return to client
+class MarketDataRead(SQLModel):
+    asset_id: int
+    timestamp: datetime
+    price: Decimal
+
+
+class MarketDataImportResult(SQLModel):
+    ingested: int
+    skipped: int
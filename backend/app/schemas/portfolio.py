@@ -58,6 +58,28 @@ class PortfolioSummary(SQLModel):
     holdings: List[HoldingItem]
     accounts: List[AccountSummaryItem]
 
+class PortfolioHistory(SQLModel):
+    id: int
+    name: str
+    interval: str
+    # 兩個等長陣列：每個時間區間結束時的組合市值
+    timestamps: List[datetime]
+    values: List[float]
+
+class PortfolioPerformance(SQLModel):
+    id: int
+    name: str
+    start: datetime
+    end: datetime
+    start_value: float
+    end_value: float
+    # 區間內的外部資金流 (入金 - 出金)
+    net_flows: float
+    # 以下皆為比例 (0.1 = 10%)；XIRR 為年化，現金流無解時為 None
+    time_weighted_return: float
+    money_weighted_return: Optional[float] = None
+    max_drawdown: float
+
 # Properties to receive on item update
 class PortfolioUpdate(SQLModel):
     name: Optional[str] = None
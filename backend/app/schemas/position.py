@@ -0,0 +1,17 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+from sqlmodel import SQLModel
+
+
+# 某個時間點的持倉 (平均成本法，與 Position 相同)
+class HoldingAsOfRead(SQLModel):
+    asset_id: int
+    quantity: Decimal
+    average_cost: Decimal
+
+
+class HoldingsAsOfReport(SQLModel):
+    account_id: int
+    as_of: datetime
+    holdings: List[HoldingAsOfRead]
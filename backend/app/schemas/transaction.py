@@ -1,7 +1,7 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
-from sqlmodel import SQLModel
+from typing import List, Optional
+from sqlmodel import Field, SQLModel
 
 from app.models.transacions import TransactionType
 
@@ -42,4 +42,35 @@ class TransactionUpdate(SQLModel):
     price_per_unit: Optional[Decimal] = None
     fee: Optional[Decimal] = None
     transaction_time: Optional[datetime] = None
-    notes: Optional[str] = None
\ No newline at end of file
+    notes: Optional[str] = None
+
+# 單次批次請求的上限 (更大的量請用 /transactions/import)
+MAX_BATCH_SIZE = 1000
+
+
+class TransactionBatchUpdate(TransactionUpdate):
+    id: int
+
+
+class TransactionBatchDelete(SQLModel):
+    ids: List[int] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+class TransactionBatchDeleteResult(SQLModel):
+    ok: bool = True
+    deleted: int
+
+
+class TransactionImportError(SQLModel):
+    row: int  # 第幾筆資料 (從 1 開始，不含 CSV 標題列)
+    error: str
+
+
+class TransactionImportResult(SQLModel):
+    rows: int
+    imported: int
+    duplicates: int
+    positions_rebuilt: int
+    # 所有不合法的列數；errors 只列出前 TransactionImportService.MAX_ERRORS 筆
+    error_count: int = 0
+    errors: List[TransactionImportError] = []
@@ -1,54 +1,90 @@
-from typing import Annotated
+from typing import Annotated, Dict, Iterable, NamedTuple
 from decimal import Decimal
 from fastapi import Depends
-from sqlmodel import Session, select
+from sqlmodel import Session, select, func, case
 
-from app.core.database import SQLiteDB
+from app.core.cache import versions
+from app.core.database import SQLiteDB, unit_of_work
 from app.models.accounts import Account
-from app.models.transacions import Transaction, Position, TransactionType
-from app.models.assets import Asset
+from app.models.transacions import Position
+from app.models.assets import Asset, AssetType
 from app.schemas.account import AccountCreate, AccountUpdate, AccountRead
+from app.services.position import PositionService
+
+
+class AccountTotals(NamedTuple):
+    balance: Decimal
+    daily_change: Decimal
+    # daily_change 中非現金 (非 fiat) 持倉的部分：不含現金的匯率變動
+    asset_daily_change: Decimal = Decimal(0)
 
 
 class AccountService:
     def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
         self.session = session
 
-    def _calculate_total_balance(self, account_id: int) -> Decimal:
+    def _calculate_account_totals(self, account_ids: Iterable[int] | None = None) -> Dict[int, AccountTotals]:
         """
-        Calculate the total Net Worth of an account based on current positions.
+        Calculate the total Net Worth and daily change of many accounts with a single grouped query.
         
-        Formula: Sum(Position.total_quantity * Asset.current_price)
+        Formula:
+          balance      = Sum(Position.total_quantity * Asset.current_price)
+          daily_change = Sum(Position.total_quantity * (Asset.current_price - Asset.previous_close))
+          asset_daily_change = the same sum over non-fiat assets only
+        GROUP BY account
         
         Note: 
         Since 'Cash' is now treated as a Position (AssetType.fiat), 
-        this loop automatically includes the cash balance value.
+        the sum automatically includes the cash balance value.
+        Assets without a known previous close (previous_close = 0) contribute no change.
+        Accounts without positions are returned with zero totals.
+        `account_ids=None` means every existing account.
         """
-        
-        # 1. 查詢該帳戶的所有持倉 (包含現金在內)，並 Join Asset 表取得最新價格
+        price_change = case(
+            (Asset.previous_close > 0, Asset.current_price - Asset.previous_close),
+            else_=0,
+        )
         query = (
-            select(Position, Asset)
+            select(
+                Position.account_id,
+                func.sum(Position.total_quantity * Asset.current_price),
+                func.sum(Position.total_quantity * price_change),
+                func.sum(case((Asset.type != AssetType.fiat, Position.total_quantity * price_change), else_=0)),
+            )
             .join(Asset, Position.asset_id == Asset.id)
-            .where(Position.account_id == account_id)
+            .group_by(Position.account_id)
         )
-        
-        results = self.session.exec(query).all()
-        
-        total_value = Decimal(0)
-        
-        for position, asset in results:
-            # 安全防護：確保 quantity 和 price 不是 None
-            qty = position.total_quantity or Decimal(0)
-            current_price = asset.current_price or Decimal(0)
-            
-            # 計算市值
-            # Case A (股票/幣): 10 股 * 150 USD = 1500 USD
-            # Case B (現金): 32000 TWD * 0.03125 (TWD匯率) = 1000 USD
-            market_value = qty * current_price
-            
-            total_value += market_value
-            
-        return total_value
+        if account_ids is None:
+            query = query.join(Account, Position.account_id == Account.id)
+        else:
+            account_ids = list(account_ids)
+            if not account_ids:
+                return {}
+            query = query.where(Position.account_id.in_(account_ids))
+
+        totals = {account_id: AccountTotals(Decimal(0), Decimal(0)) for account_id in (account_ids or [])}
+        for account_id, total_value, daily_change, asset_daily_change in self.session.exec(query).all():
+            totals[account_id] = AccountTotals(
+                Decimal(total_value or 0),
+                Decimal(daily_change or 0),
+                Decimal(asset_daily_change or 0),
+            )
+        return totals
+
+    def _calculate_total_balances(self, account_ids: Iterable[int] | None = None) -> Dict[int, Decimal]:
+        """
+        Calculate the total Net Worth of many accounts (see `_calculate_account_totals`).
+        """
+        return {
+            account_id: totals.balance
+            for account_id, totals in self._calculate_account_totals(account_ids).items()
+        }
+
+    def _calculate_total_balance(self, account_id: int) -> Decimal:
+        """
+        Calculate the total Net Worth of a single account based on current positions.
+        """
+        return self._calculate_total_balances([account_id])[account_id]
 
     def create_account(self, account_in: AccountCreate) -> Account:
         db_account = Account.model_validate(account_in)
@@ -71,12 +107,12 @@ class AccountService:
 
     def get_accounts(self, offset: int = 0, limit: int = 100) -> list[AccountRead]:
         accounts = self.session.exec(select(Account).offset(offset).limit(limit)).all()
+        balances = self._calculate_total_balances([account.id for account in accounts])
         
         results = []
         for account in accounts:
-            total_balance = self._calculate_total_balance(account.id)
             account_read = AccountRead.model_validate(account)
-            account_read.total_balance = total_balance
+            account_read.total_balance = balances[account.id]
             results.append(account_read)
             
         return results
@@ -87,13 +123,21 @@ class AccountService:
 
     def update_account(self, db_account: Account, account_in: AccountUpdate) -> Account:
         account_data = account_in.model_dump(exclude_unset=True)
-        db_account.sqlmodel_update(account_data)
-        self.session.add(db_account)
-        self.session.commit()
+        method_changed = "lot_method" in account_data and account_data["lot_method"] != db_account.lot_method
+        with unit_of_work(self.session):
+            db_account.sqlmodel_update(account_data)
+            self.session.add(db_account)
+            if method_changed:
+                # 成本基礎方法改變：以新方法重建這個帳戶的 tax lot、已實現損益與 checkpoint 的 lot 快照
+                self.session.flush()
+                PositionService(self.session).rebuild_account(db_account.id)
+        versions.bump("account", db_account.id)
         self.session.refresh(db_account)
         return db_account
 
     def delete_account(self, db_account: Account) -> None:
+        account_id = db_account.id
         self.session.delete(db_account)
         self.session.commit()
+        versions.bump("account", account_id)
         return
@@ -1,27 +1,45 @@
-from typing import Annotated, Optional
+import asyncio
+import time
+from typing import Annotated, Iterable, Optional
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
 import yfinance as yf
 from fastapi import Depends, HTTPException
-from sqlmodel import Session, select
+from sqlmodel import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import versions
 from app.core.database import SQLiteDB
+from app.core.metrics import QUOTE_PROVIDER_SYMBOLS, observe_provider_call
 from app.models.assets import Asset, AssetType
 from app.schemas.asset import AssetCreate, AssetUpdate, AssetValidateResponse
+from app.services.market_data import MarketDataService
+from app.services.quote_provider import QuoteProvider, get_quote_provider
 
 
 class AssetService:
-    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+    def __init__(
+        self,
+        session: Annotated[AsyncSession, Depends(SQLiteDB.get_async_session)],
+        quote_provider: Annotated[QuoteProvider, Depends(get_quote_provider)],
+    ):
         self.session = session
+        self.quote_provider = quote_provider
 
-    def validate_ticker(self, ticker: str) -> AssetValidateResponse:
+    async def validate_ticker(self, ticker: str) -> AssetValidateResponse:
         """
         Validates a ticker using yfinance and returns metadata if valid.
         """
         try:
-            ticker_obj = yf.Ticker(ticker)
             # Fast check: try to get info. If invalid, it might return empty or raise error depending on version
-            info = ticker_obj.info
+            # yfinance 是 blocking 呼叫，丟到 thread 執行，等待時不佔用 event loop
+            start = time.perf_counter()
+            try:
+                info = await asyncio.to_thread(lambda: yf.Ticker(ticker).info)
+            except Exception:
+                observe_provider_call("yfinance", "ticker_info", start, ok=False)
+                raise
+            observe_provider_call("yfinance", "ticker_info", start, ok=True)
             
             # Check if we got valid info. yfinance often returns a dict with 'trailingPegRatio': None for invalid tickers or empty dict
             if not info or (len(info) == 1 and 'trailingPegRatio' in info and info['trailingPegRatio'] is None):
@@ -64,64 +82,102 @@ class AssetService:
                 valid=False
             )
 
-    def update_prices(self) -> int:
+    @staticmethod
+    def _quote_symbol(ticker: str, asset_type: AssetType) -> str:
+        """
+        法幣在 yfinance 上是匯率代號 (例如 TWD -> TWD=X)
+        """
+        if asset_type == AssetType.fiat and not ticker.endswith("=X"):
+            return ticker + "=X"
+        return ticker
+
+    async def update_prices(self) -> int:
         """
-        Updates current_price for all assets in the database using yfinance.
+        Updates current_price for all assets in the database using the quote provider.
         Returns the number of assets updated.
         """
-        assets = self.session.exec(select(Asset)).all()
-        count = 0
+        return len(await self.refresh_prices())
+
+    async def refresh_prices(self, asset_ids: Optional[Iterable[int]] = None) -> set[int]:
+        """
+        更新指定資產 (預設全部) 的報價，回傳有拿到報價並更新的 asset id。
+        """
+        query = select(Asset.id, Asset.ticker, Asset.type)
+        if asset_ids is not None:
+            query = query.where(Asset.id.in_(list(asset_ids)))
+        assets = (await self.session.exec(query)).all()
         if not assets:
-            return 0
+            return set()
+        # 抓報價可能很久，先結束讀取交易，不要在等待網路時佔住 DB 連線
+        await self.session.commit()
 
-        updated_time = datetime.now(timezone(timedelta(hours=8)))
+        symbols = {asset_id: self._quote_symbol(ticker, asset_type) for asset_id, ticker, asset_type in assets}
+        quotes = await self._get_quotes(symbols.values())
 
-        for asset in assets:
-            try:
-                if asset.type == AssetType.fiat and not asset.ticker.endswith("=X"):
-                    ticker_obj = yf.Ticker(asset.ticker + "=X")
-                else:
-                    ticker_obj = yf.Ticker(asset.ticker)
-                info = ticker_obj.fast_info # fast_info is faster than info
-                current_price = info.last_price
-                
-                if current_price:
-                    asset.current_price = Decimal(current_price)
-                    asset.last_updated = updated_time
-                    self.session.add(asset)
-                    count += 1
-                    
-            except Exception as e:
-                print(f"Failed to update {asset.ticker}: {e}")
+        updated_time = datetime.now(timezone(timedelta(hours=8)))
+        updates = []
+        for asset_id, symbol in symbols.items():
+            quote = quotes.get(symbol)
+            if not quote or not quote.price:
                 continue
-        
-        self.session.commit()
-        return count
+            # 沒有前一日收盤時寫 0 (未知)，不保留可能已過期好幾天的舊收盤，日漲跌不計入這個資產
+            updates.append({
+                "id": asset_id, "current_price": quote.price, "previous_close": quote.previous_close or Decimal(0),
+                "last_updated": updated_time,
+            })
+        if updates:
+            # 一次 bulk UPDATE (依 primary key)，同時寫入價格歷史
+            await self.session.execute(update(Asset), updates)
+            await self.session.run_sync(lambda session: MarketDataService(session).ingest(
+                (row["id"], updated_time, row["current_price"]) for row in updates
+            ))
+            await self.session.commit()
+            versions.bump("prices")
+        return {row["id"] for row in updates}
+
+    async def _get_quotes(self, symbols) -> dict:
+        """
+        呼叫報價來源並記錄延遲與回傳的 symbol 數量 (/metrics)。
+        """
+        provider = type(self.quote_provider).__name__
+        symbols = list(symbols)
+        start = time.perf_counter()
+        try:
+            quotes = await self.quote_provider.aget_quotes(symbols)
+        except Exception:
+            observe_provider_call(provider, "quotes", start, ok=False)
+            raise
+        observe_provider_call(provider, "quotes", start, ok=True)
+        QUOTE_PROVIDER_SYMBOLS.inc((provider, "requested"), len(symbols))
+        QUOTE_PROVIDER_SYMBOLS.inc((provider, "returned"), len(quotes))
+        return quotes
 
-    def create_asset(self, asset_in: AssetCreate) -> Asset:
+    async def create_asset(self, asset_in: AssetCreate) -> Asset:
         db_asset = Asset.model_validate(asset_in)
         self.session.add(db_asset)
-        self.session.commit()
-        self.session.refresh(db_asset)
+        await self.session.commit()
+        await self.session.refresh(db_asset)
         return db_asset
 
-    def get_asset_by_id(self, asset_id: int) -> Asset | None:
-        return self.session.get(Asset, asset_id)
+    async def get_asset_by_id(self, asset_id: int) -> Asset | None:
+        return await self.session.get(Asset, asset_id)
 
-    def get_assets(self, offset: int = 0, limit: int = 100) -> list[Asset]:
-        assets = self.session.exec(select(Asset).offset(offset).limit(limit)).all()
+    async def get_assets(self, offset: int = 0, limit: int = 100) -> list[Asset]:
+        assets = (await self.session.exec(select(Asset).offset(offset).limit(limit))).all()
         return assets
 
-    def update_asset(self, asset: Asset, asset_in: AssetUpdate) -> Asset:
+    async def update_asset(self, asset: Asset, asset_in: AssetUpdate) -> Asset:
         asset_data = asset_in.model_dump(exclude_unset=True)
         asset_data['last_updated'] = datetime.now(timezone(timedelta(hours=8)))
         asset.sqlmodel_update(asset_data)
         self.session.add(asset)
-        self.session.commit()
-        self.session.refresh(asset)
+        await self.session.commit()
+        versions.bump("prices")
+        await self.session.refresh(asset)
         return asset
 
-    def delete_asset(self, asset: Asset) -> None:
-        self.session.delete(asset)
-        self.session.commit()
+    async def delete_asset(self, asset: Asset) -> None:
+        await self.session.delete(asset)
+        await self.session.commit()
+        versions.bump("prices")
         return
\ No newline at end of file
@@ -0,0 +1,163 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Annotated, Dict, Iterable, List, Optional
+from fastapi import Depends
+from sqlalchemy import literal
+from sqlmodel import Session, and_, delete, func, insert, or_, select, update
+
+from app.core.database import SQLiteDB
+from app.models.transacions import CheckpointLot, PositionCheckpoint, TaxLot
+
+# 交易在 (account, asset) 內的順序：(transaction_time, id)
+Key = tuple[datetime, int]
+# 只讀需要的欄位 (不建立 ORM 物件，checkpoint 都是用 Core 寫入的)
+CHECKPOINT_COLUMNS = (PositionCheckpoint.id, PositionCheckpoint.asset_id, PositionCheckpoint.transaction_time,
+                      PositionCheckpoint.transaction_id, PositionCheckpoint.total_quantity, PositionCheckpoint.total_cost)
+
+
+def later_than(time_column, id_column, key: Key):
+    """
+    (time_column, id_column) 排在 `key` 之後的條件。
+    """
+    time, transaction_id = key
+    return or_(time_column > time, and_(time_column == time, id_column > transaction_id))
+
+
+class CheckpointService:
+    """
+    Stores position checkpoints: the position (and open tax lots) of an
+    (account, asset) pair right after a given transaction.
+
+    PositionService writes one every POSITION_CHECKPOINT_INTERVAL
+    transactions of a pair. A back-dated write replays the pair from the
+    last checkpoint before it, and an as-of query starts from the last
+    checkpoint before the requested time, so both only replay the tail.
+    Cash checkpoints use the account's cash asset and cover every
+    transaction of the account. Like the other position services it only
+    flushes; the caller commits.
+    """
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+
+    def latest(self, account_id: int, asset_id: int, before: Key):
+        """
+        `before` 之前 (不含) 最近的 checkpoint：用 (account, asset, time, id) 索引直接找到。
+        """
+        time, transaction_id = before
+        return self.session.exec(
+            select(*CHECKPOINT_COLUMNS)
+            .where(
+                PositionCheckpoint.account_id == account_id,
+                PositionCheckpoint.asset_id == asset_id,
+                or_(
+                    PositionCheckpoint.transaction_time < time,
+                    and_(PositionCheckpoint.transaction_time == time,
+                         PositionCheckpoint.transaction_id < transaction_id),
+                ),
+            )
+            .order_by(PositionCheckpoint.transaction_time.desc(), PositionCheckpoint.transaction_id.desc())
+            .limit(1)
+        ).first()
+
+    def latest_by_asset(self, account_id: int, until: datetime) -> Dict:
+        """
+        帳戶每個資產在 `until` (含) 之前最近的 checkpoint，asset_id -> checkpoint。
+        以 window function 在 DB 裡挑出每個資產的最後一個，只讀回每個資產一列。
+        """
+        ranked = select(
+            *CHECKPOINT_COLUMNS,
+            func.row_number().over(
+                partition_by=PositionCheckpoint.asset_id,
+                order_by=(PositionCheckpoint.transaction_time.desc(), PositionCheckpoint.transaction_id.desc()),
+            ).label("rank"),
+        ).where(
+            PositionCheckpoint.account_id == account_id,
+            PositionCheckpoint.transaction_time <= until,
+        ).subquery()
+        rows = self.session.exec(
+            select(ranked.c.id, ranked.c.asset_id, ranked.c.transaction_time, ranked.c.transaction_id,
+                   ranked.c.total_quantity, ranked.c.total_cost)
+            .where(ranked.c.rank == 1)
+        )
+        return {row.asset_id: row for row in rows}
+
+    def get_lots(self, checkpoint_id: int) -> List:
+        return list(self.session.exec(
+            select(CheckpointLot.transaction_id, CheckpointLot.opened_at, CheckpointLot.quantity,
+                   CheckpointLot.cost_per_unit)
+            .where(CheckpointLot.checkpoint_id == checkpoint_id)
+            .order_by(CheckpointLot.opened_at, CheckpointLot.transaction_id)
+        ))
+
+    def discard(self, account_id: int, asset_id: int, after: Key | None = None) -> None:
+        """
+        刪除排在 `after` 之後的 checkpoint (None 表示全部) 與它們的 lot 快照。
+        """
+        condition = and_(PositionCheckpoint.account_id == account_id, PositionCheckpoint.asset_id == asset_id)
+        if after is not None:
+            condition = and_(condition, later_than(
+                PositionCheckpoint.transaction_time, PositionCheckpoint.transaction_id, after))
+        self.session.execute(delete(CheckpointLot.__table__).where(
+            CheckpointLot.checkpoint_id.in_(select(PositionCheckpoint.id).where(condition))
+        ))
+        self.session.execute(delete(PositionCheckpoint.__table__).where(condition))
+
+    def write(self, account_id: int, asset_id: int, key: Key, quantity: Decimal, cost: Decimal,
+              lots: Optional[Iterable] = None, snapshot_lots: bool = True) -> None:
+        """
+        寫入 `key` 這筆交易之後的 checkpoint。`lots` 是當下的 open lots (重播中的 LotBook)；
+        為 None 時從 tax_lots 複製 (append 之後 tax_lots 就是當下的狀態)。現金不需要 lot 快照。
+        """
+        checkpoint_id = self.session.execute(insert(PositionCheckpoint.__table__).values(
+            account_id=account_id, asset_id=asset_id, transaction_time=key[0], transaction_id=key[1],
+            total_quantity=quantity, total_cost=cost,
+        )).inserted_primary_key[0]
+        if not snapshot_lots:
+            return
+        if lots is None:
+            self.session.execute(insert(CheckpointLot.__table__).from_select(
+                ["checkpoint_id", "transaction_id", "opened_at", "quantity", "cost_per_unit"],
+                select(literal(checkpoint_id), TaxLot.transaction_id, TaxLot.opened_at, TaxLot.quantity,
+                       TaxLot.cost_per_unit)
+                .where(TaxLot.account_id == account_id, TaxLot.asset_id == asset_id),
+            ))
+            return
+        rows = [
+            {"checkpoint_id": checkpoint_id, "transaction_id": lot.transaction_id, "opened_at": lot.opened_at,
+             "quantity": lot.quantity, "cost_per_unit": lot.cost_per_unit}
+            for lot in lots
+        ]
+        if rows:
+            self.session.execute(insert(CheckpointLot.__table__), rows)
+
+    def shift_cash(self, account_id: int, cash_asset_id: int, changes: List[tuple[Key, Decimal]]) -> None:
+        """
+        現金與順序無關：`changes` 是 (交易的 key, 現金差額)，每個排在 key 之後 (含) 的現金 checkpoint 都加上差額。
+        新增在最後面的交易不會碰到任何 checkpoint，只需要一次查詢。
+        """
+        if not changes:
+            return
+        earliest = min(key for key, _ in changes)
+        checkpoints = self.session.exec(
+            select(PositionCheckpoint.id, PositionCheckpoint.transaction_time, PositionCheckpoint.transaction_id,
+                   PositionCheckpoint.total_quantity)
+            .where(
+                PositionCheckpoint.account_id == account_id,
+                PositionCheckpoint.asset_id == cash_asset_id,
+                or_(
+                    PositionCheckpoint.transaction_time > earliest[0],
+                    and_(PositionCheckpoint.transaction_time == earliest[0],
+                         PositionCheckpoint.transaction_id >= earliest[1]),
+                ),
+            )
+        ).all()
+        updates: List[Dict] = []
+        for checkpoint in checkpoints:
+            checkpoint_key = (checkpoint.transaction_time, checkpoint.transaction_id)
+            delta = sum((amount for key, amount in changes if key <= checkpoint_key), Decimal(0))
+            if delta:
+                balance = checkpoint.total_quantity + delta
+                updates.append({"id": checkpoint.id, "total_quantity": balance, "total_cost": balance})
+        if updates:
+            self.session.execute(update(PositionCheckpoint), updates)
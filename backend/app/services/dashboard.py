@@ -17,12 +17,10 @@ class DashboardService:
 
     def get_stats(self) -> DashboardStatsResponse:
         # 1. Calculate Total Net Worth (Cash + Assets) across all accounts
-        accounts = self.session.exec(select(Account)).all()
-        account_service = AccountService(self.session)
-        
-        total_net_worth = Decimal(0)
-        for acc in accounts:
-            total_net_worth += account_service._calculate_total_balance(acc.id)
+        account_totals = AccountService(self.session)._calculate_account_totals().values()
+        total_net_worth = sum((t.balance for t in account_totals), Decimal(0))
+        total_daily_change = sum((t.daily_change for t in account_totals), Decimal(0))
+        asset_daily_change = sum((t.asset_daily_change for t in account_totals), Decimal(0))
             
         # 2. Calculate Allocation by Asset Type (Crypto, Stock, ETF, Fiat, etc.)
         # We iterate all positions and sum market value by asset.type
@@ -45,12 +43,15 @@ class DashboardService:
             market_value = pos.total_quantity * asset.current_price
             cost_basis = pos.total_quantity * pos.average_cost
             
-            total_assets_value += market_value
-            total_cost_basis += cost_basis
-            
             # Group by Type
             asset_type = asset.type.value # Enum value
             allocation_map[asset_type] = allocation_map.get(asset_type, Decimal(0)) + market_value
+
+            # 現金 (fiat) 不算損益，與 asset_daily_change 的範圍相同
+            if asset.type == AssetType.fiat:
+                continue
+            total_assets_value += market_value
+            total_cost_basis += cost_basis
             
             # Check performance (Profit %)
             if cost_basis > 0:
@@ -93,13 +94,17 @@ class DashboardService:
                 allocation_list.append(AssetAllocationItem(label=label, value=value, percentage=pct))
         
         # 3. Total Profit
-        # Total Profit = (Total Assets Value - Total Cost Basis)
+        # Total Profit = (Total Assets Value - Total Cost Basis), non-cash positions only
         # This ignores Cash profit.
         total_profit = total_assets_value - total_cost_basis
         
-        # 4. Changes 24h (Placeholder as we don't have history)
-        net_worth_change_24h = 0.0
-        total_profit_change_24h = 0.0
+        # 4. Changes 24h (based on Asset.previous_close, precomputed when prices refresh)
+        # Net worth moves with every position, cash FX included. Profit excludes cash, so its change
+        # comes from the non-cash rows of the same query (cost basis doesn't move within a day).
+        previous_net_worth = total_net_worth - total_daily_change
+        net_worth_change_24h = float(total_daily_change / previous_net_worth * 100) if previous_net_worth > 0 else 0.0
+        previous_profit = total_profit - asset_daily_change
+        total_profit_change_24h = float(asset_daily_change / abs(previous_profit) * 100) if previous_profit != 0 else 0.0
         top_performer_change = best_performer_change_pct if best_performer_name else None
         
         return DashboardStatsResponse(
@@ -0,0 +1,228 @@
+import csv
+import importlib.util
+import io
+import json
+from enum import Enum
+from typing import Annotated, Any, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+from datetime import datetime
+from decimal import Decimal
+from fastapi import Depends
+from sqlmodel import Session, select
+
+from app.core.database import SQLiteDB
+from app.core.timeutils import to_local_naive
+from app.models.assets import Asset, MarketData
+from app.models.transacions import Position, Transaction, TransactionType
+
+# 匯出格式 -> media type；parquet 需要另外安裝 pyarrow
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+class ExportColumn(NamedTuple):
+    """
+    匯出的一個欄位：名稱、查詢用的 column、parquet 型別 ("int" | "str" | "decimal" | "datetime")
+    """
+    name: str
+    column: Any
+    kind: str
+
+
+TRANSACTION_COLUMNS = [
+    ExportColumn("id", Transaction.id, "int"),
+    ExportColumn("account_id", Transaction.account_id, "int"),
+    ExportColumn("asset_id", Transaction.asset_id, "int"),
+    ExportColumn("ticker", Asset.ticker, "str"),
+    ExportColumn("type", Transaction.type, "str"),
+    ExportColumn("quantity", Transaction.quantity, "decimal"),
+    ExportColumn("price_per_unit", Transaction.price_per_unit, "decimal"),
+    ExportColumn("fee", Transaction.fee, "decimal"),
+    ExportColumn("transaction_time", Transaction.transaction_time, "datetime"),
+    ExportColumn("notes", Transaction.notes, "str"),
+]
+
+POSITION_COLUMNS = [
+    ExportColumn("account_id", Position.account_id, "int"),
+    ExportColumn("asset_id", Position.asset_id, "int"),
+    ExportColumn("ticker", Asset.ticker, "str"),
+    ExportColumn("total_quantity", Position.total_quantity, "decimal"),
+    ExportColumn("average_cost", Position.average_cost, "decimal"),
+    ExportColumn("current_price", Asset.current_price, "decimal"),
+    ExportColumn("last_updated", Position.last_updated, "datetime"),
+]
+
+PRICE_COLUMNS = [
+    ExportColumn("asset_id", MarketData.asset_id, "int"),
+    ExportColumn("ticker", Asset.ticker, "str"),
+    ExportColumn("timestamp", MarketData.timestamp, "datetime"),
+    ExportColumn("price", MarketData.price, "decimal"),
+]
+
+
+def check_format(fmt: str) -> None:
+    """
+    不支援的格式 (或缺少 pyarrow 時的 parquet) 丟 ValueError / ModuleNotFoundError，在開始串流前檢查。
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise ModuleNotFoundError("Parquet export requires pyarrow to be installed")
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, "f")
+    return value
+
+
+def _csv_chunks(columns: Sequence[ExportColumn], batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in columns])
+    for batch in batches:
+        writer.writerows([_plain(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(columns: Sequence[ExportColumn], batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    names = [c.name for c in columns]
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(names, (_plain(v) for v in row)))) + "\n" for row in batch
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    給 ParquetWriter 寫入的 file-like 物件，每寫完一個 row group 就把累積的 bytes 交出去。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_chunks(columns: Sequence[ExportColumn], batches: Iterable[Sequence[tuple]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int": pa.int64(), "str": pa.string(), "decimal": pa.decimal128(20, 10), "datetime": pa.timestamp("us")}
+    schema = pa.schema([(c.name, types[c.kind]) for c in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for batch in batches:
+            arrays = [
+                pa.array([_plain(row[i]) if c.kind == "str" else row[i] for row in batch], type=types[c.kind])
+                for i, c in enumerate(columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+WRITERS = {"csv": _csv_chunks, "ndjson": _ndjson_chunks, "parquet": _parquet_chunks}
+
+
+class ExportService:
+    """
+    Streaming exports of transactions, positions and price history.
+
+    Rows are read with `yield_per` (a server-side cursor on PostgreSQL) and
+    encoded one batch at a time, so memory does not grow with the export
+    size and the first bytes go out as soon as the first batch is read.
+    """
+
+    BATCH_SIZE = 5000
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+
+    def _stream(self, query, columns: Sequence[ExportColumn], fmt: str) -> Iterator[bytes]:
+        result = self.session.exec(query.execution_options(yield_per=self.BATCH_SIZE))
+        batches = (tuple(tuple(row) for row in batch) for batch in result.partitions())
+        for chunk in WRITERS[fmt](columns, batches):
+            if chunk:
+                yield chunk
+
+    def export_transactions(
+        self,
+        fmt: str,
+        account_id: int | None = None,
+        asset_id: int | None = None,
+        types: Optional[List[TransactionType]] = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> Iterator[bytes]:
+        """
+        依時間順序匯出交易 (欄位可直接用 POST /transactions/import 匯回)。
+        """
+        query = (
+            select(*(c.column for c in TRANSACTION_COLUMNS))
+            .outerjoin(Asset, Transaction.asset_id == Asset.id)
+        )
+        if account_id:
+            query = query.where(Transaction.account_id == account_id)
+        if asset_id:
+            query = query.where(Transaction.asset_id == asset_id)
+        if types:
+            query = query.where(Transaction.type.in_(types))
+        if start:
+            query = query.where(Transaction.transaction_time >= to_local_naive(start))
+        if end:
+            query = query.where(Transaction.transaction_time < to_local_naive(end))
+        query = query.order_by(Transaction.transaction_time.asc(), Transaction.id.asc())
+        return self._stream(query, TRANSACTION_COLUMNS, fmt)
+
+    def export_positions(self, fmt: str, account_id: int | None = None) -> Iterator[bytes]:
+        query = (
+            select(*(c.column for c in POSITION_COLUMNS))
+            .join(Asset, Position.asset_id == Asset.id)
+        )
+        if account_id:
+            query = query.where(Position.account_id == account_id)
+        query = query.order_by(Position.account_id, Position.asset_id)
+        return self._stream(query, POSITION_COLUMNS, fmt)
+
+    def export_prices(self, fmt: str, asset_ids: Optional[List[int]] = None,
+                      start: datetime | None = None, end: datetime | None = None) -> Iterator[bytes]:
+        query = (
+            select(*(c.column for c in PRICE_COLUMNS))
+            .join(Asset, MarketData.asset_id == Asset.id)
+        )
+        if asset_ids:
+            query = query.where(MarketData.asset_id.in_(asset_ids))
+        if start:
+            query = query.where(MarketData.timestamp >= to_local_naive(start))
+        if end:
+            query = query.where(MarketData.timestamp < to_local_naive(end))
+        query = query.order_by(MarketData.asset_id, MarketData.timestamp)
+        return self._stream(query, PRICE_COLUMNS, fmt)
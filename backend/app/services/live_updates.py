@@ -0,0 +1,326 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from app.core.cache import versions
+from app.core.config import settings
+from app.models.accounts import PortfolioAccount
+from app.models.assets import Asset
+from app.services.dashboard import DashboardService
+from app.services.portfolio import PortfolioService
+
+logger = logging.getLogger(__name__)
+
+PRICES = "prices"
+DASHBOARD = "dashboard"
+
+
+def portfolio_topic(portfolio_id: int) -> str:
+    return f"portfolio:{portfolio_id}"
+
+
+class LiveEvent:
+    """
+    一個 SSE 事件。`data` 是要合併進前端狀態的頂層欄位，`frame` 是編碼好的 SSE 文字：
+    同一個事件送給所有訂閱者時只編碼一次。
+    """
+    __slots__ = ("topic", "name", "data", "_frame")
+
+    def __init__(self, topic: str, name: str, data: dict):
+        self.topic = topic
+        self.name = name
+        self.data = data
+        self._frame: bytes | None = None
+
+    @property
+    def frame(self) -> bytes:
+        if self._frame is None:
+            payload = json.dumps(self.data, separators=(",", ":"))
+            self._frame = f"event: {self.name}\ndata: {payload}\n\n".encode()
+        return self._frame
+
+    def merge(self, newer: "LiveEvent") -> "LiveEvent":
+        return LiveEvent(self.topic, self.name, {**self.data, **newer.data})
+
+
+class Change(NamedTuple):
+    topic: str
+    name: str
+    delta: dict
+    state: dict
+
+
+class LiveSubscriber:
+    """
+    一個串流連線。待送的事件依 topic 合併：連線跟不上時同一個 topic 只留一筆合併後的事件，
+    所以一個慢的連線最多佔用 (topic 數) 筆事件，也不會拖慢其他連線。
+    """
+
+    def __init__(self, portfolio_ids: Iterable[int] = ()):
+        self.portfolio_ids = frozenset(portfolio_ids)
+        self._pending: OrderedDict[str, LiveEvent] = OrderedDict()
+        self._ready = asyncio.Event()
+        self.sent = 0
+        self.conflated = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def wants(self, topic: str) -> bool:
+        if topic.startswith("portfolio:"):
+            return int(topic.split(":", 1)[1]) in self.portfolio_ids
+        return True
+
+    def offer(self, event: LiveEvent) -> None:
+        pending = self._pending.get(event.topic)
+        if pending is None:
+            self._pending[event.topic] = event
+        else:
+            self._pending[event.topic] = pending.merge(event)
+            self.conflated += 1
+        self._ready.set()
+
+    async def next(self, timeout: float) -> List[bytes]:
+        """
+        等到有事件 (最多 `timeout` 秒) 後一次取出所有待送的 frame，逾時回傳空 list。
+        """
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except TimeoutError:
+                return []
+        self._ready.clear()
+        frames = [event.frame for event in self._pending.values()]
+        self._pending.clear()
+        self.sent += len(frames)
+        return frames
+
+
+def changed_fields(previous: dict | None, current: dict) -> dict:
+    if previous is None:
+        return current
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+class LiveUpdateBroker:
+    """
+    Pushes price ticks and recomputed dashboard / portfolio summaries to the
+    SSE stream (GET /stream/), started from the app lifespan when
+    LIVE_UPDATES_ENABLED is set.
+
+    Writers already bump `versions` after they commit: "prices" on price
+    refreshes and asset edits, ("account", id) on transaction writes and
+    ("portfolio", id) on membership changes. The broker listens to those
+    bumps, waits `debounce` seconds so a burst of writes is handled once,
+    computes every affected view one time in a worker thread and fans the
+    same encoded event out to every subscriber of it.
+
+    - An event only carries the top-level fields that changed since the last
+      one; a new subscriber first gets the full current state.
+    - Portfolio summaries are only computed for subscribed portfolios, through
+      PortfolioService's version-checked cache.
+    - Backpressure: a subscriber that falls behind has its pending events
+      merged per topic (LiveSubscriber), so it never blocks the fan-out.
+    """
+
+    def __init__(self, engine: Engine, debounce: float | None = None, max_subscribers: int | None = None):
+        self.engine = engine
+        self.debounce = settings.LIVE_UPDATES_DEBOUNCE_SECONDS if debounce is None else debounce
+        self.max_subscribers = max_subscribers or settings.LIVE_UPDATES_MAX_SUBSCRIBERS
+
+        self._subscribers: set[LiveSubscriber] = set()
+        # portfolio_id -> 訂閱它的連線數
+        self._watchers: Counter[int] = Counter()
+        # topic -> 最後發布的完整狀態 (新訂閱者的第一個事件)
+        self._state: Dict[str, LiveEvent] = {}
+        self._lock = threading.Lock()
+        self._prices_changed = False
+        self._accounts: set[int] = set()
+        self._portfolios: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+
+        # 統計 (benchmark / 監控用)
+        self.computations = 0
+        self.events = 0
+        self.last_compute_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        versions.add_listener(self._on_bump)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        versions.remove_listener(self._on_bump)
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _on_bump(self, namespace: str, key: Hashable) -> None:
+        """
+        versions.bump 的 listener，可能在 worker thread 被呼叫 (sync 端點)。
+        """
+        with self._lock:
+            if namespace == "prices":
+                self._prices_changed = True
+            elif namespace == "account":
+                self._accounts.add(key)
+            elif namespace == "portfolio":
+                self._portfolios.add(key)
+            else:
+                return
+        if self._subscribers and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def subscribe(self, portfolio_ids: Iterable[int] = ()) -> LiveSubscriber:
+        """
+        新增訂閱者並先放入目前的完整狀態；還沒算過的 topic 由下一輪計算補上。
+        """
+        subscriber = LiveSubscriber(portfolio_ids)
+        if not self._subscribers:
+            # 沒有訂閱者期間不維護狀態，之前累積的變動也不需要了
+            with self._lock:
+                self._prices_changed = False
+                self._accounts.clear()
+                self._portfolios.clear()
+        self._subscribers.add(subscriber)
+        self._watchers.update(subscriber.portfolio_ids)
+        for topic, event in self._state.items():
+            if subscriber.wants(topic):
+                subscriber.offer(event)
+        topics = [PRICES, DASHBOARD, *(portfolio_topic(p) for p in subscriber.portfolio_ids)]
+        if any(topic not in self._state for topic in topics):
+            self._wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: LiveSubscriber) -> None:
+        if subscriber not in self._subscribers:
+            return
+        self._subscribers.discard(subscriber)
+        self._watchers.subtract(subscriber.portfolio_ids)
+        for portfolio_id in subscriber.portfolio_ids:
+            if self._watchers[portfolio_id] <= 0:
+                # 沒人訂閱的 portfolio 不再維護，之後訂閱時重新計算
+                del self._watchers[portfolio_id]
+                self._state.pop(portfolio_topic(portfolio_id), None)
+        if not self._subscribers:
+            self._state.clear()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # 合併同一波的變動：這段時間內的 bump 都在同一輪處理
+            await asyncio.sleep(self.debounce)
+            self._wakeup.clear()
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Live update failed")
+
+    async def refresh(self) -> None:
+        """
+        計算這段時間內受影響的 topic 一次，發布給所有訂閱者。
+        """
+        with self._lock:
+            prices_changed, self._prices_changed = self._prices_changed, False
+            accounts, self._accounts = self._accounts, set()
+            portfolios, self._portfolios = self._portfolios, set()
+        if not self._subscribers:
+            return
+        watched = frozenset(self._watchers)
+        state = {topic: event.data for topic, event in self._state.items()}
+
+        start = time.perf_counter()
+        changes = await asyncio.to_thread(self._compute, state, watched, prices_changed, accounts, portfolios)
+        self.last_compute_ms = (time.perf_counter() - start) * 1000
+        self.computations += 1
+        self._publish(changes)
+
+    def _compute(self, state: Dict[str, dict], watched: frozenset[int], prices_changed: bool,
+                 accounts: set[int], portfolios: set[int]) -> List[Change]:
+        changes: List[Change] = []
+
+        def add(topic: str, name: str, current: dict, key: Optional[dict] = None) -> None:
+            delta = changed_fields(state.get(topic), current)
+            if delta or topic not in state:
+                changes.append(Change(topic, name, {**(key or {}), **delta}, current))
+
+        with Session(self.engine) as session:
+            if prices_changed or PRICES not in state:
+                rows = session.exec(select(Asset.id, Asset.ticker, Asset.current_price, Asset.previous_close)).all()
+                add(PRICES, "prices", {
+                    str(asset_id): {
+                        "ticker": ticker,
+                        "price": str(price),
+                        "previous_close": str(previous_close) if previous_close is not None else None,
+                    }
+                    for asset_id, ticker, price, previous_close in rows
+                })
+
+            if prices_changed or accounts or DASHBOARD not in state:
+                add(DASHBOARD, "dashboard", DashboardService(session).get_stats().model_dump(mode="json"))
+
+            if prices_changed:
+                targets = set(watched)
+            else:
+                targets = {p for p in watched if p in portfolios or portfolio_topic(p) not in state}
+                if accounts:
+                    targets.update(session.exec(
+                        select(PortfolioAccount.portfolio_id)
+                        .where(PortfolioAccount.account_id.in_(accounts), PortfolioAccount.portfolio_id.in_(watched))
+                    ).all())
+            service = PortfolioService(session)
+            for portfolio_id in sorted(targets):
+                summary = service.get_portfolio_summary(portfolio_id)
+                if summary is not None:
+                    add(portfolio_topic(portfolio_id), "portfolio", summary.model_dump(mode="json"),
+                        key={"id": portfolio_id})
+        return changes
+
+    def _publish(self, changes: List[Change]) -> None:
+        if not self._subscribers:
+            # 計算期間所有連線都斷了：不保留狀態，下一個訂閱者會重新計算
+            return
+        for change in changes:
+            if change.topic.startswith("portfolio:") and int(change.topic.split(":", 1)[1]) not in self._watchers:
+                continue
+            self._state[change.topic] = LiveEvent(change.topic, change.name, change.state)
+            event = LiveEvent(change.topic, change.name, change.delta)
+            for subscriber in self._subscribers:
+                if subscriber.wants(change.topic):
+                    subscriber.offer(event)
+            self.events += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "topics": len(self._state),
+            "computations": self.computations,
+            "events": self.events,
+            "last_compute_ms": self.last_compute_ms,
+            "conflated": sum(subscriber.conflated for subscriber in self._subscribers),
+        }
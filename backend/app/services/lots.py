@@ -0,0 +1,566 @@
+from collections import deque
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Annotated, Dict, Iterable, Iterator, List, NamedTuple, Optional
+from fastapi import Depends
+from sqlmodel import Session, and_, delete, insert, or_, select, update
+
+from app.core.config import settings
+from app.core.database import SQLiteDB
+from app.models.accounts import Account, LotMethod
+from app.models.assets import Asset, AssetType
+from app.services.checkpoints import Key, later_than
+from app.models.transacions import LotSelection, RealizedGain, RealizedLot, TaxLot, Transaction, TransactionType
+
+# 開倉 / 平倉的交易類型 (與 apply_transaction 的數量規則相同)；只有 sell 會實現損益，withdraw 是轉出
+OPENING = (TransactionType.buy, TransactionType.deposit)
+CLOSING = (TransactionType.sell, TransactionType.withdraw)
+# 持有超過這個期間算長期
+LONG_TERM = timedelta(days=365)
+LOT_REPLAY_COLUMNS = (Transaction.id, Transaction.type, Transaction.quantity, Transaction.price_per_unit,
+                      Transaction.fee, Transaction.transaction_time)
+
+
+class Lot:
+    """
+    一個還沒賣完的 lot。`id` 是 tax_lots 的 id (還沒寫入的為 None)。
+    """
+    __slots__ = ("id", "transaction_id", "opened_at", "quantity", "cost_per_unit", "loaded_quantity")
+
+    def __init__(self, transaction_id: int, opened_at: datetime, quantity: Decimal, cost_per_unit: Decimal,
+                 id: int | None = None):
+        self.id = id
+        self.transaction_id = transaction_id
+        self.opened_at = opened_at
+        self.quantity = quantity
+        self.cost_per_unit = cost_per_unit
+        self.loaded_quantity = quantity
+
+
+class Match(NamedTuple):
+    lot_transaction_id: int | None
+    opened_at: datetime | None
+    quantity: Decimal
+    cost_basis: Decimal
+
+
+class LotSource:
+    """
+    The open tax_lots rows of one (account, asset), read lazily in chunks from
+    the end a sale consumes: oldest first, or newest first for LIFO. Rows are
+    turned into Lot objects once; `loaded` keeps every lot read so far, whether
+    from a chunk or by opening transaction (specific-ID selections).
+    """
+
+    def __init__(self, session: Session, account_id: int, asset_id: int, newest_first: bool, chunk_size: int):
+        self.session = session
+        self.account_id = account_id
+        self.asset_id = asset_id
+        self.newest_first = newest_first
+        self.chunk_size = chunk_size
+        self.exhausted = False
+        self.loaded: Dict[int, Lot] = {}
+        self._last: Key | None = None
+
+    def _statement(self):
+        return select(TaxLot.id, TaxLot.transaction_id, TaxLot.opened_at, TaxLot.quantity, TaxLot.cost_per_unit) \
+            .where(TaxLot.account_id == self.account_id, TaxLot.asset_id == self.asset_id)
+
+    def _lot(self, row) -> Lot:
+        lot = self.loaded.get(row.transaction_id)
+        if lot is None:
+            lot = self.loaded[row.transaction_id] = Lot(
+                row.transaction_id, row.opened_at, row.quantity, row.cost_per_unit, id=row.id)
+        return lot
+
+    def next_chunk(self) -> List[Lot]:
+        """
+        下一批 lot (依取用的順序)；讀到的列數不足一批表示已經讀完。
+        """
+        statement = self._statement()
+        if self.newest_first:
+            if self._last is not None:
+                time, transaction_id = self._last
+                statement = statement.where(or_(
+                    TaxLot.opened_at < time, and_(TaxLot.opened_at == time, TaxLot.transaction_id < transaction_id)))
+            statement = statement.order_by(TaxLot.opened_at.desc(), TaxLot.transaction_id.desc())
+        else:
+            if self._last is not None:
+                statement = statement.where(later_than(TaxLot.opened_at, TaxLot.transaction_id, self._last))
+            statement = statement.order_by(TaxLot.opened_at, TaxLot.transaction_id)
+        rows = self.session.exec(statement.limit(self.chunk_size)).all()
+        self.exhausted = len(rows) < self.chunk_size
+        if rows:
+            self._last = (rows[-1].opened_at, rows[-1].transaction_id)
+        return [self._lot(row) for row in rows]
+
+    def load_transactions(self, transaction_ids: Iterable[int]) -> None:
+        """
+        依開倉交易讀出指定的 lot (specific-ID)，之後讀到同一列時沿用同一個 Lot。
+        """
+        transaction_ids = [i for i in set(transaction_ids) if i not in self.loaded]
+        if transaction_ids:
+            for row in self.session.exec(self._statement().where(TaxLot.transaction_id.in_(transaction_ids))):
+                self._lot(row)
+
+
+class LotBook:
+    """
+    Open lots of one (account, asset), oldest at the left of a deque.
+
+    Buys append on the right; sells take from the left (FIFO, average) or the
+    right (LIFO). Every lot is appended and removed once, so matching is
+    amortized O(1) per lot. Lots sold through a specific-ID selection are left
+    in place with zero quantity and skipped when they reach an end.
+
+    With LotMethod.average the cost of a sale is the pool's average cost (the
+    same rule as apply_transaction); lots still give the holding period.
+
+    With a `source`, the lots already in the database are not in the deque up
+    front: they are older than every lot the book opens, so they are read
+    from the source only when a sale reaches them.
+    """
+
+    def __init__(self, method: LotMethod, lots: Iterable[Lot] = (),
+                 quantity: Decimal | None = None, cost: Decimal | None = None,
+                 selections: Dict[int, List[tuple[int, Decimal]]] | None = None,
+                 source: LotSource | None = None):
+        self.method = method
+        self.lots: deque[Lot] = deque(lots)
+        self.source = source
+        self.quantity = sum((lot.quantity for lot in self.lots), Decimal(0)) if quantity is None else quantity
+        self.cost = sum((lot.quantity * lot.cost_per_unit for lot in self.lots), Decimal(0)) if cost is None else cost
+        self.selections = selections or {}
+        self._by_transaction: Dict[int, Lot] | None = None
+        # 這次賣完 (數量歸零) 的 DB lot 與實現的損益
+        self.closed: List[Lot] = []
+        self.realized: List[dict] = []
+
+    def apply(self, txn) -> List[Match]:
+        """
+        依時間順序套用一筆交易 (需要 id, type, quantity, price_per_unit, fee, transaction_time)。
+        """
+        qty = txn.quantity or Decimal(0)
+        if qty <= 0:
+            return []
+        price = txn.price_per_unit or Decimal(0)
+        fee = txn.fee or Decimal(0)
+
+        if txn.type in OPENING:
+            cost = qty * price + fee
+            lot = Lot(txn.id, txn.transaction_time, qty, cost / qty)
+            self.lots.append(lot)
+            if self._by_transaction is not None:
+                self._by_transaction[lot.transaction_id] = lot
+            self.quantity += qty
+            self.cost += cost
+            return []
+
+        if txn.type not in CLOSING:
+            return []
+        matches = self.close(qty, self.selections.get(txn.id))
+        if txn.type == TransactionType.sell:
+            proceeds = qty * price - fee
+            for match in matches:
+                self.realized.append({
+                    "transaction_id": txn.id,
+                    "lot_transaction_id": match.lot_transaction_id,
+                    "opened_at": match.opened_at,
+                    "closed_at": txn.transaction_time,
+                    "quantity": match.quantity,
+                    "proceeds": proceeds * match.quantity / qty,
+                    "cost_basis": match.cost_basis,
+                    "long_term": match.opened_at is not None and txn.transaction_time - match.opened_at > LONG_TERM,
+                })
+        return matches
+
+    def close(self, quantity: Decimal, selected: List[tuple[int, Decimal]] | None = None) -> List[Match]:
+        """
+        賣出 / 轉出 `quantity`：先賣 `selected` 指定的 lot (開倉交易 id, 數量)，其餘依方法從 deque 的一端取。
+        超過持有數量的部分沒有 lot 可配，成本為 0。
+        """
+        average = self.cost / self.quantity if self.method == LotMethod.average and self.quantity > 0 else None
+        matches: List[Match] = []
+        remaining = quantity
+
+        def take(lot: Lot, qty: Decimal) -> None:
+            lot.quantity -= qty
+            if lot.quantity <= 0 and lot.id is not None:
+                self.closed.append(lot)
+            basis = qty * (average if average is not None else lot.cost_per_unit)
+            matches.append(Match(lot.transaction_id, lot.opened_at, qty, basis))
+
+        for lot_transaction_id, qty in selected or ():
+            lot = self._lots_by_transaction().get(lot_transaction_id)
+            if lot is None and self.source is not None:
+                lot = self.source.loaded.get(lot_transaction_id)
+            qty = min(qty, remaining, lot.quantity if lot else Decimal(0))
+            if qty > 0:
+                take(lot, qty)
+                remaining -= qty
+
+        from_right = self.method == LotMethod.lifo
+        while remaining > 0:
+            if self._needs_source(from_right):
+                self._load(from_right)
+            if not self.lots:
+                break
+            lot = self.lots[-1] if from_right else self.lots[0]
+            if lot.quantity > 0:
+                qty = min(lot.quantity, remaining)
+                take(lot, qty)
+                remaining -= qty
+            if lot.quantity <= 0:
+                # 包含先前指定賣出而歸零、現在才到達一端的 lot
+                self._pop(from_right)
+        if remaining > 0:
+            matches.append(Match(None, None, remaining, Decimal(0)))
+
+        # 與 apply_transaction 相同：平均成本法依比例減少成本，其他方法減掉賣掉的 lot 成本
+        if average is not None:
+            self.cost -= average * quantity
+        else:
+            self.cost -= sum((match.cost_basis for match in matches), Decimal(0))
+        self.quantity -= quantity
+        return matches
+
+    def _needs_source(self, from_right: bool) -> bool:
+        """
+        還沒讀的 DB lot 比 deque 裡的都舊：LIFO 在 deque 取完後才輪到它們；
+        其他方法在左端已經沒有讀進來的 DB lot (空的或是這次新開的 lot) 時就輪到它們。
+        """
+        if self.source is None or self.source.exhausted:
+            return False
+        return not self.lots if from_right else not self.lots or self.lots[0].id is None
+
+    def _load(self, from_right: bool) -> None:
+        chunk = self.source.next_chunk()
+        # chunk 依取用順序：LIFO 由新到舊，extendleft 後在 deque 裡仍是由舊到新
+        self.lots.extendleft(chunk if from_right else reversed(chunk))
+        if self._by_transaction is not None:
+            self._by_transaction.update((lot.transaction_id, lot) for lot in chunk)
+
+    def _pop(self, from_right: bool) -> None:
+        lot = self.lots.pop() if from_right else self.lots.popleft()
+        if self._by_transaction is not None:
+            self._by_transaction.pop(lot.transaction_id, None)
+
+    def _lots_by_transaction(self) -> Dict[int, Lot]:
+        # 只有 specific-ID 需要依開倉交易找 lot：第一次用到時才建立
+        if self._by_transaction is None:
+            self._by_transaction = {lot.transaction_id: lot for lot in self.lots}
+        return self._by_transaction
+
+    def feed(self, transactions: Iterable) -> Iterator:
+        """
+        依序套用並原樣傳回每筆交易，讓持倉重播與 lot 重播共用同一次讀取。
+        """
+        for txn in transactions:
+            self.apply(txn)
+            yield txn
+
+    def open_lots(self) -> List[Lot]:
+        return [lot for lot in self.lots if lot.quantity > 0]
+
+
+class RealizedGainYear(NamedTuple):
+    year: int
+    proceeds: Decimal
+    cost_basis: Decimal
+    gain: Decimal
+    short_term_gain: Decimal
+    long_term_gain: Decimal
+    lots: int
+
+
+class LotService:
+    """
+    Maintains the open tax lots and realized lot rows from transaction writes.
+
+    PositionService feeds a pair's ledger through `new_book` / `save_replay`
+    while it rebuilds the pair, and calls `append` for transactions added
+    after everything else in the pair, so lots change in the same database
+    transaction as positions. Every write to realized_lots also updates the
+    per-year rollup in realized_gains, so the yearly report reads a handful of
+    rows instead of the ledger.
+    """
+
+    # append 有賣出時每次讀出的既有 lot 數
+    LOT_CHUNK_SIZE = 64
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+        self._methods: Dict[int, LotMethod] = {}
+
+    def get_method(self, account_id: int) -> LotMethod:
+        if account_id not in self._methods:
+            method = self.session.exec(select(Account.lot_method).where(Account.id == account_id)).first()
+            self._methods[account_id] = method or LotMethod(settings.TAX_LOT_METHOD)
+        return self._methods[account_id]
+
+    def _selections(self, account_id: int, asset_id: int,
+                    sell_ids: Optional[List[int]] = None) -> Dict[int, List[tuple[int, Decimal]]]:
+        """
+        specific-ID 的指定：賣出交易 id -> [(開倉交易 id, 數量)]。`sell_ids` 為 None 時取整個 (account, asset)。
+        """
+        statement = select(LotSelection.transaction_id, LotSelection.lot_transaction_id, LotSelection.quantity)
+        if sell_ids is None:
+            statement = statement.join(Transaction, LotSelection.transaction_id == Transaction.id).where(
+                Transaction.account_id == account_id, Transaction.asset_id == asset_id)
+        else:
+            statement = statement.where(LotSelection.transaction_id.in_(sell_ids))
+        selections: Dict[int, List[tuple[int, Decimal]]] = {}
+        for transaction_id, lot_transaction_id, quantity in self.session.exec(
+                statement.order_by(LotSelection.transaction_id, LotSelection.lot_transaction_id)):
+            selections.setdefault(transaction_id, []).append((lot_transaction_id, quantity))
+        return selections
+
+    def new_book(self, account_id: int, asset_id: int, lots: Iterable[Lot] = (),
+                 quantity: Decimal | None = None, cost: Decimal | None = None) -> LotBook:
+        """
+        重播用的 book：從頭開始 (空的) 或從 checkpoint 還原的 lots 與成本池開始。
+        specific-ID 會載入整個 pair 的指定。
+        """
+        method = self.get_method(account_id)
+        selections = self._selections(account_id, asset_id) if method == LotMethod.specific else None
+        return LotBook(method, lots, quantity=quantity, cost=cost, selections=selections)
+
+    def save_replay(self, account_id: int, asset_id: int, book: LotBook, since: Key | None = None) -> None:
+        """
+        以重播結果取代這個 (account, asset) 的 lot 與已實現損益。只 flush，不 commit。
+        `since` 是重播起點的 checkpoint：在它之前 (含) 賣出的已實現 lot 不變，只重寫之後的；
+        年度彙總重算起點所在年度之後的部分。
+        """
+        self.session.execute(delete(TaxLot.__table__).where(
+            TaxLot.account_id == account_id, TaxLot.asset_id == asset_id))
+        realized = and_(RealizedLot.account_id == account_id, RealizedLot.asset_id == asset_id)
+        gains = and_(RealizedGain.account_id == account_id, RealizedGain.asset_id == asset_id)
+        kept: List[dict] = []
+        if since is not None:
+            realized = and_(realized, later_than(RealizedLot.closed_at, RealizedLot.transaction_id, since))
+            gains = and_(gains, RealizedGain.year >= since[0].year)
+        self.session.execute(delete(RealizedLot.__table__).where(realized))
+        self.session.execute(delete(RealizedGain.__table__).where(gains))
+        if since is not None:
+            kept = [row._asdict() for row in self.session.exec(
+                select(RealizedLot.closed_at, RealizedLot.proceeds, RealizedLot.cost_basis, RealizedLot.long_term)
+                .where(RealizedLot.account_id == account_id, RealizedLot.asset_id == asset_id,
+                       RealizedLot.closed_at >= datetime(since[0].year, 1, 1))
+            )]
+        self._insert(account_id, asset_id, book.open_lots(), book.realized, kept=kept)
+
+    def replay(self, account_id: int, asset_id: int) -> None:
+        """
+        只從頭重建 lot (持倉與 checkpoint 不變)，給補上 lot 的 migration 使用；
+        一般的寫入由 PositionService 重播 (lot 快照也在 checkpoint 裡)。
+        """
+        book = self.new_book(account_id, asset_id)
+        for txn in self.session.exec(
+            select(*LOT_REPLAY_COLUMNS)
+            .where(Transaction.account_id == account_id, Transaction.asset_id == asset_id)
+            .order_by(Transaction.transaction_time.asc(), Transaction.id.asc())
+            .execution_options(yield_per=1000)
+        ):
+            book.apply(txn)
+        self.save_replay(account_id, asset_id, book)
+
+    def replay_account(self, account_id: int) -> None:
+        """
+        重建帳戶所有非現金資產的 lot。
+        """
+        cash_asset_id = self.session.exec(
+            select(Asset.id).join(Account, Asset.ticker == Account.currency)
+            .where(Account.id == account_id, Asset.type == AssetType.fiat)
+        ).first()
+        asset_ids = self.session.exec(
+            select(Transaction.asset_id).distinct()
+            .where(Transaction.account_id == account_id, Transaction.asset_id.is_not(None))
+        ).all()
+        for asset_id in asset_ids:
+            if asset_id != cash_asset_id:
+                self.replay(account_id, asset_id)
+
+    def replay_all(self) -> None:
+        for account_id in self.session.exec(select(Account.id).order_by(Account.id)).all():
+            self.replay_account(account_id)
+
+    def append(self, account_id: int, asset_id: int, txns: List[Transaction],
+               quantity: Decimal, cost: Decimal) -> None:
+        """
+        套用排在這個 (account, asset) 所有交易之後的新交易 (已依時間排序)。
+        `quantity` / `cost` 是套用前的持倉 (平均成本法的成本池)。
+        既有的 lot 只在賣出用到時才從取用的一端分批讀出 (LIFO 由新到舊，其他由舊到新)，
+        specific-ID 另外只讀被指定的 lot；只有買入時完全不讀。
+        """
+        method = self.get_method(account_id)
+        source = LotSource(self.session, account_id, asset_id, newest_first=method == LotMethod.lifo,
+                           chunk_size=self.LOT_CHUNK_SIZE)
+        selections = None
+        sells = [txn.id for txn in txns if txn.type in CLOSING]
+        if sells and method == LotMethod.specific:
+            selections = self._selections(account_id, asset_id, sells)
+            source.load_transactions(lot_transaction_id for selected in selections.values()
+                                     for lot_transaction_id, _ in selected)
+
+        book = LotBook(method, quantity=quantity, cost=cost, selections=selections, source=source)
+        for txn in txns:
+            book.apply(txn)
+
+        if book.closed:
+            self.session.execute(delete(TaxLot.__table__).where(TaxLot.id.in_([lot.id for lot in book.closed])))
+        changed = [{"id": lot.id, "quantity": lot.quantity} for lot in source.loaded.values()
+                   if lot.quantity > 0 and lot.quantity != lot.loaded_quantity]
+        if changed:
+            self.session.execute(update(TaxLot), changed)
+        self._insert(account_id, asset_id, [lot for lot in book.lots if lot.id is None and lot.quantity > 0],
+                     book.realized)
+
+    def _insert(self, account_id: int, asset_id: int, lots: List[Lot], realized: List[dict],
+                kept: Optional[List[dict]] = None) -> None:
+        """
+        寫入新的 lot 與已實現的 lot。`kept` 不是 None 表示受影響年度的彙總剛被刪掉，
+        要以 `kept` (那些年度裡沒有重寫的已實現 lot) 加上 `realized` 重算，而不是累加到既有的彙總。
+        lot 相關的表都用 Core 的 table 語句寫入：不需要 ORM 物件，也省掉同步 identity map 的成本 (重播時很明顯)。
+        """
+        if lots:
+            self.session.execute(insert(TaxLot.__table__), [
+                {"account_id": account_id, "asset_id": asset_id, "transaction_id": lot.transaction_id,
+                 "opened_at": lot.opened_at, "quantity": lot.quantity, "cost_per_unit": lot.cost_per_unit}
+                for lot in lots
+            ])
+        if realized:
+            self.session.execute(insert(RealizedLot.__table__), [
+                {"account_id": account_id, "asset_id": asset_id, **row} for row in realized
+            ])
+        if kept is not None and (kept or realized):
+            self._add_gains(account_id, asset_id, kept + realized, replaced=True)
+        elif realized:
+            self._add_gains(account_id, asset_id, realized)
+
+    def _add_gains(self, account_id: int, asset_id: int, realized: List[dict], replaced: bool = False) -> None:
+        """
+        把新的已實現 lot 加到 realized_gains 的年度彙總。
+        """
+        totals: Dict[int, dict] = {}
+        for row in realized:
+            total = totals.setdefault(row["closed_at"].year, {
+                "proceeds": Decimal(0), "cost_basis": Decimal(0), "long_term_gain": Decimal(0), "lots": 0,
+            })
+            total["proceeds"] += row["proceeds"]
+            total["cost_basis"] += row["cost_basis"]
+            if row["long_term"]:
+                total["long_term_gain"] += row["proceeds"] - row["cost_basis"]
+            total["lots"] += 1
+
+        existing = [] if replaced else self.session.exec(
+            select(RealizedGain.year, RealizedGain.proceeds, RealizedGain.cost_basis,
+                   RealizedGain.long_term_gain, RealizedGain.lots)
+            .where(RealizedGain.account_id == account_id, RealizedGain.asset_id == asset_id,
+                   RealizedGain.year.in_(list(totals)))
+        ).all()
+        updates = []
+        for row in existing:
+            total = totals.pop(row.year)
+            updates.append({
+                "account_id": account_id, "asset_id": asset_id, "year": row.year,
+                "proceeds": row.proceeds + total["proceeds"], "cost_basis": row.cost_basis + total["cost_basis"],
+                "long_term_gain": row.long_term_gain + total["long_term_gain"], "lots": row.lots + total["lots"],
+            })
+        if updates:
+            self.session.execute(update(RealizedGain), updates)
+        if totals:
+            self.session.execute(insert(RealizedGain.__table__), [
+                {"account_id": account_id, "asset_id": asset_id, "year": year, **total}
+                for year, total in totals.items()
+            ])
+
+    def forget(self, transaction_ids: Iterable[int]) -> None:
+        """
+        刪除交易時一併刪掉跟它有關的 specific-ID 指定。
+        """
+        transaction_ids = list(transaction_ids)
+        if transaction_ids:
+            self.session.execute(delete(LotSelection.__table__).where(
+                LotSelection.transaction_id.in_(transaction_ids) | LotSelection.lot_transaction_id.in_(transaction_ids)
+            ))
+
+    def set_selections(self, transaction: Transaction, selections: List[tuple[int, Decimal]]) -> None:
+        """
+        取代一筆賣出交易的 specific-ID 指定。只 flush，不 commit；
+        呼叫端要從這筆賣出重播 (PositionService.rebuild_asset_position 的 since)。
+        """
+        self.session.execute(delete(LotSelection.__table__).where(LotSelection.transaction_id == transaction.id))
+        if selections:
+            self.session.execute(insert(LotSelection.__table__), [
+                {"transaction_id": transaction.id, "lot_transaction_id": lot_transaction_id, "quantity": quantity}
+                for lot_transaction_id, quantity in selections
+            ])
+
+    def select_lots(self, transaction: Transaction, selections: List[tuple[int, Decimal]]) -> None:
+        """
+        驗證並設定一筆賣出的 specific-ID 指定 (見 set_selections)。不合法時丟 ValueError。
+        """
+        if transaction.type != TransactionType.sell:
+            raise ValueError("Lots can only be selected for sell transactions")
+        if self.get_method(transaction.account_id) != LotMethod.specific:
+            raise ValueError("Account does not use the specific lot method")
+        lot_ids = [lot_transaction_id for lot_transaction_id, _ in selections]
+        if len(set(lot_ids)) != len(lot_ids):
+            raise ValueError("Each lot can only be selected once")
+        if sum((quantity for _, quantity in selections), Decimal(0)) > (transaction.quantity or 0):
+            raise ValueError("Selected quantity exceeds the sell quantity")
+
+        openings = {
+            row.id: row for row in self.session.exec(
+                select(Transaction.id, Transaction.transaction_time).where(
+                    Transaction.id.in_(lot_ids),
+                    Transaction.account_id == transaction.account_id,
+                    Transaction.asset_id == transaction.asset_id,
+                    Transaction.type.in_(OPENING),
+                )
+            )
+        }
+        for lot_transaction_id in lot_ids:
+            opening = openings.get(lot_transaction_id)
+            if opening is None:
+                raise ValueError(f"Transaction {lot_transaction_id} is not a buy of the same account and asset")
+            if (opening.transaction_time, opening.id) > (transaction.transaction_time, transaction.id):
+                raise ValueError(f"Transaction {lot_transaction_id} is after the sell")
+
+        self.set_selections(transaction, selections)
+
+    def get_open_lots(self, account_id: int, asset_id: int | None = None) -> List[TaxLot]:
+        statement = select(TaxLot).where(TaxLot.account_id == account_id)
+        if asset_id is not None:
+            statement = statement.where(TaxLot.asset_id == asset_id)
+        return list(self.session.exec(statement.order_by(TaxLot.asset_id, TaxLot.opened_at, TaxLot.transaction_id)))
+
+    def get_realized_lots(self, transaction_id: int) -> List[RealizedLot]:
+        return list(self.session.exec(
+            select(RealizedLot).where(RealizedLot.transaction_id == transaction_id).order_by(RealizedLot.id)
+        ))
+
+    def get_realized_gains(self, account_id: int, asset_id: int | None = None) -> List[RealizedGainYear]:
+        """
+        每年的已實現損益 (依賣出時間)：讀 realized_gains 的彙總 (每個資產每年一列)，不重播交易。
+        """
+        statement = select(RealizedGain.year, RealizedGain.proceeds, RealizedGain.cost_basis,
+                           RealizedGain.long_term_gain, RealizedGain.lots).where(RealizedGain.account_id == account_id)
+        if asset_id is not None:
+            statement = statement.where(RealizedGain.asset_id == asset_id)
+
+        years: Dict[int, list] = {}
+        for row in self.session.exec(statement):
+            total = years.setdefault(row.year, [Decimal(0), Decimal(0), Decimal(0), 0])
+            total[0] += row.proceeds
+            total[1] += row.cost_basis
+            total[2] += row.long_term_gain
+            total[3] += row.lots
+
+        return [
+            RealizedGainYear(
+                year=year, proceeds=proceeds, cost_basis=cost_basis, gain=proceeds - cost_basis,
+                short_term_gain=proceeds - cost_basis - long_term_gain, long_term_gain=long_term_gain, lots=lots,
+            )
+            for year, (proceeds, cost_basis, long_term_gain, lots) in sorted(years.items())
+        ]
@@ -0,0 +1,168 @@
+import csv
+from typing import Annotated, Dict, Iterable, List, TextIO
+from datetime import datetime
+from decimal import Decimal
+from itertools import batched
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import Float, String, cast
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.core.database import SQLiteDB
+from app.models.assets import Asset, MarketData
+from app.schemas.market_data import MarketDataRead, MarketDataImportResult
+
+
+class MarketDataService:
+    """
+    Price history (market_data) storage.
+
+    Writes go through batched `INSERT ... ON CONFLICT (asset_id, timestamp)`
+    statements, so re-ingesting the same points only overwrites the price.
+    Reads are served from the (asset_id, timestamp) unique index.
+    """
+
+    BATCH_SIZE = 5000
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+
+    def _upsert_statement(self):
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        stmt = dialect.insert(MarketData)
+        return stmt.on_conflict_do_update(
+            index_elements=["asset_id", "timestamp"],
+            set_={"price": stmt.excluded.price},
+        )
+
+    def ingest(self, rows: Iterable[tuple[int, datetime, Decimal]]) -> int:
+        """
+        批次寫入 (asset_id, timestamp, price)。不會 commit，由呼叫端決定交易範圍。
+        """
+        count = 0
+        stmt = self._upsert_statement()
+        for batch in batched(rows, self.BATCH_SIZE):
+            self.session.execute(
+                stmt,
+                [{"asset_id": asset_id, "timestamp": ts, "price": price} for asset_id, ts, price in batch],
+            )
+            count += len(batch)
+        return count
+
+    def import_csv(self, file: TextIO) -> MarketDataImportResult:
+        """
+        匯入歷史價格 CSV，欄位: ticker (或 asset_id), timestamp (ISO 8601), price。
+        逐行讀取並分批寫入，不會把整個檔案載入記憶體。
+        """
+        tickers = dict(self.session.exec(select(Asset.ticker, Asset.id)).all())
+        skipped = 0
+
+        def rows():
+            nonlocal skipped
+            for row in csv.DictReader(file):
+                try:
+                    asset_id = int(row["asset_id"]) if row.get("asset_id") else tickers[row["ticker"]]
+                    yield asset_id, datetime.fromisoformat(row["timestamp"]), Decimal(row["price"])
+                except (KeyError, ValueError, ArithmeticError):
+                    skipped += 1
+
+        ingested = self.ingest(rows())
+        self.session.commit()
+        return MarketDataImportResult(ingested=ingested, skipped=skipped)
+
+    def get_range(self, asset_ids: List[int], start: datetime | None = None,
+                  end: datetime | None = None) -> Dict[int, List[MarketDataRead]]:
+        """
+        多個資產在 [start, end] 區間的價格，依時間排序。
+        """
+        query = (
+            select(MarketData.asset_id, MarketData.timestamp, MarketData.price)
+            .where(MarketData.asset_id.in_(asset_ids))
+            .order_by(MarketData.asset_id, MarketData.timestamp)
+        )
+        if start is not None:
+            query = query.where(MarketData.timestamp >= start)
+        if end is not None:
+            query = query.where(MarketData.timestamp <= end)
+
+        series: Dict[int, List[MarketDataRead]] = {asset_id: [] for asset_id in asset_ids}
+        for asset_id, ts, price in self.session.exec(query).all():
+            series[asset_id].append(MarketDataRead(asset_id=asset_id, timestamp=ts, price=price))
+        return series
+
+    def get_prices_as_of(self, asset_ids: List[int], as_of: datetime,
+                         inclusive: bool = True) -> Dict[int, MarketDataRead]:
+        """
+        每個資產在 as_of 當下 (含；`inclusive=False` 則不含) 最後一筆價格。沒有資料的資產不會出現在結果中。
+
+        每個資產用一次 index seek (ORDER BY timestamp DESC LIMIT 1) 找到該筆，
+        不會掃描整段歷史。
+        """
+        before = MarketData.timestamp <= as_of if inclusive else MarketData.timestamp < as_of
+        latest_id = (
+            select(MarketData.id)
+            .where(MarketData.asset_id == Asset.id, before)
+            .order_by(MarketData.timestamp.desc())
+            .limit(1)
+            .correlate(Asset)
+            .scalar_subquery()
+        )
+        query = select(MarketData.asset_id, MarketData.timestamp, MarketData.price).where(
+            MarketData.id.in_(select(latest_id).where(Asset.id.in_(asset_ids)))
+        )
+        return {
+            asset_id: MarketDataRead(asset_id=asset_id, timestamp=ts, price=price)
+            for asset_id, ts, price in self.session.exec(query).all()
+        }
+
+    def get_price_matrix(self, asset_ids: List[int], cutoffs: np.ndarray,
+                         fallback: Dict[int, float] | None = None) -> np.ndarray:
+        """
+        回傳價格矩陣 P，P[i, k] = asset_ids[k] 在 cutoffs[i] 之前 (不含) 最後一筆價格 (forward fill)。
+
+        `cutoffs` 為遞增的 datetime64 陣列。某個時間點之前還沒有任何歷史價格時
+        使用 `fallback` (通常是 Asset.current_price)，沒有 fallback 則為 0。
+        與交易一樣以「嚴格早於 cutoff」為準：剛好落在 cutoff 上的價格屬於下一個時間點。
+        """
+        fallback = fallback or {}
+        matrix = np.zeros((len(cutoffs), len(asset_ids)), dtype=np.float64)
+        if not asset_ids or not len(cutoffs):
+            return matrix
+
+        first = cutoffs[0].astype(datetime)
+        last = cutoffs[-1].astype(datetime)
+        # 區間開始前 (不含 cutoffs[0]) 的最後一筆 (每個資產一次 index seek) + [cutoffs[0], cutoffs[-1]) 的所有價格。
+        # 走 Core 連線並以字串/浮點數取出，交給 numpy 一次解析，避免逐列建立 ORM row / datetime / Decimal。
+        seed = self.get_prices_as_of(asset_ids, first, inclusive=False)
+        rows = self.session.connection().execute(
+            select(MarketData.asset_id, cast(MarketData.timestamp, String), cast(MarketData.price, Float))
+            .where(
+                MarketData.asset_id.in_(asset_ids),
+                MarketData.timestamp >= first,
+                MarketData.timestamp < last,
+            )
+        ).all()
+
+        asset_col, ts_col, price_col = (list(col) for col in zip(*rows)) if rows else ([], [], [])
+        for asset_id, point in seed.items():
+            asset_col.append(asset_id)
+            ts_col.append(point.timestamp.isoformat(sep=" "))
+            price_col.append(float(point.price))
+
+        asset_arr = np.array(asset_col, dtype=np.int64)
+        ts_arr = np.array(ts_col, dtype="datetime64[us]")
+        price_arr = np.array(price_col, dtype=np.float64)
+        order = np.lexsort((ts_arr, asset_arr))
+        asset_arr, ts_arr, price_arr = asset_arr[order], ts_arr[order], price_arr[order]
+
+        for k, asset_id in enumerate(asset_ids):
+            lo, hi = np.searchsorted(asset_arr, [asset_id, asset_id + 1])
+            default = fallback.get(asset_id, 0.0)
+            if lo == hi:
+                matrix[:, k] = default
+                continue
+            # 每個 cutoff 之前最後一筆價格的位置，-1 代表還沒有資料
+            idx = np.searchsorted(ts_arr[lo:hi], cutoffs, side="left") - 1
+            matrix[:, k] = np.where(idx >= 0, price_arr[lo:hi][np.maximum(idx, 0)], default)
+        return matrix
@@ -0,0 +1,309 @@
+from typing import Annotated, List, Optional
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from fastapi import Depends
+from sqlalchemy import Float, String, cast, func
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.database import SQLiteDB
+from app.core.timeutils import to_local_naive
+from app.models.accounts import Account, Portfolio, PortfolioAccount
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.services.market_data import MarketDataService
+from app.services.portfolio import check_history_range
+from app.schemas.portfolio import PortfolioPerformance
+
+# XIRR 以年為單位，每日一個區間
+DAYS_PER_YEAR = 365.0
+# 一次展開的 (天數 x (account, asset) 欄數) 暫存矩陣最多幾格 (float64，約 32 MB)
+PAIR_CHUNK_CELLS = 4_000_000
+# 外部資金流：只有入金 / 出金，買賣與股息是帳戶內部的移轉
+EXTERNAL_FLOWS = (TransactionType.deposit.value, TransactionType.withdraw.value)
+
+
+def time_weighted_returns(values: np.ndarray, flows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    values (P, T+1) 是每個時間點的市值，flows (P, T) 是每個區間的外部資金流 (入金為正)，
+    視為發生在區間開始。回傳 (TWR (P,), 報酬指數 (P, T+1))，指數從 1 開始。
+    區間開始時的投入 (前一期市值 + 資金流) <= 0 的區間報酬視為 0。
+    """
+    invested = values[:, :-1] + flows
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(invested > 0, values[:, 1:] / invested, 1.0)
+    index = np.ones(values.shape, dtype=np.float64)
+    np.cumprod(growth, axis=1, out=index[:, 1:])
+    return index[:, -1] - 1, index
+
+
+def max_drawdowns(index: np.ndarray) -> np.ndarray:
+    """
+    每一列報酬指數從前高回落的最大比例 (正數，0.2 = 跌了 20%)。
+    """
+    peaks = np.maximum.accumulate(index, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = np.where(peaks > 0, 1 - index / peaks, 0.0)
+    return drawdowns.max(axis=1, initial=0.0)
+
+
+def _npv(rates: np.ndarray, amounts: np.ndarray, years: np.ndarray) -> np.ndarray:
+    return (amounts * (1 + rates)[:, None] ** -years).sum(axis=1)
+
+
+def _xirr_bisect(amounts: np.ndarray, years: np.ndarray, tol: float, max_iter: int) -> np.ndarray:
+    """
+    二分法：下界固定在 -100% 附近，上界加倍到 NPV 變號為止；找不到變號區間的列為 NaN。
+    """
+    rows = len(amounts)
+    lo = np.full(rows, -0.999999)
+    hi = np.full(rows, 1.0)
+    f_lo = _npv(lo, amounts, years)
+    f_hi = _npv(hi, amounts, years)
+    for _ in range(64):
+        expand = np.sign(f_lo) == np.sign(f_hi)
+        if not expand.any():
+            break
+        hi = np.where(expand, hi * 2, hi)
+        f_hi = np.where(expand, _npv(hi, amounts, years), f_hi)
+    bracketed = np.sign(f_lo) != np.sign(f_hi)
+
+    for _ in range(max_iter):
+        if np.all(hi - lo < tol):
+            break
+        mid = (lo + hi) / 2
+        f_mid = _npv(mid, amounts, years)
+        lower = np.sign(f_mid) == np.sign(f_lo)
+        lo, f_lo = np.where(lower, mid, lo), np.where(lower, f_mid, f_lo)
+        hi = np.where(lower, hi, mid)
+    return np.where(bracketed, (lo + hi) / 2, np.nan)
+
+
+def xirr(amounts: np.ndarray, years: np.ndarray, guess: float = 0.1, tol: float = 1e-9,
+         max_iter: int = 50) -> np.ndarray:
+    """
+    每一列現金流的年化內部報酬率 (NPV = 0 的利率)，所有列一起解。
+
+    `amounts` (P, N) 以投資人角度計：投入為負、取回 (含期末市值) 為正；`years` (N,) 是每一欄
+    距離第一欄的年數。先對所有列做向量化的 Newton 法，沒收斂或跑到 -100% 以下的列改用二分法；
+    現金流沒有同時包含正負值、或找不到解的列為 NaN。
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    rows = len(amounts)
+    result = np.full(rows, np.nan)
+    solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+    # 收斂條件：NPV 相對於現金流規模夠小，或步長夠小
+    scale = np.abs(amounts).sum(axis=1)
+
+    active = np.flatnonzero(solvable)
+    rate = np.full(len(active), guess)
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        a = amounts[active]
+        discount = (1 + rate)[:, None] ** -years
+        value = (a * discount).sum(axis=1)
+        slope = -(years * a * discount).sum(axis=1) / (1 + rate)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            step = value / slope
+        rate = rate - step
+        diverged = ~np.isfinite(rate) | (rate <= -1)
+        converged = ~diverged & ((np.abs(step) < tol) | (np.abs(value) < tol * scale[active]))
+        result[active[converged]] = rate[converged]
+        keep = ~(converged | diverged)
+        active, rate = active[keep], rate[keep]
+
+    fallback = solvable & np.isnan(result)
+    if fallback.any():
+        result[fallback] = _xirr_bisect(amounts[fallback], years, tol, max_iter=200)
+    return result
+
+
+class PerformanceService:
+    """
+    Time-weighted return (TWR), money-weighted return (XIRR) and max drawdown
+    of portfolios, computed for many portfolios in one pass.
+
+    The ledger of every account involved is read once and replayed into daily
+    market values and external flows (deposits / withdrawals) per account,
+    with the same rules and valuation as PortfolioService.get_portfolio_history.
+    Portfolio series are a membership-matrix product of the account series,
+    so an account shared by several portfolios is only valued once, and the
+    metrics are array operations over (portfolios x days).
+    """
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+
+    def _account_series(self, account_ids: List[int], cutoffs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        回傳 (V (A, T+1), F (A, T))：V[a, j] 是 cutoffs[j] 之前的帳戶市值，
+        F[a, j] 是 cutoffs[j] 到 cutoffs[j+1] 之間的外部資金流 (以當天的現金價格計值)。
+        """
+        values = np.zeros((len(account_ids), len(cutoffs)), dtype=np.float64)
+        flows = np.zeros((len(account_ids), len(cutoffs) - 1), dtype=np.float64)
+        if not account_ids:
+            return values, flows
+        account_index = {account_id: i for i, account_id in enumerate(account_ids)}
+        cash_assets = dict(self.session.exec(
+            select(Account.id, Asset.id)
+            .join(Asset, (Asset.ticker == Account.currency) & (Asset.type == AssetType.fiat))
+            .where(Account.id.in_(account_ids))
+        ).all())
+        # 走 Core 連線並以字串/浮點數取出 (同 get_price_matrix)，整個 ledger 一次交給 numpy
+        rows = self.session.connection().execute(
+            select(
+                Transaction.account_id,
+                func.coalesce(Transaction.asset_id, 0),
+                cast(Transaction.type, String),
+                cast(func.coalesce(Transaction.quantity, 0), Float),
+                cast(func.coalesce(Transaction.price_per_unit, 0), Float),
+                cast(func.coalesce(Transaction.fee, 0), Float),
+                cast(Transaction.transaction_time, String),
+            )
+            .where(
+                Transaction.account_id.in_(account_ids),
+                Transaction.transaction_time < cutoffs[-1].astype(datetime),
+            )
+        ).all()
+        if not rows:
+            return values, flows
+
+        account_col, asset_col, type_col, qty, price, fee, time_col = zip(*rows)
+        accounts = np.array([account_index[a] for a in account_col], dtype=np.intp)
+        assets = np.array(asset_col, dtype=np.int64)
+        types = np.array(type_col)
+        qty, price, fee = (np.array(col, dtype=np.float64) for col in (qty, price, fee))
+        # 每筆交易第一個生效的時間點 (cutoff 嚴格大於交易時間)
+        txn_rows = np.searchsorted(cutoffs, np.array(time_col, dtype="datetime64[us]"), side="right")
+
+        # 與 position.cash_flow / quantity_delta 相同的規則
+        amount = qty * price
+        is_buy, is_sell = types == TransactionType.buy.value, types == TransactionType.sell.value
+        is_deposit, is_withdraw = types == TransactionType.deposit.value, types == TransactionType.withdraw.value
+        cash = np.select(
+            [is_deposit, is_withdraw, is_buy, is_sell | (types == TransactionType.dividend.value)],
+            [amount, -amount, -(amount + fee), amount - fee],
+            0.0,
+        )
+        delta = np.select([is_buy | is_deposit, is_sell | is_withdraw], [qty, -qty], 0.0)
+
+        account_cash = np.array([cash_assets.get(a, 0) for a in account_ids], dtype=np.int64)
+        txn_cash = account_cash[accounts]
+        on_asset = (assets != 0) & (assets != txn_cash)
+        on_cash = txn_cash != 0
+
+        # 所有 (account, asset) 的異動：標的資產看 quantity_delta，現金持倉看 cash_flow
+        entry_accounts = np.concatenate([accounts[on_asset], accounts[on_cash]])
+        entry_assets = np.concatenate([assets[on_asset], txn_cash[on_cash]])
+        entry_rows = np.concatenate([txn_rows[on_asset], txn_rows[on_cash]])
+        entry_deltas = np.concatenate([delta[on_asset], cash[on_cash]])
+
+        asset_ids = np.unique(np.concatenate([entry_assets, account_cash[account_cash != 0]]))
+        if not len(asset_ids):
+            return values, flows
+        current_prices = dict(self.session.exec(
+            select(Asset.id, Asset.current_price).where(Asset.id.in_(asset_ids.tolist()))
+        ).all())
+        prices = MarketDataService(self.session).get_price_matrix(
+            asset_ids.tolist(), cutoffs, {asset_id: float(p) for asset_id, p in current_prices.items()}
+        )
+
+        # 依 pair 排序後分段展開持有矩陣，同一個 pair 的異動在同一段
+        stride = int(asset_ids.max()) + 1
+        pairs, pair_of_entry = np.unique(entry_accounts * stride + entry_assets, return_inverse=True)
+        pair_accounts = pairs // stride
+        pair_price_cols = np.searchsorted(asset_ids, pairs % stride)
+        order = np.argsort(pair_of_entry, kind="stable")
+        pair_of_entry, entry_rows, entry_deltas = pair_of_entry[order], entry_rows[order], entry_deltas[order]
+        chunk_size = max(1, PAIR_CHUNK_CELLS // len(cutoffs))
+        bounds = np.searchsorted(pair_of_entry, np.arange(0, len(pairs) + chunk_size, chunk_size))
+
+        for chunk, first in enumerate(range(0, len(pairs), chunk_size)):
+            last = min(first + chunk_size, len(pairs))
+            lo, hi = bounds[chunk], bounds[chunk + 1]
+            changes = np.zeros((len(cutoffs), last - first), dtype=np.float64)
+            np.add.at(changes, (entry_rows[lo:hi], pair_of_entry[lo:hi] - first), entry_deltas[lo:hi])
+            holdings = np.cumsum(changes, axis=0, out=changes)
+            holdings *= prices[:, pair_price_cols[first:last]]
+            # pair 依帳戶排序：同一段內同帳戶的欄位相鄰，直接分段加總
+            owners = pair_accounts[first:last]
+            starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+            values[owners[starts]] += np.add.reduceat(holdings, starts, axis=1).T
+
+        # 外部資金流記在生效前的那個區間；生效時間點 0 代表發生在區間開始之前，已含在期初市值
+        external = on_cash & np.isin(types, EXTERNAL_FLOWS) & (txn_rows > 0)
+        flow_rows = txn_rows[external]
+        cash_cols = np.searchsorted(asset_ids, txn_cash[external])
+        np.add.at(flows, (accounts[external], flow_rows - 1), cash[external] * prices[flow_rows, cash_cols])
+        return values, flows
+
+    def get_performance(self, portfolio_ids: Optional[List[int]] = None, start: datetime | None = None,
+                        end: datetime | None = None) -> List[PortfolioPerformance]:
+        """
+        Performance of the given portfolios (all of them by default) between
+        `start` (default: the first transaction, at most HISTORY_MAX_POINTS
+        days back) and `end` (default: now), on a daily grid. Raises
+        ValueError for a reversed or too long explicit range.
+        """
+        statement = select(Portfolio.id, Portfolio.name).order_by(Portfolio.id)
+        if portfolio_ids is not None:
+            statement = statement.where(Portfolio.id.in_(portfolio_ids))
+        portfolios = self.session.exec(statement).all()
+        if not portfolios:
+            return []
+        portfolio_index = {portfolio_id: i for i, (portfolio_id, _) in enumerate(portfolios)}
+        links = self.session.exec(
+            select(PortfolioAccount.portfolio_id, PortfolioAccount.account_id)
+            .where(PortfolioAccount.portfolio_id.in_(list(portfolio_index)))
+        ).all()
+        account_ids = sorted({account_id for _, account_id in links})
+
+        end = to_local_naive(end or datetime.now(timezone(timedelta(hours=8))))
+        if start is None:
+            inception = self.session.exec(
+                select(func.min(Transaction.transaction_time)).where(Transaction.account_id.in_(account_ids))
+            ).one() if account_ids else None
+            # 預設從第一筆交易開始，但不超過 HISTORY_MAX_POINTS 天
+            earliest = end - timedelta(days=settings.HISTORY_MAX_POINTS - 1)
+            start = max(to_local_naive(inception), earliest) if inception else end
+        start = to_local_naive(start)
+        check_history_range(start, end, "D")
+        # cutoffs[0] 是第一天的開始，cutoffs[j] 是第 j 天結束；區間 j 是第 j+1 天
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1)
+        cutoffs = np.concatenate([days[:1], days + 1]).astype("datetime64[us]")
+
+        account_values, account_flows = self._account_series(account_ids, cutoffs)
+        membership = np.zeros((len(portfolios), len(account_ids)), dtype=np.float64)
+        account_index = {account_id: i for i, account_id in enumerate(account_ids)}
+        for portfolio_id, account_id in links:
+            membership[portfolio_index[portfolio_id], account_index[account_id]] = 1.0
+        values = membership @ account_values
+        flows = membership @ account_flows
+
+        twr, index = time_weighted_returns(values, flows)
+        drawdown = max_drawdowns(index)
+        # XIRR 的現金流：期初市值與每天的入金為投入 (負)，期末市值為取回 (正)
+        amounts = np.zeros(values.shape, dtype=np.float64)
+        amounts[:, :-1] = -flows
+        amounts[:, 0] -= values[:, 0]
+        amounts[:, -1] += values[:, -1]
+        mwr = xirr(amounts, np.arange(len(cutoffs)) / DAYS_PER_YEAR)
+
+        first, last = cutoffs[0].astype(datetime), cutoffs[-1].astype(datetime)
+        return [
+            PortfolioPerformance(
+                id=portfolio_id,
+                name=name,
+                start=first,
+                end=last,
+                start_value=float(values[i, 0]),
+                end_value=float(values[i, -1]),
+                net_flows=float(flows[i].sum()),
+                time_weighted_return=float(twr[i]),
+                money_weighted_return=None if np.isnan(mwr[i]) else float(mwr[i]),
+                max_drawdown=float(drawdown[i]),
+            )
+            for i, (portfolio_id, name) in enumerate(portfolios)
+        ]
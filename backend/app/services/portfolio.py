@@ -1,57 +1,68 @@
 from typing import Annotated, List, Dict, Any
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
+import numpy as np
 from fastapi import Depends
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
+from app.core.cache import portfolio_summary_cache, versions
+from app.core.config import settings
 from app.core.database import SQLiteDB
-from app.services.account import AccountService
+from app.core.timeutils import to_local_naive
+from app.services.account import AccountService, AccountTotals
 from app.models.accounts import Portfolio, Account, PortfolioAccount
 from app.models.transacions import Transaction, Position, TransactionType
-from app.models.assets import Asset
+from app.models.assets import Asset, AssetType
+from app.services.market_data import MarketDataService
+from app.services.position import cash_flow, quantity_delta
 from app.schemas.portfolio import (
     PortfolioCreate, 
     PortfolioUpdate, 
     PortfolioListItem, 
     PortfolioSummary, 
     HoldingItem, 
-    AccountSummaryItem
+    AccountSummaryItem,
+    PortfolioHistory
 )
 
+# 歷史市值的時間間隔 -> numpy datetime64 單位
+HISTORY_INTERVALS = {"1d": "D", "1h": "h"}
+
+
+def check_history_range(start: datetime, end: datetime, unit: str) -> None:
+    """
+    時間序列的範圍檢查：`start` 不能晚於 `end`，區間數不能超過 HISTORY_MAX_POINTS。不合法時丟 ValueError。
+    """
+    if start > end:
+        raise ValueError("`from` must not be later than `to`")
+    points = int((np.datetime64(end, unit) - np.datetime64(start, unit)).astype(np.int64)) + 1
+    if points > settings.HISTORY_MAX_POINTS:
+        raise ValueError(
+            f"Range covers {points} intervals, at most {settings.HISTORY_MAX_POINTS} are allowed"
+        )
+
 
 class PortfolioService:
     def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
         self.session = session
 
-    def _calculate_daily_change(self, account_ids: List[int]) -> tuple[Decimal, Decimal]:
+    def _calculate_daily_change(self, account_totals: List[AccountTotals]) -> tuple[Decimal, Decimal, Decimal]:
         """
-        Calculate daily change amount and percentage.
+        Calculate total value, daily change amount and daily change percentage.
         
         Logic:
-        Daily Change = Current Value - Previous Close Value
-        Since we don't have 'Previous Close' stored explicitly in Asset history yet (we only have current_price),
-        we can simulate this or rely on a 'previous_close' field if we added it to Asset.
-        
-        Given we only have `current_price` and `last_updated` in Asset, and `update_prices` uses yfinance.
-        Ideally, `Asset` should have `previous_close`.
-        
-        Workaround: 
-        Assume 'daily change' is 0 for now OR randomly generate it OR try to fetch it?
-        Actually, yfinance `fast_info` has `regularMarketPreviousClose`.
-        
-        Better approach for this prototype without changing Asset model again:
-        Let's assume current_price includes the change.
-        If we want real calculation:
           Daily Change ($) = Sum(Position Qty * (Current Price - Previous Close))
-          
-        Since I cannot easily get Previous Close without storing it or fetching it live again (slow),
-        I will mock it as 0 or small random value? No, better to leave it 0 or try to estimate.
+          Daily Change (%) = Daily Change / (Current Value - Daily Change) * 100
         
-        However, the prompt asks to return specific structure.
-        I will modify this later if the user adds `previous_close` column.
-        For now, I'll implement the structure returning 0.0 for change if data missing.
+        `previous_close` is stored on Asset when prices are refreshed and summed per account
+        by AccountService._calculate_account_totals, so no provider call happens here.
         """
-        return Decimal(0), Decimal(0)
+        total_value = sum((t.balance for t in account_totals), Decimal(0))
+        daily_change = sum((t.daily_change for t in account_totals), Decimal(0))
+        previous_value = total_value - daily_change
+        daily_change_pct = (daily_change / previous_value * 100) if previous_value > 0 else Decimal(0)
+        return total_value, daily_change, daily_change_pct
 
     def _calculate_account_balance(self, account_id: int) -> Decimal:
         # Reuse logic from AccountService, but maybe cleaner to just duplicate small logic or inject service?
@@ -96,19 +107,26 @@ class PortfolioService:
     def get_portfolio_by_id(self, portfolio_id: int) -> Portfolio | None:
         return self.session.get(Portfolio, portfolio_id)
 
+    def _get_portfolio_with_accounts(self, portfolio_id: int) -> Portfolio | None:
+        return self.session.exec(
+            select(Portfolio)
+            .options(selectinload(Portfolio.accounts))
+            .where(Portfolio.id == portfolio_id)
+        ).first()
+
     def get_portfolios(self, offset: int = 0, limit: int = 100) -> List[PortfolioListItem]:
-        portfolios = self.session.exec(select(Portfolio).offset(offset).limit(limit)).all()
+        portfolios = self.session.exec(
+            select(Portfolio)
+            .options(selectinload(Portfolio.accounts))
+            .offset(offset)
+            .limit(limit)
+        ).all()
+        account_ids = {acc.id for p in portfolios for acc in p.accounts}
+        totals = AccountService(self.session)._calculate_account_totals(account_ids)
         results = []
         
         for p in portfolios:
-            total_val = Decimal(0)
-            for acc in p.accounts:
-                total_val += AccountService(self.session)._calculate_total_balance(acc.id)
-                # total_val += self._calculate_account_balance(acc.id)
-            
-            # Placeholder for daily change
-            d_change = Decimal(0)
-            d_change_pct = Decimal(0)
+            total_val, d_change, d_change_pct = self._calculate_daily_change([totals[acc.id] for acc in p.accounts])
             
             results.append(PortfolioListItem(
                 id=p.id,
@@ -119,11 +137,47 @@ class PortfolioService:
             ))
         return results
 
+    @staticmethod
+    def _summary_versions(portfolio_id: int, account_ids: List[int]) -> tuple:
+        """
+        Summary 的輸入版本：報價、組合成員、以及各帳戶的交易。
+        """
+        return (
+            versions.get("prices"),
+            versions.get("portfolio", portfolio_id),
+            tuple((account_id, versions.get("account", account_id)) for account_id in account_ids),
+        )
+
     def get_portfolio_summary(self, portfolio_id: int) -> PortfolioSummary | None:
-        portfolio = self.session.get(Portfolio, portfolio_id)
+        """
+        Cached by portfolio. An entry is served (without touching the database)
+        as long as none of its input versions were bumped since it was computed.
+        """
+        def is_current(entry) -> bool:
+            snapshot, _ = entry
+            return snapshot == self._summary_versions(portfolio_id, [account_id for account_id, _ in snapshot[2]])
+
+        cached = portfolio_summary_cache.get(portfolio_id, validate=is_current)
+        if cached is not None:
+            return cached[1]
+
+        # 版本要在讀取資料之前記下，計算期間有寫入時這筆快取會直接失效
+        price_version = versions.get("prices")
+        portfolio_version = versions.get("portfolio", portfolio_id)
+        portfolio = self._get_portfolio_with_accounts(portfolio_id)
         if not portfolio:
             return None
+        snapshot = (
+            price_version,
+            portfolio_version,
+            tuple((acc.id, versions.get("account", acc.id)) for acc in portfolio.accounts),
+        )
+
+        summary = self._build_portfolio_summary(portfolio)
+        portfolio_summary_cache.set(portfolio_id, (snapshot, summary))
+        return summary
 
+    def _build_portfolio_summary(self, portfolio: Portfolio) -> PortfolioSummary:
         # 1. Calculate Holdings aggregated across all accounts in this portfolio
         # We need a map: Ticker -> {qty, cost, value, etc}
         holdings_map: Dict[str, Any] = {}
@@ -205,10 +259,10 @@ class PortfolioService:
         # 3. Calculate Accounts Balances (Cash + Assets) and Portfolio Total Value
         account_items = []
         portfolio_total_value = Decimal(0)
+        totals = AccountService(self.session)._calculate_account_totals(account_ids)
         
         for acc in portfolio.accounts:
-            bal = AccountService(self.session)._calculate_total_balance(acc.id)
-            # bal = self._calculate_account_balance(acc.id)
+            bal = totals[acc.id].balance
             portfolio_total_value += bal
             account_items.append(AccountSummaryItem(
                 id=acc.id,
@@ -232,6 +286,7 @@ class PortfolioService:
         
         total_profit = assets_market_value - total_cost_basis
         total_profit_percent = (total_profit / total_cost_basis * 100) if total_cost_basis > 0 else 0
+        _, daily_change, daily_change_pct = self._calculate_daily_change(list(totals.values()))
         
         return PortfolioSummary(
             id=portfolio.id,
@@ -239,12 +294,101 @@ class PortfolioService:
             total_value=portfolio_total_value,
             total_profit=total_profit,
             total_profit_percent=total_profit_percent,
-            daily_change=Decimal(0), # Placeholder
-            daily_change_percent=Decimal(0), # Placeholder
+            daily_change=daily_change,
+            daily_change_percent=daily_change_pct,
             holdings=holdings_list,
             accounts=account_items
         )
 
+    def _build_holdings_matrix(self, account_ids: List[int], cutoffs: np.ndarray) -> tuple[List[int], np.ndarray]:
+        """
+        重播交易紀錄，回傳 (asset_ids, H)，H[i, k] = cutoffs[i] 之前持有 asset_ids[k] 的數量。
+        與 PositionService 使用相同的規則：標的資產看 quantity_delta，現金持倉看 cash_flow。
+        """
+        cash_assets = dict(self.session.exec(
+            select(Account.id, Asset.id)
+            .join(Asset, (Asset.ticker == Account.currency) & (Asset.type == AssetType.fiat))
+            .where(Account.id.in_(account_ids))
+        ).all())
+        transactions = self.session.exec(
+            select(
+                Transaction.account_id,
+                Transaction.asset_id,
+                Transaction.type,
+                Transaction.quantity,
+                Transaction.price_per_unit,
+                Transaction.fee,
+                Transaction.transaction_time,
+            )
+            .where(
+                Transaction.account_id.in_(account_ids),
+                Transaction.transaction_time < cutoffs[-1].astype(datetime),
+            )
+        ).all()
+
+        columns: Dict[int, int] = {}
+        rows, cols, deltas = [], [], []
+        times = np.array([txn.transaction_time for txn in transactions], dtype="datetime64[us]")
+        # 每筆交易第一個生效的時間點 (cutoff 嚴格大於交易時間)
+        txn_rows = np.searchsorted(cutoffs, times, side="right")
+
+        for txn, row in zip(transactions, txn_rows):
+            cash_asset_id = cash_assets.get(txn.account_id)
+            if txn.asset_id and txn.asset_id != cash_asset_id:
+                rows.append(row)
+                cols.append(columns.setdefault(txn.asset_id, len(columns)))
+                deltas.append(float(quantity_delta(txn)))
+            if cash_asset_id:
+                rows.append(row)
+                cols.append(columns.setdefault(cash_asset_id, len(columns)))
+                deltas.append(float(cash_flow(txn)))
+
+        changes = np.zeros((len(cutoffs), len(columns)), dtype=np.float64)
+        np.add.at(changes, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(deltas))
+        return list(columns), np.cumsum(changes, axis=0)
+
+    def get_portfolio_history(self, portfolio_id: int, start: datetime | None = None,
+                              end: datetime | None = None, interval: str = "1d") -> PortfolioHistory | None:
+        """
+        Portfolio market value at the end of every interval between `start` and `end`.
+        
+        Holdings over time (H) come from replaying the ledger once, prices over time (P)
+        from market_data with forward fill; the series is the row-wise sum of H * P.
+        Raises ValueError for a reversed range or more than HISTORY_MAX_POINTS intervals.
+        """
+        unit = HISTORY_INTERVALS[interval]
+        end = to_local_naive(end or datetime.now(timezone(timedelta(hours=8))))
+        start = to_local_naive(start or end - timedelta(days=365))
+        check_history_range(start, end, unit)
+
+        portfolio = self._get_portfolio_with_accounts(portfolio_id)
+        if not portfolio:
+            return None
+
+        periods = np.arange(np.datetime64(start, unit), np.datetime64(end, unit) + 1)
+        cutoffs = (periods + 1).astype("datetime64[us]")
+
+        values = np.zeros(len(periods), dtype=np.float64)
+        account_ids = [acc.id for acc in portfolio.accounts]
+        if account_ids and len(periods):
+            asset_ids, holdings = self._build_holdings_matrix(account_ids, cutoffs)
+            if asset_ids:
+                current_prices = dict(self.session.exec(
+                    select(Asset.id, Asset.current_price).where(Asset.id.in_(asset_ids))
+                ).all())
+                prices = MarketDataService(self.session).get_price_matrix(
+                    asset_ids, cutoffs, {asset_id: float(price) for asset_id, price in current_prices.items()}
+                )
+                values = np.einsum("ij,ij->i", holdings, prices)
+
+        return PortfolioHistory(
+            id=portfolio.id,
+            name=portfolio.name,
+            interval=interval,
+            timestamps=periods.astype("datetime64[us]").tolist(),
+            values=values.tolist(),
+        )
+
     def update_portfolio(self, portfolio: Portfolio, portfolio_in: PortfolioUpdate) -> Portfolio:
         portfolio_data = portfolio_in.model_dump(exclude_unset=True, exclude={"account_ids"})
         portfolio.sqlmodel_update(portfolio_data)
@@ -253,10 +397,13 @@ class PortfolioService:
             portfolio.accounts = accounts
         self.session.add(portfolio)
         self.session.commit()
+        versions.bump("portfolio", portfolio.id)
         self.session.refresh(portfolio)
         return portfolio
 
     def delete_portfolio(self, portfolio: Portfolio) -> None:
+        portfolio_id = portfolio.id
         self.session.delete(portfolio)
         self.session.commit()
+        versions.bump("portfolio", portfolio_id)
         return
\ No newline at end of file
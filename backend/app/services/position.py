@@ -0,0 +1,498 @@
+from typing import Annotated, Dict, Iterable, List, NamedTuple, Optional
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from fastapi import Depends
+from sqlmodel import Session, select, and_, or_
+
+from app.core.config import settings
+from app.core.database import SQLiteDB
+from app.core.timeutils import to_local_naive
+from app.models.transacions import Transaction, Position, TransactionType
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.services.checkpoints import CheckpointService, Key, later_than
+from app.services.lots import LOT_REPLAY_COLUMNS, Lot, LotService
+
+
+# 影響持倉計算的欄位，只改 notes 之類的欄位時不需要重算
+POSITION_FIELDS = ("account_id", "asset_id", "type", "quantity", "price_per_unit", "fee", "transaction_time")
+# 重播只需要這些欄位 (不建立 ORM 物件)，每次從 DB 讀取 REPLAY_BATCH_SIZE 筆
+REPLAY_COLUMNS = (Transaction.type, Transaction.quantity, Transaction.price_per_unit, Transaction.fee)
+REPLAY_BATCH_SIZE = 1000
+
+
+class HoldingAsOf(NamedTuple):
+    asset_id: int
+    quantity: Decimal
+    average_cost: Decimal
+
+
+def transaction_key(txn: Transaction) -> Key:
+    return txn.transaction_time, txn.id
+
+
+def cash_flow(txn: Transaction) -> Decimal:
+    """
+    單筆交易對帳戶現金的影響 (帳戶幣別計價)。
+    現金流與交易順序無關，所以現金持倉永遠可以用加減差額的方式維護。
+    """
+    qty = txn.quantity or Decimal(0)
+    price = txn.price_per_unit or Decimal(0)
+    fee = txn.fee or Decimal(0)
+    tx_amount = qty * price
+
+    if txn.type == TransactionType.deposit:
+        return tx_amount
+    elif txn.type == TransactionType.withdraw:
+        return -tx_amount
+    elif txn.type == TransactionType.buy:
+        return -(tx_amount + fee)
+    elif txn.type in (TransactionType.sell, TransactionType.dividend):
+        return tx_amount - fee
+    return Decimal(0)
+
+
+def quantity_delta(txn: Transaction) -> Decimal:
+    """
+    單筆交易對標的資產持有數量的影響 (與 apply_transaction 的數量規則相同)。
+    """
+    qty = txn.quantity or Decimal(0)
+    if txn.type in (TransactionType.buy, TransactionType.deposit):
+        return qty
+    elif txn.type in (TransactionType.sell, TransactionType.withdraw):
+        return -qty
+    return Decimal(0)
+
+
+def apply_transaction(total_qty: Decimal, total_cost: Decimal, txn: Transaction) -> tuple[Decimal, Decimal]:
+    """
+    將一筆交易套用到 (數量, 總成本) 上，平均成本法。
+    全量重算與增量更新共用這一步，確保兩者結果一致。
+    """
+    qty = txn.quantity or Decimal(0)
+    price = txn.price_per_unit or Decimal(0)
+    fee = txn.fee or Decimal(0)
+
+    if txn.type in (TransactionType.buy, TransactionType.deposit):
+        # 買入：增加數量，累加成本
+        total_cost += (qty * price) + fee
+        total_qty += qty
+
+    elif txn.type in (TransactionType.sell, TransactionType.withdraw):
+        # 賣出：減少數量，依比例減少成本
+        if total_qty > 0:
+            avg_cost = total_cost / total_qty
+            total_cost -= (avg_cost * qty)
+        total_qty -= qty
+
+    # 註：Dividend 通常不影響持倉數量 (暫時假設是現金股利，不影響 Stock Position)
+    return total_qty, total_cost
+
+
+def replay_transactions(transactions: Iterable[Transaction]) -> tuple[Decimal, Decimal]:
+    """
+    依時間順序重播交易，回傳 (total_quantity, average_cost)。
+    """
+    total_qty = Decimal(0)
+    total_cost = Decimal(0)
+    for txn in transactions:
+        total_qty, total_cost = apply_transaction(total_qty, total_cost, txn)
+
+    average_cost = Decimal(0)
+    if total_qty > 0:
+        average_cost = total_cost / total_qty
+    return total_qty, average_cost
+
+
+class PositionService:
+    """
+    Incrementally maintains the Position table from transaction writes.
+
+    - Cash positions are order independent, so every write only applies a delta.
+    - Appending a transaction (nothing later in the same account/asset pair)
+      applies it on top of the stored position in O(1).
+    - Back-dated inserts, updates and deletes replay the (account, asset) pair
+      from the last checkpoint before the earliest changed transaction.
+    - A batch of writes touches every position once (see apply_changes).
+    - Tax lots (LotService) follow the same append / replay decision.
+    - Every POSITION_CHECKPOINT_INTERVAL transactions of a pair (or of an
+      account, for cash) a checkpoint is written (CheckpointService), which
+      also lets get_holdings_as_of replay only the tail.
+
+    Changes are flushed, never committed: the caller commits the transaction
+    write and the position update together.
+    """
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+        self.lots = LotService(session)
+        self.checkpoints = CheckpointService(session)
+
+    def get_cash_asset_id(self, account_id: int) -> Optional[int]:
+        """
+        Helper: 根據 Account 的幣別找出對應的 Cash Asset ID (例如 USD)
+        """
+        account = self.session.get(Account, account_id)
+        if not account:
+            return None
+
+        # 尋找 ticker = account.currency 且 type = fiat 的資產
+        statement = select(Asset.id).where(
+            Asset.ticker == account.currency,
+            Asset.type == AssetType.fiat
+        )
+        return self.session.exec(statement).first()
+
+    def _get_position(self, account_id: int, asset_id: int) -> Position | None:
+        return self.session.exec(
+            select(Position).where(
+                Position.account_id == account_id,
+                Position.asset_id == asset_id
+            )
+        ).first()
+
+    def _save_position(self, account_id: int, asset_id: int, qty: Decimal, avg_cost: Decimal, total_cost: Decimal,
+                       position: Position | None = None, since_checkpoint: int | None = None) -> None:
+        """
+        共用的 DB 更新邏輯。只 flush，由呼叫端 (一個寫入請求) 負責 commit。
+        """
+        if position is None:
+            position = self._get_position(account_id, asset_id)
+
+        if not position:
+            if qty == 0 and avg_cost == 0:
+                return
+            position = Position(account_id=account_id, asset_id=asset_id)
+
+        position.total_quantity = qty
+        position.average_cost = avg_cost
+        position.total_cost = total_cost
+        if since_checkpoint is not None:
+            position.since_checkpoint = since_checkpoint
+        position.last_updated = datetime.now(timezone(timedelta(hours=8)))
+
+        self.session.add(position)
+        self.session.flush()
+
+    def _has_later_transaction(self, txn: Transaction, exclude_ids: Iterable[int] = ()) -> bool:
+        """
+        同一個 (account, asset) 是否有排在這筆之後的交易 (依 transaction_time, id 排序)。
+        沒有的話代表這筆是 append，可以直接增量套用。`exclude_ids` 是同一批一起寫入的交易。
+        """
+        statement = select(Transaction.id).where(
+            Transaction.account_id == txn.account_id,
+            Transaction.asset_id == txn.asset_id,
+            Transaction.id.notin_([txn.id, *exclude_ids]),
+            or_(
+                Transaction.transaction_time > txn.transaction_time,
+                and_(Transaction.transaction_time == txn.transaction_time, Transaction.id > txn.id),
+            ),
+        ).limit(1)
+        return self.session.exec(statement).first() is not None
+
+    def rebuild_asset_position(self, account_id: int, asset_id: int, since: Key | None = None) -> None:
+        """
+        重播該 (account, asset) 的交易，計算持倉與平均成本，同時重建 tax lot 與 checkpoint。
+        `since` 是最早一筆有變動的交易：從它之前最近的 checkpoint 開始重播 (None 表示從頭)。
+        """
+        if not asset_id:
+            return
+
+        interval = settings.POSITION_CHECKPOINT_INTERVAL
+        checkpoint = self.checkpoints.latest(account_id, asset_id, before=since) if since else None
+        start = (checkpoint.transaction_time, checkpoint.transaction_id) if checkpoint else None
+        self.checkpoints.discard(account_id, asset_id, after=start)
+
+        statement = select(*LOT_REPLAY_COLUMNS).where(
+            Transaction.account_id == account_id,
+            Transaction.asset_id == asset_id
+        )
+        total_qty, total_cost, lots = Decimal(0), Decimal(0), []
+        if checkpoint:
+            statement = statement.where(later_than(Transaction.transaction_time, Transaction.id, start))
+            total_qty, total_cost = checkpoint.total_quantity, checkpoint.total_cost
+            lots = [
+                Lot(row.transaction_id, row.opened_at, row.quantity, row.cost_per_unit)
+                for row in self.checkpoints.get_lots(checkpoint.id)
+            ]
+        transactions = self.session.exec(
+            statement
+            .order_by(Transaction.transaction_time.asc(), Transaction.id.asc())
+            .execution_options(yield_per=REPLAY_BATCH_SIZE)
+        )
+
+        book = self.lots.new_book(account_id, asset_id, lots, quantity=total_qty, cost=total_cost)
+        pending = 0
+        for txn in book.feed(transactions):
+            total_qty, total_cost = apply_transaction(total_qty, total_cost, txn)
+            pending += 1
+            if interval and pending >= interval:
+                self.checkpoints.write(account_id, asset_id, transaction_key(txn), total_qty, total_cost,
+                                       book.open_lots())
+                pending = 0
+
+        average_cost = total_cost / total_qty if total_qty > 0 else Decimal(0)
+        self._save_position(account_id, asset_id, total_qty, average_cost, total_cost, since_checkpoint=pending)
+        self.lots.save_replay(account_id, asset_id, book, since=start)
+
+    def rebuild_cash_position(self, account_id: int) -> None:
+        """
+        以該帳戶所有交易重新計算「現金持倉」，並重寫現金的 checkpoint。
+        """
+        cash_asset_id = self.get_cash_asset_id(account_id)
+        if not cash_asset_id:
+            # 如果系統沒有對應的法幣資產，無法計算現金持倉，直接返回
+            return
+
+        interval = settings.POSITION_CHECKPOINT_INTERVAL
+        self.checkpoints.discard(account_id, cash_asset_id)
+        transactions = self.session.exec(
+            select(Transaction.id, Transaction.transaction_time, *REPLAY_COLUMNS)
+            .where(Transaction.account_id == account_id)
+            .order_by(Transaction.transaction_time.asc(), Transaction.id.asc())
+            .execution_options(yield_per=REPLAY_BATCH_SIZE)
+        )
+        total_cash, pending = Decimal(0), 0
+        for txn in transactions:
+            total_cash += cash_flow(txn)
+            pending += 1
+            if interval and pending >= interval:
+                self.checkpoints.write(account_id, cash_asset_id, transaction_key(txn), total_cash, total_cash,
+                                       snapshot_lots=False)
+                pending = 0
+        self._save_position(account_id, cash_asset_id, total_cash, Decimal(1.0), total_cash, since_checkpoint=pending)
+
+    def rebuild_account(self, account_id: int) -> None:
+        """
+        從頭重建帳戶所有的持倉、tax lot 與 checkpoint (例如改變 lot 方法之後)。
+        """
+        cash_asset_id = self.get_cash_asset_id(account_id)
+        asset_ids = set(self.session.exec(
+            select(Transaction.asset_id).distinct().where(Transaction.account_id == account_id)
+        ).all())
+        asset_ids.update(self.session.exec(select(Position.asset_id).where(Position.account_id == account_id)).all())
+        for asset_id in sorted(a for a in asset_ids if a and a != cash_asset_id):
+            self.rebuild_asset_position(account_id, asset_id)
+        self.rebuild_cash_position(account_id)
+
+    def rebuild_all(self) -> None:
+        for account_id in self.session.exec(select(Account.id).order_by(Account.id)).all():
+            self.rebuild_account(account_id)
+
+    def _adjust_cash(self, account_id: int, delta: Decimal, changes: List[tuple[Key, Decimal]] = (),
+                     count: int = 0) -> None:
+        """
+        將現金差額套用到現金持倉。DB 中的交易必須已經是最新狀態：
+        若還沒有現金持倉 (例如法幣資產是後來才建立的)，就改為全量計算。
+        `changes` 是每筆交易的 (key, 現金差額)，用來修正排在後面的現金 checkpoint；`count` 是這次寫入的交易數。
+        """
+        cash_asset_id = self.get_cash_asset_id(account_id)
+        if not cash_asset_id:
+            return
+
+        position = self._get_position(account_id, cash_asset_id)
+        if not position:
+            self.rebuild_cash_position(account_id)
+            return
+
+        self.checkpoints.shift_cash(account_id, cash_asset_id, [change for change in changes if change[1]])
+        balance = position.total_quantity + delta
+        pending = position.since_checkpoint + count
+        interval = settings.POSITION_CHECKPOINT_INTERVAL
+        if interval and pending >= interval:
+            latest = self.session.exec(
+                select(Transaction.transaction_time, Transaction.id)
+                .where(Transaction.account_id == account_id)
+                .order_by(Transaction.transaction_time.desc(), Transaction.id.desc())
+                .limit(1)
+            ).first()
+            if latest:
+                self.checkpoints.write(account_id, cash_asset_id, tuple(latest), balance, balance, snapshot_lots=False)
+                pending = 0
+        if delta == 0 and pending == position.since_checkpoint:
+            return
+        self._save_position(account_id, cash_asset_id, balance, Decimal(1.0), balance, position,
+                            since_checkpoint=pending)
+
+    def _append_asset(self, txns: List[Transaction]) -> bool:
+        """
+        將同一個 (account, asset) 的新交易依時間順序套用到現有持倉上，只寫入一次。
+        若已有排在其中最早一筆之後的交易 (補登)，或持倉為負 (成本資訊已遺失)，回傳 False 改為重播。
+        """
+        txns = sorted(txns, key=transaction_key)
+        first = txns[0]
+        position = self._get_position(first.account_id, first.asset_id)
+        if (position is not None and position.total_quantity < 0) or \
+                self._has_later_transaction(first, exclude_ids=[t.id for t in txns[1:]]):
+            return False
+
+        total_qty = position.total_quantity if position else Decimal(0)
+        total_cost = position.total_cost if position else Decimal(0)
+        self.lots.append(first.account_id, first.asset_id, txns, total_qty, total_cost)
+        for txn in txns:
+            total_qty, total_cost = apply_transaction(total_qty, total_cost, txn)
+
+        pending = (position.since_checkpoint if position else 0) + len(txns)
+        interval = settings.POSITION_CHECKPOINT_INTERVAL
+        if interval and pending >= interval:
+            # 新交易排在最後面，tax_lots 已經是套用之後的狀態
+            self.checkpoints.write(first.account_id, first.asset_id, transaction_key(txns[-1]), total_qty, total_cost)
+            pending = 0
+
+        average_cost = Decimal(0)
+        if total_qty > 0:
+            average_cost = total_cost / total_qty
+        self._save_position(first.account_id, first.asset_id, total_qty, average_cost, total_cost, position,
+                            since_checkpoint=pending)
+        return True
+
+    def apply_changes(
+        self,
+        created: Iterable[Transaction] = (),
+        updated: Iterable[tuple[Transaction, Transaction]] = (),
+        deleted: Iterable[Transaction] = (),
+    ) -> None:
+        """
+        交易寫入 (已 flush 到 DB) 後更新持倉。`updated` 是 (修改前快照, 新狀態)，`deleted` 是刪除前的快照。
+        不論一批有幾筆交易，每個受影響的 (account, asset) 與每個帳戶的現金持倉都只寫入一次。
+        """
+        cash_asset_ids: Dict[int, Optional[int]] = {}
+
+        def is_asset(txn: Transaction) -> bool:
+            # 法幣交易的持倉就是現金持倉，由現金邏輯負責
+            if not txn.asset_id:
+                return False
+            if txn.account_id not in cash_asset_ids:
+                cash_asset_ids[txn.account_id] = self.get_cash_asset_id(txn.account_id)
+            return txn.asset_id != cash_asset_ids[txn.account_id]
+
+        cash_deltas: Dict[int, Decimal] = {}
+        cash_changes: Dict[int, List[tuple[Key, Decimal]]] = {}
+        cash_counts: Dict[int, int] = {}
+        appended: Dict[tuple[int, int], List[Transaction]] = {}
+        # 需要重播的 (account, asset) -> 最早一筆有變動的交易，從它之前的 checkpoint 開始重播 (保持順序)
+        replay: Dict[tuple[int, int], Key] = {}
+
+        def add_cash(txn: Transaction, delta: Decimal) -> None:
+            cash_deltas[txn.account_id] = cash_deltas.get(txn.account_id, Decimal(0)) + delta
+            cash_changes.setdefault(txn.account_id, []).append((transaction_key(txn), delta))
+
+        def add_replay(txn: Transaction) -> None:
+            pair = (txn.account_id, txn.asset_id)
+            replay[pair] = min(replay.get(pair, transaction_key(txn)), transaction_key(txn))
+
+        for txn in created:
+            add_cash(txn, cash_flow(txn))
+            cash_counts[txn.account_id] = cash_counts.get(txn.account_id, 0) + 1
+            if is_asset(txn):
+                appended.setdefault((txn.account_id, txn.asset_id), []).append(txn)
+
+        for old, txn in updated:
+            if all(getattr(old, field) == getattr(txn, field) for field in POSITION_FIELDS):
+                continue
+            # 平均成本與順序有關，修改既有交易一律重播受影響的 (account, asset)
+            for snapshot in (old, txn):
+                if is_asset(snapshot):
+                    add_replay(snapshot)
+            add_cash(old, -cash_flow(old))
+            add_cash(txn, cash_flow(txn))
+
+        for old in deleted:
+            if is_asset(old):
+                add_replay(old)
+            add_cash(old, -cash_flow(old))
+        self.lots.forget(old.id for old in deleted)
+
+        for pair, txns in appended.items():
+            if pair in replay:
+                for txn in txns:
+                    add_replay(txn)
+            elif not self._append_asset(txns):
+                for txn in txns:
+                    add_replay(txn)
+        for (account_id, asset_id), since in replay.items():
+            self.rebuild_asset_position(account_id, asset_id, since=since)
+        for account_id, delta in cash_deltas.items():
+            self._adjust_cash(account_id, delta, cash_changes[account_id], cash_counts.get(account_id, 0))
+
+    def on_create(self, txn: Transaction) -> None:
+        """
+        新增交易後呼叫 (交易已 flush 到 DB)。
+        """
+        self.apply_changes(created=[txn])
+
+    def on_update(self, old: Transaction, txn: Transaction) -> None:
+        """
+        修改交易後呼叫。`old` 是修改前的快照，`txn` 是已 flush 到 DB 的新狀態。
+        """
+        self.apply_changes(updated=[(old, txn)])
+
+    def on_delete(self, old: Transaction) -> None:
+        """
+        刪除交易後呼叫。`old` 是刪除前的快照。
+        """
+        self.apply_changes(deleted=[old])
+
+
+    def get_holdings_as_of(self, account_id: int, as_of: datetime) -> List[HoldingAsOf]:
+        """
+        帳戶在 `as_of` (含) 當下的持倉：每個資產從 `as_of` 之前最近的 checkpoint 開始，只重播之後的交易。
+        數量與平均成本和 Position 表用同樣的平均成本法，不為 0 的才回傳。
+        """
+        as_of = to_local_naive(as_of)
+        cash_asset_id = self.get_cash_asset_id(account_id)
+        starts = self.checkpoints.latest_by_asset(account_id, until=as_of)
+        cash_start = starts.pop(cash_asset_id, None)
+
+        asset_ids = self.session.exec(
+            select(Transaction.asset_id).distinct()
+            .where(Transaction.account_id == account_id, Transaction.asset_id.is_not(None))
+        ).all()
+        totals = {}
+        for asset_id in asset_ids:
+            if asset_id == cash_asset_id:
+                continue
+            # 每個資產各自用 (account, asset, time) 索引直接定位到 checkpoint 之後的尾端
+            statement = select(*REPLAY_COLUMNS).where(
+                Transaction.account_id == account_id,
+                Transaction.asset_id == asset_id,
+                Transaction.transaction_time <= as_of,
+            )
+            total_qty, total_cost = Decimal(0), Decimal(0)
+            checkpoint = starts.get(asset_id)
+            if checkpoint:
+                statement = statement.where(
+                    Transaction.transaction_time >= checkpoint.transaction_time,
+                    later_than(Transaction.transaction_time, Transaction.id,
+                               (checkpoint.transaction_time, checkpoint.transaction_id)),
+                )
+                total_qty, total_cost = checkpoint.total_quantity, checkpoint.total_cost
+            transactions = self.session.exec(
+                statement
+                .order_by(Transaction.transaction_time.asc(), Transaction.id.asc())
+                .execution_options(yield_per=REPLAY_BATCH_SIZE)
+            )
+            for txn in transactions:
+                total_qty, total_cost = apply_transaction(total_qty, total_cost, txn)
+            totals[asset_id] = total_qty, total_cost
+
+        holdings = [
+            HoldingAsOf(asset_id, total_qty, total_cost / total_qty if total_qty > 0 else Decimal(0))
+            for asset_id, (total_qty, total_cost) in sorted(totals.items())
+            if total_qty != 0
+        ]
+        if cash_asset_id:
+            # 現金與順序無關：checkpoint 之後的現金流直接加總
+            statement = select(*REPLAY_COLUMNS).where(
+                Transaction.account_id == account_id,
+                Transaction.transaction_time <= as_of,
+            )
+            if cash_start:
+                statement = statement.where(Transaction.transaction_time >= cash_start.transaction_time, later_than(
+                    Transaction.transaction_time, Transaction.id,
+                    (cash_start.transaction_time, cash_start.transaction_id)))
+            cash = sum((cash_flow(txn) for txn in self.session.exec(statement)),
+                       cash_start.total_quantity if cash_start else Decimal(0))
+            if cash != 0:
+                holdings.append(HoldingAsOf(cash_asset_id, cash, Decimal(1.0)))
+        return holdings
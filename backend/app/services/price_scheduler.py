@@ -0,0 +1,206 @@
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.core.timeutils import to_local_naive
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position
+from app.services.asset import AssetService
+from app.services.quote_provider import QuoteProvider
+
+
+class RefreshCandidate(NamedTuple):
+    asset_id: int
+    type: AssetType
+    last_updated: datetime
+    held: bool
+
+
+def refresh_intervals() -> Dict[AssetType, timedelta]:
+    """
+    各資產類型的報價更新間隔 (由設定決定)。
+    """
+    return {
+        AssetType.crypto: timedelta(seconds=settings.PRICE_REFRESH_CRYPTO_SECONDS),
+        AssetType.stock: timedelta(seconds=settings.PRICE_REFRESH_STOCK_SECONDS),
+        AssetType.etf: timedelta(seconds=settings.PRICE_REFRESH_ETF_SECONDS),
+        AssetType.fiat: timedelta(seconds=settings.PRICE_REFRESH_FIAT_SECONDS),
+    }
+
+
+def refresh_candidates_query():
+    """
+    所有資產與「是否有非零持倉」。子查詢只讀 positions(asset_id, total_quantity) 索引。
+    """
+    held = select(Position.asset_id).where(Position.total_quantity != 0).distinct()
+    return select(Asset.id, Asset.type, Asset.last_updated, Asset.id.in_(held))
+
+
+def plan_refresh(
+    candidates: Iterable[RefreshCandidate],
+    now: datetime,
+    intervals: Dict[AssetType, timedelta],
+    retry_at: Optional[Dict[int, datetime]] = None,
+    force_before: datetime | None = None,
+) -> List[int]:
+    """
+    這一輪到期的資產，依優先順序排列：有持倉的在前，再依 last_updated 由舊到新。
+    到期 = 距離上次更新已超過該類型的間隔 (或早於 force_before)，且不在失敗退避期間內。
+    時間都是 UTC+8 的 naive wall time。
+    """
+    retry_at = retry_at or {}
+    due = []
+    for candidate in candidates:
+        last_updated = to_local_naive(candidate.last_updated)
+        if candidate.asset_id in retry_at and retry_at[candidate.asset_id] > now:
+            continue
+        if now - last_updated >= intervals[candidate.type] or (force_before and last_updated < force_before):
+            due.append((not candidate.held, last_updated, candidate.asset_id))
+    return [asset_id for _, _, asset_id in sorted(due)]
+
+
+class PriceRefreshScheduler:
+    """
+    Background price refresh, started from the app lifespan.
+
+    Every tick it plans which assets are due (plan_refresh) and refreshes up
+    to `batch_size` of them through AssetService; if more are due it goes
+    again right away. Reads only see the stored prices and never wait on the
+    quote provider.
+
+    - Runs never overlap. trigger() during a run only marks one follow-up
+      run, however many times it is called.
+    - An asset whose quote fails is retried after an exponential backoff
+      (tick, 2 x tick, ... up to max_backoff). A failed run (e.g. the database
+      is down) backs off the whole loop the same way.
+    - Every wait is jittered by +/- `jitter` so restarts and retries spread out.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        quote_provider: QuoteProvider,
+        intervals: Optional[Dict[AssetType, timedelta]] = None,
+        tick: float | None = None,
+        batch_size: int | None = None,
+        jitter: float | None = None,
+        max_backoff: float | None = None,
+        rng: random.Random | None = None,
+    ):
+        self.engine = engine
+        self.quote_provider = quote_provider
+        self.intervals = intervals or refresh_intervals()
+        self.tick = settings.PRICE_REFRESH_TICK_SECONDS if tick is None else tick
+        self.batch_size = batch_size or settings.PRICE_REFRESH_BATCH_SIZE
+        self.jitter = settings.PRICE_REFRESH_JITTER if jitter is None else jitter
+        self.max_backoff = settings.PRICE_REFRESH_MAX_BACKOFF_SECONDS if max_backoff is None else max_backoff
+        self.rng = rng or random.Random()
+
+        self._failures: Dict[int, int] = {}
+        self._retry_at: Dict[int, datetime] = {}
+        self._force_before: datetime | None = None
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._run_failures = 0
+
+        # 統計 (benchmark / 監控用)
+        self.runs = 0
+        self.refreshed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def trigger(self) -> None:
+        """
+        立即更新所有到目前為止還沒更新過的資產 (不必等間隔到期)，在背景執行。
+        """
+        self._force_before = to_local_naive(datetime.now(timezone(timedelta(hours=8))))
+        self._wakeup.set()
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _backoff(self, failures: int) -> float:
+        return self._jittered(min(self.max_backoff, self.tick * 2 ** (failures - 1)))
+
+    async def _loop(self) -> None:
+        while True:
+            delay = self.tick
+            try:
+                more = await self.run_once()
+                self._run_failures = 0
+            except Exception as e:
+                print(f"Price refresh failed: {e}")
+                self._run_failures += 1
+                more = False
+                delay = min(self.max_backoff, self.tick * 2 ** self._run_failures)
+
+            if more:
+                # 還有到期的資產：讓出 event loop 後直接進行下一批
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._jittered(delay))
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self) -> bool:
+        """
+        更新一批到期的資產，回傳是否還有到期但這批沒輪到的資產。
+        """
+        async with self._lock:
+            now = to_local_naive(datetime.now(timezone(timedelta(hours=8))))
+            async with AsyncSession(self.engine, expire_on_commit=False) as session:
+                candidates = [RefreshCandidate(*row) for row in (await session.exec(refresh_candidates_query())).all()]
+                due = plan_refresh(candidates, now, self.intervals, self._retry_at, self._force_before)
+                if not due:
+                    self._force_before = None
+                    return False
+
+                batch = due[:self.batch_size]
+                try:
+                    updated = await AssetService(session, self.quote_provider).refresh_prices(batch)
+                except Exception as e:
+                    # 報價來源整批失敗：這批資產都進入退避
+                    print(f"Failed to refresh {len(batch)} prices: {e}")
+                    updated = set()
+
+            self.runs += 1
+            self._record(batch, updated, now)
+            return len(due) > len(batch)
+
+    def _record(self, asset_ids: List[int], updated: set[int], now: datetime) -> None:
+        for asset_id in asset_ids:
+            if asset_id in updated:
+                self._failures.pop(asset_id, None)
+                self._retry_at.pop(asset_id, None)
+                self.refreshed += 1
+            else:
+                failures = self._failures.get(asset_id, 0) + 1
+                self._failures[asset_id] = failures
+                self._retry_at[asset_id] = now + timedelta(seconds=self._backoff(failures))
+                self.failed += 1
@@ -0,0 +1,162 @@
+import asyncio
+import csv
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from decimal import Decimal
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List
+import yfinance as yf
+
+from app.core.config import settings
+from app.core.metrics import QUOTE_PROVIDER_SYMBOLS, observe_provider_call
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Quote:
+    symbol: str
+    price: Decimal
+    previous_close: Decimal | None = None
+
+
+class QuoteProvider(ABC):
+    """
+    報價來源介面。實作需自行處理批次與逾時，查不到的 symbol 直接略過不回傳。
+    """
+
+    @abstractmethod
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        ...
+
+    async def aget_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        """
+        Async 版本。預設在 thread 中執行 get_quotes，不阻塞 event loop；
+        有原生 async 來源的實作可以直接覆寫。
+        """
+        return await asyncio.to_thread(self.get_quotes, list(symbols))
+
+
+def _chunks(items: List[str], size: int) -> Iterable[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class YFinanceQuoteProvider(QuoteProvider):
+    """
+    Fetches quotes from Yahoo Finance.
+
+    Symbols are sent `batch_size` at a time through `yf.download`, which fetches
+    the symbols of a batch concurrently on at most `max_workers` threads and
+    applies `timeout` to each symbol's request. Batches run one after another
+    because `yf.download` keeps its results in module level state. A batch
+    that fails is logged and skipped; each batch is timed under the "download"
+    call of the quote metrics, and a failed batch's symbols are counted as
+    "failed".
+    """
+
+    def __init__(self, batch_size: int = 100, max_workers: int = 8, timeout: float = 10):
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        provider = type(self).__name__
+        quotes: Dict[str, Quote] = {}
+        for batch in _chunks(sorted(set(symbols)), self.batch_size):
+            start = time.perf_counter()
+            try:
+                data = yf.download(
+                    batch,
+                    period="5d",
+                    interval="1d",
+                    group_by="ticker",
+                    auto_adjust=False,
+                    threads=min(self.max_workers, len(batch)),
+                    timeout=self.timeout,
+                    progress=False,
+                )
+            except Exception:
+                observe_provider_call(provider, "download", start, ok=False)
+                QUOTE_PROVIDER_SYMBOLS.inc((provider, "failed"), len(batch))
+                logger.exception("Failed to download quotes for %d symbols (%s ...)", len(batch), batch[0])
+                continue
+            observe_provider_call(provider, "download", start, ok=True)
+
+            for symbol in batch:
+                try:
+                    closes = data[symbol]["Close"].dropna()
+                except KeyError:
+                    continue
+                if closes.empty:
+                    continue
+                quotes[symbol] = Quote(
+                    symbol=symbol,
+                    price=Decimal(str(closes.iloc[-1])),
+                    previous_close=Decimal(str(closes.iloc[-2])) if len(closes) > 1 else None,
+                )
+        return quotes
+
+
+class FileQuoteProvider(QuoteProvider):
+    """
+    Serves quotes from a local file, for offline runs and benchmarks.
+
+    Accepts a JSON object (`{"AAPL": 190.1, ...}` or
+    `{"AAPL": {"price": 190.1, "previous_close": 188.0}, ...}`) or a CSV file
+    with `symbol,price[,previous_close]` columns. The file is read once, so
+    results are deterministic.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._quotes = self._load(self.path)
+
+    @staticmethod
+    def _load(path: Path) -> Dict[str, Quote]:
+        def to_quote(symbol: str, price, previous_close=None) -> Quote:
+            return Quote(
+                symbol=symbol,
+                price=Decimal(str(price)),
+                previous_close=Decimal(str(previous_close)) if previous_close not in (None, "") else None,
+            )
+
+        if path.suffix.lower() == ".json":
+            with path.open() as f:
+                return {
+                    symbol: to_quote(symbol, **value) if isinstance(value, dict) else to_quote(symbol, value)
+                    for symbol, value in json.load(f).items()
+                }
+
+        with path.open(newline="") as f:
+            return {
+                row["symbol"]: to_quote(row["symbol"], row["price"], row.get("previous_close"))
+                for row in csv.DictReader(f)
+            }
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        return {symbol: self._quotes[symbol] for symbol in symbols if symbol in self._quotes}
+
+    async def aget_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        # 純記憶體查詢，不需要丟到 thread
+        return self.get_quotes(symbols)
+
+
+@lru_cache
+def get_quote_provider() -> QuoteProvider:
+    """
+    FastAPI dependency: 依設定建立 (並重用) 報價來源
+    """
+    if settings.QUOTE_PROVIDER == "file":
+        if not settings.QUOTE_FILE:
+            raise RuntimeError("QUOTE_FILE must be set when QUOTE_PROVIDER=file")
+        return FileQuoteProvider(settings.QUOTE_FILE)
+    return YFinanceQuoteProvider(
+        batch_size=settings.QUOTE_BATCH_SIZE,
+        max_workers=settings.QUOTE_MAX_WORKERS,
+        timeout=settings.QUOTE_TIMEOUT,
+    )
@@ -0,0 +1,180 @@
+import csv
+import hashlib
+import json
+from typing import Annotated, Any, Dict, Iterable, Iterator, List, TextIO
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+from itertools import batched
+from fastapi import Depends
+from pydantic import ValidationError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from app.core.cache import versions
+from app.core.database import SQLiteDB, unit_of_work
+from app.core.timeutils import to_local_naive
+from app.models.accounts import Account
+from app.models.assets import Asset
+from app.models.transacions import Transaction
+from app.schemas.transaction import TransactionCreate, TransactionImportError, TransactionImportResult
+from app.services.position import PositionService
+
+
+def content_hash(values: Dict[str, Any]) -> str:
+    """
+    交易內容的雜湊 (同一筆交易不論 Decimal 寫法或欄位順序都得到相同結果)。
+    """
+    def canonical(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, Decimal):
+            return format(value.normalize(), "f")
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return str(getattr(value, "value", value))
+
+    fields = ("account_id", "asset_id", "type", "quantity", "price_per_unit", "fee", "transaction_time", "notes")
+    return hashlib.sha256("|".join(canonical(values.get(f)) for f in fields).encode()).hexdigest()
+
+
+def _format_validation_error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in e.errors())
+
+
+class TransactionImportService:
+    """
+    Bulk transaction import from CSV or NDJSON.
+
+    The file is read row by row and written in chunks of CHUNK_SIZE with
+    `INSERT ... ON CONFLICT (content_hash) DO NOTHING`, so memory stays bounded
+    and re-importing the same file is a no-op. Positions are rebuilt once per
+    affected (account, asset) pair after all rows are loaded, in the same
+    database transaction: the import is committed once, or not at all.
+    Only the first MAX_ERRORS invalid rows are reported; the rest are counted.
+    """
+
+    CHUNK_SIZE = 1000
+    MAX_ERRORS = 100
+
+    def __init__(self, session: Annotated[Session, Depends(SQLiteDB.get_session)]):
+        self.session = session
+        self.position_service = PositionService(session)
+
+    def _insert_statement(self):
+        dialect = postgresql if self.session.get_bind().dialect.name == "postgresql" else sqlite
+        # RETURNING 只回傳真正寫入的列：已存在的 content_hash 被 DO NOTHING 略過
+        return (dialect.insert(Transaction).on_conflict_do_nothing(index_elements=["content_hash"])
+                .returning(Transaction.account_id, Transaction.asset_id))
+
+    @staticmethod
+    def read_csv(file: TextIO) -> Iterator[Dict[str, Any]]:
+        for row in csv.DictReader(file):
+            # 空欄位視為未填，交給 schema 的預設值
+            yield {key: value for key, value in row.items() if key and value not in (None, "")}
+
+    @staticmethod
+    def read_ndjson(file: TextIO) -> Iterator[Dict[str, Any]]:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                row = {"__error__": f"invalid JSON: {e.msg}"}
+            yield row if isinstance(row, dict) else {"__error__": "expected a JSON object"}
+
+    def import_rows(self, rows: Iterable[Dict[str, Any]]) -> TransactionImportResult:
+        """
+        驗證並匯入交易。欄位同 TransactionCreate，asset_id 也可以改用 ticker。
+        """
+        account_ids = set(self.session.exec(select(Account.id)).all())
+        tickers = dict(self.session.exec(select(Asset.ticker, Asset.id)).all())
+        asset_ids = set(tickers.values())
+        now = datetime.now(timezone(timedelta(hours=8)))
+        stmt = self._insert_statement()
+
+        total = imported = duplicates = error_count = 0
+        errors: List[TransactionImportError] = []
+        affected: set[tuple[int, int | None]] = set()
+
+        with unit_of_work(self.session):
+            for chunk in batched(enumerate(rows, start=1), self.CHUNK_SIZE):
+                pending: Dict[str, Dict[str, Any]] = {}
+                for row_number, row in chunk:
+                    total += 1
+                    try:
+                        values = self._validate(row, account_ids, asset_ids, tickers)
+                    except ValueError as e:
+                        error_count += 1
+                        if len(errors) < self.MAX_ERRORS:
+                            errors.append(TransactionImportError(row=row_number, error=str(e)))
+                        continue
+                    # 以檔案中的內容計算雜湊 (未填時間的列在雜湊之後才補上匯入時間)，重新匯入才會得到相同結果
+                    values["content_hash"] = content_hash(values)
+                    if values["transaction_time"] is None:
+                        values["transaction_time"] = to_local_naive(now)
+                    if values["content_hash"] in pending:
+                        duplicates += 1
+                        continue
+                    pending[values["content_hash"]] = values
+
+                if not pending:
+                    continue
+                # 直接走 Core (不經過 ORM bulk insert)，同一個交易內
+                inserted = self.session.connection().execute(stmt, list(pending.values())).all()
+                imported += len(inserted)
+                duplicates += len(pending) - len(inserted)
+                affected.update((account_id, asset_id) for account_id, asset_id in inserted)
+            rebuilt = self._rebuild_positions(affected)
+
+        for account_id in {account_id for account_id, _ in affected}:
+            versions.bump("account", account_id)
+        return TransactionImportResult(
+            rows=total, imported=imported, duplicates=duplicates, positions_rebuilt=rebuilt,
+            error_count=error_count, errors=errors,
+        )
+
+    def _validate(self, row: Dict[str, Any], account_ids: set[int], asset_ids: set[int],
+                  tickers: Dict[str, int]) -> Dict[str, Any]:
+        if "__error__" in row:
+            raise ValueError(row["__error__"])
+        row = dict(row)
+        ticker = row.pop("ticker", None)
+        if ticker is not None and "asset_id" not in row:
+            if ticker not in tickers:
+                raise ValueError(f"unknown ticker: {ticker}")
+            row["asset_id"] = tickers[ticker]
+
+        try:
+            txn = TransactionCreate.model_validate(row)
+        except ValidationError as e:
+            raise ValueError(_format_validation_error(e)) from e
+
+        if txn.account_id not in account_ids:
+            raise ValueError(f"account not found: {txn.account_id}")
+        if txn.asset_id is not None and txn.asset_id not in asset_ids:
+            raise ValueError(f"asset not found: {txn.asset_id}")
+
+        values = txn.model_dump()
+        if txn.transaction_time is not None:
+            values["transaction_time"] = to_local_naive(txn.transaction_time)
+        return values
+
+    def _rebuild_positions(self, affected: set[tuple[int, int | None]]) -> int:
+        """
+        每個受影響的 (account, asset) 與帳戶現金各重算一次。
+        """
+        by_account: Dict[int, set[int | None]] = {}
+        for account_id, asset_id in affected:
+            by_account.setdefault(account_id, set()).add(asset_id)
+
+        rebuilt = 0
+        for account_id, asset_ids in by_account.items():
+            cash_asset_id = self.position_service.get_cash_asset_id(account_id)
+            for asset_id in asset_ids:
+                if asset_id and asset_id != cash_asset_id:
+                    self.position_service.rebuild_asset_position(account_id, asset_id)
+                    rebuilt += 1
+            self.position_service.rebuild_cash_position(account_id)
+            rebuilt += 1
+        return rebuilt
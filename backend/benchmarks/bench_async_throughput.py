@@ -0,0 +1,173 @@
+"""
+Concurrent request throughput: async asset endpoints vs. the previous sync stack.
+
+Both apps serve the same workload over ASGI (no network): concurrent clients
+mostly read `GET /assets/` and every `--refresh-every`-th request triggers
+`POST /assets/update_prices` against a provider that takes `--latency` seconds.
+The sync baseline runs the old `def` endpoints on the threadpool, where each
+slow provider call holds a worker thread; the async app awaits it.
+
+    python -m benchmarks.bench_async_throughput [--clients 200] [--requests 2000]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable
+
+import httpx
+from fastapi import FastAPI
+from sqlmodel import Session, insert, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.database import SQLiteDB
+from app.main import app as async_app
+from app.models.assets import Asset, AssetType
+from app.services.quote_provider import Quote, QuoteProvider, get_quote_provider
+from benchmarks.common import make_async_engine, make_engine, print_table
+
+
+class SlowQuoteProvider(QuoteProvider):
+    """
+    模擬外部報價來源的延遲，價格固定可重現。
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def _quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        return {symbol: Quote(symbol=symbol, price=Decimal(100)) for symbol in symbols}
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        time.sleep(self.latency)
+        return self._quotes(symbols)
+
+    async def aget_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        await asyncio.sleep(self.latency)
+        return self._quotes(symbols)
+
+
+def build_sync_app(engine, provider: QuoteProvider) -> FastAPI:
+    """
+    舊版 (sync) 的 asset 端點：在 threadpool 上執行，等待報價時佔住 worker thread。
+    """
+    legacy = FastAPI()
+
+    @legacy.get("/api/v1/assets/")
+    def read_assets():
+        with Session(engine) as session:
+            return session.exec(select(Asset).limit(100)).all()
+
+    @legacy.post("/api/v1/assets/update_prices")
+    def update_all_prices():
+        with Session(engine) as session:
+            assets = session.exec(select(Asset.id, Asset.ticker)).all()
+            quotes = provider.get_quotes(ticker for _, ticker in assets)
+            now = datetime.now(timezone(timedelta(hours=8)))
+            session.execute(update(Asset), [
+                {"id": asset_id, "current_price": quotes[ticker].price, "last_updated": now}
+                for asset_id, ticker in assets
+            ])
+            session.commit()
+            return {"ok": True, "updated_count": len(assets)}
+
+    return legacy
+
+
+async def drive(app: FastAPI, clients: int, total: int, refresh_every: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    plan = [
+        ("POST", "/api/v1/assets/update_prices") if rng.randrange(refresh_every) == 0 else ("GET", "/api/v1/assets/")
+        for _ in range(total)
+    ]
+    latencies: Dict[str, list] = {path: [] for _, path in plan}
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while not queue.empty():
+            method, path = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.request(method, path)
+            latencies[path].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return {"elapsed": elapsed, "latencies": latencies, "errors": errors}
+
+
+def p95(values: list) -> float:
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else (values[0] if values else 0.0)
+
+
+async def run(args) -> list[list]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        engine = make_engine(f"sqlite:///{db_path}")
+        with Session(engine) as session:
+            session.execute(insert(Asset), [
+                {"ticker": f"SYM{i:04d}", "name": "Bench", "type": AssetType.stock, "currency": "USD", "current_price": 0}
+                for i in range(args.assets)
+            ])
+            session.commit()
+
+        provider = SlowQuoteProvider(args.latency)
+        async_engine = make_async_engine(str(db_path))
+
+        async def get_async_session():
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                yield session
+
+        async_app.dependency_overrides[SQLiteDB.get_async_session] = get_async_session
+        async_app.dependency_overrides[get_quote_provider] = lambda: provider
+
+        rows = []
+        try:
+            for name, app in [("sync", build_sync_app(engine, provider)), ("async", async_app)]:
+                result = await drive(app, args.clients, args.requests, args.refresh_every, args.seed)
+                reads = result["latencies"].get("/api/v1/assets/", [])
+                refreshes = result["latencies"].get("/api/v1/assets/update_prices", [])
+                rows.append([
+                    name,
+                    f"{args.requests / result['elapsed']:.0f}",
+                    f"{p95(reads) * 1000:.0f}",
+                    f"{p95(refreshes) * 1000:.0f}",
+                    result["errors"],
+                ])
+        finally:
+            async_app.dependency_overrides.clear()
+            await async_engine.dispose()
+            engine.dispose()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--refresh-every", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="provider latency in seconds")
+    parser.add_argument("--assets", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = asyncio.run(run(args))
+    print_table(["stack", "req/s", "read p95 ms", "refresh p95 ms", "errors"], rows)
+
+
+if __name__ == "__main__":
+    main()
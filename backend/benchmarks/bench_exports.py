@@ -0,0 +1,69 @@
+"""
+Streaming export throughput, time to first byte and memory.
+
+Seeds one account with N transactions and drains ExportService.export_transactions
+in every format, recording the time until the first chunk, total time and bytes.
+Peak traced memory is measured in a separate pass (tracemalloc slows the export
+down) with the export cut off after 1/10 of the rows and after all of them: it
+should not grow with the number of rows. Parquet is skipped without pyarrow.
+
+    python -m benchmarks.bench_exports [--rows 200000]
+"""
+import argparse
+import importlib.util
+import time
+import tracemalloc
+
+from sqlmodel import Session
+
+from app.services.export import ExportService
+from benchmarks.bench_transaction_pages import seed
+from benchmarks.common import make_engine, print_table
+
+
+def drain(chunks, max_bytes: int | None = None) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first = None
+    total = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+        total += len(chunk)
+        if max_bytes is not None and total >= max_bytes:
+            break
+    return first or 0.0, time.perf_counter() - start, total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    formats = ["csv", "ndjson"] + (["parquet"] if importlib.util.find_spec("pyarrow") else [])
+    engine = make_engine()
+    with Session(engine) as session:
+        seed(session, args.rows)
+
+    rows, memory = [], []
+    for fmt in formats:
+        with Session(engine) as session:
+            first, total_time, size = drain(ExportService(session).export_transactions(fmt))
+        rows.append([fmt, f"{first * 1000:.1f}", f"{total_time:.2f}", f"{args.rows / total_time:.0f}",
+                     f"{size / 1024 / 1024:.1f}"])
+
+        peaks = []
+        for cutoff in (size // 10, None):
+            with Session(engine) as session:
+                tracemalloc.start()
+                drain(ExportService(session).export_transactions(fmt), max_bytes=cutoff)
+                peaks.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+                tracemalloc.stop()
+        memory.append([fmt, *(f"{p:.1f}" for p in peaks)])
+
+    print_table(["format", "first byte ms", "seconds", "rows/s", "MB"], rows)
+    print()
+    print_table(["format", "peak MB @ 10%", "peak MB @ 100%"], memory)
+
+
+if __name__ == "__main__":
+    main()
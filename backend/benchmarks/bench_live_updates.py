@@ -0,0 +1,309 @@
+"""
+Live update stream (GET /stream/) with many concurrent subscribers.
+
+1. In process: LiveUpdateBroker with one subscriber that reads after every
+   write and one that reads nothing until the end. The slow one must never
+   hold more than one pending event per topic, and after draining both must
+   reach the broker's state (merging events as a client would).
+2. Over HTTP: the whole app (lifespan included) under uvicorn in a thread,
+   --subscribers SSE connections each watching one portfolio. For --rounds
+   rounds it alternately edits a held asset's price (PATCH /assets/{id}) and
+   appends a transaction (POST /transactions/), then waits until every
+   subscriber got the resulting events. Reports broker computations vs.
+   rounds (one per round, however many subscribers), compute time, and
+   delivery latency from sending the write to each subscriber receiving its
+   events (includes the write and LIVE_UPDATES_DEBOUNCE_SECONDS). A few
+   sampled subscribers must end with the same state as fresh GET /dashboard/
+   and /portfolios/{id}/summary responses.
+
+The database is synthetic (benchmarks.datagen, seeded; --cache-dir reuses it).
+
+    python -m benchmarks.bench_live_updates [--subscribers 1000] [--rounds 20] [--profile small]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import httpx
+
+# 在 import app 之前不能碰 app.core.config (設定在 import 時讀取)，app 相關的 import 都在 main() 裡
+
+
+def apply_frames(state: Dict[tuple, dict], frames: Iterable[bytes]) -> None:
+    """
+    像前端一樣把事件合併進狀態：(事件名稱, portfolio id) -> 欄位。
+    """
+    for frame in frames:
+        for block in frame.split(b"\n\n"):
+            if not block.startswith(b"event: "):
+                continue
+            head, data = block.split(b"\n", 1)
+            name = head[len(b"event: "):].decode()
+            payload = json.loads(data[len(b"data: "):])
+            state.setdefault((name, payload["id"] if name == "portfolio" else None), {}).update(payload)
+
+
+def broker_state(broker) -> Dict[tuple, dict]:
+    return {
+        (event.name, event.data["id"] if event.name == "portfolio" else None): event.data
+        for event in broker._state.values()
+    }
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def wait_for(condition, timeout: float = 30) -> None:
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("live updates did not arrive")
+        await asyncio.sleep(0.002)
+
+
+async def check_backpressure(engine, dataset, rounds: int) -> tuple[list[list], bool]:
+    from sqlmodel import Session, update
+
+    from app.core.cache import versions
+    from app.models.assets import Asset
+    from app.models.transacions import TransactionType
+    from app.schemas.transaction import TransactionCreate
+    from app.services.live_updates import LiveUpdateBroker
+    from app.services.transaction import TransactionService
+
+    account_id = dataset.account_ids[0]
+    asset_id = dataset.holdings[account_id][0]
+
+    def write(i: int) -> None:
+        with Session(engine) as session:
+            if i % 2:
+                session.exec(update(Asset).where(Asset.id == asset_id).values(current_price=Decimal(100 + i)))
+                session.commit()
+                versions.bump("prices")
+            else:
+                TransactionService(session).create_transaction(TransactionCreate(
+                    account_id=account_id, asset_id=asset_id, type=TransactionType.buy, quantity=Decimal(1),
+                    price_per_unit=Decimal(100), fee=Decimal(1), transaction_time=dataset.end + timedelta(seconds=i + 1),
+                ))
+
+    broker = LiveUpdateBroker(engine, debounce=0)
+    broker.start()
+    try:
+        fast, slow = broker.subscribe(dataset.portfolio_ids[:2]), broker.subscribe(dataset.portfolio_ids[:2])
+        fast_state, slow_state = {}, {}
+        await wait_for(lambda: broker.computations >= 1)
+        apply_frames(fast_state, await fast.next(1))
+        most_pending = 0
+        for i in range(rounds):
+            before = broker.computations
+            await asyncio.to_thread(write, i)
+            await wait_for(lambda: broker.computations > before)
+            apply_frames(fast_state, await fast.next(1))
+            most_pending = max(most_pending, slow.pending)
+        conflated = slow.conflated
+        apply_frames(slow_state, await slow.next(1))
+        expected = broker_state(broker)
+    finally:
+        await broker.stop()
+
+    topics = len(expected)
+    rows = [
+        ["topics", topics],
+        ["computations", broker.computations],
+        ["slow subscriber: most pending events", most_pending],
+        ["slow subscriber: merged events", conflated],
+        ["fast == broker state", "ok" if fast_state == expected else "FAIL"],
+        ["slow == broker state", "ok" if slow_state == expected else "FAIL"],
+    ]
+    return rows, most_pending <= topics and fast_state == expected and slow_state == expected
+
+
+class Listener:
+    def __init__(self, portfolio_id: int, sample: bool):
+        self.portfolio_id = portfolio_id
+        self.sample = sample
+        self.received: List[float] = []
+        self.state: Dict[tuple, dict] = {}
+        self.buffer = b""
+
+    def feed(self, chunk: bytes) -> None:
+        self.received.append(time.perf_counter())
+        if not self.sample:
+            return
+        # chunk 可能切在事件中間：只處理完整的事件
+        self.buffer += chunk
+        complete, _, self.buffer = self.buffer.rpartition(b"\n\n")
+        if complete:
+            apply_frames(self.state, [complete + b"\n\n"])
+
+
+async def listen(client: httpx.AsyncClient, listener: Listener) -> None:
+    async with client.stream("GET", "/api/v1/stream/", params={"portfolio_id": listener.portfolio_id}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_raw():
+            listener.feed(chunk)
+
+
+async def fan_out(app, dataset, args) -> tuple[list[list], bool]:
+    import uvicorn
+
+    from benchmarks.loadtest import free_port
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    # server 用自己的執行緒與 event loop，不和訂閱者搶同一個 loop
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    rng = random.Random(args.seed)
+    listeners = [
+        Listener(rng.choice(dataset.portfolio_ids), sample=i < args.sample)
+        for i in range(args.subscribers)
+    ]
+    tasks = []
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            await asyncio.sleep(0.05)
+        broker = app.state.live_updates
+        limits = httpx.Limits(max_connections=args.subscribers + 10, max_keepalive_connections=args.subscribers + 10)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            summaries = {}
+            tasks = [asyncio.create_task(listen(client, listener)) for listener in listeners]
+            start = time.perf_counter()
+            await wait_for(lambda: all(listener.received for listener in listeners), timeout=60)
+            rows = [["connect + first state (all subscribers)", f"{(time.perf_counter() - start) * 1000:.0f}"]]
+
+            account_id = dataset.account_ids[0]
+            held = dataset.holdings[account_id]
+            computations = broker.computations
+            latencies, writes, compute = [], [], []
+            for i in range(args.rounds):
+                await asyncio.sleep(args.debounce * 2)
+                t0 = time.perf_counter()
+                if i % 2:
+                    response = await client.patch(f"/api/v1/assets/{rng.choice(held)}",
+                                                  json={"current_price": str(round(rng.uniform(50, 500), 2))})
+                else:
+                    response = await client.post("/api/v1/transactions/", json={
+                        "account_id": account_id, "asset_id": rng.choice(held), "type": "buy", "quantity": "1",
+                        "price_per_unit": "100", "fee": "1",
+                        "transaction_time": (dataset.end + timedelta(minutes=i + 1)).isoformat(),
+                    })
+                response.raise_for_status()
+                writes.append(time.perf_counter() - t0)
+                await wait_for(lambda: all(listener.received[-1] >= t0 for listener in listeners))
+                latencies.extend(min(t for t in listener.received if t >= t0) - t0 for listener in listeners)
+                compute.append(broker.last_compute_ms)
+            computations = broker.computations - computations
+
+            # 取樣的訂閱者合併後的狀態 == 直接查詢的結果
+            await asyncio.sleep(args.debounce * 2)
+            dashboard = (await client.get("/api/v1/dashboard/")).json()
+            ok = True
+            for listener in listeners[:args.sample]:
+                summary = summaries.get(listener.portfolio_id)
+                if summary is None:
+                    summary = summaries[listener.portfolio_id] = \
+                        (await client.get(f"/api/v1/portfolios/{listener.portfolio_id}/summary")).json()
+                ok &= listener.state.get(("dashboard", None)) == dashboard
+                ok &= listener.state.get(("portfolio", listener.portfolio_id)) == summary
+            stats = (await client.get("/api/v1/stream/stats")).json()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+
+    latencies.sort()
+    rows += [
+        ["rounds / broker computations", f"{args.rounds} / {computations}"],
+        ["events published (total)", stats["events"]],
+        ["write request (median)", f"{statistics.median(writes) * 1000:.1f}"],
+        ["compute per round (median)", f"{statistics.median(compute):.1f}"],
+        ["write -> delivered p50", f"{percentile(latencies, 0.50) * 1000:.1f}"],
+        ["write -> delivered p95", f"{percentile(latencies, 0.95) * 1000:.1f}"],
+        ["write -> delivered p99", f"{percentile(latencies, 0.99) * 1000:.1f}"],
+        ["write -> delivered max", f"{latencies[-1] * 1000:.1f}"],
+        [f"{args.sample} sampled states == GET ({'ok' if ok else 'FAIL'})", ""],
+    ]
+    return rows, ok and computations <= args.rounds + 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="small", help="dataset profile (benchmarks.datagen)")
+    parser.add_argument("--transactions", type=int, help="override the profile's transaction count")
+    parser.add_argument("--cache-dir", type=Path, help="reuse generated datasets from this directory")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--sample", type=int, default=5, help="subscribers whose merged state is checked")
+    parser.add_argument("--debounce", type=float, default=0.05, help="LIVE_UPDATES_DEBOUNCE_SECONDS")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        db_path = workdir / "bench.db"
+        quote_path = workdir / "quotes.json"
+        quote_path.write_text("{}")
+        # app 的設定：合成資料庫、離線 (空的) 報價、不在背景更新報價、不寫 /data
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "QUOTE_PROVIDER": "file",
+            "QUOTE_FILE": str(quote_path),
+            "PRICE_REFRESH_ENABLED": "false",
+            "PROFILING_ENABLED": "false",
+            "LIVE_UPDATES_ENABLED": "true",
+            "LIVE_UPDATES_DEBOUNCE_SECONDS": str(args.debounce),
+            "LIVE_UPDATES_MAX_SUBSCRIBERS": str(args.subscribers + 10),
+        })
+        from sqlmodel import Session
+
+        from benchmarks.common import print_table
+        from benchmarks.datagen import PROFILES, Dataset
+        from benchmarks.suite import dataset_file
+
+        if args.profile not in PROFILES:
+            parser.error(f"unknown profile {args.profile!r} (known: {', '.join(PROFILES)})")
+        spec = PROFILES[args.profile]
+        if args.transactions is not None:
+            spec = replace(spec, transactions=args.transactions)
+        dataset_file(spec, args.cache_dir, workdir)
+
+        from app.core.database import SQLiteDB
+        from app.main import app
+
+        with Session(SQLiteDB.engine) as session:
+            dataset = Dataset.from_db(session, spec)
+        try:
+            backpressure, backpressure_ok = asyncio.run(check_backpressure(SQLiteDB.engine, dataset, args.rounds))
+            print_table(["in process, 1 fast + 1 slow subscriber", ""], backpressure)
+            print()
+            print(f"{args.subscribers} subscribers over HTTP, {args.rounds} rounds", file=sys.stderr)
+            fan, fan_ok = asyncio.run(fan_out(app, dataset, args))
+            print_table([f"{args.subscribers} SSE subscribers", "ms"], fan)
+        finally:
+            # aiosqlite 的連線各有一個 (非 daemon) 執行緒，不關掉的話 process 不會結束
+            asyncio.run(SQLiteDB.async_engine.dispose())
+            SQLiteDB.engine.dispose()
+    if not (backpressure_ok and fan_ok):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Overhead of the /metrics instrumentation.
+
+1. Histogram.observe from 1 and 8 threads: the thread-sharded (lock-free on
+   the write path) histogram vs. the same histogram behind a threading.Lock.
+   Counts are checked after the threaded run (no lost updates).
+2. SQL statement cost with no listeners, with empty listeners (SQLAlchemy's
+   own event dispatch cost) and with the metrics listeners.
+3. Median request latency (GET /api/v1/accounts/ through httpx's ASGI
+   transport) without metrics, with only MetricsMiddleware, and with the
+   middleware plus SQL listeners (what the app runs).
+
+    python -m benchmarks.bench_metrics_overhead [--observations 200000] [--requests 2000]
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event, text
+from sqlmodel import Session
+
+from app.api.v1.api import api_router
+from app.core.database import SQLiteDB
+from app.core.metrics import Histogram, MetricsMiddleware, instrument_engine, uninstrument_engine
+from benchmarks.common import make_engine, print_table, timer
+
+
+class LockedHistogram(Histogram):
+    """
+    對照組：所有 thread 共用一份資料，每次寫入都拿 lock。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        with self._lock:
+            row = self._data.get(labels)
+            if row is None:
+                row = self._data[labels] = [0] * self._row_size
+            row[-1] += 1
+            row[-2] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        return self._data.get(labels, [0])[-1]
+
+
+def observe_rate(histogram: Histogram, threads: int, observations: int) -> tuple[float, bool]:
+    labels = ("GET", "/api/v1/accounts/", "200")
+
+    def work():
+        for i in range(observations):
+            histogram.observe(0.001 * (i % 50), labels)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    with timer() as elapsed:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    total = threads * observations
+    return elapsed() / total * 1e9, histogram.count(labels) == total
+
+
+def sql_cost(engine, statements: int) -> float:
+    with Session(engine) as session:
+        connection = session.connection()
+        with timer() as elapsed:
+            for _ in range(statements):
+                connection.execute(text("SELECT 1")).scalar()
+    return elapsed() / statements * 1e6
+
+
+def make_app(with_metrics: bool, engine) -> FastAPI:
+    app = FastAPI()
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    app.include_router(api_router, prefix="/api/v1")
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[SQLiteDB.get_session] = get_session
+    return app
+
+
+async def request_latency(apps: dict[str, FastAPI], requests: int) -> dict[str, float]:
+    clients = {
+        name: httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+        for name, app in apps.items()
+    }
+    samples: dict[str, list[float]] = {name: [] for name in apps}
+    try:
+        for client in clients.values():
+            await client.get("/api/v1/accounts/")  # warm up
+        # 輪流送，避免機器狀態變化只影響其中一組
+        for _ in range(requests):
+            for name, client in clients.items():
+                with timer() as elapsed:
+                    response = await client.get("/api/v1/accounts/")
+                response.raise_for_status()
+                samples[name].append(elapsed())
+    finally:
+        for client in clients.values():
+            await client.aclose()
+    return {name: statistics.median(values) * 1e6 for name, values in samples.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--observations", type=int, default=200_000, help="per thread")
+    parser.add_argument("--statements", type=int, default=20_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = []
+    for threads in (1, 8):
+        for name, cls in [("sharded", Histogram), ("locked", LockedHistogram)]:
+            ns, exact = observe_rate(cls(f"bench_{name}", "bench", ("method", "route", "status")),
+                                     threads, args.observations)
+            rows.append([f"observe ({name}, {threads} threads)", f"{ns:.0f} ns", "ok" if exact else "LOST UPDATES"])
+
+    plain_engine, empty_engine, metrics_engine = make_engine(), make_engine(), make_engine()
+    for name in ("before_cursor_execute", "after_cursor_execute"):
+        event.listen(empty_engine, name, lambda *args: None)
+    instrument_engine(metrics_engine)
+    plain = sql_cost(plain_engine, args.statements)
+    empty = sql_cost(empty_engine, args.statements)
+    instrumented = sql_cost(metrics_engine, args.statements)
+    rows.append(["SELECT 1 (no listeners)", f"{plain:.1f} us", ""])
+    rows.append(["SELECT 1 (empty listeners)", f"{empty:.1f} us", f"+{empty - plain:.1f} us"])
+    rows.append(["SELECT 1 (instrumented)", f"{instrumented:.1f} us", f"+{instrumented - plain:.1f} us"])
+
+    latency = asyncio.run(request_latency({
+        "plain": make_app(False, plain_engine),
+        "middleware": make_app(True, plain_engine),
+        "metrics": make_app(True, metrics_engine),
+    }, args.requests))
+    uninstrument_engine(metrics_engine)
+    rows.append(["GET /accounts/ (no metrics)", f"{latency['plain']:.0f} us", ""])
+    rows.append(["GET /accounts/ (middleware only)", f"{latency['middleware']:.0f} us",
+                 f"+{latency['middleware'] - latency['plain']:.0f} us"])
+    rows.append(["GET /accounts/ (middleware + SQL)", f"{latency['metrics']:.0f} us",
+                 f"+{latency['metrics'] - latency['plain']:.0f} us"])
+
+    print_table(["measurement", "per op", "note"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Batched performance analytics (PerformanceService): TWR, XIRR and max drawdown.
+
+1. xirr() on hand-made cash flows (including rows Newton cannot solve from
+   the default guess, and rows with no solution) and on random rows, against
+   a scalar bisection.
+2. A dataset with --portfolios portfolios plus random deposits / withdrawals:
+   every metric of --sample portfolios is recomputed one portfolio at a time
+   from get_portfolio_history and the ledger with plain Python loops and must
+   match the batch. Then the batch over all portfolios is timed against
+   calling the service once per portfolio (extrapolated from the sample).
+
+    python -m benchmarks.bench_performance [--portfolios 1000] [--transactions 200000] [--sample 20]
+"""
+import argparse
+import math
+import random
+import statistics
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+from sqlmodel import Session, insert, select
+
+from app.models.accounts import PortfolioAccount
+from app.models.assets import Asset
+from app.models.transacions import Transaction, TransactionType
+from app.services.performance import DAYS_PER_YEAR, EXTERNAL_FLOWS, PerformanceService, xirr
+from app.services.portfolio import PortfolioService
+from app.services.position import cash_flow
+from benchmarks.common import make_engine, print_table, timer
+from benchmarks.datagen import START, DatasetSpec, _Fill, _row, generate
+
+
+def scalar_xirr(amounts: list[float], years: list[float]) -> float:
+    """
+    參考實作：逐列的二分法。
+    """
+    def npv(rate: float) -> float:
+        return sum(a * (1 + rate) ** -t for a, t in zip(amounts, years))
+
+    if not (any(a > 0 for a in amounts) and any(a < 0 for a in amounts)):
+        return math.nan
+    lo, hi = -0.999999, 1.0
+    f_lo = npv(lo)
+    while (npv(hi) > 0) == (f_lo > 0):
+        hi *= 2
+        if hi > 1e12:
+            return math.nan
+    for _ in range(200):
+        mid = (lo + hi) / 2
+        if (npv(mid) > 0) == (f_lo > 0):
+            lo = mid
+        else:
+            hi = mid
+    return (lo + hi) / 2
+
+
+def close(a: float | None, b: float | None, tol: float) -> bool:
+    if a is None or b is None or math.isnan(a) or math.isnan(b):
+        return (a is None or math.isnan(a)) and (b is None or math.isnan(b))
+    return abs(a - b) <= tol * max(1.0, abs(b))
+
+
+def check_xirr() -> tuple[list[list], bool]:
+    rows, ok = [], True
+    cases = [
+        ("-1000 -> 1100 after 1y", [-1000, 1100], [0, 1], 0.1),
+        ("-1 -> 1000 after 1y (bisection)", [-1, 1000], [0, 1], 999.0),
+        ("-100 -> 10 after 1y", [-100, 10], [0, 1], -0.9),
+        ("all outflows", [-100, -50], [0, 1], math.nan),
+    ]
+    width = max(len(c[1]) for c in cases)
+    amounts = np.array([c[1] + [0] * (width - len(c[1])) for c in cases], dtype=np.float64)
+    result = xirr(amounts, np.arange(width, dtype=np.float64))
+    for (label, *_, expected), value in zip(cases, result):
+        passed = close(float(value), expected, 1e-6)
+        ok &= passed
+        rows.append([label, f"{value:.6f}", "ok" if passed else "FAIL"])
+
+    # 隨機現金流：期初投入、期間隨機進出、期末取回
+    rng = np.random.default_rng(3)
+    amounts = rng.normal(0, 100, size=(2_000, 60))
+    amounts[:, 0] = -rng.uniform(500, 5_000, size=2_000)
+    amounts[:, -1] = rng.uniform(0, 10_000, size=2_000)
+    years = np.arange(60) / 12
+    with timer() as elapsed:
+        result = xirr(amounts, years)
+    batch_ms = elapsed() * 1000
+    failures = sum(not close(float(v), scalar_xirr(list(a), list(years)), 1e-6)
+                   for v, a in zip(result[:200], amounts[:200]))
+    ok &= failures == 0
+    rows.append([f"2000 random rows in {batch_ms:.1f} ms, 200 vs scalar", "", "ok" if failures == 0 else f"FAIL ({failures})"])
+    return rows, ok
+
+
+def add_flows(engine, dataset, flows_per_account: int, seed: int) -> None:
+    """
+    datagen 只有期初入金：每個帳戶再加上隨機時間的入金 / 出金。
+    """
+    rng = random.Random(seed)
+    span = (dataset.end - START).total_seconds()
+    rows = []
+    for account_id in dataset.account_ids:
+        for _ in range(flows_per_account):
+            kind = rng.choice([TransactionType.deposit, TransactionType.withdraw])
+            fill = _Fill(kind, Decimal(rng.randint(1_000, 200_000)), Decimal(1), Decimal(0))
+            rows.append(_row(account_id, dataset.cash_asset_id, fill, START + timedelta(seconds=rng.uniform(0, span))))
+    with Session(engine) as session:
+        session.execute(insert(Transaction), rows)
+        session.commit()
+
+
+def reference(session: Session, portfolio_id: int, first_day, end) -> dict:
+    """
+    逐一計算單一組合：市值來自 get_portfolio_history，資金流與各指標用純 Python 迴圈。
+    """
+    history = PortfolioService(session).get_portfolio_history(portfolio_id, start=first_day - timedelta(days=1), end=end)
+    values = history.values
+    flows = [0.0] * (len(values) - 1)
+    account_ids = session.exec(select(PortfolioAccount.account_id).where(PortfolioAccount.portfolio_id == portfolio_id)).all()
+    cash_price = float(session.exec(select(Asset.current_price).where(Asset.ticker == "USD")).one())
+    for txn in session.exec(select(Transaction).where(
+        Transaction.account_id.in_(account_ids), Transaction.type.in_(EXTERNAL_FLOWS),
+        Transaction.transaction_time >= first_day,
+    )):
+        day = (txn.transaction_time.date() - first_day.date()).days
+        if day < len(flows):
+            flows[day] += float(cash_flow(txn)) * cash_price
+
+    index, peak, drawdown = 1.0, 1.0, 0.0
+    for j, flow in enumerate(flows):
+        invested = values[j] + flow
+        index *= values[j + 1] / invested if invested > 0 else 1.0
+        peak = max(peak, index)
+        drawdown = max(drawdown, 1 - index / peak)
+    amounts = [-f for f in flows] + [0.0]
+    amounts[0] -= values[0]
+    amounts[-1] += values[-1]
+    return {
+        "start_value": values[0],
+        "end_value": values[-1],
+        "net_flows": sum(flows),
+        "time_weighted_return": index - 1,
+        "money_weighted_return": scalar_xirr(amounts, [j / DAYS_PER_YEAR for j in range(len(amounts))]),
+        "max_drawdown": drawdown,
+    }
+
+
+def check_portfolios(path: Path, args) -> tuple[list[list], list[list], bool]:
+    engine = make_engine(f"sqlite:///{path}")
+    spec = DatasetSpec(accounts=args.portfolios * 2, portfolios=args.portfolios, accounts_per_portfolio=3,
+                       assets=500, assets_per_account=10, transactions=args.transactions, price_days=args.days)
+    with timer() as elapsed:
+        dataset = generate(engine, spec)
+        add_flows(engine, dataset, args.flows, spec.seed)
+    timings = [["generate", f"{elapsed() * 1000:.0f}"]]
+    end = dataset.end
+
+    with Session(engine) as session:
+        service = PerformanceService(session)
+        samples = []
+        for _ in range(args.repeat):
+            with timer() as elapsed:
+                batch = service.get_performance(end=end)
+            samples.append(elapsed() * 1000)
+        timings.append([f"batch, all {len(batch)} portfolios", f"{statistics.median(samples):.0f}"])
+
+        sample = random.Random(1).sample(dataset.portfolio_ids, min(args.sample, len(dataset.portfolio_ids)))
+        by_id = {item.id: item for item in batch}
+        with timer() as elapsed:
+            single = [service.get_performance(portfolio_ids=[pid], end=end)[0] for pid in sample]
+        per_call = elapsed() * 1000 / len(sample)
+        timings.append([f"one call per portfolio (x{len(batch)}, from {len(sample)})", f"{per_call * len(batch):.0f}"])
+
+        checks, ok = [], True
+        first_day = batch[0].start
+        failures = {}
+        for pid, item in zip(sample, single):
+            expected = reference(session, pid, first_day, end)
+            batched = by_id[pid].model_dump()
+            for field, value in expected.items():
+                tol = 1e-6 if field in ("money_weighted_return",) else 1e-7
+                if not (close(batched[field], value, tol) and close(item.model_dump()[field], value, tol)):
+                    failures[field] = failures.get(field, 0) + 1
+        for field in ("start_value", "end_value", "net_flows", "time_weighted_return", "money_weighted_return",
+                      "max_drawdown"):
+            passed = field not in failures
+            ok &= passed
+            checks.append([f"{field}: batch == single == reference ({len(sample)})",
+                           "ok" if passed else f"FAIL ({failures[field]})"])
+        twr = [item.time_weighted_return for item in batch]
+        checks.append([f"median TWR {statistics.median(twr):.4f}, "
+                       f"{sum(item.money_weighted_return is None for item in batch)} without XIRR", ""])
+    engine.dispose()
+    return checks, timings, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--portfolios", type=int, default=1_000)
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--flows", type=int, default=12, help="extra deposits / withdrawals per account")
+    parser.add_argument("--sample", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    xirr_rows, xirr_ok = check_xirr()
+    with tempfile.TemporaryDirectory() as tmp:
+        checks, timings, portfolios_ok = check_portfolios(Path(tmp) / "performance.db", args)
+
+    print_table(["xirr", "value", "result"], xirr_rows)
+    print()
+    print_table([f"{args.portfolios} portfolios", "result"], checks)
+    print()
+    print_table([f"{args.transactions} trades, {args.days} days", "ms"], timings)
+    if not (xirr_ok and portfolios_ok):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Offline price refresh throughput.
+
+Seeds N assets, writes a deterministic quote file and runs
+AssetService.update_prices against FileQuoteProvider.
+
+    python -m benchmarks.bench_price_refresh [--assets 10000]
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from sqlmodel import Session, insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.assets import Asset, AssetType
+from app.services.asset import AssetService
+from app.services.quote_provider import FileQuoteProvider
+from benchmarks.common import make_async_engine, make_engine, print_table, timer
+
+
+async def run_refreshes(db_path: Path, provider: FileQuoteProvider, repeat: int) -> list[list]:
+    async_engine = make_async_engine(str(db_path))
+    rows = []
+    try:
+        for run in range(repeat):
+            with timer() as elapsed:
+                async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                    count = await AssetService(session, provider).update_prices()
+            rows.append([run + 1, count, f"{elapsed():.3f}", f"{count / elapsed():.0f}"])
+    finally:
+        await async_engine.dispose()
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tickers = [f"SYM{i:05d}" for i in range(args.assets)]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        engine = make_engine(f"sqlite:///{db_path}")
+        with Session(engine) as session:
+            session.execute(insert(Asset), [
+                {"ticker": t, "name": t, "type": AssetType.stock, "currency": "USD", "current_price": Decimal(0)}
+                for t in tickers
+            ])
+            session.commit()
+
+        quote_file = Path(tmp) / "quotes.json"
+        quote_file.write_text(json.dumps({t: round(rng.uniform(1, 500), 4) for t in tickers}))
+        provider = FileQuoteProvider(quote_file)
+
+        rows = asyncio.run(run_refreshes(db_path, provider, args.repeat))
+
+    print_table(["run", "updated", "seconds", "assets/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
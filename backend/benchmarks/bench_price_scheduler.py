@@ -0,0 +1,212 @@
+"""
+Background price refresh scheduler, simulated with scaled-down cadences.
+
+Seeds N assets (crypto and stocks, a fraction of them held in positions, all
+initially stale) and runs PriceRefreshScheduler for a few seconds against a
+slow offline quote provider where some symbols always fail. Meanwhile a
+reader keeps querying prices and, halfway through, trigger() is called 20
+times in a row. Reports:
+
+- how long until every held asset / every asset was refreshed once
+  (held assets go first),
+- refreshes per asset by type: at most one per cadence, plus the initial
+  refresh and the one forced by the trigger burst,
+- attempts per failing symbol (backoff keeps this far below the tick count),
+- scheduler runs vs. trigger() calls (overlapping triggers coalesce),
+- read latency while refreshes are in flight (reads never wait on the provider).
+
+    python -m benchmarks.bench_price_scheduler [--assets 2000] [--seconds 12]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Iterable
+
+from sqlmodel import Session, func, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType, MarketData
+from app.models.transacions import Position
+from app.services.price_scheduler import PriceRefreshScheduler
+from app.services.quote_provider import Quote, QuoteProvider
+from benchmarks.common import make_async_engine, make_engine, print_table
+
+
+class SlowQuoteProvider(QuoteProvider):
+    """
+    離線報價：每次呼叫固定延遲，`failing` 裡的 symbol 永遠查不到。記錄每個 symbol 被查詢的次數。
+    """
+
+    def __init__(self, latency: float, failing: set[str], rng: random.Random):
+        self.latency = latency
+        self.failing = failing
+        self.rng = rng
+        self.attempts: Counter[str] = Counter()
+        self.calls = 0
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        raise NotImplementedError
+
+    async def aget_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        symbols = list(symbols)
+        self.calls += 1
+        self.attempts.update(symbols)
+        await asyncio.sleep(self.latency)
+        return {s: Quote(symbol=s, price=Decimal(str(round(self.rng.uniform(1, 500), 4))))
+                for s in symbols if s not in self.failing}
+
+
+def seed(path: Path, assets: int, crypto_ratio: float, held_ratio: float, failing: int,
+         rng: random.Random) -> tuple[dict, set[str]]:
+    engine = make_engine(f"sqlite:///{path}")
+    stale = datetime(2020, 1, 1)
+    with Session(engine) as session:
+        account = Account(name="scheduler")
+        session.add(account)
+        session.commit()
+        rows = []
+        for i in range(assets):
+            crypto = rng.random() < crypto_ratio
+            rows.append({"ticker": f"{'C' if crypto else 'S'}{i:05d}", "name": "Sim",
+                         "type": AssetType.crypto if crypto else AssetType.stock, "currency": "USD",
+                         "current_price": Decimal(0), "last_updated": stale})
+        session.execute(insert(Asset), rows)
+        # 讓 fiat 資產也是過期的
+        session.execute(Asset.__table__.update().values(last_updated=stale))
+        asset_rows = session.exec(select(Asset.id, Asset.ticker, Asset.type)).all()
+        held = {asset_id for asset_id, _, asset_type in asset_rows
+                if asset_type != AssetType.fiat and rng.random() < held_ratio}
+        session.execute(insert(Position), [
+            {"account_id": account.id, "asset_id": asset_id, "total_quantity": Decimal(1), "average_cost": Decimal(1)}
+            for asset_id in held
+        ])
+        session.commit()
+    engine.dispose()
+
+    info = {asset_id: (ticker, asset_type, asset_id in held) for asset_id, ticker, asset_type in asset_rows}
+    candidates = [ticker for ticker, asset_type, _ in info.values() if asset_type != AssetType.fiat]
+    return info, set(rng.sample(candidates, failing))
+
+
+async def simulate(path: Path, args, info: dict, failing: set[str], rng: random.Random) -> dict:
+    engine = make_async_engine(str(path))
+    provider = SlowQuoteProvider(args.latency, failing, rng)
+    intervals = {AssetType.crypto: timedelta(seconds=args.crypto_every), AssetType.stock: timedelta(seconds=args.stock_every),
+                 AssetType.etf: timedelta(seconds=args.stock_every), AssetType.fiat: timedelta(seconds=args.seconds * 10)}
+    scheduler = PriceRefreshScheduler(engine, provider, intervals=intervals, tick=args.tick,
+                                      batch_size=args.batch, jitter=0.2, max_backoff=args.seconds, rng=rng)
+
+    held_ids = {asset_id for asset_id, (_, _, held) in info.items() if held}
+    first_seen: Dict[int, float] = {}
+    read_latencies: list[float] = []
+    triggers = 0
+    start = time.perf_counter()
+
+    async def reader():
+        while True:
+            t0 = time.perf_counter()
+            async with AsyncSession(engine) as session:
+                rows = (await session.exec(select(MarketData.asset_id).distinct())).all()
+            read_latencies.append(time.perf_counter() - t0)
+            now = time.perf_counter() - start
+            for asset_id in rows:
+                first_seen.setdefault(asset_id, now)
+            await asyncio.sleep(0.05)
+
+    async def trigger_burst():
+        nonlocal triggers
+        await asyncio.sleep(args.seconds / 2)
+        for _ in range(20):
+            scheduler.trigger()
+            triggers += 1
+            await asyncio.sleep(0.001)
+
+    scheduler.start()
+    tasks = [asyncio.create_task(reader()), asyncio.create_task(trigger_burst())]
+    await asyncio.sleep(args.seconds)
+    for task in tasks:
+        task.cancel()
+    await scheduler.stop()
+
+    async with AsyncSession(engine) as session:
+        refreshes = dict((await session.exec(
+            select(MarketData.asset_id, func.count()).group_by(MarketData.asset_id)
+        )).all())
+    await engine.dispose()
+
+    reachable = [a for a, (ticker, asset_type, _) in info.items() if ticker not in failing and asset_type != AssetType.fiat]
+    held_reachable = [a for a in reachable if a in held_ids]
+
+    def all_seen_at(ids):
+        return max((first_seen.get(a, float("inf")) for a in ids), default=0.0)
+
+    return {
+        "scheduler": scheduler, "provider": provider, "refreshes": refreshes, "triggers": triggers,
+        "read_latencies": read_latencies, "held_done": all_seen_at(held_reachable),
+        "all_done": all_seen_at(reachable),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assets", type=int, default=2000)
+    parser.add_argument("--crypto-ratio", type=float, default=0.2)
+    parser.add_argument("--held-ratio", type=float, default=0.1)
+    parser.add_argument("--failing", type=int, default=20, help="symbols the provider never returns")
+    parser.add_argument("--seconds", type=float, default=12)
+    parser.add_argument("--crypto-every", type=float, default=2, help="crypto cadence (scaled down)")
+    parser.add_argument("--stock-every", type=float, default=6, help="stock/etf cadence (scaled down)")
+    parser.add_argument("--tick", type=float, default=0.25)
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per provider call")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scheduler.db"
+        info, failing = seed(path, args.assets, args.crypto_ratio, args.held_ratio, args.failing, rng)
+        result = asyncio.run(simulate(path, args, info, failing, rng))
+
+    scheduler, provider, refreshes = result["scheduler"], result["provider"], result["refreshes"]
+    print_table(["milestone", "seconds"], [
+        ["all held assets refreshed once", f"{result['held_done']:.2f}"],
+        ["all assets refreshed once", f"{result['all_done']:.2f}"],
+    ])
+    print()
+
+    by_type = {}
+    for asset_id, (ticker, asset_type, held) in info.items():
+        if ticker in failing or asset_type == AssetType.fiat:
+            continue
+        by_type.setdefault(asset_type.value, []).append(refreshes.get(asset_id, 0))
+    expected = {"crypto": args.seconds / args.crypto_every, "stock": args.seconds / args.stock_every}
+    print_table(["type", "assets", "refreshes/asset", "cadence bound"], [
+        [t, len(counts), f"{statistics.mean(counts):.2f}", f"<= {expected[t] + 2:.1f}"] for t, counts in by_type.items()
+    ])
+    print()
+
+    ticks = args.seconds / args.tick
+    failing_attempts = [provider.attempts[s] for s in failing]
+    latencies = sorted(result["read_latencies"])
+    print_table(["metric", "value"], [
+        ["scheduler runs", scheduler.runs],
+        ["provider calls", provider.calls],
+        ["trigger() calls", result["triggers"]],
+        ["attempts per failing symbol (max)", f"{max(failing_attempts)} (vs ~{ticks:.0f} ticks)"],
+        ["read p50 ms", f"{latencies[len(latencies) // 2] * 1000:.1f}"],
+        ["read p99 ms", f"{latencies[int(len(latencies) * 0.99)] * 1000:.1f}"],
+        ["provider latency ms", f"{args.latency * 1000:.0f}"],
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Batch transaction writes: throughput vs. batch size.
+
+Posts the same stream of fills (spread over a few accounts and assets, in
+time order like a trading job would send them) through
+TransactionService.create_transactions in batches of each size, then updates
+and deletes them in batches of the same size. Batch size 1 is the per-request
+baseline. Also counts the position writes per batch (should be at most one
+per touched position plus one cash position per account) and checks that the
+stored positions match a full replay. Uses a file-backed SQLite database with
+the app's PRAGMAs.
+
+    python -m benchmarks.bench_transaction_batches [--rows 2000] [--sizes 1 10 100 1000]
+"""
+import argparse
+import random
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import batched
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position, TransactionType
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2021, 1, 1)
+
+
+def seed(engine, accounts: int, assets: int) -> tuple[list[int], list[int]]:
+    with Session(engine) as session:
+        account_rows = [Account(name=f"batch-{i}") for i in range(accounts)]
+        asset_rows = [Asset(ticker=f"BAT{i:03d}", name="Batch", type=AssetType.stock, current_price=Decimal(100))
+                      for i in range(assets)]
+        session.add_all(account_rows + asset_rows)
+        session.commit()
+        account_ids = [a.id for a in account_rows]
+        service = TransactionService(session)
+        cash_asset_id = service.position_service.get_cash_asset_id(account_ids[0])
+        service.create_transactions([
+            TransactionCreate(account_id=account_id, asset_id=cash_asset_id, type=TransactionType.deposit,
+                              quantity=Decimal(10_000_000), price_per_unit=Decimal(1), transaction_time=START)
+            for account_id in account_ids
+        ])
+        return account_ids, [a.id for a in asset_rows]
+
+
+def fills(rows: int, account_ids: list[int], asset_ids: list[int], rng: random.Random) -> list[dict]:
+    return [dict(
+        account_id=rng.choice(account_ids),
+        asset_id=rng.choice(asset_ids),
+        type=TransactionType.buy if rng.random() < 0.7 else TransactionType.sell,
+        quantity=Decimal(rng.randint(1, 10)),
+        price_per_unit=Decimal(rng.randint(50, 150)),
+        fee=Decimal(1),
+        transaction_time=START + timedelta(seconds=i + 1),
+    ) for i in range(rows)]
+
+
+def positions_match_replay(session: Session) -> bool:
+    stored = {(p.account_id, p.asset_id): (p.total_quantity, p.average_cost)
+              for p in session.exec(select(Position)).all()}
+    positions = PositionService(session)
+    for account_id, asset_id in stored:
+        if asset_id == positions.get_cash_asset_id(account_id):
+            positions.rebuild_cash_position(account_id)
+        else:
+            positions.rebuild_asset_position(account_id, asset_id)
+    session.expire_all()
+    replayed = {(p.account_id, p.asset_id): (p.total_quantity, p.average_cost)
+                for p in session.exec(select(Position)).all()}
+    session.rollback()
+    return stored == replayed
+
+
+def run(path: Path, batch_size: int, args, rng: random.Random) -> list:
+    engine = make_engine(f"sqlite:///{path}")
+    account_ids, asset_ids = seed(engine, args.accounts, args.assets)
+    stream = fills(args.rows, account_ids, asset_ids, rng)
+
+    position_writes = 0
+
+    def count_position_writes(conn, cursor, statement, parameters, context, executemany):
+        nonlocal position_writes
+        if statement.startswith(("INSERT INTO positions", "UPDATE positions")):
+            position_writes += len(parameters) if executemany else 1
+
+    event.listen(engine, "before_cursor_execute", count_position_writes)
+    with Session(engine) as session:
+        service = TransactionService(session)
+        ids = []
+        with timer() as create_elapsed:
+            for batch in batched(stream, batch_size):
+                if batch_size == 1:
+                    ids.append(service.create_transaction(TransactionCreate(**batch[0])).id)
+                else:
+                    ids.extend(t.id for t in service.create_transactions([TransactionCreate(**f) for f in batch]))
+        batches = -(-args.rows // batch_size)
+        writes_per_batch = position_writes / batches
+
+        with timer() as update_elapsed:
+            for batch in batched(ids, batch_size):
+                transactions = service.get_transactions_by_ids(batch)
+                service.update_transactions([
+                    (transactions[i], TransactionUpdate(price_per_unit=Decimal(rng.randint(50, 150))))
+                    for i in batch
+                ])
+        matches = positions_match_replay(session)
+
+        with timer() as delete_elapsed:
+            for batch in batched(ids, batch_size):
+                service.delete_transactions(list(service.get_transactions_by_ids(batch).values()))
+    event.remove(engine, "before_cursor_execute", count_position_writes)
+    engine.dispose()
+
+    return [batch_size, f"{args.rows / create_elapsed():.0f}", f"{args.rows / update_elapsed():.0f}",
+            f"{args.rows / delete_elapsed():.0f}", f"{writes_per_batch:.1f}", "ok" if matches else "MISMATCH"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--accounts", type=int, default=2)
+    parser.add_argument("--assets", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in args.sizes:
+            rows.append(run(Path(tmp) / f"batch-{batch_size}.db", batch_size, args, random.Random(args.seed)))
+
+    print_table(["batch size", "create rows/s", "update rows/s", "delete rows/s",
+                 "position writes/batch", "replay-equal"], rows)
+
+
+if __name__ == "__main__":
+    main()
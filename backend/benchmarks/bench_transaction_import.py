@@ -0,0 +1,170 @@
+"""
+Bulk transaction import vs. one create per row.
+
+Writes a deterministic CSV (and NDJSON) broker history, imports it through
+TransactionImportService, then imports it again (every row a duplicate).
+The per-row baseline replays TransactionService.create_transaction on a
+sample of the same rows. Peak traced memory is measured in a separate pass
+(tracemalloc slows the import down) on fresh databases for 1/10 of the file
+and the whole file: it should not grow with the file size.
+
+    python -m benchmarks.bench_transaction_import [--rows 50000] [--sample 500]
+"""
+import argparse
+import csv
+import json
+import random
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position, TransactionType
+from app.schemas.transaction import TransactionCreate
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+from app.services.transaction_import import TransactionImportService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2015, 1, 1)
+FIELDS = ["account_id", "ticker", "type", "quantity", "price_per_unit", "fee", "transaction_time", "notes"]
+
+
+def write_history(path: Path, rows: int, accounts: list[int], tickers: list[str], rng: random.Random) -> None:
+    with path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for i in range(rows):
+            writer.writerow({
+                "account_id": rng.choice(accounts),
+                "ticker": rng.choice(tickers),
+                "type": TransactionType.buy.value if rng.random() < 0.7 else TransactionType.sell.value,
+                "quantity": rng.randint(1, 10),
+                "price_per_unit": f"{rng.uniform(10, 500):.4f}",
+                "fee": "1",
+                "transaction_time": (START + timedelta(minutes=i)).isoformat(),
+                "notes": "",
+            })
+
+
+def to_ndjson(csv_path: Path, ndjson_path: Path) -> None:
+    with csv_path.open(newline="") as src, ndjson_path.open("w") as dst:
+        for row in csv.DictReader(src):
+            dst.write(json.dumps({k: v for k, v in row.items() if v}) + "\n")
+
+
+def seed(engine, accounts: int, assets: int) -> tuple[list[int], dict[str, int]]:
+    with Session(engine) as session:
+        account_rows = [Account(name=f"import-{i}") for i in range(accounts)]
+        asset_rows = [Asset(ticker=f"IMP{i:03d}", name="Import", type=AssetType.stock, current_price=Decimal(100))
+                      for i in range(assets)]
+        session.add_all(account_rows + asset_rows)
+        session.commit()
+        return [a.id for a in account_rows], {a.ticker: a.id for a in asset_rows}
+
+
+def run_import(engine, path: Path, fmt: str, limit: int | None = None):
+    with Session(engine) as session, path.open(newline="") as f:
+        service = TransactionImportService(session)
+        rows = service.read_ndjson(f) if fmt == "ndjson" else service.read_csv(f)
+        if limit is not None:
+            rows = (row for _, row in zip(range(limit), rows))
+        with timer() as elapsed:
+            result = service.import_rows(rows)
+    return result, elapsed()
+
+
+def peak_memory_mb(path: Path, rows: int, accounts: int, assets: int) -> float:
+    engine = make_engine()
+    seed(engine, accounts, assets)
+    tracemalloc.start()
+    run_import(engine, path, "csv", limit=rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    engine.dispose()
+    return peak / 1024 / 1024
+
+
+def check_positions(engine, account_ids: list[int]) -> bool:
+    """
+    匯入後的持倉要與逐筆重播的結果一致。
+    """
+    with Session(engine) as session:
+        stored = {(p.account_id, p.asset_id): (p.total_quantity, p.average_cost)
+                  for p in session.exec(select(Position).where(Position.account_id.in_(account_ids))).all()}
+        positions = PositionService(session)
+        for account_id, asset_id in stored:
+            if asset_id != positions.get_cash_asset_id(account_id):
+                positions.rebuild_asset_position(account_id, asset_id)
+            else:
+                positions.rebuild_cash_position(account_id)
+        positions.session.expire_all()
+        replayed = {(p.account_id, p.asset_id): (p.total_quantity, p.average_cost)
+                    for p in session.exec(select(Position).where(Position.account_id.in_(account_ids))).all()}
+    return stored == replayed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--assets", type=int, default=50)
+    parser.add_argument("--sample", type=int, default=500, help="rows for the one-create-per-row baseline")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = make_engine()
+    account_ids, tickers = seed(engine, args.accounts, args.assets)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "history.csv"
+        ndjson_path = Path(tmp) / "history.ndjson"
+        write_history(csv_path, args.rows, account_ids, list(tickers), rng)
+        to_ndjson(csv_path, ndjson_path)
+
+        for label, path, fmt in [("csv", csv_path, "csv"), ("csv again", csv_path, "csv"),
+                                 ("ndjson (same rows)", ndjson_path, "ndjson")]:
+            result, seconds = run_import(engine, path, fmt)
+            rows.append([label, result.rows, result.imported, result.duplicates, len(result.errors),
+                         f"{seconds:.2f}", f"{result.rows / seconds:.0f}"])
+
+        # 逐筆新增 (舊的做法) 的基準：取前 sample 筆，寫到另一組帳戶
+        with Session(engine) as session, csv_path.open(newline="") as f:
+            baseline_account = Account(name="per-row")
+            session.add(baseline_account)
+            session.commit()
+            service = TransactionService(session)
+            sample = [row for _, row in zip(range(args.sample), csv.DictReader(f))]
+            with timer() as per_row_elapsed:
+                for row in sample:
+                    service.create_transaction(TransactionCreate(
+                        account_id=baseline_account.id,
+                        asset_id=tickers[row["ticker"]],
+                        type=row["type"],
+                        quantity=Decimal(row["quantity"]),
+                        price_per_unit=Decimal(row["price_per_unit"]),
+                        fee=Decimal(row["fee"]),
+                        transaction_time=datetime.fromisoformat(row["transaction_time"]),
+                    ))
+            rate = len(sample) / per_row_elapsed()
+            rows.append(["per-row create", len(sample), len(sample), 0, 0,
+                         f"{per_row_elapsed():.2f}", f"{rate:.0f}"])
+
+        memory = [[n, f"{peak_memory_mb(csv_path, n, args.accounts, args.assets):.1f}"]
+                  for n in (args.rows // 10, args.rows)]
+
+    print_table(["run", "rows", "imported", "duplicates", "errors", "seconds", "rows/s"], rows)
+    print(f"positions match full replay: {'ok' if check_positions(engine, account_ids) else 'MISMATCH'}")
+    print()
+    print_table(["rows", "peak MB"], memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Transaction listing: OFFSET vs. keyset cursor at increasing page depth.
+
+Seeds one account with N transactions (pairs share a timestamp to exercise
+the id tie-breaker) and times fetching a 100-row page at several depths with
+`offset` and with the cursor of the preceding row. Also checks that walking
+the first pages by cursor returns the same rows as walking them by offset.
+
+    python -m benchmarks.bench_transaction_pages [--rows 1000000] [--depths 0 10000 100000 900000]
+"""
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import batched
+
+from sqlmodel import Session, insert, select
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.services.transaction import TransactionService, encode_cursor
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2000, 1, 1)
+PAGE = 100
+
+
+def seed(session: Session, rows: int) -> int:
+    account = Account(name="pages")
+    asset = Asset(ticker="PAGE", name="Page", type=AssetType.stock, current_price=Decimal(1))
+    session.add_all([account, asset])
+    session.commit()
+    for chunk in batched(range(rows), 50_000):
+        session.execute(insert(Transaction), [
+            {
+                "account_id": account.id,
+                "asset_id": asset.id,
+                "type": TransactionType.buy,
+                "quantity": Decimal(1),
+                "price_per_unit": Decimal(1),
+                "fee": Decimal(0),
+                "transaction_time": START + timedelta(seconds=i // 2),
+            }
+            for i in chunk
+        ])
+    session.commit()
+    return account.id
+
+
+def cursor_at(session: Session, account_id: int, depth: int) -> str | None:
+    """
+    第 depth 筆 (依列表順序) 之前那一筆的游標，模擬 client 一路翻頁到這裡。
+    """
+    if depth == 0:
+        return None
+    row = session.exec(
+        select(Transaction.transaction_time, Transaction.id)
+        .where(Transaction.account_id == account_id)
+        .order_by(Transaction.transaction_time.desc(), Transaction.id.desc())
+        .offset(depth - 1)
+        .limit(1)
+    ).one()
+    return encode_cursor(*row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--depths", type=int, nargs="+", default=[0, 10_000, 100_000, 900_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = make_engine()
+    rows = []
+    with Session(engine) as session:
+        account_id = seed(session, args.rows)
+        service = TransactionService(session)
+
+        for depth in (d for d in args.depths if d < args.rows):
+            cursor = cursor_at(session, account_id, depth)
+            with timer() as offset_elapsed:
+                for _ in range(args.repeat):
+                    by_offset = service.get_transactions(offset=depth, limit=PAGE, account_id=account_id)
+            with timer() as cursor_elapsed:
+                for _ in range(args.repeat):
+                    by_cursor = service.get_transactions(limit=PAGE, account_id=account_id, cursor=cursor)
+            rows.append([
+                depth,
+                f"{offset_elapsed() / args.repeat * 1000:.2f}",
+                f"{cursor_elapsed() / args.repeat * 1000:.2f}",
+                "ok" if [t.id for t in by_offset] == [t.id for t in by_cursor] else "MISMATCH",
+            ])
+
+        cursor, walked = None, []
+        for _ in range(5):
+            page = service.get_transactions(limit=PAGE, account_id=account_id, cursor=cursor)
+            walked += [t.id for t in page]
+            cursor = encode_cursor(page[-1].transaction_time, page[-1].id)
+        expected = [t.id for t in service.get_transactions(limit=5 * PAGE, account_id=account_id)]
+        walk_status = "ok" if walked == expected else "MISMATCH"
+
+    print_table(["depth", "offset ms/page", "cursor ms/page", "same rows"], rows)
+    print(f"cursor walk vs. single query: {walk_status}")
+
+
+if __name__ == "__main__":
+    main()
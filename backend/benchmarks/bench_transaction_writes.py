@@ -0,0 +1,97 @@
+"""
+Transaction write latency vs. account history size.
+
+Appending a transaction should cost the same no matter how many rows the
+(account, asset) pair already has; a full replay grows linearly.
+Equivalence with a full replay is covered by tests/test_positions.py.
+
+    python -m benchmarks.bench_transaction_writes [--writes 200] [--sizes 100 1000 10000]
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlmodel import Session
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.schemas.transaction import TransactionCreate
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2015, 1, 1)
+
+
+def seed_history(session: Session, size: int, rng: random.Random) -> tuple[int, int]:
+    account = Account(name=f"bench-{size}")
+    asset = Asset(ticker=f"BENCH{size}", name="Bench", type=AssetType.stock, current_price=Decimal(100))
+    session.add_all([account, asset])
+    session.commit()
+
+    rows = [Transaction(account_id=account.id, type=TransactionType.deposit,
+                        quantity=Decimal(10_000_000), price_per_unit=Decimal(1), transaction_time=START)]
+    for i in range(size):
+        txn_type = TransactionType.buy if i % 3 else TransactionType.sell
+        rows.append(Transaction(
+            account_id=account.id,
+            asset_id=asset.id,
+            type=txn_type,
+            quantity=Decimal(rng.randint(1, 10)) if txn_type == TransactionType.buy else Decimal(1),
+            price_per_unit=Decimal(rng.randint(50, 150)),
+            fee=Decimal(1),
+            transaction_time=START + timedelta(minutes=i + 1),
+        ))
+    session.add_all(rows)
+    session.commit()
+
+    positions = PositionService(session)
+    positions.rebuild_asset_position(account.id, asset.id)
+    positions.rebuild_cash_position(account.id)
+    session.commit()
+    return account.id, asset.id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engine = make_engine()
+    rows = []
+    for size in args.sizes:
+        with Session(engine) as session:
+            account_id, asset_id = seed_history(session, size, rng)
+            service = TransactionService(session)
+
+            with timer() as append_elapsed:
+                for i in range(args.writes):
+                    service.create_transaction(TransactionCreate(
+                        account_id=account_id,
+                        asset_id=asset_id,
+                        type=TransactionType.buy,
+                        quantity=Decimal(1),
+                        price_per_unit=Decimal(rng.randint(50, 150)),
+                        transaction_time=START + timedelta(minutes=size + i + 1),
+                    ))
+
+            with timer() as replay_elapsed:
+                for _ in range(args.writes):
+                    service.position_service.rebuild_asset_position(account_id, asset_id)
+                    service.position_service.rebuild_cash_position(account_id)
+
+            rows.append([
+                size,
+                f"{append_elapsed() / args.writes * 1000:.2f}",
+                f"{replay_elapsed() / args.writes * 1000:.2f}",
+            ])
+
+    print_table(["history", "append ms/write", "full replay ms/write"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Write throughput with one commit per request vs. one commit per step.
+
+Runs the same create / update / delete workload through TransactionService
+twice on a file-backed SQLite database: once as it is now (every write
+endpoint flushes and commits once) and once with the previous behaviour,
+where the transaction row and every position update were committed
+separately. Each commit is an fsync with synchronous=FULL, so the commit
+count per write dominates the latency. Commits are counted with an engine
+"commit" event listener.
+
+    python -m benchmarks.bench_unit_of_work [--writes 300] [--dir /path/on/real/disk]
+"""
+import argparse
+import random
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2020, 1, 1)
+
+CONFIGS = {
+    "rollback journal, synchronous=FULL": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "WAL, synchronous=FULL": {"journal_mode": "WAL", "synchronous": "FULL"},
+    "WAL, synchronous=NORMAL (app default)": {"journal_mode": "WAL", "synchronous": "NORMAL"},
+}
+
+
+class CommitPerStepPositionService(PositionService):
+    """
+    舊的做法：每次更新持倉都各自 commit。
+    """
+
+    def _save_position(self, *args, **kwargs) -> None:
+        super()._save_position(*args, **kwargs)
+        self.session.commit()
+
+
+class CommitPerStepTransactionService(TransactionService):
+    """
+    舊的做法：先 commit 交易本身，再由 PositionService 逐一 commit 持倉。
+    """
+
+    def __init__(self, session: Session):
+        super().__init__(session)
+        self.position_service = CommitPerStepPositionService(session)
+
+    def create_transaction(self, transaction_in: TransactionCreate) -> Transaction:
+        db_transaction = Transaction.model_validate(transaction_in)
+        self.session.add(db_transaction)
+        self.session.commit()
+        self.session.refresh(db_transaction)
+        self.position_service.on_create(db_transaction)
+        return db_transaction
+
+    def update_transaction(self, transaction: Transaction, transaction_in: TransactionUpdate) -> Transaction:
+        old_transaction = Transaction(**transaction.model_dump())
+        transaction.sqlmodel_update(transaction_in.model_dump(exclude_unset=True))
+        self.session.add(transaction)
+        self.session.commit()
+        self.session.refresh(transaction)
+        self.position_service.on_update(old_transaction, transaction)
+        return transaction
+
+    def delete_transaction(self, transaction: Transaction) -> None:
+        old_transaction = Transaction(**transaction.model_dump())
+        self.session.delete(transaction)
+        self.session.commit()
+        self.position_service.on_delete(old_transaction)
+
+
+def seed(engine) -> tuple[int, int, int]:
+    with Session(engine) as session:
+        account = Account(name="uow")
+        asset = Asset(ticker="UOW", name="Unit of work", type=AssetType.stock, current_price=Decimal(100))
+        session.add_all([account, asset])
+        session.commit()
+        service = TransactionService(session)
+        cash_asset_id = service.position_service.get_cash_asset_id(account.id)
+        service.create_transaction(TransactionCreate(
+            account_id=account.id, asset_id=cash_asset_id, type=TransactionType.deposit,
+            quantity=Decimal(10_000_000), price_per_unit=Decimal(1), transaction_time=START,
+        ))
+        return account.id, asset.id, cash_asset_id
+
+
+def run_workload(engine, service_cls, writes: int, rng: random.Random) -> list[tuple[str, int, float, int]]:
+    """
+    依序跑 create / update / delete，回傳每一種的 (名稱, 筆數, 秒數, commit 數)。
+    """
+    account_id, asset_id, _ = seed(engine)
+    commits = 0
+
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    event.listen(engine, "commit", count_commit)
+    results = []
+    try:
+        with Session(engine) as session:
+            service = service_cls(session)
+            created = []
+
+            commits = 0
+            with timer() as elapsed:
+                for i in range(writes):
+                    created.append(service.create_transaction(TransactionCreate(
+                        account_id=account_id, asset_id=asset_id, type=TransactionType.buy,
+                        quantity=Decimal(rng.randint(1, 10)), price_per_unit=Decimal(rng.randint(50, 150)),
+                        fee=Decimal(1), transaction_time=START + timedelta(minutes=i + 1),
+                    )).id)
+            results.append(("create", writes, elapsed(), commits))
+
+            edits = created[: writes // 2]
+            commits = 0
+            with timer() as elapsed:
+                for transaction_id in edits:
+                    service.update_transaction(service.get_transaction(transaction_id),
+                                               TransactionUpdate(price_per_unit=Decimal(rng.randint(50, 150))))
+            results.append(("update", len(edits), elapsed(), commits))
+
+            commits = 0
+            with timer() as elapsed:
+                for transaction_id in edits:
+                    service.delete_transaction(service.get_transaction(transaction_id))
+            results.append(("delete", len(edits), elapsed(), commits))
+    finally:
+        event.remove(engine, "commit", count_commit)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=300)
+    parser.add_argument("--dir", default=None, help="directory for the database files (defaults to a temp dir)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for config_name, pragmas in CONFIGS.items():
+            measured = {}
+            for label, service_cls in [("commit per step", CommitPerStepTransactionService),
+                                       ("one commit", TransactionService)]:
+                path = Path(tmp) / f"{len(rows)}-{service_cls.__name__}.db"
+                engine = make_engine(f"sqlite:///{path}", pragmas)
+                measured[label] = run_workload(engine, service_cls, args.writes, random.Random(args.seed))
+                engine.dispose()
+
+            for before, after in zip(measured["commit per step"], measured["one commit"]):
+                op, count = before[0], before[1]
+                rows.append([
+                    config_name, op,
+                    f"{before[3] / count:.1f}", f"{after[3] / count:.1f}",
+                    f"{count / before[2]:.0f}", f"{count / after[2]:.0f}",
+                    f"{before[2] / after[2]:.1f}x",
+                ])
+
+    print_table(["config", "op", "commits/write before", "after", "writes/s before", "after", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
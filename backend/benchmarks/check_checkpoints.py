@@ -0,0 +1,242 @@
+"""
+Checks position checkpoints (CheckpointService) and the as-of holdings query.
+
+1. A small ledger with a tiny --interval: holdings as of random dates must
+   equal a replay of every transaction up to that date. After each of a
+   series of back-dated creates, edits and deletes (replayed from the
+   nearest checkpoint), positions, tax lots and realized gains must equal a
+   full rebuild, and every checkpoint must equal the replay up to its
+   transaction.
+2. One account with --transactions trades at the configured interval: the
+   as-of query versus a full replay (median of --repeat), and a back-dated
+   edit near the end versus one near the start of the ledger.
+
+    python -m benchmarks.check_checkpoints [--transactions 100000] [--interval 20] [--repeat 20]
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.transacions import Position, PositionCheckpoint, Transaction, TransactionType
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.position import REPLAY_COLUMNS, HoldingAsOf, PositionService, apply_transaction, cash_flow
+from app.services.transaction import TransactionService
+from benchmarks.check_tax_lots import snapshot
+from benchmarks.common import make_engine, print_table, timer
+from benchmarks.datagen import START, DatasetSpec, generate
+
+
+def q(value: Decimal) -> Decimal:
+    return Decimal(value).quantize(Decimal("0.000001"))
+
+
+def replayed_holdings(session: Session, account_id: int, as_of, cash_asset_id: int) -> list[HoldingAsOf]:
+    """
+    不用 checkpoint：重播帳戶在 as_of 之前的所有交易。
+    """
+    totals, cash = {}, Decimal(0)
+    for txn in session.exec(select(Transaction.asset_id, *REPLAY_COLUMNS)
+                            .where(Transaction.account_id == account_id, Transaction.transaction_time <= as_of)
+                            .order_by(Transaction.transaction_time, Transaction.id)):
+        cash += cash_flow(txn)
+        if txn.asset_id and txn.asset_id != cash_asset_id:
+            totals[txn.asset_id] = apply_transaction(*totals.get(txn.asset_id, (Decimal(0), Decimal(0))), txn)
+    holdings = [
+        HoldingAsOf(asset_id, qty, cost / qty if qty > 0 else Decimal(0))
+        for asset_id, (qty, cost) in sorted(totals.items()) if qty != 0
+    ]
+    if cash != 0:
+        holdings.append(HoldingAsOf(cash_asset_id, cash, Decimal(1.0)))
+    return holdings
+
+
+def rounded(holdings: list[HoldingAsOf]) -> list[tuple]:
+    return [(h.asset_id, q(h.quantity), q(h.average_cost)) for h in holdings]
+
+
+def checkpoints_valid(session: Session, account_id: int, cash_asset_id: int) -> bool:
+    """
+    每個 checkpoint 都要等於重播到它那筆交易為止的結果 (現金是整個帳戶的交易)。
+    """
+    rows = session.exec(select(Transaction).where(Transaction.account_id == account_id)
+                        .order_by(Transaction.transaction_time, Transaction.id)).all()
+    expected, totals, cash = {}, {}, Decimal(0)
+    for txn in rows:
+        cash += cash_flow(txn)
+        expected[(cash_asset_id, txn.id)] = (q(cash), q(cash))
+        if txn.asset_id and txn.asset_id != cash_asset_id:
+            totals[txn.asset_id] = apply_transaction(*totals.get(txn.asset_id, (Decimal(0), Decimal(0))), txn)
+            qty, cost = totals[txn.asset_id]
+            expected[(txn.asset_id, txn.id)] = (q(qty), q(cost))
+    checkpoints = session.exec(select(PositionCheckpoint.asset_id, PositionCheckpoint.transaction_id,
+                                      PositionCheckpoint.total_quantity, PositionCheckpoint.total_cost)
+                               .where(PositionCheckpoint.account_id == account_id)).all()
+    return bool(checkpoints) and all(
+        expected.get((row.asset_id, row.transaction_id)) == (q(row.total_quantity), q(row.total_cost))
+        for row in checkpoints
+    )
+
+
+def positions(session: Session, account_id: int) -> list[tuple]:
+    return [
+        (row.asset_id, q(row.total_quantity), q(row.average_cost))
+        for row in session.exec(select(Position).where(Position.account_id == account_id)
+                                .order_by(Position.asset_id).execution_options(populate_existing=True))
+    ]
+
+
+def matches_rebuild(session: Session, account_id: int) -> bool:
+    before = positions(session, account_id), snapshot(session, account_id)
+    PositionService(session).rebuild_account(account_id)
+    session.flush()
+    after = positions(session, account_id), snapshot(session, account_id)
+    session.rollback()
+    return before == after
+
+
+def check_small(path: Path, interval: int, steps: int) -> tuple[list[list], bool]:
+    settings.POSITION_CHECKPOINT_INTERVAL = interval
+    engine = make_engine(f"sqlite:///{path}")
+    spec = DatasetSpec(accounts=2, portfolios=1, accounts_per_portfolio=2, assets=10, assets_per_account=5,
+                       transactions=3_000, price_days=365)
+    dataset = generate(engine, spec)
+    account_id, cash_asset_id = dataset.account_ids[0], dataset.cash_asset_id
+    rng = random.Random(7)
+    span = (dataset.end - START).total_seconds()
+    rows, ok = [], True
+
+    with Session(engine) as session:
+        dates = [START + timedelta(seconds=rng.uniform(0, span)) for _ in range(20)] + [START, dataset.end]
+        passed = all(
+            rounded(PositionService(session).get_holdings_as_of(account_id, as_of))
+            == rounded(replayed_holdings(session, account_id, as_of, cash_asset_id))
+            for as_of in dates
+        )
+        ok &= passed
+        rows.append([f"as-of == replay ({len(dates)} dates)", "ok" if passed else "FAIL"])
+        passed = checkpoints_valid(session, account_id, cash_asset_id)
+        ok &= passed
+        rows.append(["generated checkpoints", "ok" if passed else "FAIL"])
+
+        def load(transaction_id: int) -> Transaction:
+            transaction = session.get(Transaction, transaction_id)
+            session.refresh(transaction)
+            return transaction
+
+        failures = 0
+        for step in range(steps):
+            ids = session.exec(select(Transaction.id).where(
+                Transaction.account_id == account_id, Transaction.asset_id != cash_asset_id,
+                Transaction.type.in_([TransactionType.buy, TransactionType.sell]),
+            )).all()
+            service = TransactionService(session)
+            action = step % 3
+            if action == 0:
+                service.create_transaction(TransactionCreate(
+                    account_id=account_id, asset_id=rng.choice(dataset.holdings[account_id]),
+                    type=TransactionType.buy, quantity=Decimal(rng.randint(1, 20)), price_per_unit=Decimal(50),
+                    fee=Decimal(1), transaction_time=START + timedelta(seconds=rng.uniform(0, span)),
+                ))
+            elif action == 1:
+                transaction = load(rng.choice(ids))
+                service.update_transaction(transaction, TransactionUpdate(
+                    quantity=transaction.quantity + 1,
+                    transaction_time=transaction.transaction_time - timedelta(days=rng.randint(0, 30)),
+                ))
+            else:
+                service.delete_transaction(load(rng.choice(ids)))
+            if not (matches_rebuild(session, account_id) and checkpoints_valid(session, account_id, cash_asset_id)):
+                failures += 1
+        ok &= failures == 0
+        rows.append([f"back-dated writes == rebuild ({steps} steps)", "ok" if failures == 0 else f"FAIL ({failures})"])
+
+        as_of = START + timedelta(seconds=span / 2)
+        passed = (rounded(PositionService(session).get_holdings_as_of(account_id, as_of))
+                  == rounded(replayed_holdings(session, account_id, as_of, cash_asset_id)))
+        ok &= passed
+        rows.append(["as-of == replay after writes", "ok" if passed else "FAIL"])
+    engine.dispose()
+    return rows, ok
+
+
+def check_scale(path: Path, transactions: int, repeat: int) -> tuple[list[list], bool]:
+    settings.POSITION_CHECKPOINT_INTERVAL = 500
+    engine = make_engine(f"sqlite:///{path}")
+    spec = DatasetSpec(accounts=1, portfolios=1, accounts_per_portfolio=1, assets=20, assets_per_account=20,
+                       transactions=transactions, price_days=730)
+    with timer() as elapsed:
+        dataset = generate(engine, spec)
+    rows = [["generate + replay", f"{elapsed() * 1000:.0f}"]]
+    account_id, cash_asset_id = dataset.account_ids[0], dataset.cash_asset_id
+    as_of = START + (dataset.end - START) * 0.9
+
+    with Session(engine) as session:
+        service = PositionService(session)
+        samples, expected = [], None
+        for _ in range(repeat):
+            with timer() as elapsed:
+                holdings = service.get_holdings_as_of(account_id, as_of)
+            samples.append(elapsed() * 1000)
+        rows.append([f"holdings as of (checkpoint + tail, {len(holdings)} holdings)",
+                     f"{statistics.median(samples):.2f}"])
+        samples = []
+        for _ in range(max(repeat // 4, 1)):
+            with timer() as elapsed:
+                expected = replayed_holdings(session, account_id, as_of, cash_asset_id)
+            samples.append(elapsed() * 1000)
+        ok = rounded(holdings) == rounded(expected)
+        rows.append([f"holdings as of (full replay, {'ok' if ok else 'FAIL'})", f"{statistics.median(samples):.2f}"])
+
+        # 同一個資產最後面 / 最前面的一筆買入改數量：前者只重播 checkpoint 之後的尾端
+        asset_id = dataset.holdings[account_id][0]
+        buys = session.exec(select(Transaction.id).where(
+            Transaction.account_id == account_id, Transaction.asset_id == asset_id,
+            Transaction.type == TransactionType.buy,
+        ).order_by(Transaction.transaction_time, Transaction.id)).all()
+        for label, transaction_ids in (("recent", buys[-repeat:]), ("oldest", buys[:max(repeat // 4, 1)])):
+            samples = []
+            for transaction_id in transaction_ids:
+                transaction = session.get(Transaction, transaction_id)
+                session.refresh(transaction)
+                with timer() as elapsed:
+                    TransactionService(session).update_transaction(
+                        transaction, TransactionUpdate(quantity=transaction.quantity + 1))
+                samples.append(elapsed() * 1000)
+            rows.append([f"back-dated edit, {label} buy (update_transaction)", f"{statistics.median(samples):.2f}"])
+    engine.dispose()
+    return rows, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--interval", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    interval = settings.POSITION_CHECKPOINT_INTERVAL
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            small, small_ok = check_small(Path(tmp) / "small.db", args.interval, args.steps)
+            scale, scale_ok = check_scale(Path(tmp) / "scale.db", args.transactions, args.repeat)
+    finally:
+        settings.POSITION_CHECKPOINT_INTERVAL = interval
+
+    print_table([f"interval {args.interval}", "result"], small)
+    print()
+    print_table([f"{args.transactions} trades, one account, interval 500", "ms"], scale)
+    if not (small_ok and scale_ok):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
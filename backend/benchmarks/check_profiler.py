@@ -0,0 +1,219 @@
+"""
+Checks the on-demand request profiler against GET /portfolios/{id}/summary.
+
+1. A flagged request (X-Profile: 1, and ?profile=1) from an allowed client
+   gets X-Profile-Id and leaves a loadable .pstats (containing the summary
+   service call), a non-empty .collapsed file and a .sql.json whose statement
+   count matches what the engine executed.
+2. Unflagged requests, flagged requests from a client outside the allowlist
+   and a flagged request while another profile is running write nothing.
+3. Median latency: without the middleware (PROFILING_ENABLED=false), with the
+   middleware but unflagged, and profiled.
+
+    python -m benchmarks.check_profiler [--accounts 5] [--assets 30] [--requests 300]
+"""
+import argparse
+import asyncio
+import json
+import pstats
+import statistics
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.api.v1.api import api_router
+from app.core.cache import portfolio_summary_cache
+from app.core.database import SQLiteDB
+from app.core.metrics import MetricsMiddleware, instrument_engine, uninstrument_engine
+from app.core.profiling import ProfilingMiddleware
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import TransactionType
+from app.schemas.portfolio import PortfolioCreate
+from app.schemas.transaction import TransactionCreate
+from app.services.market_data import MarketDataService
+from app.services.portfolio import PortfolioService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2024, 1, 1)
+
+
+def seed(engine, accounts: int, assets: int) -> int:
+    with Session(engine) as session:
+        account_rows = [Account(name=f"profile-{i}") for i in range(accounts)]
+        asset_rows = [Asset(ticker=f"PRF{i:03d}", name="Profile", type=AssetType.stock, current_price=Decimal(10))
+                      for i in range(assets)]
+        session.add_all(account_rows + asset_rows)
+        session.commit()
+
+        service = TransactionService(session)
+        cash_asset_id = service.position_service.get_cash_asset_id(account_rows[0].id)
+        fills = []
+        for account in account_rows:
+            fills.append(TransactionCreate(
+                account_id=account.id, asset_id=cash_asset_id, type=TransactionType.deposit,
+                quantity=Decimal(1_000_000), price_per_unit=Decimal(1), transaction_time=START,
+            ))
+            fills.extend(TransactionCreate(
+                account_id=account.id, asset_id=asset.id, type=TransactionType.buy,
+                quantity=Decimal(5), price_per_unit=Decimal(10), transaction_time=START + timedelta(days=i + 1),
+            ) for i, asset in enumerate(asset_rows))
+        service.create_transactions(fills)
+        MarketDataService(session).ingest(
+            (asset.id, START + timedelta(days=day), Decimal(10 + day)) for asset in asset_rows for day in range(30)
+        )
+        session.commit()
+        return PortfolioService(session).create_portfolio(
+            PortfolioCreate(name="profile", account_ids=[a.id for a in account_rows])
+        ).id
+
+
+def make_app(engine, profile_dir: Path | None) -> FastAPI:
+    app = FastAPI()
+    if profile_dir is not None:
+        # httpx 的 ASGITransport 預設 client 是 127.0.0.1
+        app.add_middleware(ProfilingMiddleware, directory=str(profile_dir), allowed_clients=["127.0.0.1"])
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(api_router, prefix="/api/v1")
+
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[SQLiteDB.get_session] = get_session
+    return app
+
+
+def client(app: FastAPI, host: str = "127.0.0.1") -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(host, 50000)), base_url="http://check")
+
+
+def find_profiler(app: FastAPI) -> ProfilingMiddleware:
+    layer = app.middleware_stack
+    while not isinstance(layer, ProfilingMiddleware):
+        layer = layer.app
+    return layer
+
+
+def check_profile(profile_dir: Path, profile_id: str, statements: int) -> tuple[list[list], bool]:
+    stats = pstats.Stats(str(profile_dir / f"{profile_id}.pstats"))
+    functions = {name for _, _, name in stats.stats}
+    collapsed = (profile_dir / f"{profile_id}.collapsed").read_text().splitlines()
+    summary = json.loads((profile_dir / f"{profile_id}.sql.json").read_text())
+    profiled = "get_portfolio_summary" in functions
+    sampled = any("get_portfolio_summary" in line for line in collapsed)
+    rows = [
+        ["pstats has get_portfolio_summary", profiled],
+        ["collapsed stacks (distinct)", len(collapsed)],
+        ["collapsed has get_portfolio_summary", sampled],
+        ["sql.json statements / executed", f"{summary['sql_statements']} / {statements}"],
+        ["sql.json route", summary["route"]],
+        ["sql.json sql ms / request ms", f"{summary['sql_seconds'] * 1000:.1f} / {summary['seconds'] * 1000:.1f}"],
+    ]
+    return rows, profiled and sampled and summary["sql_statements"] == statements
+
+
+async def run(engine, portfolio_id: int, profile_dir: Path, requests: int) -> tuple[list, list, bool]:
+    url = f"/api/v1/portfolios/{portfolio_id}/summary"
+    plain_app, profiled_app = make_app(engine, None), make_app(engine, profile_dir)
+    executed = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal executed
+        executed += 1
+
+    checks = []
+    ok = True
+    async with client(profiled_app) as allowed, client(profiled_app, "10.1.2.3") as outsider, \
+            client(plain_app) as plain:
+        # 1. 被 profile 的請求 (清掉 summary 快取，profile 的才是完整計算)
+        for name, kwargs in [("header", {"headers": {"X-Profile": "1"}}), ("query", {"params": {"profile": "1"}})]:
+            portfolio_summary_cache.clear()
+            executed = 0
+            event.listen(engine, "after_cursor_execute", count)
+            response = await allowed.get(url, **kwargs)
+            event.remove(engine, "after_cursor_execute", count)
+            response.raise_for_status()
+            profile_id = response.headers.get("x-profile-id")
+            checks.append([f"{name}: X-Profile-Id", profile_id])
+            if profile_id is None:
+                ok = False
+                continue
+            rows, passed = check_profile(profile_dir, profile_id, executed)
+            ok &= passed
+            checks.extend([f"{name}: {label}", value] for label, value in rows)
+
+        # 2. 不應該產生檔案的請求
+        before = set(profile_dir.iterdir())
+        unflagged = await allowed.get(url)
+        refused = await outsider.get(url, headers={"X-Profile": "1"})
+        # 模擬另一個請求正在被 profile
+        profiler = find_profiler(profiled_app)
+        profiler._lock.acquire()
+        try:
+            busy = await allowed.get(url, headers={"X-Profile": "1"})
+        finally:
+            profiler._lock.release()
+        written = set(profile_dir.iterdir()) - before
+        for label, response in [("unflagged", unflagged), ("outside allowlist", refused), ("while busy", busy)]:
+            ok &= "x-profile-id" not in response.headers
+            checks.append([f"{label}: X-Profile-Id", response.headers.get("x-profile-id", "-")])
+        checks.append(["while busy: X-Profile-Skipped", busy.headers.get("x-profile-skipped", "-")])
+        checks.append(["files written by the above", len(written)])
+        ok &= not written and busy.headers.get("x-profile-skipped") == "busy"
+
+        # 3. 延遲 (summary 走快取以外的完整計算，每次都清快取)
+        samples: dict[str, list[float]] = {"plain": [], "installed": [], "profiled": []}
+        runs = [("plain", plain, {}), ("installed", allowed, {}), ("profiled", allowed, {"headers": {"X-Profile": "1"}})]
+        for i in range(requests):
+            for name, http, kwargs in runs:
+                if name == "profiled" and i % 10:
+                    continue  # 每次 profile 都會寫檔，取樣少一點
+                portfolio_summary_cache.clear()
+                with timer() as elapsed:
+                    response = await http.get(url, **kwargs)
+                response.raise_for_status()
+                samples[name].append(elapsed())
+
+    medians = {name: statistics.median(values) * 1000 for name, values in samples.items()}
+    latency = [
+        ["no middleware", f"{medians['plain']:.2f}", ""],
+        ["installed, unflagged", f"{medians['installed']:.2f}", f"{medians['installed'] - medians['plain']:+.2f}"],
+        ["profiled", f"{medians['profiled']:.2f}", f"{medians['profiled'] - medians['plain']:+.2f}"],
+    ]
+    return checks, latency, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=5)
+    parser.add_argument("--assets", type=int, default=30)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'profile.db'}")
+        instrument_engine(engine)
+        portfolio_id = seed(engine, args.accounts, args.assets)
+        profile_dir = Path(tmp) / "profiles"
+        checks, latency, ok = asyncio.run(run(engine, portfolio_id, profile_dir, args.requests))
+        uninstrument_engine(engine)
+        engine.dispose()
+
+    print_table(["check", "result"], checks)
+    print()
+    print_table(["GET /portfolios/{id}/summary", "median ms", "vs no middleware"], latency)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
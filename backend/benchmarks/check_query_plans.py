@@ -0,0 +1,144 @@
+"""
+Query-plan regression check for the hot service paths.
+
+Runs each hot service call against a small seeded SQLite database, captures
+every SELECT it issues and runs EXPLAIN QUERY PLAN on it. Exits with status 1
+if any plan does a full scan of a ledger-sized table (transactions, positions,
+market_data). Scans of small dimension tables (accounts, assets) are allowed.
+
+    python -m benchmarks.check_query_plans
+"""
+import re
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Callable
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.schemas.portfolio import PortfolioCreate
+from app.schemas.transaction import TransactionCreate
+from app.services.account import AccountService
+from app.services.market_data import MarketDataService
+from app.services.portfolio import PortfolioService
+from app.services.price_scheduler import refresh_candidates_query
+from app.services.transaction import TransactionService, encode_cursor
+from benchmarks.common import make_engine
+
+LARGE_TABLES = {"transactions", "positions", "market_data"}
+# "SCAN t" 是全表掃描；"SCAN t USING [COVERING] INDEX" 是依索引順序讀取
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+START = datetime(2024, 1, 1)
+
+
+@contextmanager
+def capture_selects(engine):
+    statements: list[tuple[str, tuple]] = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+def seed(session: Session) -> dict:
+    accounts = [Account(name=f"plan-{i}") for i in range(3)]
+    assets = [Asset(ticker=f"PLAN{i}", name="Plan", type=AssetType.stock, current_price=Decimal(10)) for i in range(3)]
+    session.add_all(accounts + assets)
+    session.commit()
+
+    service = TransactionService(session)
+    cash_asset_id = service.position_service.get_cash_asset_id(accounts[0].id)
+    for account in accounts:
+        service.create_transaction(TransactionCreate(
+            account_id=account.id, asset_id=cash_asset_id, type=TransactionType.deposit,
+            quantity=Decimal(10_000), price_per_unit=Decimal(1), transaction_time=START,
+        ))
+        for i, asset in enumerate(assets):
+            service.create_transaction(TransactionCreate(
+                account_id=account.id, asset_id=asset.id, type=TransactionType.buy,
+                quantity=Decimal(5), price_per_unit=Decimal(10), transaction_time=START + timedelta(days=i + 1),
+            ))
+    MarketDataService(session).ingest(
+        (asset.id, START + timedelta(days=day), Decimal(10 + day)) for asset in assets for day in range(10)
+    )
+    session.commit()
+
+    portfolio = PortfolioService(session).create_portfolio(
+        PortfolioCreate(name="plan", account_ids=[a.id for a in accounts])
+    )
+    latest = session.get(Transaction, 2)
+    return {
+        "account_id": accounts[0].id,
+        "account_ids": [a.id for a in accounts],
+        "asset_id": assets[0].id,
+        "asset_ids": [a.id for a in assets],
+        "portfolio_id": portfolio.id,
+        "transaction": latest,
+    }
+
+
+def hot_paths(session: Session, ids: dict) -> dict[str, Callable[[], object]]:
+    transactions = TransactionService(session)
+    positions = transactions.position_service
+    market_data = MarketDataService(session)
+    portfolios = PortfolioService(session)
+    cursor = encode_cursor(ids["transaction"].transaction_time, ids["transaction"].id)
+    return {
+        "position lookup": lambda: positions._get_position(ids["account_id"], ids["asset_id"]),
+        "append check": lambda: positions._has_later_transaction(ids["transaction"]),
+        "asset replay": lambda: positions.rebuild_asset_position(ids["account_id"], ids["asset_id"]),
+        "cash replay": lambda: positions.rebuild_cash_position(ids["account_id"]),
+        "account transactions": lambda: transactions.get_transactions(account_id=ids["account_id"]),
+        "account transactions page": lambda: transactions.get_transactions(account_id=ids["account_id"], cursor=cursor),
+        "transactions page": lambda: transactions.get_transactions(cursor=cursor),
+        "account balances": lambda: AccountService(session)._calculate_account_totals(ids["account_ids"]),
+        "portfolio summary": lambda: portfolios._build_portfolio_summary(
+            portfolios._get_portfolio_with_accounts(ids["portfolio_id"])
+        ),
+        "portfolio history": lambda: portfolios.get_portfolio_history(
+            ids["portfolio_id"], START, START + timedelta(days=30)
+        ),
+        "price range": lambda: market_data.get_range(ids["asset_ids"], START, START + timedelta(days=5)),
+        "prices as of": lambda: market_data.get_prices_as_of(ids["asset_ids"], START + timedelta(days=5)),
+        "price refresh plan": lambda: session.exec(refresh_candidates_query()).all(),
+    }
+
+
+def main() -> int:
+    engine = make_engine()
+    failures = 0
+    with Session(engine) as session:
+        ids = seed(session)
+        for name, call in hot_paths(session, ids).items():
+            with capture_selects(engine) as statements:
+                call()
+            problems = []
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                    for row in plan:
+                        match = FULL_SCAN.match(row.detail)
+                        if match and match.group(1) in LARGE_TABLES:
+                            problems.append(f"    {row.detail}\n      in: {' '.join(statement.split())}")
+            status = "FAIL" if problems else "ok"
+            print(f"{status:4}  {name} ({len(statements)} queries)")
+            for problem in problems:
+                print(problem)
+            failures += bool(problems)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
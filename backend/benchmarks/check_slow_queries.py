@@ -0,0 +1,165 @@
+"""
+Checks the slow query log and measures its overhead.
+
+1. normalize_statement: IN lists / multi-row VALUES of any length and
+   literals collapse to one fingerprint.
+2. Seeds accounts with a long cash history, lowers the threshold and runs
+   cash / asset replays plus a transaction listing. Reports the top offenders
+   from GET /api/v1/admin/slow_queries: count, p95, calling service method and
+   the captured EXPLAIN QUERY PLAN.
+3. Per-statement cost of the listeners below the threshold (the normal case)
+   and of recording a slow statement (first time with EXPLAIN, then without).
+
+    python -m benchmarks.check_slow_queries [--accounts 3] [--transactions 20000] [--statements 20000]
+"""
+import argparse
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session, insert
+
+from app.api.v1.api import api_router
+from app.core.config import settings
+from app.core.slow_queries import install_slow_query_log, normalize_statement, slow_query_log, uninstall_slow_query_log
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Transaction, TransactionType
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+
+START = datetime(2020, 1, 1)
+
+
+def check_normalize() -> list[list]:
+    cases = [
+        ("SELECT * FROM t WHERE id IN (?, ?)", "SELECT * FROM t WHERE id IN (?, ?, ?, ?)"),
+        ("INSERT INTO t (a, b) VALUES (?, ?)", "INSERT INTO t (a, b) VALUES (?, ?), (?, ?), (?, ?)"),
+        ("SELECT * FROM t WHERE name = 'a' AND x > 1.5", "SELECT  *\n FROM t WHERE name = 'it''s' AND x > 20"),
+        ("SELECT * FROM t WHERE id = %(id_1)s", "SELECT * FROM t WHERE id = %(id_2)s"),
+    ]
+    rows = []
+    for a, b in cases:
+        rows.append([a, normalize_statement(a) == normalize_statement(b)])
+    rows.append(["t1 / anon_1 identifiers kept", normalize_statement("SELECT anon_1.x FROM t1 AS anon_1") == "SELECT anon_1.x FROM t1 AS anon_1"])
+    return rows
+
+
+def seed(engine, accounts: int, transactions: int) -> tuple[list[int], int]:
+    with Session(engine) as session:
+        account_rows = [Account(name=f"slow-{i}") for i in range(accounts)]
+        asset = Asset(ticker="SLOW", name="Slow", type=AssetType.stock, current_price=Decimal(10))
+        session.add_all(account_rows + [asset])
+        session.commit()
+        cash_asset_id = PositionService(session).get_cash_asset_id(account_rows[0].id)
+        rows = []
+        for account in account_rows:
+            for i in range(transactions):
+                buy = i % 2
+                rows.append({
+                    "account_id": account.id, "asset_id": asset.id if buy else cash_asset_id,
+                    "type": TransactionType.buy if buy else TransactionType.deposit,
+                    "quantity": Decimal(1), "price_per_unit": Decimal(10), "fee": Decimal(0),
+                    "transaction_time": START + timedelta(minutes=i),
+                })
+        session.execute(insert(Transaction), rows)
+        session.commit()
+        return [a.id for a in account_rows], asset.id
+
+
+def workload(engine, account_ids: list[int], asset_id: int) -> None:
+    with Session(engine) as session:
+        positions = PositionService(session)
+        for account_id in account_ids:
+            positions.rebuild_cash_position(account_id)
+            positions.rebuild_asset_position(account_id, asset_id)
+        session.commit()
+        transactions = TransactionService(session)
+        for account_id in account_ids:
+            transactions.get_transactions(account_id=account_id, limit=100)
+
+
+def statement_cost(engine, statements: int) -> float:
+    with Session(engine) as session:
+        connection = session.connection()
+        with timer() as elapsed:
+            for _ in range(statements):
+                connection.execute(text("SELECT 1")).scalar()
+    return elapsed() / statements * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--transactions", type=int, default=20_000, help="per account")
+    parser.add_argument("--threshold-ms", type=float, default=5.0)
+    parser.add_argument("--statements", type=int, default=20_000)
+    args = parser.parse_args()
+
+    ok = True
+    normalize_rows = check_normalize()
+    ok &= all(row[1] for row in normalize_rows)
+    print_table(["normalize", "same fingerprint"], normalize_rows)
+    print()
+
+    # 預設關閉：這裡明確開啟 (SQLiteConnection 在建立 engine 時決定) 並取得 EXPLAIN
+    saved = slow_query_log.threshold, slow_query_log.explain, settings.SLOW_QUERY_LOG_ENABLED
+    settings.SLOW_QUERY_LOG_ENABLED = True
+    slow_query_log.explain = True
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'slow.db'}")
+        account_ids, asset_id = seed(engine, args.accounts, args.transactions)
+        install_slow_query_log(engine)
+        slow_query_log.reset()
+        slow_query_log.threshold = args.threshold_ms / 1000
+        workload(engine, account_ids, asset_id)
+
+        client = TestClient(FastAPI())
+        client.app.include_router(api_router, prefix="/api/v1")
+        report = client.get("/api/v1/admin/slow_queries", params={"order_by": "total", "limit": 5}).json()
+        rows = []
+        for query in report["queries"]:
+            rows.append([query["statement"][:70], query["count"], f"{query['p95_ms']:.1f}",
+                         ", ".join(query["callers"]), " | ".join(query["plan"] or [])])
+        print_table(["statement", "count", "p95 ms", "callers", "plan"], rows)
+        callers = {caller for query in report["queries"] for caller in query["callers"]}
+        ok &= "PositionService.rebuild_cash_position" in callers
+        # SQLite 的 INSERT ... VALUES 沒有查詢計畫 (不用讀表)
+        ok &= all(query["plan"] for query in report["queries"] if query["statement"].startswith("SELECT"))
+        ok &= client.delete("/api/v1/admin/slow_queries").json() == {"ok": True}
+        print()
+
+        # 門檻以下 (一般情況) 的成本：沒有 listener vs 有 listener
+        slow_query_log.threshold = 10.0
+        uninstall_slow_query_log(engine)
+        plain = statement_cost(engine, args.statements)
+        install_slow_query_log(engine)
+        below = statement_cost(engine, args.statements)
+        # 每個 SQL 都算慢：第一次有 EXPLAIN，之後只更新統計
+        slow_query_log.reset()
+        slow_query_log.threshold = 0.0
+        first = statement_cost(engine, 1)
+        recorded = statement_cost(engine, args.statements // 10)
+        uninstall_slow_query_log(engine)
+        slow_query_log.reset()
+        engine.dispose()
+    slow_query_log.threshold, slow_query_log.explain, settings.SLOW_QUERY_LOG_ENABLED = saved
+
+    print_table(["SELECT 1", "us/statement", "vs no listeners"], [
+        ["no listeners", f"{plain:.1f}", ""],
+        ["below threshold", f"{below:.1f}", f"{below - plain:+.1f}"],
+        ["slow, first (EXPLAIN)", f"{first:.1f}", f"{first - plain:+.1f}"],
+        ["slow, recorded", f"{recorded:.1f}", f"{recorded - plain:+.1f}"],
+    ])
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Checks the tax-lot engine (LotService) against hand-computed results and at scale.
+
+1. One small ledger (two buys, one sell) under FIFO, LIFO, average and
+   specific-ID: realized gain, long/short-term split and the open lots left.
+   Backdated writes, edits, deletes and a method change must leave the same
+   lots as a full replay.
+2. One account with --transactions trades: the per-year realized-gains
+   report (median of --repeat), appending a sell through TransactionService,
+   and that incrementally maintained lots and yearly totals equal a full
+   replay.
+
+    python -m benchmarks.check_tax_lots [--transactions 100000] [--repeat 20]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from sqlmodel import Session, select
+
+from app.models.accounts import Account, LotMethod
+from app.models.assets import Asset, AssetType
+from app.models.transacions import RealizedGain, RealizedLot, TaxLot, Transaction, TransactionType
+from app.schemas.account import AccountUpdate
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.account import AccountService
+from app.services.lots import LotService
+from app.services.transaction import TransactionService
+from benchmarks.common import make_engine, print_table, timer
+from benchmarks.datagen import DatasetSpec, generate
+
+# 買 10 @ 10 (長期)、買 10 @ 20、賣 15 @ 30 -> proceeds 450
+LEDGER = [
+    (TransactionType.buy, 10, 10, datetime(2022, 1, 3)),
+    (TransactionType.buy, 10, 20, datetime(2023, 6, 1)),
+    (TransactionType.sell, 15, 30, datetime(2023, 9, 1)),
+]
+# method -> (gain, long-term gain, open lots [(quantity, cost per unit)])
+EXPECTED = {
+    LotMethod.fifo: (250, 200, [(5, 20)]),
+    LotMethod.lifo: (200, 100, [(5, 10)]),
+    LotMethod.average: (225, 150, [(5, 20)]),
+    # 指定賣第二筆買入 10 股，其餘 5 股 FIFO
+    LotMethod.specific: (200, 100, [(5, 10)]),
+}
+
+
+def snapshot(session: Session, account_id: int) -> tuple[list, list, list]:
+    """
+    帳戶的 open lots、已實現的 lot 與年度彙總 (金額取到 1e-6，append 與重播的捨入可能不同)。
+    populate_existing：重播是用 Core 寫入的，identity map 裡的物件不會自動更新。
+    """
+    def q(value: Decimal) -> Decimal:
+        return Decimal(value).quantize(Decimal("0.000001"))
+
+    lots = [
+        (lot.asset_id, lot.transaction_id, q(lot.quantity), q(lot.cost_per_unit))
+        for lot in session.exec(select(TaxLot).where(TaxLot.account_id == account_id)
+                                .order_by(TaxLot.asset_id, TaxLot.transaction_id)
+                                .execution_options(populate_existing=True))
+    ]
+    realized = [
+        (row.asset_id, row.transaction_id, row.lot_transaction_id, q(row.quantity), q(row.proceeds),
+         q(row.cost_basis), row.long_term)
+        for row in session.exec(select(RealizedLot).where(RealizedLot.account_id == account_id)
+                                .order_by(RealizedLot.transaction_id, RealizedLot.lot_transaction_id)
+                                .execution_options(populate_existing=True))
+    ]
+    gains = [
+        (row.asset_id, row.year, q(row.proceeds), q(row.cost_basis), q(row.long_term_gain), row.lots)
+        for row in session.exec(select(RealizedGain).where(RealizedGain.account_id == account_id)
+                                .order_by(RealizedGain.asset_id, RealizedGain.year)
+                                .execution_options(populate_existing=True))
+    ]
+    return lots, realized, gains
+
+
+def matches_replay(session: Session, account_id: int) -> bool:
+    before = snapshot(session, account_id)
+    LotService(session).replay_account(account_id)
+    session.flush()
+    after = snapshot(session, account_id)
+    session.rollback()
+    return before == after
+
+
+def check_methods(engine) -> tuple[list[list], bool]:
+    rows, ok = [], True
+    with Session(engine) as session:
+        asset = Asset(ticker="LOT", name="Lot", type=AssetType.stock, current_price=Decimal(30))
+        session.add(asset)
+        session.commit()
+        asset_id = asset.id
+
+        for method, (gain, long_term, open_lots) in EXPECTED.items():
+            account = Account(name=f"lots-{method.value}", lot_method=method)
+            session.add(account)
+            session.commit()
+            service = TransactionService(session)
+            created = [
+                service.create_transaction(TransactionCreate(
+                    account_id=account.id, asset_id=asset.id, type=txn_type, quantity=Decimal(qty),
+                    price_per_unit=Decimal(price), transaction_time=time,
+                ))
+                for txn_type, qty, price, time in LEDGER
+            ]
+            if method == LotMethod.specific:
+                service.select_lots(created[2], [(created[1].id, Decimal(10))])
+
+            lots = LotService(session)
+            years = lots.get_realized_gains(account.id)
+            actual_gain = sum((year.gain for year in years), Decimal(0))
+            actual_long = sum((year.long_term_gain for year in years), Decimal(0))
+            actual_open = [(lot.quantity, lot.cost_per_unit) for lot in lots.get_open_lots(account.id)]
+            passed = (actual_gain == gain and actual_long == long_term
+                      and actual_open == [(Decimal(q), Decimal(c)) for q, c in open_lots]
+                      and [year.year for year in years] == [2023])
+            ok &= passed
+            rows.append([method.value, f"{actual_gain:.2f}", f"{actual_long:.2f}",
+                         " ".join(f"{q:g}@{c:g}" for q, c in actual_open), "ok" if passed else "FAIL"])
+
+        # 補登 / 修改 / 刪除 / 改方法之後，持續維護的 lot 要與全量重播相同
+        account_id = session.exec(select(Account.id).where(Account.name == "lots-specific")).one()
+        ids = list(session.exec(select(Transaction.id).where(Transaction.account_id == account_id)
+                                .order_by(Transaction.id)))
+
+        def load(transaction_id: int) -> Transaction:
+            # 每一步都像一個請求：重新讀取 (matches_replay 的 rollback 會讓物件過期)，服務也重新建立
+            transaction = session.get(Transaction, transaction_id)
+            session.refresh(transaction)
+            return transaction
+
+        steps = [
+            ("backdated buy", lambda: TransactionService(session).create_transaction(TransactionCreate(
+                account_id=account_id, asset_id=asset_id, type=TransactionType.buy, quantity=Decimal(4),
+                price_per_unit=Decimal(5), transaction_time=datetime(2021, 5, 1)))),
+            ("appended sell", lambda: TransactionService(session).create_transaction(TransactionCreate(
+                account_id=account_id, asset_id=asset_id, type=TransactionType.sell, quantity=Decimal(3),
+                price_per_unit=Decimal(40), fee=Decimal(2), transaction_time=datetime(2024, 2, 1)))),
+            ("edited sell", lambda: TransactionService(session).update_transaction(
+                load(ids[2]), TransactionUpdate(quantity=Decimal(12)))),
+            ("deleted selected buy", lambda: TransactionService(session).delete_transaction(load(ids[1]))),
+            ("method -> lifo", lambda: AccountService(session).update_account(
+                session.get(Account, account_id), AccountUpdate(lot_method=LotMethod.lifo))),
+            ("oversell", lambda: TransactionService(session).create_transaction(TransactionCreate(
+                account_id=account_id, asset_id=asset_id, type=TransactionType.sell, quantity=Decimal(50),
+                price_per_unit=Decimal(40), transaction_time=datetime(2024, 3, 1)))),
+        ]
+        for name, step in steps:
+            step()
+            passed = matches_replay(session, account_id)
+            ok &= passed
+            rows.append([name, "", "", "", "ok" if passed else "FAIL"])
+    return rows, ok
+
+
+def check_scale(path: Path, transactions: int, repeat: int) -> tuple[list[list], bool]:
+    engine = make_engine(f"sqlite:///{path}")
+    spec = DatasetSpec(accounts=1, portfolios=1, accounts_per_portfolio=1, assets=20, assets_per_account=20,
+                       transactions=transactions, price_days=730)
+    with timer() as elapsed:
+        dataset = generate(engine, spec)
+    rows = [["generate + replay lots", f"{elapsed() * 1000:.0f}"]]
+    account_id = dataset.account_ids[0]
+
+    with Session(engine) as session:
+        lots = LotService(session)
+        samples = []
+        for _ in range(repeat):
+            with timer() as elapsed:
+                years = lots.get_realized_gains(account_id)
+            samples.append(elapsed() * 1000)
+        rows.append([f"realized gains report ({len(years)} years, {sum(y.lots for y in years)} lots)",
+                     f"{statistics.median(samples):.2f}"])
+
+        service = TransactionService(session)
+        samples = []
+        for i, asset_id in enumerate(dataset.holdings[account_id][:repeat]):
+            position = service.position_service._get_position(account_id, asset_id)
+            with timer() as elapsed:
+                service.create_transaction(TransactionCreate(
+                    account_id=account_id, asset_id=asset_id, type=TransactionType.sell,
+                    quantity=min(position.total_quantity, Decimal(5)), price_per_unit=Decimal(100),
+                    transaction_time=dataset.end + timedelta(minutes=i + 1),
+                ))
+            samples.append(elapsed() * 1000)
+        rows.append(["append sell (create_transaction)", f"{statistics.median(samples):.2f}"])
+
+        with timer() as elapsed:
+            ok = matches_replay(session, account_id)
+        rows.append([f"append == replay ({'ok' if ok else 'FAIL'})", f"{elapsed() * 1000:.0f}"])
+    engine.dispose()
+    return rows, ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'lots.db'}")
+        methods, methods_ok = check_methods(engine)
+        engine.dispose()
+        scale, scale_ok = check_scale(Path(tmp) / "scale.db", args.transactions, args.repeat)
+
+    print_table(["case", "gain", "long term", "open lots", "result"], methods)
+    print()
+    print_table([f"{args.transactions} trades, one account", "ms"], scale)
+    if not (methods_ok and scale_ok):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+from sqlmodel import Session, SQLModel
+
+# 確保所有 table 都註冊到 metadata
+from app.models import accounts, assets, transacions  # noqa: F401
+from app.core.database import create_async_db_engine, create_db_engine
+from app.core.init_db import init_fiat_assets
+from app.migrations import run_migrations
+
+
+def make_engine(url: str = "sqlite://", pragmas: dict | None = None):
+    """
+    建立獨立的 benchmark 資料庫 (預設為 in-memory SQLite)，不碰 /data/test.db。
+    """
+    engine = create_db_engine(url, pragmas)
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    with Session(engine) as session:
+        init_fiat_assets(session)
+    return engine
+
+
+def make_async_engine(path: str):
+    """
+    對同一個 SQLite 檔案建立 async engine (in-memory DB 無法在 sync/async engine 之間共用)。
+    """
+    return create_async_db_engine(f"sqlite:///{path}")
+
+
+@contextmanager
+def timer():
+    """
+    with timer() as elapsed: ...；結束後 elapsed() 回傳經過的秒數。
+    """
+    start = time.perf_counter()
+    end = None
+
+    def elapsed() -> float:
+        return (end or time.perf_counter()) - start
+
+    yield elapsed
+    end = time.perf_counter()
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,285 @@
+"""
+Seeded synthetic data for benchmarks.
+
+generate() fills an (empty, migrated) database with accounts, portfolios,
+assets, daily price history and a time-ordered transaction ledger, and
+writes the positions the ledger implies (with the same replay rules as
+PositionService), then replays every account once through PositionService
+for the tax lots (under each account's lot method) and position
+checkpoints, so no rebuild is needed afterwards. The same spec and seed
+always produce the same rows. Rows go in with bulk Core inserts in chunks,
+so millions of transactions are feasible.
+
+    python -m benchmarks.datagen --profile large --out /tmp/profitfolio.db
+    python -m benchmarks.datagen --transactions 2000000 --out /tmp/big.db
+"""
+import argparse
+import random
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from sqlmodel import Session, insert, select, update
+
+from app.models.accounts import Account, Portfolio, PortfolioAccount
+from app.models.assets import Asset, AssetType, MarketData
+from app.models.transacions import Position, Transaction, TransactionType
+from app.services.position import PositionService, apply_transaction, cash_flow
+from benchmarks.common import make_engine, timer
+
+START = datetime(2020, 1, 1)
+INSERT_CHUNK = 20_000
+ASSET_TYPES = ((AssetType.stock, 0.6), (AssetType.etf, 0.25), (AssetType.crypto, 0.15))
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    accounts: int = 20
+    portfolios: int = 5
+    accounts_per_portfolio: int = 4
+    assets: int = 200
+    # 每個帳戶交易的資產數 (帳戶之間各自隨機挑選)
+    assets_per_account: int = 30
+    transactions: int = 50_000
+    price_days: int = 180
+    seed: int = 42
+
+
+PROFILES: Dict[str, DatasetSpec] = {
+    "tiny": DatasetSpec(accounts=4, portfolios=2, accounts_per_portfolio=2, assets=20, assets_per_account=10,
+                        transactions=2_000, price_days=30),
+    "small": DatasetSpec(),
+    "medium": DatasetSpec(accounts=100, portfolios=20, accounts_per_portfolio=5, assets=1_000,
+                          assets_per_account=50, transactions=500_000, price_days=365),
+    "large": DatasetSpec(accounts=500, portfolios=100, accounts_per_portfolio=5, assets=5_000,
+                         assets_per_account=80, transactions=2_000_000, price_days=730),
+}
+
+
+@dataclass
+class Dataset:
+    spec: DatasetSpec
+    account_ids: List[int] = field(default_factory=list)
+    portfolio_ids: List[int] = field(default_factory=list)
+    asset_ids: List[int] = field(default_factory=list)
+    cash_asset_id: int = 0
+    # 每個帳戶有交易的資產
+    holdings: Dict[int, List[int]] = field(default_factory=dict)
+    end: datetime = START
+
+    @classmethod
+    def from_db(cls, session: Session, spec: DatasetSpec) -> "Dataset":
+        """
+        從已經產生好的資料庫讀回 id (例如重複使用 --cache-dir 裡的檔案)。
+        """
+        holdings: Dict[int, List[int]] = {}
+        cash_asset_id = session.exec(select(Asset.id).where(Asset.ticker == "USD", Asset.type == AssetType.fiat)).one()
+        for account_id, asset_id in session.exec(
+            select(Position.account_id, Position.asset_id).where(Position.asset_id != cash_asset_id)
+            .order_by(Position.account_id, Position.asset_id)
+        ):
+            holdings.setdefault(account_id, []).append(asset_id)
+        return cls(
+            spec=spec,
+            account_ids=list(session.exec(select(Account.id).order_by(Account.id))),
+            portfolio_ids=list(session.exec(select(Portfolio.id).order_by(Portfolio.id))),
+            asset_ids=list(session.exec(select(Asset.id).where(Asset.type != AssetType.fiat).order_by(Asset.id))),
+            cash_asset_id=cash_asset_id,
+            holdings=holdings,
+            end=session.exec(select(Transaction.transaction_time).order_by(Transaction.transaction_time.desc())).first(),
+        )
+
+
+class _Fill(NamedTuple):
+    """apply_transaction / cash_flow 只需要這幾個欄位"""
+    type: TransactionType
+    quantity: Decimal
+    price_per_unit: Decimal
+    fee: Decimal
+
+
+def _insert_chunks(session: Session, model, rows: List[dict]) -> None:
+    for i in range(0, len(rows), INSERT_CHUNK):
+        session.execute(insert(model), rows[i:i + INSERT_CHUNK])
+
+
+def _price_paths(rng: random.Random, asset_ids: List[int], days: int) -> Dict[int, List[Decimal]]:
+    """
+    每個資產一條日頻隨機漫步 (幾何)，價格取到小數 4 位。
+    """
+    paths = {}
+    for asset_id in asset_ids:
+        price = rng.uniform(5, 500)
+        volatility = rng.uniform(0.005, 0.04)
+        path = []
+        for _ in range(days):
+            price *= 1 + rng.gauss(0.0003, volatility)
+            price = max(price, 0.01)
+            path.append(Decimal(f"{price:.4f}"))
+        paths[asset_id] = path
+    return paths
+
+
+def generate(engine, spec: DatasetSpec, verbose: bool = False) -> Dataset:
+    """
+    在 engine 的資料庫 (已建立 table 與法幣資產) 產生 `spec` 描述的資料。
+    """
+    rng = random.Random(spec.seed)
+    days = max(spec.price_days, 1)
+    dataset = Dataset(spec=spec)
+
+    def log(message: str, seconds: float) -> None:
+        if verbose:
+            print(f"{message}: {seconds:.1f}s")
+
+    with Session(engine) as session:
+        with timer() as elapsed:
+            dataset.cash_asset_id = session.exec(
+                select(Asset.id).where(Asset.ticker == "USD", Asset.type == AssetType.fiat)
+            ).one()
+            session.execute(insert(Account), [
+                {"name": f"Account {i:05d}", "currency": "USD", "created_at": START} for i in range(spec.accounts)
+            ])
+            types, weights = zip(*ASSET_TYPES)
+            _insert_chunks(session, Asset, [
+                {"ticker": f"SYN{i:05d}", "name": f"Synthetic {i}", "type": rng.choices(types, weights)[0],
+                 "currency": "USD", "current_price": Decimal(0), "previous_close": Decimal(0), "last_updated": START}
+                for i in range(spec.assets)
+            ])
+            session.execute(insert(Portfolio), [
+                {"name": f"Portfolio {i:04d}", "created_at": START} for i in range(spec.portfolios)
+            ])
+            dataset.account_ids = list(session.exec(select(Account.id).order_by(Account.id)))
+            dataset.asset_ids = list(session.exec(
+                select(Asset.id).where(Asset.type != AssetType.fiat).order_by(Asset.id)
+            ))
+            dataset.portfolio_ids = list(session.exec(select(Portfolio.id).order_by(Portfolio.id)))
+            per_portfolio = min(spec.accounts_per_portfolio, len(dataset.account_ids))
+            session.execute(insert(PortfolioAccount), [
+                {"portfolio_id": portfolio_id, "account_id": account_id}
+                for portfolio_id in dataset.portfolio_ids
+                for account_id in rng.sample(dataset.account_ids, per_portfolio)
+            ])
+        log("accounts, assets, portfolios", elapsed())
+
+        # 價格歷史 (每日一筆)；最後兩天寫回 current_price / previous_close
+        with timer() as elapsed:
+            paths = _price_paths(rng, dataset.asset_ids, days)
+            _insert_chunks(session, MarketData, [
+                {"asset_id": asset_id, "timestamp": START + timedelta(days=day), "price": price}
+                for asset_id, path in paths.items() for day, price in enumerate(path)
+            ])
+            last_day = START + timedelta(days=days - 1)
+            session.execute(update(Asset), [
+                {"id": asset_id, "current_price": path[-1], "previous_close": path[-2] if days > 1 else path[-1],
+                 "last_updated": last_day}
+                for asset_id, path in paths.items()
+            ])
+        log(f"{len(dataset.asset_ids) * days} prices", elapsed())
+
+        # 交易：每個帳戶先入金，之後依時間順序在自己的資產上買賣 (不會賣超) 與配息
+        with timer() as elapsed:
+            per_account = min(spec.assets_per_account, len(dataset.asset_ids))
+            dataset.holdings = {a: sorted(rng.sample(dataset.asset_ids, per_account)) for a in dataset.account_ids}
+            positions: Dict[tuple[int, int], tuple[Decimal, Decimal]] = {}
+            cash: Dict[int, Decimal] = {a: Decimal(0) for a in dataset.account_ids}
+            rows: List[dict] = []
+            deposit = Decimal(1_000_000) * max(1, spec.transactions // max(1, spec.accounts * 100))
+            for account_id in dataset.account_ids:
+                fill = _Fill(TransactionType.deposit, deposit, Decimal(1), Decimal(0))
+                cash[account_id] += cash_flow(fill)
+                rows.append(_row(account_id, dataset.cash_asset_id, fill, START))
+
+            step = days * 86_400 / (spec.transactions + 1)
+            fee = Decimal("1.00")
+            for i in range(1, spec.transactions + 1):
+                seconds = i * step
+                account_id = rng.choice(dataset.account_ids)
+                asset_id = rng.choice(dataset.holdings[account_id])
+                price = paths[asset_id][min(int(seconds // 86_400), days - 1)]
+                total_qty, total_cost = positions.get((account_id, asset_id), (Decimal(0), Decimal(0)))
+                qty = Decimal(rng.randint(1, 20))
+                roll = rng.random()
+                if roll < 0.3 and total_qty >= qty:
+                    fill = _Fill(TransactionType.sell, qty, price, fee)
+                elif roll < 0.35 and total_qty > 0:
+                    fill = _Fill(TransactionType.dividend, total_qty, (price / 200).quantize(Decimal("0.0001")), Decimal(0))
+                else:
+                    fill = _Fill(TransactionType.buy, qty, price, fee)
+                positions[(account_id, asset_id)] = apply_transaction(total_qty, total_cost, fill)
+                cash[account_id] += cash_flow(fill)
+                rows.append(_row(account_id, asset_id, fill, START + timedelta(seconds=seconds)))
+                if len(rows) >= INSERT_CHUNK:
+                    session.execute(insert(Transaction), rows)
+                    rows = []
+            if rows:
+                session.execute(insert(Transaction), rows)
+            dataset.end = START + timedelta(seconds=spec.transactions * step)
+        log(f"{spec.transactions + len(dataset.account_ids)} transactions", elapsed())
+
+        # 持倉：與 replay_transactions 相同的規則 (數量為 0 的平均成本為 0)
+        with timer() as elapsed:
+            position_rows = [
+                {"account_id": account_id, "asset_id": asset_id, "total_quantity": qty,
+                 "average_cost": cost / qty if qty > 0 else Decimal(0), "last_updated": dataset.end}
+                for (account_id, asset_id), (qty, cost) in positions.items()
+            ]
+            position_rows.extend(
+                {"account_id": account_id, "asset_id": dataset.cash_asset_id, "total_quantity": balance,
+                 "average_cost": Decimal(1), "last_updated": dataset.end}
+                for account_id, balance in cash.items()
+            )
+            _insert_chunks(session, Position, position_rows)
+            session.commit()
+        log(f"{len(position_rows)} positions", elapsed())
+
+        with timer() as elapsed:
+            PositionService(session).rebuild_all()
+            session.commit()
+        log("tax lots + checkpoints", elapsed())
+    return dataset
+
+
+def _row(account_id: int, asset_id: int, fill: _Fill, transaction_time: datetime) -> dict:
+    return {"account_id": account_id, "asset_id": asset_id, "type": fill.type, "quantity": fill.quantity,
+            "price_per_unit": fill.price_per_unit, "fee": fill.fee, "transaction_time": transaction_time}
+
+
+def spec_from_args(args) -> DatasetSpec:
+    """
+    --profile 為基礎，再套用有指定的欄位 (--transactions 等)。
+    """
+    overrides = {name: getattr(args, name) for name in asdict(DatasetSpec()) if getattr(args, name, None) is not None}
+    return replace(PROFILES[args.profile], **overrides)
+
+
+def add_spec_arguments(parser: argparse.ArgumentParser, default_profile: str = "small") -> None:
+    parser.add_argument("--profile", choices=sorted(PROFILES), default=default_profile)
+    for name, value in asdict(DatasetSpec()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=type(value), default=None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_spec_arguments(parser)
+    parser.add_argument("--out", type=Path, required=True, help="SQLite file to create")
+    parser.add_argument("--force", action="store_true", help="overwrite --out")
+    args = parser.parse_args()
+
+    if args.out.exists():
+        if not args.force:
+            parser.error(f"{args.out} exists (use --force)")
+        args.out.unlink()
+    spec = spec_from_args(args)
+    print(spec)
+    engine = make_engine(f"sqlite:///{args.out}")
+    with timer() as elapsed:
+        generate(engine, spec, verbose=True)
+    engine.dispose()
+    print(f"total: {elapsed():.1f}s -> {args.out} ({args.out.stat().st_size / 1024 / 1024:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
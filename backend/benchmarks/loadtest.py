@@ -0,0 +1,397 @@
+"""
+Closed-loop load test of the whole app (app.main:app, middlewares and lifespan included).
+
+Builds a synthetic database (benchmarks.datagen, seeded; --cache-dir reuses it)
+and a quote file for its tickers, points the app at both (DATABASE_URL,
+QUOTE_PROVIDER=file), so a run never touches /data or the network. Then
+`--users` virtual users each loop: pick a route from the read/write mix, send
+the request, wait for the response, think (--think-ms, exponential), repeat.
+Requests are sent in process over the ASGI interface (httpx.ASGITransport) or,
+with --transport uvicorn, over HTTP to a local uvicorn server running in a
+thread.
+
+Reports throughput and p50 / p95 / p99 latency per route template (requests
+finished during --warmup are not counted) plus the status codes of failures.
+Writes are appended after the dataset's last transaction, so every run on the
+same dataset and seed sends the same sequence of requests per user.
+
+    python -m benchmarks.loadtest                                # 200 users, mixed, 30 s, small profile
+    python -m benchmarks.loadtest --mix dashboard --users 50 --duration 60
+    python -m benchmarks.loadtest --mix "dashboard=5,summary=3,create=1" --think-ms 100
+    python -m benchmarks.loadtest --transport uvicorn --price-refresh --output /tmp/load.json
+    python -m benchmarks.loadtest --list
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import httpx
+
+# 在 import app 之前不能碰 app.core.config (設定在 import 時讀取)，app 相關的 import 都在 main() 裡
+
+
+@dataclass
+class User:
+    """
+    一個虛擬使用者：自己的亂數與自己建立、還沒刪掉的交易 id。
+    """
+    index: int
+    rng: random.Random
+    created: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Target:
+    dataset: object
+    # 寫入的交易時間：接在資料集最後一筆之後，每次遞增
+    clock: itertools.count
+
+    def next_time(self) -> str:
+        return (self.dataset.end + timedelta(seconds=next(self.clock))).isoformat()
+
+
+@dataclass
+class Action:
+    route: str
+    write: bool
+    # build(target, user) -> (method, path, httpx kwargs)；回傳 None 表示現在做不了 (例如沒有可刪的交易)
+    build: Callable[[Target, User], tuple | None]
+    # 回應成功後更新 user 的狀態
+    done: Callable[[User, httpx.Response], None] | None = None
+
+
+def _fill(target: Target, user: User) -> dict:
+    dataset = target.dataset
+    account_id = user.rng.choice(dataset.account_ids)
+    return {
+        "account_id": account_id, "asset_id": user.rng.choice(dataset.holdings[account_id]),
+        "type": "buy", "quantity": str(user.rng.randint(1, 10)), "price_per_unit": str(user.rng.randint(10, 200)),
+        "fee": "1", "transaction_time": target.next_time(),
+    }
+
+
+def _remember(user: User, response: httpx.Response) -> None:
+    body = response.json()
+    user.created.extend(t["id"] for t in (body if isinstance(body, list) else [body]))
+
+
+def _forget(user: User, response: httpx.Response) -> None:
+    user.created.pop()
+
+
+def _history(target: Target, user: User):
+    end = target.dataset.end
+    return "GET", f"/api/v1/portfolios/{user.rng.choice(target.dataset.portfolio_ids)}/history", {
+        "params": {"from": (end - timedelta(days=90)).isoformat(), "to": end.isoformat()}}
+
+
+def _update(target: Target, user: User):
+    if not user.created:
+        return None
+    return "PATCH", f"/api/v1/transactions/{user.rng.choice(user.created)}", {
+        "json": {"price_per_unit": str(user.rng.randint(10, 200))}}
+
+
+def _delete(target: Target, user: User):
+    # 刪最新建立的那筆 (與 append 相反的順序)
+    if not user.created:
+        return None
+    return "DELETE", f"/api/v1/transactions/{user.created[-1]}", {}
+
+
+ACTIONS: Dict[str, Action] = {
+    "dashboard": Action("GET /dashboard/", False, lambda t, u: ("GET", "/api/v1/dashboard/", {})),
+    "accounts": Action("GET /accounts/", False, lambda t, u: ("GET", "/api/v1/accounts/", {})),
+    "account": Action("GET /accounts/{id}", False,
+                      lambda t, u: ("GET", f"/api/v1/accounts/{u.rng.choice(t.dataset.account_ids)}", {})),
+    "portfolios": Action("GET /portfolios/", False, lambda t, u: ("GET", "/api/v1/portfolios/", {})),
+    "summary": Action("GET /portfolios/{id}/summary", False,
+                      lambda t, u: ("GET", f"/api/v1/portfolios/{u.rng.choice(t.dataset.portfolio_ids)}/summary", {})),
+    "history": Action("GET /portfolios/{id}/history", False, _history),
+    "assets": Action("GET /assets/", False, lambda t, u: ("GET", "/api/v1/assets/", {})),
+    "transactions": Action("GET /transactions/", False, lambda t, u: (
+        "GET", "/api/v1/transactions/", {"params": {"account_id": u.rng.choice(t.dataset.account_ids), "limit": 50}})),
+    "create": Action("POST /transactions/", True,
+                     lambda t, u: ("POST", "/api/v1/transactions/", {"json": _fill(t, u)}), _remember),
+    "batch": Action("POST /transactions/batch", True,
+                    lambda t, u: ("POST", "/api/v1/transactions/batch", {"json": [_fill(t, u) for _ in range(20)]}),
+                    _remember),
+    "update": Action("PATCH /transactions/{id}", True, _update),
+    "delete": Action("DELETE /transactions/{id}", True, _delete, _forget),
+    "prices": Action("POST /assets/update_prices", True,
+                     lambda t, u: ("POST", "/api/v1/assets/update_prices", {"params": {"background": "true"}})),
+}
+
+MIXES: Dict[str, Dict[str, int]] = {
+    # 只有讀取：一群人開著 dashboard
+    "dashboard": {"dashboard": 30, "summary": 30, "portfolios": 10, "accounts": 10, "history": 5, "transactions": 15},
+    # 預設：大約 80% 讀、20% 寫
+    "mixed": {"dashboard": 20, "summary": 20, "portfolios": 5, "accounts": 5, "account": 5, "history": 5,
+              "transactions": 15, "assets": 5, "create": 8, "update": 5, "delete": 4, "batch": 2, "prices": 1},
+    "writes": {"create": 40, "update": 20, "delete": 20, "batch": 10, "transactions": 10},
+}
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """
+    preset 名稱，或 "dashboard=3,create=1" 形式的權重。
+    """
+    if text in MIXES:
+        return MIXES[text]
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ACTIONS:
+            raise ValueError(f"unknown action {name!r} (known: {', '.join(ACTIONS)})")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise ValueError("the mix has no positive weights")
+    return mix
+
+
+# --- 執行 -----------------------------------------------------------------------
+
+@dataclass
+class Sample:
+    route: str
+    finished: float
+    seconds: float
+    status: int  # 0 = 連線 / 傳輸錯誤
+
+
+async def virtual_user(client: httpx.AsyncClient, target: Target, user: User, mix: Dict[str, int],
+                       deadline: float, think: float, samples: List[Sample], errors: Counter) -> None:
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        action = ACTIONS[user.rng.choices(names, weights)[0]]
+        request = action.build(target, user)
+        if request is None:
+            # 還沒有自己的交易可以改 / 刪：先建立一筆
+            action = ACTIONS["create"]
+            request = action.build(target, user)
+        method, path, kwargs = request
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, 0
+            errors[f"{action.route}: {type(e).__name__}"] += 1
+        finished = time.perf_counter()
+        samples.append(Sample(action.route, finished, finished - start, status))
+        if response is not None:
+            if status < 400:
+                if action.done is not None:
+                    action.done(user, response)
+            else:
+                errors[f"{action.route}: {status} {response.text[:100]}"] += 1
+        if think > 0:
+            await asyncio.sleep(user.rng.expovariate(1 / think))
+
+
+async def drive(client: httpx.AsyncClient, target: Target, args, mix: Dict[str, int]) -> tuple[List[Sample], Counter, float]:
+    samples: List[Sample] = []
+    errors: Counter = Counter()
+    users = [User(i, random.Random(target.dataset.spec.seed * 100_003 + i)) for i in range(args.users)]
+    start = time.perf_counter()
+    deadline = start + args.warmup + args.duration
+    await asyncio.gather(*(
+        virtual_user(client, target, user, mix, deadline, args.think_ms / 1000, samples, errors)
+        for user in users
+    ))
+    measured_from = start + args.warmup
+    measured = [s for s in samples if s.finished >= measured_from]
+    return measured, errors, time.perf_counter() - measured_from
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+def summarize(samples: List[Sample], seconds: float) -> Dict[str, dict]:
+    by_route: Dict[str, List[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_route[sample.route].append(sample)
+    by_route["total"] = samples
+    results = {}
+    for route, route_samples in sorted(by_route.items(), key=lambda item: -len(item[1])):
+        if not route_samples:
+            continue
+        ordered = sorted(s.seconds for s in route_samples)
+        results[route] = {
+            "requests": len(ordered),
+            "errors": sum(1 for s in route_samples if s.status == 0 or s.status >= 400),
+            "rps": len(ordered) / seconds,
+            "mean_ms": sum(ordered) / len(ordered) * 1000,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+    return results
+
+
+def write_quote_file(db_path: Path, path: Path, seed: int) -> None:
+    """
+    資料集每個 ticker 的報價 (最後價格 ±2%)，給 FileQuoteProvider 用。
+    """
+    rng = random.Random(seed)
+    connection = sqlite3.connect(db_path)
+    try:
+        rows = connection.execute("SELECT ticker, current_price FROM assets WHERE type != 'fiat'").fetchall()
+    finally:
+        connection.close()
+    path.write_text(json.dumps({
+        ticker: {"price": round(float(price or 100) * rng.uniform(0.98, 1.02), 4), "previous_close": float(price or 100)}
+        for ticker, price in rows
+    }))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run(app, target: Target, args, mix: Dict[str, int]):
+    if args.transport == "asgi":
+        # ASGITransport 不會跑 lifespan：自己進出 (建表、背景報價更新)
+        async with app.router.lifespan_context(app):
+            # app 裡未處理的例外當成 500 回應 (和 uvicorn 一樣)，不要丟到 client
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            # 沒有 timeout：取消 in-process 的請求會在 sync 端點還在 worker thread 上用 session 時就關掉它
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+                return await drive(client, target, args, mix)
+
+    import uvicorn
+    port = args.port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    # server 用自己的執行緒與 event loop，不和產生負載的 client 搶同一個 loop
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    try:
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            await asyncio.sleep(0.05)
+        limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=args.timeout) as client:
+            return await drive(client, target, args, mix)
+    finally:
+        server.should_exit = True
+        await asyncio.to_thread(thread.join)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="small", help="dataset profile (benchmarks.datagen)")
+    parser.add_argument("--transactions", type=int, help="override the profile's transaction count")
+    parser.add_argument("--cache-dir", type=Path, help="reuse generated datasets from this directory")
+    parser.add_argument("--mix", default="mixed", help=f"preset ({', '.join(MIXES)}) or name=weight,...")
+    parser.add_argument("--users", type=int, default=200, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean think time between requests of a user")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds (uvicorn only)")
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--port", type=int, help="uvicorn port (default: a free one)")
+    parser.add_argument("--price-refresh", action="store_true", help="run the background price scheduler (1 s tick)")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--list", action="store_true", help="list the actions and presets and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, action in ACTIONS.items():
+            print(f"{name:<14} {'write' if action.write else 'read ':<6} {action.route}")
+        for name, mix in MIXES.items():
+            print(f"\n{name}: " + ", ".join(f"{k}={v}" for k, v in mix.items()))
+        return
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        db_path = workdir / "bench.db"
+        quote_path = workdir / "quotes.json"
+        # app 的設定：合成資料庫、離線報價、不寫 /data
+        os.environ.update({
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "QUOTE_PROVIDER": "file",
+            "QUOTE_FILE": str(quote_path),
+            "PRICE_REFRESH_ENABLED": "true" if args.price_refresh else "false",
+            "PRICE_REFRESH_TICK_SECONDS": "1",
+            "PROFILING_ENABLED": "false",
+        })
+        from sqlmodel import Session
+
+        from benchmarks.common import print_table
+        from benchmarks.datagen import PROFILES, Dataset
+        from benchmarks.suite import dataset_file, environment
+
+        if args.profile not in PROFILES:
+            parser.error(f"unknown profile {args.profile!r} (known: {', '.join(PROFILES)})")
+        spec = PROFILES[args.profile]
+        if args.transactions is not None:
+            spec = replace(spec, transactions=args.transactions)
+        dataset_file(spec, args.cache_dir, workdir)
+        write_quote_file(db_path, quote_path, spec.seed)
+
+        from app.core.database import SQLiteDB
+        from app.main import app
+
+        with Session(SQLiteDB.engine) as session:
+            dataset = Dataset.from_db(session, spec)
+        target = Target(dataset=dataset, clock=itertools.count(1))
+
+        print(f"{args.users} users, mix {args.mix}, {args.transport}, {args.warmup:g}s warmup + {args.duration:g}s",
+              file=sys.stderr)
+        try:
+            samples, errors, seconds = asyncio.run(run(app, target, args, mix))
+        finally:
+            # aiosqlite 的連線各有一個 (非 daemon) 執行緒，不關掉的話 process 不會結束
+            asyncio.run(SQLiteDB.async_engine.dispose())
+            SQLiteDB.engine.dispose()
+
+    results = summarize(samples, seconds)
+    print_table(["route", "requests", "errors", "req/s", "mean ms", "p50 ms", "p95 ms", "p99 ms", "max ms"], [
+        [route, r["requests"], r["errors"], f"{r['rps']:.1f}", f"{r['mean_ms']:.1f}", f"{r['p50_ms']:.1f}",
+         f"{r['p95_ms']:.1f}", f"{r['p99_ms']:.1f}", f"{r['max_ms']:.1f}"]
+        for route, r in results.items()
+    ])
+    if errors:
+        print("\nerrors:")
+        for message, count in errors.most_common(10):
+            print(f"  {count:>6}  {message}")
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "profile": args.profile,
+            "spec": asdict(spec),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "environment": environment(),
+            "options": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "list"},
+            "mix": mix,
+            "results": results,
+            "errors": dict(errors),
+        }, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
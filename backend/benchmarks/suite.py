@@ -0,0 +1,461 @@
+"""
+Benchmark suite for the service hot paths, with JSON baselines.
+
+Builds a synthetic dataset (benchmarks.datagen, seeded) in a temporary SQLite
+file with the app's PRAGMAs and times every registered benchmark through the
+service layer, one fresh session per operation like a request. Writes clean
+up after themselves, so benchmarks are independent of each other and of
+their order.
+
+Results (median / p95 / mean per operation) can be written as JSON. With a
+baseline (default benchmarks/baselines/<profile>.json) every benchmark whose
+median got slower by more than --threshold (and by more than --min-delta-ms)
+is flagged and the exit code is 1. Baselines are only comparable on the same
+machine; the environment is stored alongside the results.
+
+    python -m benchmarks.suite                                  # small profile vs. its baseline
+    python -m benchmarks.suite --save-baseline                  # (re)write benchmarks/baselines/small.json
+    python -m benchmarks.suite --profile medium --cache-dir /tmp/pf-datasets
+    python -m benchmarks.suite --only portfolio.summary dashboard.stats --output /tmp/run.json
+    python -m benchmarks.suite --list
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.cache import portfolio_summary_cache
+from app.models.transacions import TransactionType
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.account import AccountService
+from app.services.asset import AssetService
+from app.services.dashboard import DashboardService
+from app.services.portfolio import PortfolioService
+from app.services.quote_provider import Quote, QuoteProvider
+from app.services.transaction import TransactionService
+from benchmarks.common import make_async_engine, make_engine, print_table
+from benchmarks.datagen import START, Dataset, DatasetSpec, add_spec_arguments, generate, spec_from_args
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+# 產生資料的規則改變時遞增，讓 --cache-dir 裡的舊檔案失效
+DATAGEN_VERSION = 3
+
+
+@dataclass
+class Context:
+    engine: object
+    db_path: Path
+    dataset: Dataset
+    rng: random.Random
+
+    def session(self) -> Session:
+        return Session(self.engine)
+
+
+BENCHMARKS: Dict[str, tuple[Callable[[Context, int], List[float]], int]] = {}
+
+
+def benchmark(name: str, ops: int):
+    """
+    註冊一個 benchmark：fn(ctx, ops) 回傳每次操作的秒數。`ops` 是預設的操作次數。
+    """
+    def register(fn):
+        BENCHMARKS[name] = (fn, ops)
+        return fn
+    return register
+
+
+def timed(operation: Callable[[int], None], ops: int, warmup: int = 2) -> List[float]:
+    """
+    operation(i) 的 i 從 0 到 warmup + ops - 1 (暖身也算在內，每次都不同)，只回傳後 ops 次的秒數。
+    """
+    for i in range(warmup):
+        operation(i)
+    samples = []
+    for i in range(warmup, warmup + ops):
+        start = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# --- 讀取 ---------------------------------------------------------------------
+
+@benchmark("account.list", ops=30)
+def account_list(ctx: Context, ops: int) -> List[float]:
+    def op(_):
+        with ctx.session() as session:
+            AccountService(session).get_accounts(limit=100)
+    return timed(op, ops)
+
+
+@benchmark("portfolio.list", ops=30)
+def portfolio_list(ctx: Context, ops: int) -> List[float]:
+    def op(_):
+        with ctx.session() as session:
+            PortfolioService(session).get_portfolios(limit=100)
+    return timed(op, ops)
+
+
+@benchmark("portfolio.summary", ops=30)
+def portfolio_summary(ctx: Context, ops: int) -> List[float]:
+    # 每次都清掉快取：量的是完整計算
+    def op(i):
+        portfolio_summary_cache.clear()
+        with ctx.session() as session:
+            PortfolioService(session).get_portfolio_summary(ctx.dataset.portfolio_ids[i % len(ctx.dataset.portfolio_ids)])
+    return timed(op, ops)
+
+
+@benchmark("portfolio.summary_cached", ops=200)
+def portfolio_summary_cached(ctx: Context, ops: int) -> List[float]:
+    portfolio_id = ctx.dataset.portfolio_ids[0]
+
+    def op(_):
+        with ctx.session() as session:
+            PortfolioService(session).get_portfolio_summary(portfolio_id)
+    return timed(op, ops)
+
+
+@benchmark("portfolio.history", ops=10)
+def portfolio_history(ctx: Context, ops: int) -> List[float]:
+    end = ctx.dataset.end
+    start = end - timedelta(days=365)
+
+    def op(i):
+        with ctx.session() as session:
+            PortfolioService(session).get_portfolio_history(
+                ctx.dataset.portfolio_ids[i % len(ctx.dataset.portfolio_ids)], start=start, end=end)
+    return timed(op, ops)
+
+
+@benchmark("dashboard.stats", ops=20)
+def dashboard_stats(ctx: Context, ops: int) -> List[float]:
+    def op(_):
+        with ctx.session() as session:
+            DashboardService(session).get_stats()
+    return timed(op, ops)
+
+
+@benchmark("transaction.list", ops=30)
+def transaction_list(ctx: Context, ops: int) -> List[float]:
+    def op(i):
+        with ctx.session() as session:
+            TransactionService(session).get_transactions(
+                account_id=ctx.dataset.account_ids[i % len(ctx.dataset.account_ids)], limit=100)
+    return timed(op, ops)
+
+
+# --- 寫入 (結束時刪掉自己建立的交易) --------------------------------------------
+
+def _fills(ctx: Context, count: int, backdated: bool = False) -> List[TransactionCreate]:
+    """
+    買入交易：預設排在既有資料之後 (append)，backdated 則落在歷史中間 (需要重播)。
+    """
+    dataset = ctx.dataset
+    fills = []
+    for i in range(count):
+        account_id = ctx.rng.choice(dataset.account_ids)
+        when = (START + (dataset.end - START) / 2 if backdated else dataset.end) + timedelta(seconds=i + 1)
+        fills.append(TransactionCreate(
+            account_id=account_id, asset_id=ctx.rng.choice(dataset.holdings[account_id]),
+            type=TransactionType.buy, quantity=Decimal(ctx.rng.randint(1, 10)),
+            price_per_unit=Decimal(ctx.rng.randint(10, 200)), fee=Decimal(1), transaction_time=when,
+        ))
+    return fills
+
+
+def _cleanup(ctx: Context, ids: Iterable[int]) -> None:
+    with ctx.session() as session:
+        service = TransactionService(session)
+        service.delete_transactions(list(service.get_transactions_by_ids(list(ids)).values()))
+
+
+def _create(ctx: Context, fills: List[TransactionCreate]) -> List[int]:
+    with ctx.session() as session:
+        return [t.id for t in TransactionService(session).create_transactions(fills)]
+
+
+def _single_creates(ctx: Context, ops: int, backdated: bool) -> List[float]:
+    fills = _fills(ctx, ops + 2, backdated)
+    ids = []
+
+    def op(i):
+        with ctx.session() as session:
+            ids.append(TransactionService(session).create_transaction(fills[i]).id)
+    try:
+        return timed(op, ops)
+    finally:
+        _cleanup(ctx, ids)
+
+
+@benchmark("transaction.create", ops=50)
+def transaction_create(ctx: Context, ops: int) -> List[float]:
+    return _single_creates(ctx, ops, backdated=False)
+
+
+@benchmark("transaction.create_backdated", ops=20)
+def transaction_create_backdated(ctx: Context, ops: int) -> List[float]:
+    return _single_creates(ctx, ops, backdated=True)
+
+
+@benchmark("transaction.update", ops=50)
+def transaction_update(ctx: Context, ops: int) -> List[float]:
+    ids = _create(ctx, _fills(ctx, ops + 2))
+
+    def op(i):
+        with ctx.session() as session:
+            service = TransactionService(session)
+            service.update_transaction(service.get_transaction(ids[i]),
+                                       TransactionUpdate(price_per_unit=Decimal(ctx.rng.randint(10, 200))))
+    try:
+        return timed(op, ops)
+    finally:
+        _cleanup(ctx, ids)
+
+
+@benchmark("transaction.delete", ops=50)
+def transaction_delete(ctx: Context, ops: int) -> List[float]:
+    # 由最新的開始刪 (與 create 相反的順序，每次都是 append 的反向)
+    ids = _create(ctx, _fills(ctx, ops + 2))[::-1]
+
+    def op(i):
+        with ctx.session() as session:
+            service = TransactionService(session)
+            service.delete_transaction(service.get_transaction(ids[i]))
+    return timed(op, ops)
+
+
+@benchmark("transaction.batch_create_100", ops=10)
+def transaction_batch_create(ctx: Context, ops: int) -> List[float]:
+    batches = [_fills(ctx, 100) for _ in range(ops + 2)]
+    ids = []
+
+    def op(i):
+        # 每批都接在前一批之後
+        shifted = [fill.model_copy(update={"transaction_time": fill.transaction_time + timedelta(hours=i + 1)})
+                   for fill in batches[i]]
+        ids.extend(_create(ctx, shifted))
+    try:
+        return timed(op, ops)
+    finally:
+        _cleanup(ctx, ids)
+
+
+# --- 報價更新 -------------------------------------------------------------------
+
+class FakeQuoteProvider(QuoteProvider):
+    """
+    不連網路的報價：每個 symbol 在前一次價格上隨機 ±1%。
+    """
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def get_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        return {s: Quote(symbol=s, price=Decimal(f"{self.rng.uniform(10, 500):.4f}")) for s in symbols}
+
+    async def aget_quotes(self, symbols: Iterable[str]) -> Dict[str, Quote]:
+        return self.get_quotes(symbols)
+
+
+@benchmark("price.refresh", ops=5)
+def price_refresh(ctx: Context, ops: int) -> List[float]:
+    provider = FakeQuoteProvider(ctx.rng)
+
+    async def run() -> List[float]:
+        engine = make_async_engine(str(ctx.db_path))
+        try:
+            async def op():
+                async with AsyncSession(engine, expire_on_commit=False) as session:
+                    await AssetService(session, provider).refresh_prices()
+            await op()
+            samples = []
+            for _ in range(ops):
+                start = time.perf_counter()
+                await op()
+                samples.append(time.perf_counter() - start)
+            return samples
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+# --- 執行與比較 -----------------------------------------------------------------
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "ops": len(samples),
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, round(0.95 * len(ordered)) - 1)] * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "sqlite": sqlite3.sqlite_version,
+        "commit": commit,
+    }
+
+
+def dataset_file(spec: DatasetSpec, cache_dir: Path | None, workdir: Path) -> Path:
+    """
+    產生 (或從 cache_dir 複製) 資料庫到 workdir。快取檔名包含 spec 的雜湊。
+    """
+    target = workdir / "bench.db"
+    if cache_dir is None:
+        engine = make_engine(f"sqlite:///{target}")
+        generate(engine, spec, verbose=True)
+        engine.dispose()
+        return target
+
+    key = hashlib.sha1(json.dumps({**asdict(spec), "version": DATAGEN_VERSION}, sort_keys=True).encode()).hexdigest()[:12]
+    cached = cache_dir / f"dataset-{key}.db"
+    if not cached.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        partial = cache_dir / f"dataset-{key}.partial"
+        partial.unlink(missing_ok=True)
+        engine = make_engine(f"sqlite:///{partial}")
+        generate(engine, spec, verbose=True)
+        engine.dispose()
+        partial.rename(cached)
+    shutil.copyfile(cached, target)
+    return target
+
+
+def run_suite(spec: DatasetSpec, names: List[str], ops: int | None, cache_dir: Path | None) -> Dict[str, dict]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = dataset_file(spec, cache_dir, Path(tmp))
+        engine = make_engine(f"sqlite:///{db_path}")
+        with Session(engine) as session:
+            dataset = Dataset.from_db(session, spec)
+        ctx = Context(engine=engine, db_path=db_path, dataset=dataset, rng=random.Random(spec.seed))
+        for name in names:
+            fn, default_ops = BENCHMARKS[name]
+            results[name] = summarize(fn(ctx, ops or default_ops))
+            print(f"{name}: {results[name]['median_ms']:.2f} ms", file=sys.stderr)
+        engine.dispose()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+            min_delta_ms: float) -> tuple[list[list], list[str]]:
+    rows, regressions = [], []
+    for name in sorted(set(results) | set(baseline)):
+        current, previous = results.get(name), baseline.get(name)
+        if current is None:
+            rows.append([name, f"{previous['median_ms']:.2f}", "-", "", "not run"])
+            continue
+        if previous is None:
+            rows.append([name, "-", f"{current['median_ms']:.2f}", "", "new"])
+            continue
+        delta = current["median_ms"] - previous["median_ms"]
+        change = delta / previous["median_ms"] if previous["median_ms"] else 0.0
+        if change > threshold and delta > min_delta_ms:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif change < -threshold and -delta > min_delta_ms:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append([name, f"{previous['median_ms']:.2f}", f"{current['median_ms']:.2f}", f"{change:+.0%}", status])
+    return rows, regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    add_spec_arguments(parser)
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="benchmarks to run (default: all)")
+    parser.add_argument("--ops", type=int, help="operations per benchmark (default: per benchmark)")
+    parser.add_argument("--cache-dir", type=Path, help="reuse generated datasets from this directory")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--baseline", type=Path, help="default: benchmarks/baselines/<profile>.json")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="flag medians slower by more than this ratio")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="ignore smaller absolute slowdowns")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, (_, ops) in BENCHMARKS.items():
+            print(f"{name} ({ops} ops)")
+        return
+    names = args.only or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    spec = spec_from_args(args)
+    results = run_suite(spec, names, args.ops, args.cache_dir)
+    report = {
+        "profile": args.profile,
+        "spec": asdict(spec),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "results": results,
+    }
+
+    print_table(["benchmark", "ops", "median ms", "p95 ms", "mean ms"], [
+        [name, r["ops"], f"{r['median_ms']:.2f}", f"{r['p95_ms']:.2f}", f"{r['mean_ms']:.2f}"]
+        for name, r in results.items()
+    ])
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    baseline_path = args.baseline or BASELINE_DIR / f"{args.profile}.json"
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nbaseline written to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print(f"\nno baseline at {baseline_path} (run with --save-baseline)")
+        return
+
+    baseline = json.loads(baseline_path.read_text())
+    print(f"\nvs. {baseline_path} ({baseline['created_at']}, commit {baseline['environment'].get('commit')})")
+    if baseline["spec"] != report["spec"]:
+        print("warning: the baseline was recorded with a different dataset spec")
+    if any(baseline["environment"].get(k) != report["environment"].get(k) for k in ("machine", "cpus", "python")):
+        print("warning: the baseline was recorded on a different machine / Python")
+    rows, regressions = compare(results, {k: v for k, v in baseline["results"].items() if k in names},
+                                args.threshold, args.min_delta_ms)
+    print_table(["benchmark", "baseline ms", "current ms", "change", "status"], rows)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import json
+import os
+
+# 測試不碰 /data/test.db，也不啟動背景報價更新 (在 import app 之前設定)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("PRICE_REFRESH_ENABLED", "false")
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# 確保所有 table 都註冊到 metadata
+from app.models import accounts, assets, transacions  # noqa: E402,F401
+from app.core.database import SQLiteDB, create_db_engine, to_async_url  # noqa: E402
+from app.core.init_db import init_fiat_assets  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrations import run_migrations  # noqa: E402
+from app.models.accounts import Account, Portfolio  # noqa: E402
+from app.models.assets import Asset, AssetType, MarketData  # noqa: E402
+from app.models.transacions import TransactionType  # noqa: E402
+from app.schemas.transaction import TransactionCreate  # noqa: E402
+from app.services.quote_provider import FileQuoteProvider, get_quote_provider  # noqa: E402
+from app.services.transaction import TransactionService  # noqa: E402
+
+# priced_portfolio 的第一天
+DAY0 = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def database_url(tmp_path) -> str:
+    # 檔案 DB：sync engine 與 async (aiosqlite) engine 才能共用同一個資料庫
+    return f"sqlite:///{tmp_path / 'test.db'}"
+
+
+@pytest.fixture
+def engine(database_url):
+    """
+    每個測試一個 DB：create_all + migrations + 預設法幣資產 (USD)。
+    """
+    engine = create_db_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+    with Session(engine) as session:
+        init_fiat_assets(session)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture
+def async_engine(engine, database_url):
+    """
+    同一個測試 DB 的 aiosqlite engine。TestClient 每個請求用各自的 event loop，連線不能跨請求重用 (NullPool)。
+    """
+    async_engine = create_async_engine(to_async_url(database_url), poolclass=NullPool)
+    yield async_engine
+    async_engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def client(engine, async_engine):
+    """
+    打在測試 DB 上的 TestClient (sync 與 async 端點的 session 都換成測試 DB)。
+    不進入 lifespan：不啟動背景報價更新與即時更新。
+    """
+    def get_session():
+        with Session(engine) as session:
+            yield session
+
+    async def get_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[SQLiteDB.get_session] = get_session
+    app.dependency_overrides[SQLiteDB.get_async_session] = get_async_session
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def quotes(tmp_path):
+    """
+    以本地報價檔 (FileQuoteProvider) 取代 client 的報價來源，回傳寫入報價的函式。
+    """
+    path = tmp_path / "quotes.json"
+
+    def write(values: dict) -> None:
+        path.write_text(json.dumps(values))
+        app.dependency_overrides[get_quote_provider] = lambda: FileQuoteProvider(path)
+
+    return write
+
+
+@pytest.fixture
+def priced_portfolio(session: Session):
+    """
+    入金 1000，買 3 股 @ 30：現金 910 + 3 股。歷史價格在每天 00:00 (31, 33, 35)，current_price 為 989。
+    """
+    account = Account(name="Broker")
+    asset = Asset(ticker="ABC", name="ABC", type=AssetType.stock, current_price=Decimal(989))
+    session.add_all([account, asset])
+    session.commit()
+    cash_asset_id = session.exec(select(Asset.id).where(Asset.ticker == "USD")).one()
+    session.add_all([
+        MarketData(asset_id=asset.id, timestamp=DAY0 + timedelta(days=day), price=Decimal(price))
+        for day, price in enumerate([31, 33, 35])
+    ])
+    portfolio = Portfolio(name="Main", accounts=[account])
+    session.add(portfolio)
+    session.commit()
+
+    service = TransactionService(session)
+    for asset_id, type, quantity, price in ((cash_asset_id, TransactionType.deposit, 1000, 1),
+                                            (asset.id, TransactionType.buy, 3, 30)):
+        service.create_transaction(TransactionCreate(
+            account_id=account.id, asset_id=asset_id, type=type, quantity=Decimal(quantity),
+            price_per_unit=Decimal(price), transaction_time=DAY0 - timedelta(hours=1),
+        ))
+    return portfolio.id, asset.id
@@ -0,0 +1,28 @@
+"""
+/assets 端點走 async engine 與 AssetService：新增、列出、更新報價的來回都落在測試 DB 上。
+"""
+from decimal import Decimal
+
+from sqlmodel import select
+
+from app.models.assets import Asset, MarketData
+
+
+def test_create_list_and_refresh(client, session, quotes):
+    response = client.post("/api/v1/assets/", json={"ticker": "ABC", "name": "ABC Corp", "type": "stock"})
+    assert response.status_code == 200, response.text
+    asset_id = response.json()["id"]
+
+    listed = {asset["ticker"]: asset for asset in client.get("/api/v1/assets/").json()}
+    assert set(listed) == {"USD", "ABC"}
+    assert Decimal(listed["ABC"]["current_price"]) == 0
+
+    quotes({"ABC": {"price": 12.5, "previous_close": 12}})
+    assert client.post("/api/v1/assets/update_prices").json() == {"ok": True, "updated_count": 1}
+
+    asset = client.get(f"/api/v1/assets/{asset_id}").json()
+    assert (Decimal(asset["current_price"]), Decimal(asset["previous_close"])) == (Decimal("12.5"), 12)
+    # 同一個 DB：sync session 也看得到新價格與價格歷史
+    stored = session.exec(select(Asset).where(Asset.id == asset_id)).one()
+    assert stored.current_price == Decimal("12.5")
+    assert session.exec(select(MarketData.price).where(MarketData.asset_id == asset_id)).all() == [Decimal("12.5")]
@@ -0,0 +1,91 @@
+"""
+as-of 持倉只讀每個資產在 as_of 之前最近的一個 checkpoint，結果與從頭重播相同。
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import PositionCheckpoint, Transaction, TransactionType
+from app.schemas.transaction import TransactionCreate
+from app.services.checkpoints import CheckpointService
+from app.services.position import PositionService, cash_flow, replay_transactions
+from app.services.transaction import TransactionService
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def account_id(session: Session, monkeypatch) -> int:
+    """
+    入金後兩個資產交錯買賣，每 2 筆一個 checkpoint。
+    """
+    monkeypatch.setattr(settings, "POSITION_CHECKPOINT_INTERVAL", 2)
+    account = Account(name="Broker")
+    assets = [Asset(ticker=ticker, name=ticker, type=AssetType.stock, current_price=Decimal(10))
+              for ticker in ("ABC", "XYZ")]
+    session.add_all([account, *assets])
+    session.commit()
+    cash_asset_id = session.exec(select(Asset.id).where(Asset.ticker == "USD")).one()
+
+    service = TransactionService(session)
+    service.create_transaction(TransactionCreate(
+        account_id=account.id, asset_id=cash_asset_id, type=TransactionType.deposit, quantity=Decimal(10000),
+        price_per_unit=Decimal(1), transaction_time=START))
+    for hour in range(1, 21):
+        asset = assets[hour % 2]
+        sell = hour % 5 == 0
+        service.create_transaction(TransactionCreate(
+            account_id=account.id, asset_id=asset.id, type=TransactionType.sell if sell else TransactionType.buy,
+            quantity=Decimal(3 if sell else 2), price_per_unit=Decimal(10 + hour), fee=Decimal(1),
+            transaction_time=START + timedelta(hours=hour)))
+    return account.id
+
+
+def rounded(holdings) -> list:
+    # checkpoint 的成本存到小數 10 位，平均成本只差在最後幾位
+    return [(asset_id, quantity, average_cost.quantize(Decimal("0.000001")))
+            for asset_id, quantity, average_cost in holdings]
+
+
+def replayed(session: Session, account_id: int, as_of: datetime) -> list:
+    transactions = session.exec(
+        select(Transaction).where(Transaction.account_id == account_id, Transaction.transaction_time <= as_of)
+        .order_by(Transaction.transaction_time, Transaction.id)).all()
+    cash_asset_id = PositionService(session).get_cash_asset_id(account_id)
+    holdings = []
+    for asset_id in sorted({txn.asset_id for txn in transactions} - {cash_asset_id}):
+        quantity, average_cost = replay_transactions(txn for txn in transactions if txn.asset_id == asset_id)
+        if quantity != 0:
+            holdings.append((asset_id, quantity, average_cost))
+    cash = sum((cash_flow(txn) for txn in transactions), Decimal(0))
+    if cash != 0:
+        holdings.append((cash_asset_id, cash, Decimal(1)))
+    return holdings
+
+
+def test_latest_by_asset(session, account_id):
+    until = START + timedelta(hours=13, minutes=30)
+    latest = CheckpointService(session).latest_by_asset(account_id, until=until)
+
+    checkpoints = session.exec(select(PositionCheckpoint).where(
+        PositionCheckpoint.account_id == account_id, PositionCheckpoint.transaction_time <= until)).all()
+    expected = {}
+    for checkpoint in checkpoints:
+        key = (checkpoint.transaction_time, checkpoint.transaction_id)
+        if checkpoint.asset_id not in expected or key > expected[checkpoint.asset_id]:
+            expected[checkpoint.asset_id] = key
+    # 每個資產 (含現金) 只有一列，而且是 until 之前最後一個
+    assert len(checkpoints) > len(expected) == 3
+    assert {asset_id: (row.transaction_time, row.transaction_id) for asset_id, row in latest.items()} == expected
+
+
+@pytest.mark.parametrize("hours", [0, 1, 4.5, 10, 13.5, 20, 30])
+def test_holdings_as_of_match_replay(session, account_id, hours):
+    as_of = START + timedelta(hours=hours)
+    holdings = PositionService(session).get_holdings_as_of(account_id, as_of)
+    assert rounded(holdings) == rounded(replayed(session, account_id, as_of))
@@ -0,0 +1,61 @@
+"""
+日漲跌 (Asset.previous_close)：報價沒有前一日收盤時不沿用舊值；dashboard 的損益變動不含現金與匯率。
+"""
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position
+from app.services.account import AccountService
+
+
+@pytest.fixture
+def holdings(session: Session) -> int:
+    """
+    帳戶持有 1000 USD、100 EUR (成本 1.1) 與 10 股 ABC (成本 10)。回傳帳戶 id。
+    """
+    account = Account(name="Broker")
+    eur = Asset(ticker="EUR", name="Euro", type=AssetType.fiat, current_price=Decimal("1.1"),
+                previous_close=Decimal(1))
+    abc = Asset(ticker="ABC", name="ABC Corp", type=AssetType.stock, current_price=Decimal(12),
+                previous_close=Decimal(11))
+    session.add_all([account, eur, abc])
+    session.commit()
+    usd_id = session.exec(select(Asset.id).where(Asset.ticker == "USD")).one()
+    session.add_all([
+        Position(account_id=account.id, asset_id=usd_id, total_quantity=Decimal(1000), average_cost=Decimal(1)),
+        Position(account_id=account.id, asset_id=eur.id, total_quantity=Decimal(100), average_cost=Decimal("1.1")),
+        Position(account_id=account.id, asset_id=abc.id, total_quantity=Decimal(10), average_cost=Decimal(10)),
+    ])
+    session.commit()
+    return account.id
+
+
+def test_refresh_without_previous_close_clears_it(client, session, holdings, quotes):
+    quotes({"ABC": {"price": 13, "previous_close": 12}})
+    client.post("/api/v1/assets/update_prices")
+    assert AccountService(session)._calculate_account_totals([holdings])[holdings].asset_daily_change == 10
+
+    # 報價來源不再提供前一日收盤：不保留 12 (可能已是好幾天前的收盤)，這個資產不計日漲跌
+    quotes({"ABC": {"price": 14}})
+    client.post("/api/v1/assets/update_prices")
+    session.expire_all()
+    abc = session.exec(select(Asset).where(Asset.ticker == "ABC")).one()
+    assert (abc.current_price, abc.previous_close) == (14, 0)
+    totals = AccountService(session)._calculate_account_totals([holdings])[holdings]
+    assert totals.asset_daily_change == 0
+    # 只剩 EUR 的匯率變動
+    assert totals.daily_change == 10
+
+
+def test_dashboard_profit_change_excludes_cash(client, holdings):
+    stats = client.get("/api/v1/dashboard/").json()
+    # 損益只算 ABC：10 * (12 - 10)，前一日為 10 * (11 - 10)
+    assert Decimal(stats["total_profit"]) == 20
+    assert stats["total_profit_change_24h"] == pytest.approx(100.0)
+    # 淨值包含 EUR 的匯率變動：(10 + 10) / (1230 - 20)
+    assert Decimal(stats["net_worth"]) == 1230
+    assert stats["net_worth_change_24h"] == pytest.approx(20 / 1210 * 100)
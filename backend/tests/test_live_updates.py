@@ -0,0 +1,55 @@
+"""
+即時更新串流預設關閉 (LIVE_UPDATES_ENABLED)；計算失敗時記錄 log，broker 繼續執行。
+"""
+import asyncio
+import logging
+
+from fastapi.testclient import TestClient
+
+from app.core.cache import versions
+from app.core.config import settings
+from app.core.database import SQLiteDB
+from app.main import app
+from app.services.live_updates import LiveUpdateBroker
+
+
+def test_disabled_by_default():
+    assert not settings.LIVE_UPDATES_ENABLED
+    with TestClient(app) as client:
+        assert not app.state.live_updates.running
+        assert app.state.live_updates._on_bump not in versions._listeners
+        assert client.get("/api/v1/stream/stats").status_code == 503
+
+
+def test_enabled_starts_broker(monkeypatch):
+    monkeypatch.setattr(settings, "LIVE_UPDATES_ENABLED", True)
+    with TestClient(app) as client:
+        assert app.state.live_updates.running
+        assert client.get("/api/v1/stream/stats").status_code == 200
+    assert not app.state.live_updates.running
+
+
+def test_failed_refresh_is_logged(caplog):
+    async def run() -> int:
+        broker = LiveUpdateBroker(SQLiteDB.engine, debounce=0)
+        calls = 0
+
+        async def refresh():
+            nonlocal calls
+            calls += 1
+            raise RuntimeError("boom")
+
+        broker.refresh = refresh
+        broker.start()
+        for _ in range(2):
+            broker._wakeup.set()
+            await asyncio.sleep(0.01)
+        running = broker.running
+        await broker.stop()
+        assert running
+        return calls
+
+    with caplog.at_level(logging.ERROR, logger="app.services.live_updates"):
+        assert asyncio.run(run()) == 2
+    records = [record for record in caplog.records if record.message == "Live update failed"]
+    assert len(records) == 2 and records[0].exc_info[0] is RuntimeError
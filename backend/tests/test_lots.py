@@ -0,0 +1,123 @@
+"""
+LotService.append 只從賣出取用的一端分批讀既有的 lot，結果 (open lots 與已實現的 lot) 必須與從頭重播相同。
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.accounts import Account, LotMethod
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position, RealizedLot, TaxLot, Transaction, TransactionType
+from app.schemas.transaction import TransactionCreate
+from app.services.lots import LotService
+from app.services.transaction import TransactionService
+from tests.test_query_counts import count_statements
+
+START = datetime(2024, 1, 1)
+CHUNK = 4
+
+
+def buy_or_sell(account_id: int, asset_id: int, type: TransactionType, quantity, price, hour: int) -> TransactionCreate:
+    return TransactionCreate(
+        account_id=account_id, asset_id=asset_id, type=type, quantity=Decimal(quantity),
+        price_per_unit=Decimal(price), fee=Decimal(1), transaction_time=START + timedelta(hours=hour),
+    )
+
+
+def make_pair(session: Session, method: LotMethod, buys: int = 20) -> tuple[int, int]:
+    """
+    一個帳戶與資產，先買入 `buys` 個 lot (每個 2 股，價格遞增)。
+    """
+    account = Account(name="Broker", lot_method=method)
+    asset = Asset(ticker="ABC", name="ABC Corp", type=AssetType.stock, current_price=Decimal(10))
+    session.add_all([account, asset])
+    session.commit()
+    service = TransactionService(session)
+    for i in range(buys):
+        service.create_transaction(buy_or_sell(account.id, asset.id, TransactionType.buy, 2, 10 + i, hour=i))
+    return account.id, asset.id
+
+
+def lots(session: Session, account_id: int, asset_id: int) -> tuple[list, list]:
+    open_lots = [(row.transaction_id, row.quantity, row.cost_per_unit) for row in session.exec(
+        select(TaxLot).where(TaxLot.account_id == account_id, TaxLot.asset_id == asset_id)
+        .order_by(TaxLot.opened_at, TaxLot.transaction_id).execution_options(populate_existing=True))]
+    realized = [(row.transaction_id, row.lot_transaction_id, row.quantity, row.cost_basis) for row in session.exec(
+        select(RealizedLot).where(RealizedLot.account_id == account_id, RealizedLot.asset_id == asset_id)
+        .order_by(RealizedLot.transaction_id, RealizedLot.lot_transaction_id)
+        .execution_options(populate_existing=True))]
+    return open_lots, realized
+
+
+def replayed(session: Session, account_id: int, asset_id: int) -> tuple[list, list]:
+    LotService(session).replay(account_id, asset_id)
+    session.flush()
+    result = lots(session, account_id, asset_id)
+    session.rollback()
+    return result
+
+
+@pytest.mark.parametrize("method", [LotMethod.fifo, LotMethod.lifo, LotMethod.average, LotMethod.specific])
+def test_append_matches_replay(session, monkeypatch, method):
+    monkeypatch.setattr(LotService, "LOT_CHUNK_SIZE", CHUNK)
+    account_id, asset_id = make_pair(session, method)
+    service = TransactionService(session)
+    sell, buy = TransactionType.sell, TransactionType.buy
+
+    # 不到一個 lot、跨過好幾批、剛好用完一批，以及同一批裡先買後賣 (新 lot 在既有 lot 之後)
+    steps = [
+        [buy_or_sell(account_id, asset_id, sell, 1, 50, hour=100)],
+        [buy_or_sell(account_id, asset_id, sell, 13, 50, hour=101)],
+        [buy_or_sell(account_id, asset_id, buy, 3, 40, hour=102), buy_or_sell(account_id, asset_id, sell, 10, 50, hour=103)],
+        [buy_or_sell(account_id, asset_id, sell, 8, 50, hour=104)],
+    ]
+    for step, batch in enumerate(steps):
+        service.create_transactions(batch)
+        assert lots(session, account_id, asset_id) == replayed(session, account_id, asset_id), f"step {step}"
+
+    position = session.exec(select(Position).where(Position.account_id == account_id, Position.asset_id == asset_id)).one()
+    open_lots, _ = lots(session, account_id, asset_id)
+    assert position.total_quantity == sum(quantity for _, quantity, _ in open_lots) == 11
+
+
+def test_append_reads_lots_from_consumed_end(engine, session, monkeypatch):
+    monkeypatch.setattr(LotService, "LOT_CHUNK_SIZE", CHUNK)
+    account_id, asset_id = make_pair(session, LotMethod.lifo)
+    service = TransactionService(session)
+
+    with count_statements(engine) as statements:
+        service.create_transaction(buy_or_sell(account_id, asset_id, TransactionType.sell, 1, 50, hour=100))
+    lot_reads = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM tax_lots" in s]
+    # 只讀最新的一批 (LIMIT)，不讀整個 pair
+    assert len(lot_reads) == 1 and "LIMIT" in lot_reads[0]
+    open_lots, realized = lots(session, account_id, asset_id)
+    assert realized[0][1] == open_lots[-1][0]
+
+    # 只有買入時不讀既有的 lot
+    with count_statements(engine) as statements:
+        service.create_transaction(buy_or_sell(account_id, asset_id, TransactionType.buy, 1, 50, hour=101))
+    assert not [s for s in statements if s.lstrip().startswith("SELECT") and "FROM tax_lots" in s]
+
+
+def test_append_specific_reads_selected_lots(session, monkeypatch):
+    monkeypatch.setattr(LotService, "LOT_CHUNK_SIZE", CHUNK)
+    account_id, asset_id = make_pair(session, LotMethod.specific)
+    buys = session.exec(select(Transaction.id).where(Transaction.account_id == account_id)
+                        .order_by(Transaction.transaction_time)).all()
+
+    # 指定最新的一個 lot 與中間的一個，其餘 (3 股) 依 FIFO
+    sell = Transaction(account_id=account_id, asset_id=asset_id, type=TransactionType.sell, quantity=Decimal(6),
+                       price_per_unit=Decimal(50), fee=Decimal(0), transaction_time=START + timedelta(hours=100))
+    session.add(sell)
+    session.flush()
+    service = LotService(session)
+    service.set_selections(sell, [(buys[-1], Decimal(2)), (buys[9], Decimal(1))])
+    service.append(account_id, asset_id, [sell], quantity=Decimal(40), cost=Decimal(0))
+    session.flush()
+
+    _, realized = lots(session, account_id, asset_id)
+    assert [(lot_id, quantity) for _, lot_id, quantity, _ in realized] == sorted(
+        [(buys[-1], 2), (buys[9], 1), (buys[0], 2), (buys[1], 1)])
+    assert lots(session, account_id, asset_id) == replayed(session, account_id, asset_id)
@@ -0,0 +1,171 @@
+"""
+從最初版本的 schema (加入 migration 之前) 升級：啟動時的 create_all + run_migrations 要補上所有欄位與索引，
+並以既有交易回填持倉、tax lot 與 checkpoint。
+
+m0006 / m0007 有自己的一份回填規則 (不用 LotService / PositionService)：這裡把回填結果固定下來，
+也以每批一列的方式回填一次，確認分批讀寫的結果相同。
+"""
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, select
+
+from app.core.config import settings
+from app.core.database import create_db_engine
+from app.migrations import MIGRATIONS, m0006_tax_lots, m0007_position_checkpoints, run_migrations
+from app.models.transacions import Position, PositionCheckpoint, RealizedLot, TaxLot
+
+# 最初版本的 models 以 create_all 建立的 schema
+BASELINE_SCHEMA = """
+CREATE TABLE assets (
+    id INTEGER NOT NULL,
+    ticker VARCHAR(20) NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    type VARCHAR(6) NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    current_price NUMERIC(20, 10) NOT NULL,
+    last_updated DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (ticker)
+);
+CREATE TABLE accounts (
+    id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    currency VARCHAR(10) NOT NULL,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE portfolios (
+    id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    description VARCHAR,
+    created_at DATETIME NOT NULL,
+    PRIMARY KEY (id)
+);
+CREATE TABLE portfolio_accounts (
+    portfolio_id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    PRIMARY KEY (portfolio_id, account_id),
+    FOREIGN KEY(portfolio_id) REFERENCES portfolios (id) ON DELETE CASCADE,
+    FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE CASCADE
+);
+CREATE TABLE transactions (
+    id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    asset_id INTEGER,
+    type VARCHAR(8) NOT NULL,
+    quantity NUMERIC(20, 10),
+    price_per_unit NUMERIC(20, 10),
+    fee NUMERIC(20, 10) NOT NULL,
+    transaction_time DATETIME NOT NULL,
+    notes VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE CASCADE,
+    FOREIGN KEY(asset_id) REFERENCES assets (id) ON DELETE RESTRICT
+);
+CREATE TABLE positions (
+    id INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    asset_id INTEGER NOT NULL,
+    total_quantity NUMERIC(20, 10) NOT NULL,
+    average_cost NUMERIC(20, 10) NOT NULL,
+    last_updated DATETIME NOT NULL,
+    PRIMARY KEY (id),
+    CONSTRAINT unique_account_asset_position UNIQUE (account_id, asset_id),
+    FOREIGN KEY(account_id) REFERENCES accounts (id) ON DELETE CASCADE,
+    FOREIGN KEY(asset_id) REFERENCES assets (id) ON DELETE CASCADE
+);
+"""
+
+BASELINE_DATA = """
+INSERT INTO assets VALUES (1, 'USD', 'US Dollar', 'fiat', 'USD', 1, '2024-01-01 00:00:00');
+INSERT INTO assets VALUES (2, 'AAA', 'AAA Corp', 'stock', 'USD', 20, '2024-01-01 00:00:00');
+INSERT INTO accounts VALUES (1, 'Broker', 'USD', '2024-01-01 00:00:00');
+INSERT INTO transactions VALUES (1, 1, 1, 'deposit', 1000, 1, 0, '2024-01-01 09:00:00.000000', NULL);
+INSERT INTO transactions VALUES (2, 1, 2, 'buy', 10, 10, 1, '2024-01-02 09:00:00.000000', NULL);
+INSERT INTO transactions VALUES (3, 1, 2, 'buy', 10, 20, 1, '2024-01-03 09:00:00.000000', NULL);
+INSERT INTO transactions VALUES (4, 1, 2, 'sell', 5, 30, 0, '2024-01-04 09:00:00.000000', NULL);
+-- 舊版本留下的持倉 (數值已過期)，升級時要重建
+INSERT INTO positions VALUES (1, 1, 2, 20, 15.1, '2024-01-03 09:00:00');
+INSERT INTO positions VALUES (2, 1, 1, 698, 1, '2024-01-03 09:00:00');
+"""
+
+
+@pytest.fixture
+def upgraded(request, monkeypatch):
+    monkeypatch.setattr(settings, "POSITION_CHECKPOINT_INTERVAL", 2)
+    batch_size = getattr(request, "param", None)
+    if batch_size:
+        monkeypatch.setattr(m0006_tax_lots, "BATCH_SIZE", batch_size)
+        monkeypatch.setattr(m0007_position_checkpoints, "BATCH_SIZE", batch_size)
+    monkeypatch.setattr(settings, "TAX_LOT_METHOD", "fifo")
+    engine = create_db_engine("sqlite://")
+    with engine.begin() as connection:
+        for statement in (BASELINE_SCHEMA + BASELINE_DATA).split(";"):
+            if statement.strip():
+                connection.execute(text(statement))
+
+    # 與 SQLiteDB.create_db_and_tables 相同的啟動流程
+    SQLModel.metadata.create_all(engine)
+    applied = run_migrations(engine)
+    yield engine, applied
+    engine.dispose()
+
+
+def test_upgrade_applies_every_migration(upgraded):
+    engine, applied = upgraded
+    assert applied == list(range(1, len(MIGRATIONS) + 1))
+    # 再執行一次不會重複套用
+    assert run_migrations(engine) == []
+
+    columns = {table: {column["name"] for column in inspect(engine).get_columns(table)}
+               for table in ("assets", "transactions", "accounts", "positions")}
+    assert "previous_close" in columns["assets"]
+    assert "content_hash" in columns["transactions"]
+    assert "lot_method" in columns["accounts"]
+    assert {"since_checkpoint", "total_cost"} <= columns["positions"]
+
+
+def test_upgrade_creates_model_indexes(upgraded):
+    engine, _ = upgraded
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {index["name"]: index for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            assert index.name in existing, f"{table.name}: {index.name}"
+            assert bool(existing[index.name]["unique"]) == index.unique, index.name
+
+    names = {index["name"] for index in inspector.get_indexes("transactions")}
+    assert {"ix_transactions_account_asset_time", "ix_transactions_account_time", "ix_transactions_time_id",
+            "ux_transactions_content_hash"} <= names
+    assert "ix_positions_asset_quantity" in {index["name"] for index in inspector.get_indexes("positions")}
+
+
+@pytest.mark.parametrize("upgraded", [None, 1], indirect=True)
+def test_upgrade_backfills_positions_lots_and_checkpoints(upgraded):
+    engine, _ = upgraded
+    with Session(engine) as session:
+        positions = {row.asset_id: (row.total_quantity, row.average_cost, row.total_cost, row.since_checkpoint)
+                     for row in session.exec(select(Position))}
+        # AAA：成本 101 + 201，賣出 5 股後剩 15 股，平均成本 15.1；現金 1000 - 101 - 201 + 150
+        assert positions == {
+            2: (Decimal(15), Decimal("15.1"), Decimal("226.5"), 1),
+            1: (Decimal(848), Decimal(1), Decimal(848), 0),
+        }
+
+        lots = [(lot.transaction_id, lot.quantity, lot.cost_per_unit)
+                for lot in session.exec(select(TaxLot).order_by(TaxLot.opened_at))]
+        assert lots == [(2, Decimal(5), Decimal("10.1")), (3, Decimal(10), Decimal("20.1"))]
+        realized = [(lot.transaction_id, lot.lot_transaction_id, lot.quantity, lot.proceeds, lot.cost_basis)
+                    for lot in session.exec(select(RealizedLot))]
+        assert realized == [(4, 2, Decimal(5), Decimal(150), Decimal("50.5"))]
+
+        checkpoints = [(row.asset_id, row.transaction_id, row.total_quantity, row.total_cost)
+                       for row in session.exec(select(PositionCheckpoint)
+                                               .order_by(PositionCheckpoint.asset_id, PositionCheckpoint.transaction_id))]
+        assert checkpoints == [
+            (1, 2, Decimal(899), Decimal(899)),
+            (1, 4, Decimal(848), Decimal(848)),
+            (2, 3, Decimal(20), Decimal(302)),
+        ]
@@ -0,0 +1,74 @@
+"""
+PerformanceService：TWR、XIRR、最大回撤，以及第一個時間點剛好有價格時的市值。
+"""
+import math
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from app.services.performance import PerformanceService, max_drawdowns, time_weighted_returns, xirr
+from tests.conftest import DAY0
+
+
+def test_xirr_newton_bisection_and_no_solution():
+    amounts = np.array([
+        [-1000, 1100, 0],
+        # Newton 從 10% 出發不會收斂，改用二分法
+        [-1, 1000, 0],
+        [-100, -50, 0],
+        [-100, 0, 121],
+    ], dtype=np.float64)
+    result = xirr(amounts, np.array([0.0, 1.0, 2.0]))
+    assert result[0] == pytest.approx(0.1)
+    assert result[1] == pytest.approx(999.0)
+    assert math.isnan(result[2])
+    assert result[3] == pytest.approx(0.1)
+
+
+def test_twr_ignores_flows_and_drawdown():
+    # 第二天入金 100：TWR 只看 110/100 與 220/(110+100)
+    values = np.array([[100.0, 110.0, 220.0], [100.0, 50.0, 75.0]])
+    flows = np.array([[0.0, 100.0], [0.0, 0.0]])
+    twr, index = time_weighted_returns(values, flows)
+    assert twr == pytest.approx([1.1 * 220 / 210 - 1, -0.25])
+    assert max_drawdowns(index) == pytest.approx([0.0, 0.5])
+
+
+def test_first_value_uses_price_on_cutoff(session, priced_portfolio):
+    """
+    cutoffs[0] (DAY0 + 1 天 00:00) 剛好有一筆價格 (33)：它屬於下一個時間點，
+    第一個市值用前一筆 (31)，不是 fallback 的 current_price (989)。
+    """
+    portfolio_id, _ = priced_portfolio
+    result, = PerformanceService(session).get_performance(
+        [portfolio_id], start=DAY0 + timedelta(days=1), end=DAY0 + timedelta(days=2)
+    )
+    values = [910 + 3 * 31, 910 + 3 * 33, 910 + 3 * 35]
+    assert result.start == DAY0 + timedelta(days=1)
+    assert [result.start_value, result.end_value] == [values[0], values[-1]]
+    assert result.net_flows == 0
+    assert result.time_weighted_return == pytest.approx(values[-1] / values[0] - 1)
+    assert result.money_weighted_return == pytest.approx((values[-1] / values[0]) ** (365 / 2) - 1)
+    assert result.max_drawdown == 0
+
+
+def test_performance_since_inception_counts_deposit_as_flow(session, priced_portfolio):
+    portfolio_id, _ = priced_portfolio
+    result, = PerformanceService(session).get_performance([portfolio_id], end=DAY0 + timedelta(days=1))
+    # 第一筆交易在 DAY0 前一天 23:00：那一天的入金 1000 是外部資金流，期初市值為 0
+    assert result.start == DAY0 - timedelta(days=1)
+    assert result.start_value == 0
+    assert result.net_flows == 1000
+    # 前一天結束時用 fallback (還沒有歷史價格)，之後 31 -> 33
+    assert result.time_weighted_return == pytest.approx((910 + 3 * 33) / 1000 - 1)
+
+
+def test_performance_range_is_validated(client, priced_portfolio):
+    portfolio_id, _ = priced_portfolio
+    url = f"/api/v1/portfolios/{portfolio_id}/performance"
+    assert client.get(url, params={"from": "2024-03-02", "to": "2024-03-03"}).status_code == 200
+    assert client.get(url, params={"from": "2024-03-03", "to": "2024-03-01"}).status_code == 400
+    assert client.get(url, params={"from": "1900-01-01", "to": "2024-03-03"}).status_code == 400
+    assert client.get("/api/v1/portfolios/performance", params={"from": "1900-01-01"}).status_code == 400
+    assert client.get("/api/v1/portfolios/999/performance").status_code == 404
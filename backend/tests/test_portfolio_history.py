@@ -0,0 +1,42 @@
+"""
+歷史市值：價格以「嚴格早於 cutoff」為準 (與交易相同)，以及端點的範圍檢查。
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from app.services.market_data import MarketDataService
+from app.services.portfolio import PortfolioService
+from tests.conftest import DAY0
+
+
+def test_price_matrix_is_strictly_before_cutoff(session, priced_portfolio):
+    _, asset_id = priced_portfolio
+    cutoffs = np.array([DAY0, DAY0 + timedelta(hours=12), DAY0 + timedelta(days=1), DAY0 + timedelta(days=3)],
+                       dtype="datetime64[us]")
+    prices = MarketDataService(session).get_price_matrix([asset_id], cutoffs, {asset_id: 989.0})
+    # 剛好落在 cutoff 上的價格屬於下一個時間點；第一個 cutoff 之前沒有價格時用 fallback
+    assert prices[:, 0].tolist() == [989.0, 31.0, 31.0, 35.0]
+
+    cutoffs = np.array([DAY0 + timedelta(days=1), DAY0 + timedelta(days=2)], dtype="datetime64[us]")
+    prices = MarketDataService(session).get_price_matrix([asset_id], cutoffs, {asset_id: 989.0})
+    assert prices[:, 0].tolist() == [31.0, 33.0]
+
+
+def test_history_first_point_on_price_timestamp(session, priced_portfolio):
+    portfolio_id, _ = priced_portfolio
+    # 每天結束 (隔天 00:00) 的市值，第一個 cutoff 剛好有一筆價格
+    history = PortfolioService(session).get_portfolio_history(portfolio_id, start=DAY0, end=DAY0 + timedelta(days=2))
+    assert history.values == [910 + 3 * 31, 910 + 3 * 33, 910 + 3 * 35]
+
+
+def test_history_range_is_validated(client, priced_portfolio):
+    portfolio_id, _ = priced_portfolio
+    url = f"/api/v1/portfolios/{portfolio_id}/history"
+    assert client.get(url, params={"from": "2024-03-01", "to": "2024-03-03"}).status_code == 200
+    assert client.get(url, params={"from": "2024-03-03", "to": "2024-03-01"}).status_code == 400
+    response = client.get(url, params={"from": "1900-01-01", "to": "2024-03-01"})
+    assert response.status_code == 400
+    assert "at most" in response.json()["detail"]
+    assert client.get(url, params={"from": "2023-01-01", "to": "2024-03-01", "interval": "1h"}).status_code == 400
+    assert client.get("/api/v1/portfolios/999/history").status_code == 404
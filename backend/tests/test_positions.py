@@ -0,0 +1,178 @@
+"""
+PositionService 的增量更新 (append、補登重播、修改 / 刪除差額、現金) 必須與從頭重建的結果相同。
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position, TransactionType
+from app.schemas.transaction import TransactionCreate, TransactionUpdate
+from app.services.position import PositionService
+from app.services.transaction import TransactionService
+
+START = datetime(2024, 1, 1)
+
+
+def q(value: Decimal) -> Decimal:
+    return Decimal(value).quantize(Decimal("0.000001"))
+
+
+@pytest.fixture
+def ledger(session: Session):
+    account = Account(name="Broker")
+    assets = [Asset(ticker=f"AS{i}", name=f"Asset {i}", type=AssetType.stock, current_price=Decimal(100))
+              for i in range(2)]
+    session.add_all([account, *assets])
+    session.commit()
+    cash_asset_id = session.exec(select(Asset.id).where(Asset.ticker == "USD")).one()
+    return account.id, [asset.id for asset in assets], cash_asset_id
+
+
+def create(session: Session, account_id: int, asset_id: int | None, type: TransactionType, quantity, price,
+           day: float, fee=0):
+    return TransactionService(session).create_transaction(TransactionCreate(
+        account_id=account_id, asset_id=asset_id, type=type, quantity=Decimal(quantity),
+        price_per_unit=Decimal(price), fee=Decimal(fee), transaction_time=START + timedelta(days=day),
+    ))
+
+
+def positions(session: Session, account_id: int) -> dict[int, tuple[Decimal, Decimal]]:
+    return {
+        row.asset_id: (q(row.total_quantity), q(row.average_cost))
+        for row in session.exec(select(Position).where(Position.account_id == account_id)
+                                .execution_options(populate_existing=True))
+        if row.total_quantity != 0
+    }
+
+
+def rebuilt(session: Session, account_id: int) -> dict[int, tuple[Decimal, Decimal]]:
+    """
+    從頭重建後的持倉 (rollback，不影響增量維護的結果)。
+    """
+    PositionService(session).rebuild_account(account_id)
+    session.flush()
+    result = positions(session, account_id)
+    session.rollback()
+    return result
+
+
+def test_append_applies_transaction_and_cash(session, ledger):
+    account_id, (asset_id, _), cash_asset_id = ledger
+    create(session, account_id, cash_asset_id, TransactionType.deposit, 10_000, 1, day=0)
+    create(session, account_id, asset_id, TransactionType.buy, 10, 100, day=1, fee=1)
+    create(session, account_id, asset_id, TransactionType.buy, 10, 200, day=2, fee=1)
+
+    expected = {asset_id: (q(20), q(Decimal("150.1"))), cash_asset_id: (q(6_998), q(1))}
+    assert positions(session, account_id) == expected
+    assert rebuilt(session, account_id) == expected
+
+
+def test_back_dated_insert_replays_pair(session, ledger):
+    account_id, (asset_id, _), cash_asset_id = ledger
+    create(session, account_id, cash_asset_id, TransactionType.deposit, 10_000, 1, day=0)
+    create(session, account_id, asset_id, TransactionType.buy, 10, 100, day=1)
+    create(session, account_id, asset_id, TransactionType.sell, 5, 150, day=3)
+    # 補登在賣出之前：賣出的平均成本改變
+    create(session, account_id, asset_id, TransactionType.buy, 10, 400, day=2)
+
+    expected = {asset_id: (q(15), q(250)), cash_asset_id: (q(10_000 - 1_000 - 4_000 + 750), q(1))}
+    assert positions(session, account_id) == expected
+    assert rebuilt(session, account_id) == expected
+
+
+def test_update_and_delete_apply_deltas(session, ledger):
+    account_id, (asset_id, other_asset_id), cash_asset_id = ledger
+    create(session, account_id, cash_asset_id, TransactionType.deposit, 10_000, 1, day=0)
+    first = create(session, account_id, asset_id, TransactionType.buy, 10, 100, day=1)
+    second = create(session, account_id, asset_id, TransactionType.buy, 10, 200, day=2)
+    service = TransactionService(session)
+
+    service.update_transaction(first, TransactionUpdate(quantity=Decimal(20)))
+    assert positions(session, account_id)[asset_id] == (q(30), q(Decimal(4_000) / 30))
+    assert positions(session, account_id)[cash_asset_id] == (q(6_000), q(1))
+    assert positions(session, account_id) == rebuilt(session, account_id)
+
+    # 只改 notes 不影響持倉
+    service.update_transaction(second, TransactionUpdate(notes="memo"))
+    assert positions(session, account_id) == rebuilt(session, account_id)
+
+    # 移到另一個資產：兩個 (account, asset) 都要重播
+    service.update_transaction(second, TransactionUpdate(asset_id=other_asset_id, transaction_time=START))
+    assert positions(session, account_id) == {
+        asset_id: (q(20), q(100)), other_asset_id: (q(10), q(200)), cash_asset_id: (q(6_000), q(1)),
+    }
+    assert positions(session, account_id) == rebuilt(session, account_id)
+
+    service.delete_transaction(first)
+    assert positions(session, account_id) == {other_asset_id: (q(10), q(200)), cash_asset_id: (q(8_000), q(1))}
+    assert positions(session, account_id) == rebuilt(session, account_id)
+
+
+@pytest.mark.parametrize("interval", [0, 3])
+def test_random_writes_match_rebuild(session, ledger, monkeypatch, interval):
+    """
+    隨機的新增 / 補登 / 修改 / 刪除 (含批次)，每一步之後持倉與現金都等於從頭重建。
+    `interval` 為 0 時不寫 checkpoint，3 時補登會從 checkpoint 開始重播。
+    """
+    monkeypatch.setattr(settings, "POSITION_CHECKPOINT_INTERVAL", interval)
+    account_id, asset_ids, cash_asset_id = ledger
+    rng = random.Random(interval)
+    service = TransactionService(session)
+    create(session, account_id, cash_asset_id, TransactionType.deposit, 100_000, 1, day=0)
+
+    def random_create() -> TransactionCreate:
+        return TransactionCreate(
+            account_id=account_id, asset_id=rng.choice(asset_ids),
+            type=rng.choice([TransactionType.buy, TransactionType.buy, TransactionType.sell, TransactionType.dividend]),
+            quantity=Decimal(rng.randint(1, 10)), price_per_unit=Decimal(rng.randint(50, 150)),
+            fee=Decimal(rng.randint(0, 2)), transaction_time=START + timedelta(hours=rng.randint(1, 2_000)),
+        )
+
+    transactions = []
+    for step in range(60):
+        action = step % 5 if transactions else 0
+        if action in (0, 1):
+            transactions.append(service.create_transaction(random_create()))
+        elif action == 2:
+            transactions.extend(service.create_transactions([random_create() for _ in range(3)]))
+        elif action == 3:
+            targets = rng.sample(transactions, min(2, len(transactions)))
+            service.update_transactions([
+                (txn, TransactionUpdate(quantity=Decimal(rng.randint(1, 10)),
+                                        transaction_time=START + timedelta(hours=rng.randint(1, 2_000))))
+                for txn in targets
+            ])
+        else:
+            target = transactions.pop(rng.randrange(len(transactions)))
+            service.delete_transaction(target)
+        assert positions(session, account_id) == rebuilt(session, account_id), f"step {step}"
+
+
+def test_many_appends_match_replay(session, ledger):
+    """
+    append 從持倉存的總成本繼續，不從四捨五入過的平均成本反推：很多次 append 之後仍與從頭重播相同。
+    """
+    account_id, (asset_id, _), cash_asset_id = ledger
+    create(session, account_id, cash_asset_id, TransactionType.deposit, 10**9, 1, day=0)
+    rng = random.Random(1)
+    for step in range(200):
+        sell = step % 3 == 2
+        create(session, account_id, asset_id, TransactionType.sell if sell else TransactionType.buy,
+               rng.randint(100_000, 300_000) if not sell else rng.randint(50_000, 150_000),
+               Decimal(rng.randint(10**9, 9 * 10**9)).scaleb(-10), day=1 + step / 1000, fee=Decimal("0.3333333333"))
+
+    def stored() -> tuple[Decimal, Decimal, Decimal]:
+        position = session.exec(select(Position).where(Position.account_id == account_id, Position.asset_id == asset_id)
+                                .execution_options(populate_existing=True)).one()
+        return position.total_quantity, position.average_cost, position.total_cost
+
+    appended = stored()
+    PositionService(session).rebuild_asset_position(account_id, asset_id)
+    session.flush()
+    assert appended == stored()
@@ -0,0 +1,93 @@
+"""
+帳戶餘額的路徑 (AccountService._calculate_account_totals 與列出帳戶 / 組合 / dashboard 的端點)
+執行的 SQL 數量是固定的，不隨帳戶數量增加 (沒有 N+1)。
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, insert
+from sqlmodel import Session, func, select
+
+from app.models.accounts import Account, Portfolio, PortfolioAccount
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position
+from app.services.account import AccountService
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed(engine, accounts: int) -> list[int]:
+    """
+    新增 `accounts` 個帳戶，各有三個資產與現金的持倉；每兩個帳戶一個組合。回傳新帳戶的 id。
+    """
+    with Session(engine) as session:
+        cash_asset_id = session.exec(select(Asset.id).where(Asset.ticker == "USD")).one()
+        asset_ids = list(session.exec(select(Asset.id).where(Asset.type == AssetType.stock)))
+        if not asset_ids:
+            assets = [Asset(ticker=f"AS{i}", name=f"Asset {i}", type=AssetType.stock, current_price=Decimal(10 + i),
+                            previous_close=Decimal(9 + i)) for i in range(3)]
+            session.add_all(assets)
+            session.flush()
+            asset_ids = [asset.id for asset in assets]
+        first_account = session.exec(select(func.max(Account.id))).one() or 0
+        first_portfolio = session.exec(select(func.max(Portfolio.id))).one() or 0
+        session.execute(insert(Account), [{"name": f"Account {i}"} for i in range(accounts)])
+        session.execute(insert(Portfolio), [{"name": f"Portfolio {i}"} for i in range(accounts // 2)])
+        account_ids = list(session.exec(select(Account.id).where(Account.id > first_account).order_by(Account.id)))
+        portfolio_ids = list(session.exec(
+            select(Portfolio.id).where(Portfolio.id > first_portfolio).order_by(Portfolio.id)
+        ))
+        session.execute(insert(Position), [
+            {"account_id": account_id, "asset_id": asset_id, "total_quantity": Decimal(5), "average_cost": Decimal(8)}
+            for account_id in account_ids for asset_id in [cash_asset_id, *asset_ids]
+        ])
+        session.execute(insert(PortfolioAccount), [
+            {"portfolio_id": portfolio_id, "account_id": account_ids[2 * i + k]}
+            for i, portfolio_id in enumerate(portfolio_ids) for k in range(2)
+        ])
+        session.commit()
+        return account_ids
+
+
+@pytest.mark.parametrize("accounts", [4, 40])
+def test_account_totals_is_one_query(engine, accounts):
+    account_ids = seed(engine, accounts)
+    with Session(engine) as session:
+        service = AccountService(session)
+        with count_statements(engine) as statements:
+            totals = service._calculate_account_totals(account_ids)
+        assert len(statements) == 1
+        assert len(totals) == accounts
+        # 5 USD + 5 * (10 + 11 + 12)
+        assert all(t.balance == Decimal(170) and t.daily_change == Decimal(15) for t in totals.values())
+
+        with count_statements(engine) as statements:
+            totals = service._calculate_account_totals()
+        assert len(statements) == 1
+        assert len(totals) == accounts
+
+
+@pytest.mark.parametrize("path", ["/api/v1/accounts/", "/api/v1/portfolios/", "/api/v1/dashboard/"])
+def test_list_endpoints_query_count_is_constant(engine, client, path):
+    counts = []
+    for accounts in (4, 40):
+        # 第二輪的帳戶總數是第一輪的 11 倍
+        seed(engine, accounts)
+        with count_statements(engine) as statements:
+            response = client.get(path)
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert 0 < counts[0] == counts[1], counts
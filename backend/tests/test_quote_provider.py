@@ -0,0 +1,38 @@
+"""
+YFinanceQuoteProvider：下載失敗的批次記錄 log 並計入報價 metrics，其他批次照常回傳。
+"""
+import logging
+from decimal import Decimal
+
+import pandas as pd
+
+from app.core.metrics import QUOTE_PROVIDER_SECONDS, QUOTE_PROVIDER_SYMBOLS
+from app.services import quote_provider
+from app.services.quote_provider import YFinanceQuoteProvider
+
+PROVIDER = "YFinanceQuoteProvider"
+
+
+def test_failed_batch_is_logged_and_counted(monkeypatch, caplog):
+    def download(batch, **kwargs):
+        if "BAD" in batch:
+            raise ConnectionError("rate limited")
+        return {symbol: {"Close": pd.Series([10.0, 11.0])} for symbol in batch}
+
+    monkeypatch.setattr(quote_provider.yf, "download", download)
+    failed = QUOTE_PROVIDER_SYMBOLS.value((PROVIDER, "failed"))
+    errors = QUOTE_PROVIDER_SECONDS.count((PROVIDER, "download", "error"))
+    downloads = QUOTE_PROVIDER_SECONDS.count((PROVIDER, "download", "ok"))
+
+    with caplog.at_level(logging.ERROR, logger="app.services.quote_provider"):
+        # 依 symbol 排序後每批 2 個：[AAA, BAD] 失敗，[CCC, DDD] 成功
+        quotes = YFinanceQuoteProvider(batch_size=2).get_quotes(["DDD", "BAD", "AAA", "CCC"])
+
+    assert {symbol: (quote.price, quote.previous_close) for symbol, quote in quotes.items()} == {
+        "CCC": (Decimal(11), Decimal(10)), "DDD": (Decimal(11), Decimal(10)),
+    }
+    assert QUOTE_PROVIDER_SYMBOLS.value((PROVIDER, "failed")) - failed == 2
+    assert QUOTE_PROVIDER_SECONDS.count((PROVIDER, "download", "error")) - errors == 1
+    assert QUOTE_PROVIDER_SECONDS.count((PROVIDER, "download", "ok")) - downloads == 1
+    [record] = caplog.records
+    assert record.exc_info[0] is ConnectionError
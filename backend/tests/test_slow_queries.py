@@ -0,0 +1,27 @@
+"""
+慢查詢紀錄預設關閉：engine 不掛 listener，SQLite 連線也不換成 SQLiteConnection。
+"""
+import sqlite3
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.database import SQLiteDB, create_db_engine
+from app.core.slow_queries import SQLiteConnection, _before_cursor_execute
+
+
+def raw_connection_type(engine) -> type:
+    with engine.connect() as connection:
+        return type(connection.connection.dbapi_connection)
+
+
+def test_disabled_by_default():
+    assert not settings.SLOW_QUERY_LOG_ENABLED
+    assert not settings.SLOW_QUERY_EXPLAIN
+    assert not event.contains(SQLiteDB.engine, "before_cursor_execute", _before_cursor_execute)
+    assert raw_connection_type(create_db_engine("sqlite://")) is sqlite3.Connection
+
+
+def test_enabled_uses_timed_connection(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_LOG_ENABLED", True)
+    assert raw_connection_type(create_db_engine("sqlite://")) is SQLiteConnection
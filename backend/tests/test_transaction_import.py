@@ -0,0 +1,71 @@
+"""
+批次匯入以內容雜湊去重：重新匯入同一個檔案 (包含未填時間的列) 不會產生重複的交易。
+"""
+from decimal import Decimal
+
+import pytest
+from sqlmodel import Session, func, select
+
+from app.models.accounts import Account
+from app.models.assets import Asset, AssetType
+from app.models.transacions import Position, Transaction
+from app.services.transaction_import import TransactionImportService
+
+
+@pytest.fixture
+def account_id(session: Session) -> int:
+    account = Account(name="Broker")
+    session.add_all([account, Asset(ticker="ABC", name="ABC Corp", type=AssetType.stock, current_price=Decimal(10))])
+    session.commit()
+    return account.id
+
+
+def upload(client, content: str, filename: str = "transactions.csv") -> dict:
+    response = client.post("/api/v1/transactions/import", files={"file": (filename, content.encode())})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def count(session: Session) -> int:
+    return session.exec(select(func.count()).select_from(Transaction)).one()
+
+
+def test_reimport_skips_rows_without_time(client, session, account_id):
+    content = (
+        "account_id,ticker,type,quantity,price_per_unit,fee,transaction_time\n"
+        f"{account_id},USD,deposit,1000,1,0,2024-01-01T09:00:00\n"
+        f"{account_id},ABC,buy,10,10,1,\n"
+        f"{account_id},ABC,buy,10.0,10,1.00,\n"
+    )
+    first = upload(client, content)
+    # 第三列與第二列內容相同 (Decimal 寫法不同)
+    assert (first["rows"], first["imported"], first["duplicates"]) == (3, 2, 1)
+    assert count(session) == 2
+
+    second = upload(client, content)
+    assert (second["rows"], second["imported"], second["duplicates"], second["positions_rebuilt"]) == (3, 0, 3, 0)
+    assert count(session) == 2
+    position = session.exec(select(Position).join(Asset).where(Asset.ticker == "ABC")).one()
+    assert position.total_quantity == 10
+
+
+def test_duplicates_count_rows_not_inserted(client, session, account_id):
+    upload(client, f'{{"account_id": {account_id}, "ticker": "ABC", "type": "buy", "quantity": 1, '
+                   f'"price_per_unit": 5}}\n', filename="first.ndjson")
+    content = (
+        f'{{"account_id": {account_id}, "ticker": "ABC", "type": "buy", "quantity": 1, "price_per_unit": 5}}\n'
+        f'{{"account_id": {account_id}, "ticker": "ABC", "type": "buy", "quantity": 2, "price_per_unit": 5}}\n'
+        'not json\n'
+    )
+    result = upload(client, content, filename="second.ndjson")
+    assert (result["rows"], result["imported"], result["duplicates"], len(result["errors"])) == (3, 1, 1, 1)
+    assert count(session) == 2
+
+
+def test_errors_are_capped(client, session, account_id, monkeypatch):
+    monkeypatch.setattr(TransactionImportService, "MAX_ERRORS", 3)
+    content = "".join(f"not json {i}\n" for i in range(10))
+    content += f'{{"account_id": {account_id}, "ticker": "ABC", "type": "buy", "quantity": 1, "price_per_unit": 5}}\n'
+    result = upload(client, content, filename="bad.ndjson")
+    assert (result["rows"], result["imported"], result["error_count"]) == (11, 1, 10)
+    assert [error["row"] for error in result["errors"]] == [1, 2, 3]